@@ -0,0 +1,336 @@
+"""
+Pipeline Instrumentation
+Records where the time and memory of compiling and running a SQL file go,
+phase by phase: lex, parse, semantic, plan and execute.
+
+For every phase the profiler keeps the wall and CPU time, the number of
+times it ran, the peak memory allocated while it ran (tracemalloc, relative
+to the memory in use when the phase started) and phase-specific counts such
+as tokens, parse tree nodes or rows. Lexing, parsing and semantic analysis
+run once per file; planning and execution are also recorded per statement.
+
+Phases nest: the scans planned while a statement executes are timed as
+'plan' and left out of that statement's 'execute' time, so the phase times
+of a file add up to its total. Peak memory includes the nested phases.
+
+Profiling is off unless a PipelineProfiler is passed in (main.py creates
+one for --profile or the MINISQL_PROFILE environment variable); the
+executor then only pays one `is None` check per statement and per scan.
+CPU time is per thread. tracemalloc is process wide, so the peaks of
+statements running concurrently (statement_workers > 1) overlap.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+PHASES = ('lex', 'parse', 'semantic', 'plan', 'execute')
+
+# Environment variable that turns profiling on ('1', 'true', 'yes' or 'on')
+PROFILE_ENVIRONMENT_VARIABLE = 'MINISQL_PROFILE'
+
+
+def profiling_requested(flag=False):
+    """True if the flag is set or the environment variable asks for profiling"""
+    if flag:
+        return True
+    return os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def count_nodes(node):
+    """Number of nodes in a parse (sub)tree"""
+    if node is None:
+        return 0
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+class PhaseTiming:
+    """Accumulated measurements of one phase"""
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_bytes = 0
+        # Phase-specific counts (tokens, nodes, rows, ...)
+        self.counts = {}
+
+    def merge(self, other):
+        """Add another timing of the same phase to this one"""
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+        for name, value in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def to_dict(self):
+        """JSON-ready form"""
+        data = {
+            'calls': self.calls,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'peak_bytes': self.peak_bytes,
+        }
+        data.update(self.counts)
+        return data
+
+
+class StatementProfile:
+    """Phases of one executed statement"""
+
+    def __init__(self, index, node):
+        self.index = index
+        self.statement_type = node.node_type
+        self.line = node.line
+        self.nodes = count_nodes(node)
+        self.phases = {}
+        self.succeeded = None
+
+    def finish(self, result):
+        """Note the statement's ExecutionResult (None if it failed)"""
+        self.succeeded = result is not None
+        if result is not None:
+            execute = self.phases.get('execute')
+            if execute is not None:
+                execute.counts['rows'] = execute.counts.get('rows', 0) + result.row_count
+
+    def to_dict(self):
+        """JSON-ready form"""
+        return {
+            'index': self.index,
+            'type': self.statement_type,
+            'line': self.line,
+            'nodes': self.nodes,
+            'succeeded': self.succeeded,
+            'phases': {name: timing.to_dict() for name, timing in self.phases.items()},
+        }
+
+
+class FileProfile:
+    """Phases of one SQL file and of each of its statements"""
+
+    def __init__(self, path):
+        self.path = path
+        # Phases that ran for the whole file (lex, parse, semantic)
+        self.phases = {}
+        self.statements = []
+
+    def phase_totals(self):
+        """File phases plus the statement phases summed, in PHASES order"""
+        totals = {}
+        for name, timing in self.phases.items():
+            totals.setdefault(name, PhaseTiming()).merge(timing)
+        for statement in self.statements:
+            for name, timing in statement.phases.items():
+                totals.setdefault(name, PhaseTiming()).merge(timing)
+        return {name: totals[name] for name in PHASES if name in totals}
+
+    def to_dict(self):
+        """JSON-ready form"""
+        totals = self.phase_totals()
+        return {
+            'path': self.path,
+            'wall_seconds': round(sum(timing.wall_seconds for timing in totals.values()), 6),
+            'cpu_seconds': round(sum(timing.cpu_seconds for timing in totals.values()), 6),
+            'phases': {name: timing.to_dict() for name, timing in totals.items()},
+            'statements': [statement.to_dict() for statement in self.statements],
+        }
+
+
+class _ActivePhase:
+    # Bookkeeping of a phase that is running on some thread
+
+    __slots__ = ('timing', 'wall_start', 'cpu_start', 'memory_start', 'peak', 'child_wall', 'child_cpu')
+
+    def __init__(self, timing, memory_start):
+        self.timing = timing
+        self.memory_start = memory_start
+        # Highest traced memory seen before a nested phase reset the peak
+        self.peak = memory_start
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+
+class PipelineProfiler:
+    """Collects per-phase measurements over any number of files"""
+
+    def __init__(self, trace_memory=True):
+        """
+        Args:
+            trace_memory: Measure peak memory with tracemalloc (slows
+                allocation-heavy phases down noticeably)
+        """
+        self.trace_memory = trace_memory
+        self.files = []
+        self._started_tracing = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ==================== Lifecycle ====================
+
+    def start(self):
+        """Start tracing memory allocations if asked to and nobody else is"""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """Stop the tracing started by start()"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def begin_file(self, path):
+        """
+        Start recording a new file; later phases and statements belong to it
+
+        Returns:
+            FileProfile
+        """
+        profile = FileProfile(path)
+        with self._lock:
+            self.files.append(profile)
+        return profile
+
+    def _current_file(self):
+        with self._lock:
+            if not self.files:
+                self.files.append(FileProfile(None))
+            return self.files[-1]
+
+    # ==================== Recording ====================
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _traced(self):
+        return tracemalloc.is_tracing() if self.trace_memory else False
+
+    @contextmanager
+    def _measure(self, timing):
+        stack = self._stack()
+        traced = self._traced()
+        if traced:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Resetting the peak below would lose the enclosing phase's
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            active = _ActivePhase(timing, current)
+        else:
+            active = _ActivePhase(timing, 0)
+        stack.append(active)
+        try:
+            yield timing.counts
+        finally:
+            wall = time.perf_counter() - active.wall_start
+            cpu = time.thread_time() - active.cpu_start
+            stack.pop()
+            timing.calls += 1
+            timing.wall_seconds += wall - active.child_wall
+            timing.cpu_seconds += cpu - active.child_cpu
+            if traced:
+                peak = max(active.peak, tracemalloc.get_traced_memory()[1])
+                timing.peak_bytes = max(timing.peak_bytes, peak - active.memory_start)
+            if stack:
+                parent = stack[-1]
+                parent.child_wall += wall
+                parent.child_cpu += cpu
+                if traced:
+                    parent.peak = max(parent.peak, peak)
+
+    def phase(self, name):
+        """
+        Context manager timing one run of a phase
+
+        Within a statement (see statement()) the run is recorded for that
+        statement, otherwise for the current file. The context value is the
+        phase's counts dict, to which the caller may add counts.
+
+        Example:
+            with profiler.phase('lex') as counts:
+                tokens = lexer.tokenize()
+                counts['tokens'] = len(tokens)
+        """
+        statement = getattr(self._local, 'statement', None)
+        owner = statement if statement is not None else self._current_file()
+        timing = owner.phases.get(name)
+        if timing is None:
+            timing = owner.phases[name] = PhaseTiming()
+        return self._measure(timing)
+
+    @contextmanager
+    def statement(self, node):
+        """
+        Context manager executing one statement: its run is timed as
+        'execute' and the phases started inside it are recorded for it
+
+        The context value is the StatementProfile; pass the statement's
+        result to its finish().
+        """
+        file_profile = self._current_file()
+        with self._lock:
+            profile = StatementProfile(len(file_profile.statements), node)
+            file_profile.statements.append(profile)
+        previous = getattr(self._local, 'statement', None)
+        self._local.statement = profile
+        try:
+            with self.phase('execute'):
+                yield profile
+        finally:
+            self._local.statement = previous
+
+    # ==================== Report ====================
+
+    def report(self):
+        """
+        Everything recorded so far
+
+        Returns:
+            Dict with 'phases' (totals over every file), 'files' and whether
+            memory was traced
+        """
+        with self._lock:
+            files = list(self.files)
+        totals = {}
+        for file_profile in files:
+            for name, timing in file_profile.phase_totals().items():
+                totals.setdefault(name, PhaseTiming()).merge(timing)
+        return {
+            'memory_traced': self.trace_memory,
+            'phases': {name: totals[name].to_dict() for name in PHASES if name in totals},
+            'files': [file_profile.to_dict() for file_profile in files],
+        }
+
+    def to_json(self, indent=2):
+        """The report as a JSON string"""
+        return json.dumps(self.report(), indent=indent)
+
+    def write_json(self, path):
+        """Write the report to a JSON file"""
+        with open(path, 'w') as file:
+            file.write(self.to_json())
+            file.write('\n')
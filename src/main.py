@@ -1,6 +1,12 @@
+import argparse
+from contextlib import nullcontext
+
 from phase1_lexer.lexer import LexicalAnalyzer
 from phase1_lexer.token_definitions import TokenType
 from phase2_parser.parser import SyntaxAnalyzer
+from phase3_semantic.semantic_analyzer import analyze
+from phase4_executor import QueryExecutor, open_database
+from instrumentation import PipelineProfiler, count_nodes, profiling_requested
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -89,26 +95,134 @@ def print_parse_tree(parse_tree):
     add_children(parse_tree, tree)
     console.print(tree)
 
-def main():
-    console.print(Panel.fit("[header]Mini SQL Compiler - Phase 1 & 2: Lexical & Syntax Analysis[/header]", border_style="border"))
+def print_results(results):
+    """Print the outcome of every executed statement"""
+    if not results:
+        console.print("[info]No statements executed.[/info]")
+        return
+
+    for result in results:
+        if not result.columns:
+            console.print(f"[success]{result.statement_type}[/success]: [info]{result.message}[/info]")
+            continue
+
+        table = Table(title=f"{result.statement_type} ({result.message})", header_style="header")
+        for column in result.columns:
+            table.add_column(column, style="white")
+        for row in result.rows:
+            table.add_row(*(str(value) for value in row))
+        console.print(table)
+
+def print_profile(report):
+    """Print the per-phase time and memory of every profiled file"""
+    for file_report in report["files"]:
+        table = Table(title=f"Profile: {file_report['path']}", header_style="header")
+        table.add_column("Phase", style="keyword")
+        table.add_column("Calls", justify="right", style="accent")
+        table.add_column("Wall ms", justify="right", style="white")
+        table.add_column("CPU ms", justify="right", style="white")
+        table.add_column("Peak KiB", justify="right", style="error")
+        table.add_column("Counts", style="info")
+        for name, phase in file_report["phases"].items():
+            counts = ", ".join(
+                f"{key} {value}" for key, value in phase.items()
+                if key not in ("calls", "wall_seconds", "cpu_seconds", "peak_bytes")
+            )
+            table.add_row(
+                name, str(phase["calls"]), f"{phase['wall_seconds'] * 1000:.2f}",
+                f"{phase['cpu_seconds'] * 1000:.2f}", f"{phase['peak_bytes'] / 1024:.1f}", counts
+            )
+        table.add_row(
+            "total", "", f"{file_report['wall_seconds'] * 1000:.2f}",
+            f"{file_report['cpu_seconds'] * 1000:.2f}", "", f"statements {len(file_report['statements'])}",
+            style="bold"
+        )
+        console.print(table)
+
+def phase(profiler, name):
+    """Time a phase when profiling; otherwise a context doing nothing"""
+    return profiler.phase(name) if profiler is not None else nullcontext({})
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Mini SQL Compiler")
+    parser.add_argument("files", nargs="*", default=["src/phase1_lexer/test_input.sql"],
+                        help="SQL files to compile and run")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every phase and print a summary (also MINISQL_PROFILE=1)")
+    parser.add_argument("--profile-json", metavar="PATH",
+                        help="Write the profile report as JSON to PATH ('-' prints it)")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="Profile without tracemalloc peak memory")
+    parser.add_argument("--database", metavar="DIR",
+                        help="Run against the database in DIR: recover it from its write-ahead log, "
+                             "log every write and checkpoint it at the end")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    profiler = None
+    if profiling_requested(arguments.profile or arguments.profile_json is not None):
+        profiler = PipelineProfiler(trace_memory=not arguments.no_trace_memory)
+        profiler.start()
+    catalog = wal = None
+    if arguments.database is not None:
+        catalog, wal = open_database(arguments.database)
+    try:
+        for sql_file_path in arguments.files:
+            run_file(sql_file_path, profiler, catalog, wal)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if wal is not None:
+            try:
+                if wal.record_count:
+                    wal.checkpoint(catalog, arguments.database)
+            finally:
+                # Syncs the records a group commit still holds
+                wal.close()
+    if profiler is None:
+        return
+
+    report = profiler.report()
+    console.print("\n[header]=== PROFILE ===[/header]")
+    print_profile(report)
+    if arguments.profile_json == "-":
+        print(profiler.to_json())
+    elif arguments.profile_json is not None:
+        profiler.write_json(arguments.profile_json)
+        console.print(f"[info]Profile written to[/info] [accent]{arguments.profile_json}[/accent]")
+
+def run_file(sql_file_path, profiler=None, catalog=None, wal=None):
+    """
+    Compile and run one SQL file, printing every phase's output
+
+    A file with lexical or syntax errors is not executed. Without a catalog
+    the file runs against a new, empty database.
 
-    # Path to your SQL test input
-    sql_file_path = "src/phase1_lexer/test_input.sql"
+    Returns:
+        The QueryExecutor that ran the file, or None if it was not run
+    """
+    console.print(Panel.fit("[header]Mini SQL Compiler - Lexical, Syntax & Semantic Analysis and Execution[/header]", border_style="border"))
 
     try:
         with open(sql_file_path, "r") as file:
             source_code = file.read()
     except FileNotFoundError:
         console.print(f"[error]Error:[/error] Cannot find [accent]{sql_file_path}[/accent]")
-        return
+        return None
+    if profiler is not None:
+        profiler.begin_file(sql_file_path)
 
     # ========== PHASE 1: LEXICAL ANALYSIS ==========
     console.print("\n[header]================================================================[/header]")
     console.print("[header]PHASE 1: LEXICAL ANALYSIS[/header]")
     console.print("[header]================================================================[/header]\n")
     
-    lexer = LexicalAnalyzer(source_code)
-    tokens = lexer.tokenize()
+    with phase(profiler, "lex") as counts:
+        lexer = LexicalAnalyzer(source_code)
+        tokens = lexer.tokenize()
+        counts["tokens"] = len(tokens)
+        counts["errors"] = len(lexer.errors.get_errors())
 
     # Output Phase 1 results
     console.print("\n[header]=== TOKENS ===[/header]")
@@ -129,8 +243,13 @@ def main():
     filtered_tokens = [t for t in tokens if t.type not in [TokenType.COMMENT, TokenType.ERROR]]
     
     # Initialize and run the parser
-    parser = SyntaxAnalyzer(filtered_tokens)
-    parse_tree = parser.parse()
+    with phase(profiler, "parse") as counts:
+        parser = SyntaxAnalyzer(filtered_tokens)
+        parse_tree = parser.parse()
+        if profiler is not None:
+            counts["nodes"] = count_nodes(parse_tree)
+            counts["statements"] = len(parse_tree.children) if parse_tree is not None else 0
+            counts["errors"] = len(parser.errors.get_errors())
 
     # Output Phase 2 results
     console.print("\n[header]=== PARSE TREE ===[/header]")
@@ -139,6 +258,33 @@ def main():
     console.print("\n[header]=== SYNTAX ERRORS ===[/header]")
     print_errors(parser.errors, "Syntax")
 
+    # ========== PHASE 3: SEMANTIC ANALYSIS ==========
+    with phase(profiler, "semantic"):
+        analyze(parse_tree)
+
+    # ========== PHASE 4: EXECUTION ==========
+    console.print("\n[header]================================================================[/header]")
+    console.print("[header]PHASE 4: EXECUTION[/header]")
+    console.print("[header]================================================================[/header]\n")
+
+    if lexer.errors.has_errors() or parser.errors.has_errors():
+        # Error recovery may have dropped part of a statement (a WHERE
+        # clause, say), so running what is left could change the wrong rows
+        console.print("[error]Execution skipped: the script has lexical or syntax errors[/error]")
+        executor = None
+    else:
+        executor = QueryExecutor(catalog, wal, profiler=profiler)
+        try:
+            results = executor.execute(parse_tree)
+
+            console.print("\n[header]=== RESULTS ===[/header]")
+            print_results(results)
+
+            console.print("\n[header]=== RUNTIME ERRORS ===[/header]")
+            print_errors(executor.errors, "Runtime")
+        finally:
+            executor.close()
+
     # Summary
     console.print("\n[header]================================================================[/header]")
     if not lexer.errors.has_errors() and not parser.errors.has_errors():
@@ -153,6 +299,7 @@ def main():
             console.print("[error]Syntax Analysis: FAILED[/error]")
         else:
             console.print("[success]Syntax Analysis: PASSED[/success]")
+    return executor
 
 if __name__ == "__main__":
     main()
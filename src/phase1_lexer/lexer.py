@@ -23,7 +23,11 @@ class LexicalAnalyzer:
         self.keywords = {
             'SELECT', 'FROM', 'WHERE', 'INSERT', 'INTO', 'VALUES',
             'UPDATE', 'SET', 'DELETE', 'CREATE', 'TABLE', 'INT',
-            'FLOAT', 'TEXT', 'AND', 'OR', 'NOT'
+            'FLOAT', 'TEXT', 'AND', 'OR', 'NOT', 'ANALYZE', 'COPY',
+            'EXPLAIN', 'GROUP', 'BY', 'HAVING', 'JOIN', 'ON', 'ORDER',
+            'ASC', 'DESC', 'LIMIT', 'BLOOM', 'BEGIN', 'COMMIT', 'ROLLBACK',
+            'SAVE', 'LOAD', 'SNAPSHOT', 'UNCOMPRESSED', 'IN', 'BETWEEN', 'LIKE',
+            'SHOW', 'INDEX', 'ADVICE'
         }
 
     def current_char(self):
@@ -239,6 +243,12 @@ class LexicalAnalyzer:
                 self.advance()
                 continue
 
+            # Positional parameter placeholder
+            if char == '?':
+                self.tokens.append(Token(TokenType.PARAMETER, char, self.line, self.column))
+                self.advance()
+                continue
+
             # Invalid character
             self.errors.add_error(
                 f"Error: invalid character '{char}' at line {self.line}, column {self.column}",
@@ -8,6 +8,7 @@ class TokenType(Enum):
     STRING_LITERAL = "STRING_LITERAL"
     OPERATOR = "OPERATOR"
     PUNCTUATION = "PUNCTUATION"
+    PARAMETER = "PARAMETER"
     COMMENT = "COMMENT"
     EOF = "EOF"
     ERROR = "ERROR"
@@ -15,7 +16,11 @@ class TokenType(Enum):
 KEYWORDS = {
     "SELECT", "FROM", "WHERE", "INSERT", "INTO", "VALUES",
     "UPDATE", "SET", "DELETE", "CREATE", "TABLE",
-    "INT", "FLOAT", "TEXT", "AND", "OR", "NOT"
+    "INT", "FLOAT", "TEXT", "AND", "OR", "NOT", "ANALYZE", "COPY", "EXPLAIN",
+    "GROUP", "BY", "HAVING", "JOIN", "ON", "ORDER", "ASC", "DESC", "LIMIT",
+    "BLOOM", "BEGIN", "COMMIT", "ROLLBACK",
+    "SAVE", "LOAD", "SNAPSHOT", "UNCOMPRESSED", "IN", "BETWEEN", "LIKE",
+    "SHOW", "INDEX", "ADVICE"
 }
 
 OPERATORS = {"+", "-", "*", "/", "=", "!=", ">", ">=", "<", "<="}
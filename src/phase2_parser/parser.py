@@ -22,6 +22,7 @@ class SyntaxAnalyzer:
         self.current_index = 0
         self.errors = ErrorHandler()
         self.parse_tree = None
+        self.parameter_count = 0
     
     def current_token(self):
         """Get the current token"""
@@ -124,10 +125,35 @@ class SyntaxAnalyzer:
         else:
             self.errors.add_error(f"Syntax Error: {message} at line {line}, position {column}.", line, column)
     
+    def report_missing(self, what, error_count):
+        """
+        Report that an expected construct is missing at the current token,
+        unless the sub-rule that failed to parse it already reported why
+        
+        Args:
+            what: Description of the construct (e.g. "a condition after WHERE")
+            error_count: Number of errors reported before the sub-rule ran
+        
+        Returns:
+            None, so that rules can `return self.report_missing(...)`
+        """
+        if len(self.errors.get_errors()) > error_count:
+            return None
+        token = self.current_token()
+        if token is None:
+            self.report_error(f"Expected {what}, but found end of input", None, None)
+        else:
+            self.report_error(
+                f"Expected {what} at line {token.line}, position {token.column}, but found '{token.lexeme}'",
+                token.line, token.column
+            )
+        return None
+    
     def synchronize(self):
         """
         Error recovery: skip tokens until finding a synchronizing token
-        Synchronizing tokens: SEMICOLON, CREATE, SELECT, INSERT, UPDATE, DELETE
+        Synchronizing tokens: SEMICOLON, CREATE, SELECT, INSERT, UPDATE, DELETE, ANALYZE, COPY, EXPLAIN,
+        BEGIN, COMMIT, ROLLBACK, SAVE, LOAD, SHOW
         
         For semicolons, advance past them to skip to the next statement.
         For keywords, stop so they can be parsed as the start of the next statement.
@@ -144,7 +170,8 @@ class SyntaxAnalyzer:
             # so it can be parsed as the next statement
             if token.type == TokenType.KEYWORD:
                 keyword = token.lexeme.upper()
-                if keyword in ['CREATE', 'SELECT', 'INSERT', 'UPDATE', 'DELETE']:
+                if keyword in ['CREATE', 'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'ANALYZE', 'COPY', 'EXPLAIN',
+                               'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVE', 'LOAD', 'SHOW']:
                     return
             
             self.advance()
@@ -193,6 +220,9 @@ class SyntaxAnalyzer:
         Parse a SQL statement
         
         Statement -> SELECT_STMT | INSERT_STMT | UPDATE_STMT | DELETE_STMT | CREATE_STMT
+                   | ANALYZE_STMT | COPY_STMT | EXPLAIN_STMT
+                   | BEGIN_STMT | COMMIT_STMT | ROLLBACK_STMT
+                   | SAVE_SNAPSHOT_STMT | LOAD_SNAPSHOT_STMT | SHOW_INDEX_ADVICE_STMT
         """
         token = self.current_token()
         if token is None:
@@ -200,7 +230,7 @@ class SyntaxAnalyzer:
         
         if token.type != TokenType.KEYWORD:
             self.report_error(
-                f"Expected a SQL statement keyword (SELECT, INSERT, UPDATE, DELETE, CREATE) at line {token.line}, position {token.column}, but found '{token.lexeme}'",
+                f"Expected a SQL statement keyword (SELECT, INSERT, UPDATE, DELETE, CREATE, ANALYZE, COPY, EXPLAIN, BEGIN, COMMIT, ROLLBACK, SAVE, LOAD, SHOW) at line {token.line}, position {token.column}, but found '{token.lexeme}'",
                 token.line, token.column
             )
             return None
@@ -217,9 +247,21 @@ class SyntaxAnalyzer:
             return self.parse_delete_statement()
         elif keyword == 'CREATE':
             return self.parse_create_statement()
+        elif keyword == 'ANALYZE':
+            return self.parse_analyze_statement()
+        elif keyword == 'COPY':
+            return self.parse_copy_statement()
+        elif keyword == 'EXPLAIN':
+            return self.parse_explain_statement()
+        elif keyword in ('BEGIN', 'COMMIT', 'ROLLBACK'):
+            return self.parse_transaction_statement()
+        elif keyword in ('SAVE', 'LOAD'):
+            return self.parse_snapshot_statement()
+        elif keyword == 'SHOW':
+            return self.parse_show_statement()
         else:
             self.report_error(
-                f"Unexpected keyword '{keyword}' at line {token.line}, position {token.column}. Expected one of: SELECT, INSERT, UPDATE, DELETE, CREATE",
+                f"Unexpected keyword '{keyword}' at line {token.line}, position {token.column}. Expected one of: SELECT, INSERT, UPDATE, DELETE, CREATE, ANALYZE, COPY, EXPLAIN, BEGIN, COMMIT, ROLLBACK, SAVE, LOAD, SHOW",
                 token.line, token.column
             )
             return None
@@ -228,7 +270,9 @@ class SyntaxAnalyzer:
         """
         Parse SELECT statement
         
-        SELECT_STMT -> SELECT SelectList FROM Identifier [WHERE Condition]
+        SELECT_STMT -> SELECT SelectList FROM Identifier (JOIN Identifier ON Condition)*
+                       [WHERE Condition] [GROUP BY ExpressionList] [HAVING Condition]
+                       [ORDER BY SortKey (',' SortKey)*] [LIMIT (INT_LITERAL | Parameter)]
         """
         node = ParseTreeNode("SELECT_STMT")
         start_token = self.current_token()
@@ -239,9 +283,12 @@ class SyntaxAnalyzer:
             return None
         
         # SelectList
+        error_count = len(self.errors.get_errors())
         select_list = self.parse_select_list()
         if select_list:
             node.add_child(select_list)
+        else:
+            return self.report_missing("a select list after SELECT", error_count)
         
         # FROM
         if not self.consume(TokenType.KEYWORD, 'FROM'):
@@ -254,11 +301,222 @@ class SyntaxAnalyzer:
         else:
             return None
         
+        # Optional JOIN clauses
+        while self.match(TokenType.KEYWORD, 'JOIN'):
+            join_clause = self.parse_join_clause()
+            if join_clause:
+                node.add_child(join_clause)
+            else:
+                return None
+        
         # Optional WHERE clause
         if self.match(TokenType.KEYWORD, 'WHERE'):
             where_clause = self.parse_where_clause()
             if where_clause:
                 node.add_child(where_clause)
+            else:
+                return None
+        
+        # Optional GROUP BY clause
+        if self.match(TokenType.KEYWORD, 'GROUP'):
+            group_by = self.parse_group_by_clause()
+            if group_by:
+                node.add_child(group_by)
+            else:
+                return None
+        
+        # Optional HAVING clause
+        if self.match(TokenType.KEYWORD, 'HAVING'):
+            having_clause = self.parse_having_clause()
+            if having_clause:
+                node.add_child(having_clause)
+            else:
+                return None
+        
+        # Optional ORDER BY clause
+        if self.match(TokenType.KEYWORD, 'ORDER'):
+            order_by = self.parse_order_by_clause()
+            if order_by:
+                node.add_child(order_by)
+            else:
+                return None
+        
+        # Optional LIMIT clause
+        if self.match(TokenType.KEYWORD, 'LIMIT'):
+            limit_clause = self.parse_limit_clause()
+            if limit_clause:
+                node.add_child(limit_clause)
+            else:
+                return None
+        
+        return node
+    
+    def parse_join_clause(self):
+        """
+        Parse JOIN clause
+        
+        JOIN_CLAUSE -> JOIN Identifier ON Condition
+        """
+        node = ParseTreeNode("JOIN_CLAUSE")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # JOIN
+        if not self.consume(TokenType.KEYWORD, 'JOIN'):
+            return None
+        
+        # Identifier (table name)
+        table_node = self.parse_identifier()
+        if table_node:
+            node.add_child(table_node)
+        else:
+            token = self.current_token()
+            line = token.line if token else start_token.line
+            col = token.column if token else start_token.column
+            self.report_error(
+                f"Expected a table name after JOIN at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                line, col
+            )
+            return None
+        
+        # ON Condition
+        if not self.consume(TokenType.KEYWORD, 'ON'):
+            return None
+        error_count = len(self.errors.get_errors())
+        condition = self.parse_condition()
+        if condition:
+            node.add_child(condition)
+        else:
+            return self.report_missing("a join condition after ON", error_count)
+        
+        return node
+    
+    def parse_group_by_clause(self):
+        """
+        Parse GROUP BY clause
+        
+        GROUP_BY -> GROUP BY Expression (',' Expression)*
+        """
+        node = ParseTreeNode("GROUP_BY")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # GROUP BY
+        if not self.consume(TokenType.KEYWORD, 'GROUP'):
+            return None
+        if not self.consume(TokenType.KEYWORD, 'BY'):
+            return None
+        
+        # Grouping expressions
+        while True:
+            token = self.current_token()
+            expression = self.parse_expression()
+            if expression is None:
+                line = token.line if token else start_token.line
+                col = token.column if token else start_token.column
+                self.report_error(
+                    f"Expected an expression after GROUP BY at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                    line, col
+                )
+                return None
+            node.add_child(expression)
+            if not self.match(TokenType.PUNCTUATION, ','):
+                break
+            self.advance()  # consume comma
+        
+        return node
+    
+    def parse_having_clause(self):
+        """
+        Parse HAVING clause
+        
+        HAVING_CLAUSE -> HAVING Condition
+        """
+        node = ParseTreeNode("HAVING_CLAUSE")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # HAVING
+        if not self.consume(TokenType.KEYWORD, 'HAVING'):
+            return None
+        
+        # Condition
+        error_count = len(self.errors.get_errors())
+        condition = self.parse_condition()
+        if condition:
+            node.add_child(condition)
+        else:
+            return self.report_missing("a condition after HAVING", error_count)
+        
+        return node
+    
+    def parse_order_by_clause(self):
+        """
+        Parse ORDER BY clause
+        
+        ORDER_BY -> ORDER BY SortKey (',' SortKey)*
+        SortKey -> Expression [ASC | DESC]
+        """
+        node = ParseTreeNode("ORDER_BY")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # ORDER BY
+        if not self.consume(TokenType.KEYWORD, 'ORDER'):
+            return None
+        if not self.consume(TokenType.KEYWORD, 'BY'):
+            return None
+        
+        # Sort keys, ascending unless DESC is given
+        while True:
+            token = self.current_token()
+            expression = self.parse_expression()
+            if expression is None:
+                line = token.line if token else start_token.line
+                col = token.column if token else start_token.column
+                self.report_error(
+                    f"Expected an expression after ORDER BY at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                    line, col
+                )
+                return None
+            sort_key = ParseTreeNode("SORT_KEY", 'ASC')
+            sort_key.set_position(expression.line, expression.column)
+            sort_key.add_child(expression)
+            if self.match(TokenType.KEYWORD, 'ASC') or self.match(TokenType.KEYWORD, 'DESC'):
+                sort_key.value = self.current_token().lexeme
+                self.advance()
+            node.add_child(sort_key)
+            if not self.match(TokenType.PUNCTUATION, ','):
+                break
+            self.advance()  # consume comma
+        
+        return node
+    
+    def parse_limit_clause(self):
+        """
+        Parse LIMIT clause
+        
+        LIMIT_CLAUSE -> LIMIT (INT_LITERAL | Parameter)
+        """
+        node = ParseTreeNode("LIMIT_CLAUSE")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # LIMIT
+        if not self.consume(TokenType.KEYWORD, 'LIMIT'):
+            return None
+        
+        # Row count
+        token = self.current_token()
+        if token is None or token.type not in (TokenType.INT_LITERAL, TokenType.PARAMETER):
+            line = token.line if token else start_token.line
+            col = token.column if token else start_token.column
+            self.report_error(
+                f"Expected a row count after LIMIT at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                line, col
+            )
+            return None
+        node.add_child(self.parse_factor())
         
         return node
     
@@ -288,11 +546,12 @@ class SyntaxAnalyzer:
             
             while self.match(TokenType.PUNCTUATION, ','):
                 self.advance()  # consume comma
+                error_count = len(self.errors.get_errors())
                 item = self.parse_select_item()
                 if item:
                     node.add_child(item)
                 else:
-                    break
+                    return self.report_missing("a select item after ','", error_count)
         
         return node
     
@@ -373,11 +632,12 @@ class SyntaxAnalyzer:
         
         while self.match(TokenType.PUNCTUATION, ','):
             self.advance()  # consume comma
+            error_count = len(self.errors.get_errors())
             val = self.parse_value()
             if val:
                 node.add_child(val)
             else:
-                break
+                return self.report_missing("a value after ','", error_count)
         
         return node
     
@@ -438,6 +698,8 @@ class SyntaxAnalyzer:
             where_clause = self.parse_where_clause()
             if where_clause:
                 node.add_child(where_clause)
+            else:
+                return None
         
         return node
     
@@ -458,11 +720,12 @@ class SyntaxAnalyzer:
         
         while self.match(TokenType.PUNCTUATION, ','):
             self.advance()  # consume comma
+            error_count = len(self.errors.get_errors())
             assign = self.parse_assignment()
             if assign:
                 node.add_child(assign)
             else:
-                break
+                return self.report_missing("an assignment after ','", error_count)
         
         return node
     
@@ -524,6 +787,8 @@ class SyntaxAnalyzer:
             where_clause = self.parse_where_clause()
             if where_clause:
                 node.add_child(where_clause)
+            else:
+                return None
         
         return node
     
@@ -574,7 +839,7 @@ class SyntaxAnalyzer:
         Parse column definition list
         
         ColumnDefList -> ColumnDef (',' ColumnDef)*
-        ColumnDef -> Identifier DataType
+        ColumnDef -> Identifier DataType [BloomOption]
         """
         node = ParseTreeNode("COLUMN_DEF_LIST")
         
@@ -586,11 +851,12 @@ class SyntaxAnalyzer:
         
         while self.match(TokenType.PUNCTUATION, ','):
             self.advance()  # consume comma
+            error_count = len(self.errors.get_errors())
             col_def = self.parse_column_def()
             if col_def:
                 node.add_child(col_def)
             else:
-                break
+                return self.report_missing("a column definition after ','", error_count)
         
         return node
     
@@ -598,7 +864,7 @@ class SyntaxAnalyzer:
         """
         Parse a column definition
         
-        ColumnDef -> Identifier DataType
+        ColumnDef -> Identifier DataType [BloomOption]
         """
         node = ParseTreeNode("COLUMN_DEF")
         
@@ -616,6 +882,50 @@ class SyntaxAnalyzer:
         else:
             return None
         
+        # Optional BLOOM option
+        if self.match(TokenType.KEYWORD, 'BLOOM'):
+            bloom = self.parse_bloom_option()
+            if bloom:
+                node.add_child(bloom)
+            else:
+                return None
+        
+        return node
+    
+    def parse_bloom_option(self):
+        """
+        Parse the Bloom filter option of a column definition
+        
+        BloomOption -> BLOOM ['(' FLOAT_LITERAL ')']
+        
+        The BLOOM_FILTER node's value is the false positive rate lexeme, or
+        None for the default rate.
+        """
+        node = ParseTreeNode("BLOOM_FILTER")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # BLOOM
+        if not self.consume(TokenType.KEYWORD, 'BLOOM'):
+            return None
+        
+        # Optional false positive rate
+        if self.match(TokenType.PUNCTUATION, '('):
+            self.advance()  # consume '('
+            token = self.current_token()
+            if token is None or token.type != TokenType.FLOAT_LITERAL:
+                line = token.line if token else start_token.line
+                col = token.column if token else start_token.column
+                self.report_error(
+                    f"Expected a false positive rate after BLOOM ( at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                    line, col
+                )
+                return None
+            node.value = token.lexeme
+            self.advance()
+            if not self.consume(TokenType.PUNCTUATION, ')'):
+                return None
+        
         return node
     
     def parse_data_type(self):
@@ -647,6 +957,175 @@ class SyntaxAnalyzer:
         self.advance()
         return node
     
+    def parse_analyze_statement(self):
+        """
+        Parse ANALYZE statement
+        
+        ANALYZE_STMT -> ANALYZE [Identifier]
+        
+        Without a table name every table in the catalog is analyzed.
+        """
+        node = ParseTreeNode("ANALYZE_STMT")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # ANALYZE
+        if not self.consume(TokenType.KEYWORD, 'ANALYZE'):
+            return None
+        
+        # Optional Identifier (table name)
+        if self.match(TokenType.IDENTIFIER):
+            node.add_child(self.parse_identifier())
+        
+        return node
+    
+    def parse_transaction_statement(self):
+        """
+        Parse a transaction control statement
+        
+        BEGIN_STMT -> BEGIN
+        COMMIT_STMT -> COMMIT
+        ROLLBACK_STMT -> ROLLBACK
+        """
+        token = self.current_token()
+        node = ParseTreeNode(f"{token.lexeme.upper()}_STMT")
+        node.set_position(token.line, token.column)
+        self.advance()
+        return node
+    
+    def parse_snapshot_statement(self):
+        """
+        Parse SAVE SNAPSHOT / LOAD SNAPSHOT
+        
+        SAVE_SNAPSHOT_STMT -> SAVE SNAPSHOT STRING_LITERAL [UNCOMPRESSED]
+        LOAD_SNAPSHOT_STMT -> LOAD SNAPSHOT STRING_LITERAL
+        """
+        start_token = self.current_token()
+        keyword = start_token.lexeme.upper()
+        node = ParseTreeNode(f"{keyword}_SNAPSHOT_STMT")
+        node.set_position(start_token.line, start_token.column)
+        
+        # SAVE | LOAD
+        self.advance()
+        
+        # SNAPSHOT
+        if not self.consume(TokenType.KEYWORD, 'SNAPSHOT'):
+            return None
+        
+        # Directory path
+        path_token = self.consume(TokenType.STRING_LITERAL)
+        if not path_token:
+            return None
+        path_node = ParseTreeNode("FILE_PATH", path_token.lexeme)
+        path_node.set_position(path_token.line, path_token.column)
+        node.add_child(path_node)
+        
+        # Optional UNCOMPRESSED (SAVE only)
+        if keyword == 'SAVE' and self.match(TokenType.KEYWORD, 'UNCOMPRESSED'):
+            token = self.consume(TokenType.KEYWORD, 'UNCOMPRESSED')
+            option = ParseTreeNode("UNCOMPRESSED")
+            option.set_position(token.line, token.column)
+            node.add_child(option)
+        
+        return node
+    
+    def parse_show_statement(self):
+        """
+        Parse SHOW INDEX ADVICE
+        
+        SHOW_INDEX_ADVICE_STMT -> SHOW INDEX ADVICE [CREATE]
+        
+        With CREATE, the advised indexes are also built.
+        """
+        start_token = self.current_token()
+        node = ParseTreeNode("SHOW_INDEX_ADVICE_STMT")
+        node.set_position(start_token.line, start_token.column)
+        
+        # SHOW INDEX ADVICE
+        for keyword in ('SHOW', 'INDEX', 'ADVICE'):
+            if not self.consume(TokenType.KEYWORD, keyword):
+                return None
+        
+        # Optional CREATE
+        if self.match(TokenType.KEYWORD, 'CREATE'):
+            token = self.consume(TokenType.KEYWORD, 'CREATE')
+            option = ParseTreeNode("CREATE_INDEXES")
+            option.set_position(token.line, token.column)
+            node.add_child(option)
+        
+        return node
+    
+    def parse_copy_statement(self):
+        """
+        Parse COPY statement (bulk CSV import)
+        
+        COPY_STMT -> COPY Identifier FROM STRING_LITERAL
+        """
+        node = ParseTreeNode("COPY_STMT")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # COPY
+        if not self.consume(TokenType.KEYWORD, 'COPY'):
+            return None
+        
+        # Identifier (table name)
+        if not self.match(TokenType.IDENTIFIER):
+            self.consume(TokenType.IDENTIFIER)  # reports the error
+            return None
+        node.add_child(self.parse_identifier())
+        
+        # FROM
+        if not self.consume(TokenType.KEYWORD, 'FROM'):
+            return None
+        
+        # File path
+        path_token = self.consume(TokenType.STRING_LITERAL)
+        if not path_token:
+            return None
+        path_node = ParseTreeNode("FILE_PATH", path_token.lexeme)
+        path_node.set_position(path_token.line, path_token.column)
+        node.add_child(path_node)
+        
+        return node
+    
+    def parse_explain_statement(self):
+        """
+        Parse EXPLAIN statement
+        
+        EXPLAIN_STMT -> EXPLAIN (SELECT_STMT | UPDATE_STMT | DELETE_STMT)
+        """
+        node = ParseTreeNode("EXPLAIN_STMT")
+        start_token = self.current_token()
+        node.set_position(start_token.line, start_token.column)
+        
+        # EXPLAIN
+        if not self.consume(TokenType.KEYWORD, 'EXPLAIN'):
+            return None
+        
+        # Explained statement
+        token = self.current_token()
+        keyword = token.lexeme.upper() if token and token.type == TokenType.KEYWORD else None
+        if keyword == 'SELECT':
+            statement = self.parse_select_statement()
+        elif keyword == 'UPDATE':
+            statement = self.parse_update_statement()
+        elif keyword == 'DELETE':
+            statement = self.parse_delete_statement()
+        else:
+            line = token.line if token else 0
+            col = token.column if token else 0
+            self.report_error(
+                f"Expected SELECT, UPDATE or DELETE after EXPLAIN at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                line, col
+            )
+            return None
+        
+        if statement is None:
+            return None
+        node.add_child(statement)
+        return node
+    
     def parse_where_clause(self):
         """
         Parse WHERE clause
@@ -662,11 +1141,12 @@ class SyntaxAnalyzer:
             return None
         
         # Condition
+        error_count = len(self.errors.get_errors())
         condition = self.parse_condition()
         if condition:
             node.add_child(condition)
         else:
-            return None
+            return self.report_missing("a condition after WHERE", error_count)
         
         return node
     
@@ -701,9 +1181,11 @@ class SyntaxAnalyzer:
             or_token = self.current_token()
             self.advance()  # consume OR
             
+            error_count = len(self.errors.get_errors())
             right = self.parse_and_condition()
             if right is None:
-                break
+                # A half-parsed condition must not stand in for the whole one
+                return self.report_missing("a condition after OR", error_count)
             
             # Create OR node
             or_node = ParseTreeNode("OR_CONDITION")
@@ -730,9 +1212,11 @@ class SyntaxAnalyzer:
             and_token = self.current_token()
             self.advance()  # consume AND
             
+            error_count = len(self.errors.get_errors())
             right = self.parse_not_condition()
             if right is None:
-                break
+                # A half-parsed condition must not stand in for the whole one
+                return self.report_missing("a condition after AND", error_count)
             
             # Create AND node
             and_node = ParseTreeNode("AND_CONDITION")
@@ -756,9 +1240,10 @@ class SyntaxAnalyzer:
             not_token = self.current_token()
             self.advance()  # consume NOT
             
+            error_count = len(self.errors.get_errors())
             operand = self.parse_not_condition()  # Recursive for NOT NOT ...
             if operand is None:
-                return None
+                return self.report_missing("a condition after NOT", error_count)
             
             node = ParseTreeNode("NOT_CONDITION")
             node.set_position(not_token.line, not_token.column)
@@ -785,7 +1270,12 @@ class SyntaxAnalyzer:
         Parse comparison expression
         
         Comparison -> Expression Operator Expression
+                    | Expression [NOT] IN '(' Expression (',' Expression)* ')'
+                    | Expression [NOT] BETWEEN Expression AND Expression
+                    | Expression [NOT] LIKE Expression
                     | Identifier
+        
+        The NOT forms are returned as a NOT_CONDITION over the predicate.
         """
         node = ParseTreeNode("COMPARISON")
         
@@ -794,6 +1284,23 @@ class SyntaxAnalyzer:
         if left is None:
             return None
         
+        # IN, BETWEEN or LIKE, possibly preceded by NOT
+        not_token = None
+        if self.match(TokenType.KEYWORD, 'NOT'):
+            next_token = self.peek_token()
+            if next_token and next_token.type == TokenType.KEYWORD and next_token.lexeme in ('IN', 'BETWEEN', 'LIKE'):
+                not_token = self.current_token()
+                self.advance()  # consume NOT
+        token = self.current_token()
+        if token and token.type == TokenType.KEYWORD and token.lexeme in ('IN', 'BETWEEN', 'LIKE'):
+            predicate = self.parse_special_predicate(left)
+            if predicate is None or not_token is None:
+                return predicate
+            node = ParseTreeNode("NOT_CONDITION")
+            node.set_position(not_token.line, not_token.column)
+            node.add_child(predicate)
+            return node
+        
         node.add_child(left)
         
         # Operator (if present)
@@ -807,15 +1314,81 @@ class SyntaxAnalyzer:
                 self.advance()
                 
                 # Right side
+                error_count = len(self.errors.get_errors())
                 right = self.parse_expression()
                 if right:
                     node.add_child(right)
+                else:
+                    return self.report_missing(f"an expression after '{operator}'", error_count)
         else:
             # Just an identifier (for boolean columns)
             pass
         
         return node
     
+    def parse_special_predicate(self, left):
+        """
+        Parse the IN, BETWEEN or LIKE predicate following an expression
+        
+        InPredicate -> Expression IN '(' Expression (',' Expression)* ')'
+        BetweenPredicate -> Expression BETWEEN Expression AND Expression
+        LikePredicate -> Expression LIKE Expression
+        
+        Builds an IN_CONDITION (children: the expression and an IN_LIST),
+        BETWEEN_CONDITION (the expression, lower and upper bound) or
+        LIKE_CONDITION (the expression and the pattern) node.
+        """
+        token = self.current_token()
+        keyword = token.lexeme
+        node = ParseTreeNode(f"{keyword}_CONDITION")
+        node.set_position(token.line, token.column)
+        node.add_child(left)
+        self.advance()  # consume IN, BETWEEN or LIKE
+        
+        if keyword == 'IN':
+            values = ParseTreeNode("IN_LIST")
+            values.set_position(token.line, token.column)
+            if not self.consume(TokenType.PUNCTUATION, '('):
+                return None
+            while True:
+                value_token = self.current_token()
+                value = self.parse_expression()
+                if value is None:
+                    line = value_token.line if value_token else token.line
+                    col = value_token.column if value_token else token.column
+                    self.report_error(
+                        f"Expected a value in the IN list at line {line}, position {col}, but found {repr(value_token.lexeme) if value_token else 'end of input'}",
+                        line, col
+                    )
+                    return None
+                values.add_child(value)
+                if not self.match(TokenType.PUNCTUATION, ','):
+                    break
+                self.advance()  # consume comma
+            if not self.consume(TokenType.PUNCTUATION, ')'):
+                return None
+            node.add_child(values)
+            return node
+        
+        bounds = 2 if keyword == 'BETWEEN' else 1
+        for i in range(bounds):
+            if i:
+                # The AND separating the bounds
+                if not self.consume(TokenType.KEYWORD, 'AND'):
+                    return None
+            operand_token = self.current_token()
+            operand = self.parse_expression()
+            if operand is None:
+                line = operand_token.line if operand_token else token.line
+                col = operand_token.column if operand_token else token.column
+                self.report_error(
+                    f"Expected an expression after {keyword} at line {line}, position {col}, but found {repr(operand_token.lexeme) if operand_token else 'end of input'}",
+                    line, col
+                )
+                return None
+            node.add_child(operand)
+        return node
+    
     def parse_expression(self):
         """
         Parse arithmetic expression
@@ -834,9 +1407,10 @@ class SyntaxAnalyzer:
                 op_token = token
                 self.advance()
                 
+                error_count = len(self.errors.get_errors())
                 right = self.parse_term()
                 if right is None:
-                    break
+                    return self.report_missing(f"an operand after '{op_token.lexeme}'", error_count)
                 
                 op_node = ParseTreeNode("EXPRESSION", op_token.lexeme)
                 op_node.set_position(op_token.line, op_token.column)
@@ -866,9 +1440,10 @@ class SyntaxAnalyzer:
                 op_token = token
                 self.advance()
                 
+                error_count = len(self.errors.get_errors())
                 right = self.parse_factor()
                 if right is None:
-                    break
+                    return self.report_missing(f"an operand after '{op_token.lexeme}'", error_count)
                 
                 op_node = ParseTreeNode("TERM", op_token.lexeme)
                 op_node.set_position(op_token.line, op_token.column)
@@ -884,8 +1459,10 @@ class SyntaxAnalyzer:
         """
         Parse factor (base elements)
         
-        Factor -> Identifier
+        Factor -> FunctionCall
+                | ColumnRef
                 | Literal
+                | Parameter
                 | '(' Expression ')'
         """
         token = self.current_token()
@@ -904,9 +1481,15 @@ class SyntaxAnalyzer:
             
             return expr
         
-        # Identifier
+        # Function call: an identifier directly followed by '('
         if token.type == TokenType.IDENTIFIER:
-            return self.parse_identifier()
+            next_token = self.peek_token()
+            if next_token and next_token.type == TokenType.PUNCTUATION and next_token.lexeme == '(':
+                return self.parse_function_call()
+        
+        # Column reference
+        if token.type == TokenType.IDENTIFIER:
+            return self.parse_column_reference()
         
         # Literal
         if token.type in [TokenType.INT_LITERAL, TokenType.FLOAT_LITERAL, TokenType.STRING_LITERAL]:
@@ -915,8 +1498,81 @@ class SyntaxAnalyzer:
             self.advance()
             return node
         
+        # Parameter placeholder, numbered from 0 in order of appearance
+        if token.type == TokenType.PARAMETER:
+            node = ParseTreeNode("PARAMETER", self.parameter_count)
+            node.set_position(token.line, token.column)
+            self.parameter_count += 1
+            self.advance()
+            return node
+        
         return None
     
+    def parse_function_call(self):
+        """
+        Parse function call (aggregates such as COUNT, SUM and AVG)
+        
+        FunctionCall -> Identifier '(' ('*' | Expression) ')'
+        
+        The node's value is the function name in upper case.
+        """
+        name_token = self.current_token()
+        node = ParseTreeNode("FUNCTION_CALL", name_token.lexeme.upper())
+        node.set_position(name_token.line, name_token.column)
+        self.advance()  # consume function name
+        
+        if not self.consume(TokenType.PUNCTUATION, '('):
+            return None
+        
+        # Argument: '*' or one expression
+        if self.match(TokenType.OPERATOR, '*'):
+            token = self.consume(TokenType.OPERATOR, '*')
+            argument = ParseTreeNode("ALL_COLUMNS", "*")
+            argument.set_position(token.line, token.column)
+        else:
+            token = self.current_token()
+            argument = self.parse_expression()
+            if argument is None:
+                line = token.line if token else name_token.line
+                col = token.column if token else name_token.column
+                self.report_error(
+                    f"Expected an argument for {node.value} at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                    line, col
+                )
+                return None
+        node.add_child(argument)
+        
+        if not self.consume(TokenType.PUNCTUATION, ')'):
+            return None
+        
+        return node
+    
+    def parse_column_reference(self):
+        """
+        Parse column reference, optionally qualified by its table
+        
+        ColumnRef -> Identifier ['.' Identifier]
+        
+        A qualified reference is one IDENTIFIER node whose value is 'table.column'.
+        """
+        node = self.parse_identifier()
+        if node is None or not self.match(TokenType.PUNCTUATION, '.'):
+            return node
+        self.advance()  # consume '.'
+        
+        token = self.current_token()
+        if token is None or token.type != TokenType.IDENTIFIER:
+            line = token.line if token else node.line
+            col = token.column if token else node.column
+            self.report_error(
+                f"Expected a column name after '{node.value}.' at line {line}, position {col}, but found {repr(token.lexeme) if token else 'end of input'}",
+                line, col
+            )
+            return None
+        node.value = f"{node.value}.{token.lexeme}"
+        self.advance()
+        return node
+    
     def parse_identifier(self):
         """
         Parse identifier
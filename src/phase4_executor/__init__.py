@@ -0,0 +1,40 @@
+from .catalog import Catalog
+from .table import Table
+from .executor import QueryExecutor, ExecutionResult
+from .evaluator import ExecutionError
+from .storage import (
+    MappedTable, StorageError, save_table, open_table, save_catalog, open_catalog,
+    save_snapshot, load_snapshot
+)
+from .wal import WriteAheadLog, open_database
+from .bulk_load import CopyResult, copy_from_csv
+from .connection import Connection, Cursor, DatabaseError, ParseCache, ProgrammingError, connect
+from .statistics import TableStatistics, ColumnStatistics, HyperLogLog, analyze_table
+from .zone_map import ZoneMap, ScanPlan, plan_scan
+from .bloom import ColumnBlooms
+from .dictionary import DictionaryColumn
+from .compression import EncodedColumn
+from .buffer_pool import BufferPool, ScanRing, default_buffer_pool
+from .client import ClientConnection, ConnectionPool, QueryResult
+from .result_cache import ResultCache
+from .aggregate import HashAggregator
+from .join import HashJoin
+from .sort import ExternalSort
+from .scheduler import StatementScheduler
+from .transaction import Transaction
+from .index import HashIndex, OrderedIndex
+from .index_advisor import IndexAdvisor
+
+__all__ = [
+    'Catalog', 'Table', 'QueryExecutor', 'ExecutionResult', 'ExecutionError',
+    'MappedTable', 'StorageError', 'save_table', 'open_table', 'save_catalog', 'open_catalog',
+    'save_snapshot', 'load_snapshot',
+    'WriteAheadLog', 'open_database', 'CopyResult', 'copy_from_csv',
+    'Connection', 'Cursor', 'DatabaseError', 'ParseCache', 'ProgrammingError', 'connect',
+    'TableStatistics', 'ColumnStatistics', 'HyperLogLog', 'analyze_table',
+    'ZoneMap', 'ScanPlan', 'plan_scan', 'ColumnBlooms', 'DictionaryColumn', 'EncodedColumn',
+    'BufferPool', 'ScanRing', 'default_buffer_pool',
+    'ClientConnection', 'ConnectionPool', 'QueryResult', 'ResultCache',
+    'HashAggregator', 'HashJoin', 'ExternalSort', 'StatementScheduler', 'Transaction',
+    'HashIndex', 'OrderedIndex', 'IndexAdvisor',
+]
@@ -0,0 +1,475 @@
+"""
+Hash Aggregation
+Evaluates COUNT, SUM, AVG, MIN and MAX, optionally grouped by GROUP BY
+expressions, over column batches (see Table.column_batches).
+
+Every aggregate keeps its own hash table of running values by group key,
+and a batch is folded into them one aggregate at a time: the group keys
+and argument values arrive as columns, so each inner loop is a tight pass
+over two sequences rather than per-row interpretation of the select list.
+
+When the number of groups outgrows the memory budget, the partial results
+are written to partition files by hash of the group key and the hash
+tables are emptied. Each partition is then merged on its own (and split
+again if it is still too large), so the groups never all have to fit in
+memory at once. Spilled groups are kept column by column as well.
+"""
+
+import operator
+import sys
+from collections import Counter
+from itertools import compress, islice, repeat
+
+from .evaluator import ExecutionError, compile_expression, expression_text
+from .spill import MAX_SPILL_DEPTH, SpillPartitions, chunks
+
+
+AGGREGATE_FUNCTIONS = ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX')
+
+# Default budget for the groups held in memory, in bytes
+DEFAULT_AGGREGATE_MEMORY = 256 * 1024 * 1024
+
+# Approximate bytes for one dict entry plus its boxed value
+ENTRY_BYTES = 120
+
+# Group keys measured to estimate the memory held per group
+KEY_SAMPLE = 64
+
+MISSING = object()
+
+
+# ==================== Aggregate functions ====================
+
+class Aggregate:
+    """
+    Running values of one aggregate call, by group key
+
+    Subclasses fold batches of argument values into `values`, and merge
+    batches of partial values read back from spill files.
+    """
+
+    def __init__(self, node):
+        """
+        Args:
+            node: The FUNCTION_CALL node
+        """
+        self.node = node
+        self.text = expression_text(node)
+        self.values = {}
+
+    def fold(self, keys, arguments):
+        """
+        Add a batch of argument values
+
+        Args:
+            keys: Group key of each row, or None when there is one group
+            arguments: Argument value of each row (None is skipped)
+        """
+        raise NotImplementedError
+
+    def partials(self, keys):
+        """Running values of some groups, as written to a spill file"""
+        return list(map(self.values.get, keys))
+
+    def merge(self, keys, partials):
+        """
+        Combine partial values read back from a spill file
+
+        Args:
+            keys: Distinct group keys
+            partials: Partial value of each group (see partials())
+        """
+        raise NotImplementedError
+
+    def results(self, keys):
+        """Final values of some groups"""
+        return list(map(self.values.get, keys))
+
+    def clear(self):
+        self.values = {}
+
+
+class Count(Aggregate):
+    """COUNT(expression): rows where the argument is not NULL"""
+
+    def __init__(self, node):
+        super().__init__(node)
+        self.values = Counter()
+
+    def fold(self, keys, arguments):
+        if keys is None:
+            self.values[()] += len(arguments) - arguments.count(None)
+        elif None in arguments:
+            self.values.update(compress(keys, [value is not None for value in arguments]))
+        else:
+            self.values.update(keys)
+
+    def partials(self, keys):
+        # Counter returns 0 for groups without values
+        return list(map(self.values.__getitem__, keys))
+
+    def merge(self, keys, partials):
+        values = self.values
+        get = values.get
+        for key, partial in zip(keys, partials):
+            values[key] = get(key, 0) + partial
+
+    results = partials
+
+    def clear(self):
+        self.values = Counter()
+
+
+class Sum(Aggregate):
+    """SUM(expression); NULL for a group without values"""
+
+    def fold(self, keys, arguments):
+        values = self.values
+        if keys is None:
+            present = [value for value in arguments if value is not None] if None in arguments else arguments
+            if len(present):
+                values[()] = values.get((), 0) + sum(present)
+            return
+        get = values.get
+        if None in arguments:
+            for key, value in zip(keys, arguments):
+                if value is not None:
+                    values[key] = get(key, 0) + value
+        else:
+            for key, value in zip(keys, arguments):
+                values[key] = get(key, 0) + value
+
+    def merge(self, keys, partials):
+        values = self.values
+        get = values.get
+        for key, partial in zip(keys, partials):
+            if partial is not None:
+                values[key] = get(key, 0) + partial
+
+
+class Average(Aggregate):
+    """AVG(expression), kept as a running sum and count"""
+
+    def __init__(self, node):
+        super().__init__(node)
+        self.sums = Sum(node)
+        self.counts = Count(node)
+
+    def fold(self, keys, arguments):
+        self.sums.fold(keys, arguments)
+        self.counts.fold(keys, arguments)
+
+    def partials(self, keys):
+        return list(zip(self.sums.partials(keys), self.counts.partials(keys)))
+
+    def merge(self, keys, partials):
+        sums, counts = zip(*partials) if partials else ((), ())
+        self.sums.merge(keys, sums)
+        self.counts.merge(keys, counts)
+
+    def results(self, keys):
+        return [
+            total / count if count else None
+            for total, count in zip(self.sums.results(keys), self.counts.results(keys))
+        ]
+
+    def clear(self):
+        self.sums.clear()
+        self.counts.clear()
+
+
+class Extreme(Aggregate):
+    """MIN / MAX(expression); NULL for a group without values"""
+
+    def __init__(self, node, pick):
+        super().__init__(node)
+        # min or max, and the comparison a new value must win to replace the current one
+        self.pick = pick
+        self.better = operator.lt if pick is min else operator.gt
+
+    def fold(self, keys, arguments):
+        values = self.values
+        if keys is None:
+            present = [value for value in arguments if value is not None] if None in arguments else arguments
+            if len(present):
+                current = values.get((), MISSING)
+                best = self.pick(present)
+                values[()] = best if current is MISSING else self.pick(current, best)
+            return
+        self.merge(keys, arguments)
+
+    def merge(self, keys, partials):
+        values = self.values
+        get = values.get
+        better = self.better
+        for key, value in zip(keys, partials):
+            if value is not None:
+                current = get(key, MISSING)
+                if current is MISSING or better(value, current):
+                    values[key] = value
+
+
+def new_aggregate(node):
+    """
+    Create the running state of a FUNCTION_CALL node
+
+    Returns:
+        Aggregate, or None for COUNT(*), which the aggregator answers from
+        its per-group row counts
+
+    Raises:
+        ExecutionError: for an unknown function or a misplaced '*'
+    """
+    name = node.value
+    if name not in AGGREGATE_FUNCTIONS:
+        raise ExecutionError(f"Unknown function '{name}'", node)
+    if node.children[0].node_type == 'ALL_COLUMNS':
+        if name != 'COUNT':
+            raise ExecutionError(f"{name}(*) is not supported; only COUNT(*) is", node)
+        return None
+    if name == 'COUNT':
+        return Count(node)
+    if name == 'SUM':
+        return Sum(node)
+    if name == 'AVG':
+        return Average(node)
+    return Extreme(node, min if name == 'MIN' else max)
+
+
+# ==================== Aggregator ====================
+
+class HashAggregator:
+    """
+    Groups column batches by key and computes aggregates for every group
+
+    Produces one row per group: the group key values followed by the value
+    of each aggregate.
+    """
+
+    def __init__(self, key_count, aggregates, memory_limit=DEFAULT_AGGREGATE_MEMORY):
+        """
+        Args:
+            key_count: Number of GROUP BY expressions (0 for a single group)
+            aggregates: One Aggregate (or None for COUNT(*)) per output aggregate
+            memory_limit: Budget in bytes for the groups held in memory
+        """
+        self.key_count = key_count
+        self.aggregates = aggregates
+        self.states = [aggregate for aggregate in aggregates if aggregate is not None]
+        self.memory_limit = memory_limit
+        # Rows per group; also the set of groups held in memory
+        self.rows = Counter()
+        self.max_groups = None
+        self.input_rows = 0
+        self.group_count = 0
+        self.spill_count = 0
+        self.spilled_bytes = 0
+
+    # ==================== Building ====================
+
+    def add_batch(self, keys, row_count, arguments):
+        """
+        Fold one batch in
+
+        Args:
+            keys: Group key of each row (None when there is no GROUP BY)
+            row_count: Rows in the batch
+            arguments: Per aggregate state, the column of its argument values
+        """
+        self.input_rows += row_count
+        if keys is None:
+            self.rows[()] += row_count
+        else:
+            self.rows.update(keys)
+        for state, values in zip(self.states, arguments):
+            try:
+                state.fold(keys, values)
+            except TypeError:
+                raise ExecutionError(f"Cannot compute {state.text} over values of this type", state.node)
+
+    def over_budget(self):
+        """Whether the groups in memory exceed the budget"""
+        if self.max_groups is None:
+            if len(self.rows) < KEY_SAMPLE:
+                return False
+            self.max_groups = max(KEY_SAMPLE, self.memory_limit // self._group_size())
+        return len(self.rows) > self.max_groups
+
+    def _group_size(self):
+        # Estimated bytes per group: its key plus one entry per hash table
+        sample = list(islice(self.rows, KEY_SAMPLE))
+        key_size = sum(map(sys.getsizeof, sample)) // len(sample)
+        if self.key_count > 1:
+            key_size += sum(sys.getsizeof(value) for key in sample for value in key) // len(sample)
+        tables = 1 + sum(2 if isinstance(state, Average) else 1 for state in self.states)
+        return key_size + ENTRY_BYTES * tables
+
+    def merge(self, columns):
+        """Combine one spilled chunk of [keys, row counts, partial values...]"""
+        keys, row_counts, *partials = columns
+        rows = self.rows
+        get = rows.get
+        for key, row_count in zip(keys, row_counts):
+            rows[key] = get(key, 0) + row_count
+        for state, values in zip(self.states, partials):
+            state.merge(keys, values)
+
+    def clear(self):
+        """Forget the groups held in memory"""
+        self.rows = Counter()
+        for state in self.states:
+            state.clear()
+
+    def spill(self, partitions):
+        """
+        Move the groups held in memory to partition files, as chunks of
+        [keys, row counts, partial values of each aggregate...]
+        """
+        for keys in chunks(self.rows):
+            row_counts = list(map(self.rows.__getitem__, keys))
+            partitions.write([keys, row_counts] + [state.partials(keys) for state in self.states])
+        self.spill_count += 1
+        self.clear()
+
+    # ==================== Results ====================
+
+    def results(self):
+        """Output rows of the groups held in memory"""
+        rows = self.rows
+        if not rows and self.key_count == 0:
+            # No input rows: one group with COUNT = 0 and every other aggregate NULL
+            rows = Counter({(): 0})
+        for keys in chunks(rows):
+            self.group_count += len(keys)
+            values = [
+                list(map(rows.__getitem__, keys)) if aggregate is None else aggregate.results(keys)
+                for aggregate in self.aggregates
+            ]
+            if self.key_count == 1:
+                yield from zip(keys, *values)
+            elif not values:
+                yield from keys
+            else:
+                yield from map(tuple.__add__, keys, zip(*values))
+
+    def run(self, batches):
+        """
+        Aggregate every batch and yield the output rows
+
+        Args:
+            batches: Iterable of (keys, row count, arguments), see add_batch
+        """
+        partitions = None
+        try:
+            for keys, row_count, arguments in batches:
+                self.add_batch(keys, row_count, arguments)
+                if self.key_count and self.over_budget():
+                    if partitions is None:
+                        partitions = SpillPartitions()
+                    self.spill(partitions)
+            if partitions is None:
+                yield from self.results()
+                return
+            self.spill(partitions)
+            yield from self._merge_partitions(partitions)
+        finally:
+            if partitions is not None:
+                self.spilled_bytes += partitions.bytes_written
+                partitions.close()
+
+    def _merge_partitions(self, partitions):
+        for index in range(partitions.count):
+            split = None
+            try:
+                for columns in partitions.read(index):
+                    self.merge(columns)
+                    if partitions.depth < MAX_SPILL_DEPTH and len(self.rows) > self.max_groups:
+                        # Still too many groups: split this partition again
+                        if split is None:
+                            split = partitions.split()
+                        self.spill(split)
+                if split is None:
+                    yield from self.results()
+                    self.clear()
+                else:
+                    self.spill(split)
+                    yield from self._merge_partitions(split)
+            finally:
+                if split is not None:
+                    self.spilled_bytes += split.bytes_written
+                    split.close()
+
+
+# ==================== Planning ====================
+
+def find_aggregates(node, found):
+    """Collect the distinct FUNCTION_CALL nodes of a subtree by expression text"""
+    if node.node_type == 'FUNCTION_CALL':
+        found.setdefault(expression_text(node), node)
+        return found
+    for child in node.children:
+        find_aggregates(child, found)
+    return found
+
+
+def check_grouped(node, group_texts):
+    """
+    Reject columns read outside an aggregate that are not grouped on
+
+    Raises:
+        ExecutionError: naming the first offending column
+    """
+    if node.node_type == 'FUNCTION_CALL':
+        return
+    if node.node_type in ('IDENTIFIER', 'EXPRESSION', 'TERM') and expression_text(node) in group_texts:
+        return
+    if node.node_type == 'IDENTIFIER':
+        raise ExecutionError(f"Column '{node.value}' must appear in GROUP BY or inside an aggregate", node)
+    for child in node.children:
+        check_grouped(child, group_texts)
+
+
+def column_references(node, found):
+    """Collect the IDENTIFIER nodes of a subtree by column name, in order of appearance"""
+    if node.node_type == 'IDENTIFIER':
+        found.setdefault(node.value, node)
+    for child in node.children:
+        column_references(child, found)
+    return found
+
+
+def batch_evaluator(node, positions, parameters):
+    """
+    Compile an expression into a function of a column batch
+
+    A plain column reference returns the batch's column itself; any other
+    expression is evaluated row by row over the batch.
+
+    Returns:
+        Callable taking (row count, columns) and returning a sequence of values
+    """
+    if node.node_type == 'IDENTIFIER' and node.value in positions:
+        position = positions[node.value]
+        return lambda row_count, columns: columns[position]
+    evaluate = compile_expression(node, positions, parameters)
+
+    def evaluate_batch(row_count, columns):
+        rows = zip(*columns) if columns else repeat((), row_count)
+        return list(map(evaluate, rows))
+
+    return evaluate_batch
+
+
+def filter_batch(predicate, row_count, columns):
+    """
+    Keep the rows of a batch satisfying a predicate
+
+    Returns:
+        (row count, columns) of the remaining rows
+    """
+    if not columns:
+        return (row_count if predicate(()) else 0), columns
+    mask = list(map(predicate, zip(*columns)))
+    if all(mask):
+        return row_count, columns
+    return mask.count(True), [list(compress(column, mask)) for column in columns]
@@ -0,0 +1,128 @@
+"""
+Bloom Filters
+Columns declared with the BLOOM option keep one Bloom filter per block of
+rows next to their zone map. A scan with an equality predicate on such a
+column skips the blocks whose filter rules the value out, which min/max
+ranges cannot do for unsorted values such as e-mail addresses or random
+keys.
+
+Values are hashed with BLAKE2b rather than hash(), whose string hashing is
+randomized per process, so the filters saved with a table stay valid when
+it is reopened. Like zone maps, filters are conservative: updates only add
+values and deletes leave them alone; compaction rebuilds them.
+"""
+
+import hashlib
+import math
+import struct
+
+
+# False positive rate of a BLOOM column declared without one
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+MASK_64 = (1 << 64) - 1
+
+
+def filter_size(count, false_positive_rate):
+    """
+    Size a Bloom filter
+
+    Args:
+        count: Values the filter is meant to hold
+        false_positive_rate: Target probability that an absent value passes
+
+    Returns:
+        (bit count, hash count)
+    """
+    bit_count = max(64, math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2))
+    bit_count = (bit_count + 7) // 8 * 8
+    hash_count = max(1, round(bit_count / count * math.log(2)))
+    return bit_count, hash_count
+
+
+def value_key(value):
+    """Stable bytes of a value; numbers that compare equal give the same bytes"""
+    if isinstance(value, str):
+        return b's' + value.encode('utf-8')
+    if isinstance(value, float):
+        if not value.is_integer():
+            return b'f' + struct.pack('<d', value)
+        value = int(value)
+    return b'i' + str(value).encode('ascii')
+
+
+def value_hashes(value):
+    """The two 64-bit hashes a value's bit positions are derived from"""
+    digest = int.from_bytes(hashlib.blake2b(value_key(value), digest_size=16).digest(), 'little')
+    return digest & MASK_64, (digest >> 64) | 1
+
+
+class ColumnBlooms:
+    """Bloom filter of every block of one column"""
+
+    def __init__(self, false_positive_rate, block_size):
+        """
+        Args:
+            false_positive_rate: Target rate for a full block
+            block_size: Rows per block
+        """
+        self.false_positive_rate = false_positive_rate
+        self.bit_count, self.hash_count = filter_size(block_size, false_positive_rate)
+        # One bytearray of bit_count bits per block
+        self.filters = []
+
+    def _filter(self, block):
+        while block >= len(self.filters):
+            self.filters.append(bytearray(self.bit_count // 8))
+        return self.filters[block]
+
+    def _set(self, bits, value):
+        h1, h2 = value_hashes(value)
+        bit_count = self.bit_count
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % bit_count
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def add(self, block, value):
+        """Account for a value stored in the given block"""
+        if value is not None:
+            self._set(self._filter(block), value)
+
+    def add_block(self, block, values):
+        """Account for several values stored in the given block"""
+        bits = self._filter(block)
+        for value in set(values):
+            if value is not None:
+                self._set(bits, value)
+
+    def may_contain(self, block, value):
+        """Whether the block may hold a value equal to `value`"""
+        if value is None:
+            return True
+        if block >= len(self.filters):
+            return False
+        try:
+            h1, h2 = value_hashes(value)
+        except (TypeError, ValueError, OverflowError):
+            return True
+        bits = self.filters[block]
+        bit_count = self.bit_count
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % bit_count
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def memory_bytes(self):
+        """Bytes held by the filters"""
+        return len(self.filters) * self.bit_count // 8
+
+    def to_list(self):
+        return [self.false_positive_rate, [bytes(bits) for bits in self.filters]]
+
+    @classmethod
+    def from_list(cls, data, block_size):
+        blooms = cls(data[0], block_size)
+        blooms.filters = [bytearray(bits) for bits in data[1]]
+        return blooms
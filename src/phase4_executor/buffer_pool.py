@@ -0,0 +1,276 @@
+"""
+Buffer Pool for Decoded Column Segments
+Compressed columns of opened tables (see compression.py) are decoded one
+segment at a time. The decoded pages are kept in a BufferPool with a fixed
+memory budget instead of on the columns themselves, so the memory held by
+decoded data is capped and its hit rate can be observed.
+
+Eviction uses the CLOCK (second chance) policy: every page has a reference
+bit that is set when it is read; the hand clears set bits and evicts the
+first unpinned page whose bit is already clear. Pinned pages are never
+evicted.
+
+Large sequential scans read through a ScanRing: pages they load occupy a
+small ring of slots and are dropped again as the scan moves on, so one big
+SELECT does not push the working set of other queries out of the pool.
+"""
+
+import sys
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import count
+
+
+# Default budget of a pool, in bytes
+DEFAULT_POOL_SIZE = 256 * 1024 * 1024
+
+# Pages a sequential scan may hold at once
+DEFAULT_RING_PAGES = 16
+
+# Scans expected to read more than this fraction of the budget use a ring
+RING_SCAN_FRACTION = 0.25
+
+_owner_ids = count(1)
+
+
+def new_owner_id():
+    """Unique id for an object whose pages are kept in a pool"""
+    return next(_owner_ids)
+
+
+def page_size(value):
+    """Bytes held by a cached page"""
+    itemsize = getattr(value, 'itemsize', None)
+    if itemsize is not None:
+        return itemsize * len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class Frame:
+    """One cached page"""
+
+    __slots__ = ('value', 'size', 'pin_count', 'referenced', 'ring')
+
+    def __init__(self, value, size, ring):
+        self.value = value
+        self.size = size
+        self.pin_count = 0
+        self.referenced = False
+        # The ScanRing that loaded the page, until a regular read claims it
+        self.ring = ring
+
+
+class BufferPool:
+    """
+    Caches pages under a memory budget with CLOCK eviction
+
+    Pages are identified by hashable keys whose first item is the owner id
+    (see new_owner_id) so that all pages of an owner can be discarded at once.
+    """
+
+    def __init__(self, capacity=DEFAULT_POOL_SIZE):
+        """
+        Args:
+            capacity: Budget in bytes for unpinned pages; pinned pages may
+                temporarily push the pool above it
+        """
+        self.capacity = capacity
+        # Insertion order is the clock: the hand is always at the front
+        self.frames = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def pin(self, key, load, ring=None):
+        """
+        Get a page and pin it so it cannot be evicted until unpin()
+
+        Args:
+            key: Page key, (owner id, ...)
+            load: Callable producing the page on a miss
+            ring: ScanRing of the sequential scan reading the page, if any
+
+        Returns:
+            The page
+        """
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.hits += 1
+                frame.pin_count += 1
+                if ring is None:
+                    frame.referenced = True
+                    frame.ring = None
+                return frame.value
+            self.misses += 1
+
+        # Decode outside the lock; a concurrent miss on the same key may
+        # decode the page twice, and the first copy stored wins
+        value = load()
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                frame = Frame(value, page_size(value), ring)
+                self.frames[key] = frame
+                self.used += frame.size
+                if ring is not None:
+                    ring.add(key)
+            frame.pin_count += 1
+            self._evict()
+            return frame.value
+
+    def unpin(self, key):
+        """Release a pin taken by pin()"""
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None and frame.pin_count:
+                frame.pin_count -= 1
+                if self.used > self.capacity:
+                    self._evict()
+
+    @contextmanager
+    def pinned(self, key, load, ring=None):
+        """Context manager pinning a page for the duration of a block"""
+        value = self.pin(key, load, ring)
+        try:
+            yield value
+        finally:
+            self.unpin(key)
+
+    def get(self, key, load, ring=None):
+        """Get a page without keeping it pinned"""
+        value = self.pin(key, load, ring)
+        self.unpin(key)
+        return value
+
+    def _evict(self):
+        # Every frame is looked at most twice: once to clear its reference
+        # bit and once to evict it; pinned frames are passed over
+        frames = self.frames
+        budget = 2 * len(frames)
+        while self.used > self.capacity and budget:
+            budget -= 1
+            key, frame = next(iter(frames.items()))
+            if frame.pin_count or frame.referenced:
+                frame.referenced = False
+                frames.move_to_end(key)
+                continue
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key):
+        frame = self.frames.pop(key)
+        self.used -= frame.size
+
+    def release(self, key, ring):
+        """Drop a page loaded by a ring, unless it is pinned or was claimed"""
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None and frame.ring is ring and not frame.pin_count:
+                self._remove(key)
+                self.evictions += 1
+
+    def discard(self, owner):
+        """Drop every page of an owner (e.g. when its file is closed)"""
+        with self.lock:
+            for key in [key for key in self.frames if key[0] == owner]:
+                self._remove(key)
+
+    def scan_ring(self, pages=DEFAULT_RING_PAGES):
+        """Create a ring for one sequential scan"""
+        return ScanRing(self, pages)
+
+    def wants_ring(self, size):
+        """Whether a scan reading about `size` bytes of pages should use a ring"""
+        return size > self.capacity * RING_SCAN_FRACTION
+
+    def resize(self, capacity):
+        """Change the budget, evicting pages if it shrank"""
+        with self.lock:
+            self.capacity = capacity
+            self._evict()
+
+    def clear(self):
+        """Drop every unpinned page"""
+        with self.lock:
+            for key in [key for key, frame in self.frames.items() if not frame.pin_count]:
+                self._remove(key)
+
+    # ==================== Reporting ====================
+
+    @property
+    def hit_rate(self):
+        """Fraction of page reads served from the pool"""
+        reads = self.hits + self.misses
+        return self.hits / reads if reads else 0.0
+
+    def stats(self):
+        """Counters and occupancy as a dict"""
+        with self.lock:
+            return {
+                'capacity': self.capacity,
+                'used': self.used,
+                'pages': len(self.frames),
+                'pinned': sum(1 for frame in self.frames.values() if frame.pin_count),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hit_rate,
+            }
+
+    def reset_counters(self):
+        """Zero the hit, miss and eviction counters"""
+        with self.lock:
+            self.hits = self.misses = self.evictions = 0
+
+
+class ScanRing:
+    """
+    The slots of one sequential scan in a BufferPool
+
+    Pages the scan loads are remembered in order; once more than `pages` are
+    held the oldest is released back. Pages that were already cached are
+    read without taking a slot, and a page loaded by the ring but then read
+    by a regular access stays in the pool.
+    """
+
+    def __init__(self, pool, pages=DEFAULT_RING_PAGES):
+        self.pool = pool
+        self.pages = pages
+        self.keys = deque()
+
+    def add(self, key):
+        # Called by the pool with its lock held: release() is deferred
+        self.keys.append(key)
+        while len(self.keys) > self.pages:
+            key = self.keys.popleft()
+            frame = self.pool.frames.get(key)
+            if frame is not None and frame.ring is self and not frame.pin_count:
+                self.pool._remove(key)
+                self.pool.evictions += 1
+
+    def close(self):
+        """Release every page the scan still holds"""
+        while self.keys:
+            self.pool.release(self.keys.popleft(), self)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_buffer_pool():
+    """The process-wide pool used by tables opened without an explicit one"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BufferPool()
+        return _default_pool
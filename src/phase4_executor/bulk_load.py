@@ -0,0 +1,154 @@
+"""
+Bulk CSV Import (COPY)
+Streams a CSV file in batches, converts each batch column by column to the
+declared INT / FLOAT / TEXT types and appends it straight into the column
+buffers, bypassing the lexer and parser entirely
+"""
+
+import csv
+import os
+import time
+
+from .table import new_column_buffer
+
+
+DEFAULT_BATCH_SIZE = 10000
+
+CONVERTERS = {
+    'INT': int,
+    'FLOAT': float,
+    'TEXT': str,
+}
+
+
+class CopyResult:
+    """Outcome of one bulk import"""
+
+    def __init__(self, table_name, path):
+        self.table_name = table_name
+        self.path = path
+        self.rows_loaded = 0
+        self.rejected = []
+        self.bytes_read = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_loaded / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes_read / (1024 * 1024) / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (f"CopyResult({self.table_name}: {self.rows_loaded} rows, "
+                f"{len(self.rejected)} rejected)")
+
+
+def _convert_batch(table, rows, line_numbers, rejected):
+    """
+    Convert one batch of CSV records into typed column buffers
+
+    The fast path converts whole columns with map(); only when a column
+    contains a bad value are the offending rows located one by one.
+
+    Returns:
+        List of column buffers in table column order (bad rows removed)
+    """
+    column_count = len(table.column_names)
+    bad_rows = {}
+    for i, row in enumerate(rows):
+        if len(row) != column_count:
+            bad_rows[i] = f"expected {column_count} fields, found {len(row)}"
+    if bad_rows:
+        rows = [row if i not in bad_rows else [''] * column_count for i, row in enumerate(rows)]
+
+    raw_columns = list(zip(*rows)) if rows else [() for _ in table.column_names]
+    converted = []
+    for column_name, raw in zip(table.column_names, raw_columns):
+        data_type = table.column_types[column_name]
+        convert = CONVERTERS[data_type]
+        buffer = new_column_buffer(data_type)
+        try:
+            if bad_rows:
+                raise ValueError
+            buffer.extend(map(convert, raw))
+        except ValueError:
+            buffer = new_column_buffer(data_type)
+            for i, text in enumerate(raw):
+                if i in bad_rows:
+                    buffer.append(convert(0) if data_type != 'TEXT' else '')
+                    continue
+                try:
+                    buffer.append(convert(text))
+                except ValueError:
+                    bad_rows[i] = f"invalid {data_type} value {text!r} for column '{column_name}'"
+                    buffer.append(convert(0) if data_type != 'TEXT' else '')
+        converted.append(buffer)
+
+    if not bad_rows:
+        return converted
+
+    for i in sorted(bad_rows):
+        rejected.append((line_numbers[i], bad_rows[i]))
+    cleaned = []
+    for column_name, buffer in zip(table.column_names, converted):
+        kept = new_column_buffer(table.column_types[column_name])
+        kept.extend(value for i, value in enumerate(buffer) if i not in bad_rows)
+        cleaned.append(kept)
+    return cleaned
+
+
+def copy_from_csv(table, path, header=False, delimiter=',', batch_size=DEFAULT_BATCH_SIZE,
+                  on_batch=None):
+    """
+    Load a CSV file into a table
+
+    Args:
+        table: Target Table
+        path: CSV file path
+        header: Skip the first record
+        delimiter: Field delimiter
+        batch_size: Records converted and appended per batch
+        on_batch: Optional callback receiving each appended batch of column buffers
+            (used to maintain statistics and the write-ahead log)
+
+    Returns:
+        CopyResult with loaded/rejected counts, rejected (line, reason) pairs
+        and throughput
+    """
+    result = CopyResult(table.name, path)
+    start = time.perf_counter()
+
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        if header:
+            next(reader, None)
+
+        rows = []
+        line_numbers = []
+        for row in reader:
+            if not row:
+                continue
+            rows.append(row)
+            line_numbers.append(reader.line_num)
+            if len(rows) >= batch_size:
+                _append_batch(table, rows, line_numbers, result, on_batch)
+                rows = []
+                line_numbers = []
+        if rows:
+            _append_batch(table, rows, line_numbers, result, on_batch)
+
+    result.bytes_read = os.path.getsize(path)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _append_batch(table, rows, line_numbers, result, on_batch):
+    columns = _convert_batch(table, rows, line_numbers, result.rejected)
+    if not columns or not len(columns[0]):
+        return
+    table.append_columns(columns)
+    result.rows_loaded += len(columns[0])
+    if on_batch is not None:
+        on_batch(columns)
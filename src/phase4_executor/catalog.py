@@ -0,0 +1,76 @@
+"""
+Catalog of Tables
+Keeps the tables created by CREATE TABLE together with their statistics
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager
+
+from .index_advisor import IndexAdvisor
+from .table import Table
+
+
+class Catalog:
+    """Registry of tables and their collected statistics"""
+
+    def __init__(self):
+        self.tables = {}
+        self.statistics = {}
+        # Held while CREATE TABLE changes the set of tables; statements
+        # writing a table take that table's write_lock instead, and readers
+        # use table snapshots and take neither
+        self.write_lock = threading.RLock()
+        # ResultCache shared by every session, or None to run every SELECT
+        self.result_cache = None
+        # Records the filtered columns of every scan for SHOW INDEX ADVICE;
+        # None stops recording
+        self.index_advisor = IndexAdvisor()
+
+    def create_table(self, name, columns, bloom_filters=None):
+        """
+        Register a new, empty table
+
+        Args:
+            name: Table name
+            columns: List of (column_name, data_type) pairs
+            bloom_filters: Dict of column name -> false positive rate for the
+                columns that keep per-block Bloom filters
+
+        Returns:
+            The created Table
+        """
+        table = Table(name, columns, bloom_filters)
+        self.tables[name] = table
+        return table
+
+    def has_table(self, name):
+        """Check whether a table exists"""
+        return name in self.tables
+
+    def get_table(self, name):
+        """Get a table by name, or None if it does not exist"""
+        return self.tables.get(name)
+
+    def table_names(self):
+        """List table names in creation order"""
+        return list(self.tables)
+
+    @contextmanager
+    def writers_locked(self):
+        """
+        Keep every writer out: hold the catalog's write_lock, then the
+        write_lock of each table in name order (the order COMMIT uses)
+        """
+        with ExitStack() as locks:
+            locks.enter_context(self.write_lock)
+            for name in sorted(self.tables):
+                locks.enter_context(self.tables[name].write_lock)
+            yield
+
+    def set_statistics(self, name, statistics):
+        """Store the statistics collected for a table"""
+        self.statistics[name] = statistics
+
+    def get_statistics(self, name):
+        """Get the statistics of a table, or None if it was never analyzed"""
+        return self.statistics.get(name)
@@ -0,0 +1,229 @@
+"""
+Query Server Client
+asyncio client for QueryServer (see server.py and protocol.py).
+
+A ClientConnection pipelines: any number of coroutines may issue statements
+on it at once; each request is written immediately and the answers, which
+the server sends in request order, are routed back by request id. A
+ConnectionPool spreads statements over several connections, opening them
+as needed and picking the one with the fewest requests in flight.
+"""
+
+import asyncio
+from itertools import count
+
+from .connection import DatabaseError, ProgrammingError
+from .protocol import ProtocolError, encode_frame, read_frame
+
+
+DEFAULT_POOL_SIZE = 8
+
+ERROR_CLASSES = {'DatabaseError': DatabaseError, 'ProgrammingError': ProgrammingError}
+
+
+class QueryResult:
+    """The complete answer to one statement"""
+
+    def __init__(self, columns, rows, row_count, message):
+        """
+        Args:
+            columns: Result column names ([] for statements without rows)
+            rows: Result rows as tuples
+            row_count: Rows returned or affected
+            message: Server summary, e.g. '3 rows updated'
+        """
+        self.columns = columns
+        self.rows = rows
+        self.row_count = row_count
+        self.message = message
+
+    def __repr__(self):
+        return f"QueryResult({self.row_count} rows, {self.message!r})"
+
+
+class ClientConnection:
+    """One pipelined connection to a QueryServer"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.request_ids = count(1)
+        # Answer frames of requests in flight, by request id
+        self.pending = {}
+        self.closed = False
+        self.reader_task = asyncio.create_task(self._read_answers())
+
+    @classmethod
+    async def open(cls, path=None, host='127.0.0.1', port=None):
+        """
+        Connect to a server on a Unix socket path or a localhost TCP port
+
+        Returns:
+            ClientConnection
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        elif port is not None:
+            reader, writer = await asyncio.open_connection(host, port)
+        else:
+            raise ValueError("A socket path or a TCP port is required")
+        return cls(reader, writer)
+
+    @property
+    def in_flight(self):
+        """Requests sent and not fully answered yet"""
+        return len(self.pending)
+
+    async def _read_answers(self):
+        error = None
+        try:
+            while True:
+                message = await read_frame(self.reader)
+                if message is None:
+                    break
+                queue = self.pending.get(message.get('id'))
+                if queue is not None:
+                    queue.put_nowait(message)
+        except (ProtocolError, ConnectionError, asyncio.IncompleteReadError) as exc:
+            error = exc
+        # Fail every request still waiting for an answer
+        self.closed = True
+        failure = {'type': 'error', 'error': 'DatabaseError',
+                   'message': f"Connection lost: {error}" if error else "Connection closed by the server"}
+        for queue in self.pending.values():
+            queue.put_nowait(failure)
+
+    def _send(self, sql, parameters):
+        if self.closed:
+            raise DatabaseError("Connection is closed")
+        request_id = next(self.request_ids)
+        queue = asyncio.Queue()
+        self.pending[request_id] = queue
+        self.writer.write(encode_frame({'id': request_id, 'sql': sql, 'parameters': list(parameters)}))
+        return request_id, queue
+
+    async def _answers(self, sql, parameters):
+        # Yields the frames answering one request, ending with 'done'
+        request_id, queue = self._send(sql, parameters)
+        try:
+            try:
+                await self.writer.drain()
+            except ConnectionError as error:
+                raise DatabaseError(f"Connection lost: {error}")
+            while True:
+                message = await queue.get()
+                if message['type'] == 'error':
+                    raise ERROR_CLASSES.get(message.get('error'), DatabaseError)(message['message'])
+                yield message
+                if message['type'] == 'done':
+                    return
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def execute(self, sql, parameters=()):
+        """
+        Run one statement and collect its whole result
+
+        Returns:
+            QueryResult
+
+        Raises:
+            DatabaseError / ProgrammingError: as raised by the server's Cursor
+        """
+        columns = []
+        rows = []
+        async for message in self._answers(sql, parameters):
+            if message['type'] == 'columns':
+                columns = message['columns']
+            elif message['type'] == 'rows':
+                rows.extend(map(tuple, message['rows']))
+            else:
+                return QueryResult(columns, rows, message['row_count'], message['message'])
+
+    async def stream(self, sql, parameters=()):
+        """
+        Run one statement and yield its rows as their batches arrive
+
+        The generator must be consumed to the end (or the connection closed)
+        before later pipelined answers on this connection can be read.
+        """
+        async for message in self._answers(sql, parameters):
+            if message['type'] == 'rows':
+                for row in message['rows']:
+                    yield tuple(row)
+
+    async def close(self):
+        """Close the connection; requests in flight fail"""
+        if not self.writer.is_closing():
+            self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.reader_task
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class ConnectionPool:
+    """A set of pipelined connections to one server"""
+
+    def __init__(self, path=None, host='127.0.0.1', port=None, size=DEFAULT_POOL_SIZE):
+        """
+        Args:
+            path, host, port: Server address (see ClientConnection.open)
+            size: Most connections opened
+        """
+        self.path = path
+        self.host = host
+        self.port = port
+        self.size = size
+        self.connections = []
+        self.opening = 0
+
+    async def acquire(self):
+        """
+        A connection to send the next statement on
+
+        An idle connection is reused first; otherwise a new one is opened
+        while the pool is below its size, and after that the statement is
+        pipelined on the least busy connection.
+        """
+        self.connections = [connection for connection in self.connections if not connection.closed]
+        idle = [connection for connection in self.connections if connection.in_flight == 0]
+        if idle:
+            return idle[0]
+        if len(self.connections) + self.opening < self.size:
+            self.opening += 1
+            try:
+                connection = await ClientConnection.open(self.path, self.host, self.port)
+            finally:
+                self.opening -= 1
+            self.connections.append(connection)
+            return connection
+        if not self.connections:
+            # Every slot is still being opened by other callers
+            await asyncio.sleep(0)
+            return await self.acquire()
+        return min(self.connections, key=lambda connection: connection.in_flight)
+
+    async def execute(self, sql, parameters=()):
+        """Run one statement on a pooled connection (see ClientConnection.execute)"""
+        connection = await self.acquire()
+        return await connection.execute(sql, parameters)
+
+    async def close(self):
+        """Close every connection"""
+        connections, self.connections = self.connections, []
+        for connection in connections:
+            await connection.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
@@ -0,0 +1,418 @@
+"""
+Lightweight Compression for INT/FLOAT Column Segments
+A persisted column is cut into segments of SEGMENT_ROWS rows and every
+segment is stored with whichever of these encodings is smallest:
+
+    PLAIN  raw int64 / float64 values
+    RLE    run values followed by uint32 run lengths
+    FOR    frame of reference: value - base, bit-packed (INT only)
+    DELTA  first value plus (delta - base) of consecutive values, bit-packed (INT only)
+
+Bit-packed codes use a width of 0, 1, 2, 4, 8, 16 or 32 bits; sub-byte widths
+are packed and unpacked with big-integer shifts so no Python loop runs per
+value. Comparisons with a constant are evaluated on RLE runs and FOR codes
+directly, without rebuilding the column values. Decoded segments are cached
+in a BufferPool (see buffer_pool.py).
+"""
+
+import copy
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, chain, compress, repeat
+from operator import add, itemgetter, mul, ne, sub
+import struct
+import sys
+
+from .buffer_pool import default_buffer_pool, new_owner_id
+from .evaluator import COMPARISON_OPERATORS
+from .zone_map import BLOCK_SIZE
+
+
+# Segments are aligned to zone map blocks, so a block never spans two segments
+SEGMENT_ROWS = 4 * BLOCK_SIZE
+
+PLAIN, RLE, FOR, DELTA = 0, 1, 2, 3
+ENCODING_NAMES = {PLAIN: 'plain', RLE: 'rle', FOR: 'for', DELTA: 'delta'}
+
+# encoding, bit width, row count, payload offset, payload length, base, first value
+SEGMENT_ENTRY = struct.Struct('<BBxxIQQqq')
+SEGMENT_COUNT = struct.Struct('<Q')
+
+VALUE_TYPECODES = {'INT': 'q', 'FLOAT': 'd'}
+BIT_WIDTHS = (0, 1, 2, 4, 8, 16, 32)
+WIDE_CODE_TYPECODES = {16: 'H', 32: 'I'}
+RUN_LENGTH_TYPECODE = 'I'
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+# Mask bytes for False / True
+FLAG_BYTES = (b'\x00', b'\x01')
+
+# Decoding assembles little-endian int64 values byte by byte when it can
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def bit_width(span):
+    """Smallest supported width that can hold codes 0..span, or None"""
+    for width in BIT_WIDTHS:
+        if span < (1 << width):
+            return width
+    return None
+
+
+def pack_codes(codes, width):
+    """
+    Bit-pack non-negative integer codes
+
+    Args:
+        codes: Iterable of ints below 2 ** width
+        width: One of BIT_WIDTHS
+
+    Returns:
+        bytes
+    """
+    if width == 0:
+        return b''
+    if width > 8:
+        return array(WIDE_CODE_TYPECODES[width], codes).tobytes()
+    data = bytes(codes)
+    if width == 8:
+        return data
+    # Code i goes to byte i // per_byte at bit offset (i % per_byte) * width.
+    # Every lane of codes is shifted into place as one big integer.
+    per_byte = 8 // width
+    data += bytes(-len(data) % per_byte)
+    packed = 0
+    for lane in range(per_byte):
+        packed |= int.from_bytes(data[lane::per_byte], 'little') << (width * lane)
+    return packed.to_bytes(len(data) // per_byte, 'little')
+
+
+def unpack_codes(payload, width, count, swap=False):
+    """
+    Reverse pack_codes()
+
+    Returns:
+        bytes (width <= 8) or array of 16/32-bit codes
+    """
+    if width == 0:
+        return bytes(count)
+    if width > 8:
+        codes = array(WIDE_CODE_TYPECODES[width])
+        codes.frombytes(payload)
+        if swap:
+            codes.byteswap()
+        return codes
+    if width == 8:
+        return bytes(payload[:count])
+    per_byte = 8 // width
+    size = len(payload)
+    packed = int.from_bytes(payload, 'little')
+    lane_mask = int.from_bytes(bytes([(1 << width) - 1]) * size, 'little')
+    data = bytearray(size * per_byte)
+    for lane in range(per_byte):
+        data[lane::per_byte] = ((packed >> (width * lane)) & lane_mask).to_bytes(size, 'little')
+    return bytes(data[:count])
+
+
+def code_bytes(width):
+    """Bytes per unpacked code: sub-byte widths unpack to one byte per code"""
+    return 1 if width <= 8 else width // 8
+
+
+def _run_starts(values):
+    """Positions where a new run of equal values begins"""
+    if not values:
+        return []
+    return [0] + list(compress(range(1, len(values)), map(ne, values[1:], values[:-1])))
+
+
+def encode_segment(values, data_type):
+    """
+    Encode one segment with its smallest encoding
+
+    Args:
+        values: array of the segment's values
+        data_type: 'INT' or 'FLOAT'
+
+    Returns:
+        (encoding, width, base, first, payload bytes)
+    """
+    typecode = VALUE_TYPECODES[data_type]
+    count = len(values)
+    # (stored size, encoding, width, base, first)
+    best = (count * 8, PLAIN, 0, 0, 0)
+
+    deltas = None
+    if data_type == 'INT' and count:
+        low, high = min(values), max(values)
+        width = bit_width(high - low)
+        if width is not None and (count * width + 7) // 8 < best[0]:
+            # A base whose low code bytes are zero lets decoding drop the
+            # codes straight into the value bytes (see EncodedColumn)
+            unit = 1 << (8 * code_bytes(width))
+            aligned = low - low % unit
+            base = aligned if bit_width(high - aligned) == width else low
+            best = ((count * width + 7) // 8, FOR, width, base, 0)
+        if count > 1:
+            deltas = list(map(sub, values[1:], values[:-1]))
+            low_delta, high_delta = min(deltas), max(deltas)
+            width = bit_width(high_delta - low_delta)
+            size = ((count - 1) * width + 7) // 8 if width is not None else None
+            # Delta decoding needs a running sum per value, so it is only
+            # worth it when it at least halves the size
+            if size is not None and INT64_MIN <= low_delta <= INT64_MAX and size * 2 <= best[0]:
+                best = (size, DELTA, width, low_delta, values[0])
+
+    # Runs of floats are found on their bit patterns so -0.0 and 0.0 (and
+    # NaN payloads) survive the round trip
+    keys = values
+    if data_type == 'FLOAT':
+        keys = array('q')
+        keys.frombytes(values.tobytes())
+    run_count = 1 + sum(map(ne, keys[1:], keys[:-1])) if count else 0
+    if run_count * (8 + 4) < best[0]:
+        best = (run_count * (8 + 4), RLE, 0, 0, 0)
+
+    _, encoding, width, base, first = best
+    if encoding == FOR:
+        payload = pack_codes(map(sub, values, repeat(base)), width)
+    elif encoding == DELTA:
+        payload = pack_codes(map(sub, deltas, repeat(base)), width)
+    elif encoding == RLE:
+        starts = _run_starts(keys)
+        run_values = array(typecode, map(values.__getitem__, starts))
+        lengths = array(RUN_LENGTH_TYPECODE, map(sub, starts[1:] + [count], starts))
+        payload = run_values.tobytes() + lengths.tobytes()
+    else:
+        payload = array(typecode, values).tobytes()
+    return encoding, width, base, first, payload
+
+
+def encode_column(values, data_type):
+    """
+    Split a column into segments and encode each one
+
+    Returns:
+        List of (encoding, width, base, first, payload, row count)
+    """
+    typecode = VALUE_TYPECODES[data_type]
+    if not isinstance(values, array):
+        values = array(typecode, values)
+    segments = []
+    for start in range(0, len(values), SEGMENT_ROWS):
+        chunk = values[start:start + SEGMENT_ROWS]
+        segments.append(encode_segment(chunk, data_type) + (len(chunk),))
+    return segments
+
+
+class EncodedColumn:
+    """
+    Read-only INT/FLOAT column backed by encoded segments
+
+    Segments are decoded on demand and the decoded pages are kept in a
+    BufferPool, keyed by this column's owner id and the segment index.
+    """
+
+    def __init__(self, data_type, segments, swap=False, pool=None):
+        """
+        Args:
+            data_type: 'INT' or 'FLOAT'
+            segments: List of (encoding, width, row count, base, first, payload view);
+                a segment's row count may be less than it holds, the rest is ignored
+            swap: Payload was written with the opposite byte order
+            pool: BufferPool caching decoded segments; the process-wide
+                default pool if omitted
+        """
+        self.data_type = data_type
+        self.typecode = VALUE_TYPECODES[data_type]
+        self._pack = struct.Struct(self.typecode).pack
+        self.segments = segments
+        self.swap = swap
+        self.starts = list(accumulate((segment[2] for segment in segments), initial=0))
+        self.pool = pool if pool is not None else default_buffer_pool()
+        self.owner = new_owner_id()
+        # ScanRing pages are read through (see scanning())
+        self.ring = None
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def _values_array(self, data):
+        values = array(self.typecode)
+        values.frombytes(data)
+        if self.swap:
+            values.byteswap()
+        return values
+
+    def _runs(self, index):
+        _, _, _, _, _, payload = self.segments[index]
+        run_count = len(payload) // (8 + 4)
+        run_values = self._values_array(payload[:run_count * 8])
+        lengths = array(RUN_LENGTH_TYPECODE)
+        lengths.frombytes(payload[run_count * 8:])
+        if self.swap:
+            lengths.byteswap()
+        return run_values, lengths
+
+    def _codes(self, index):
+        return self.pool.get((self.owner, index, 'codes'), lambda: self._unpack(index), self.ring)
+
+    def _unpack(self, index):
+        encoding, width, count, _, _, payload = self.segments[index]
+        return unpack_codes(payload, width, count - 1 if encoding == DELTA else count, self.swap)
+
+    def decode_segment(self, index):
+        """Decode one segment into an array"""
+        encoding, width, count, base, first, payload = self.segments[index]
+        if encoding == PLAIN:
+            return self._values_array(payload[:count * 8])
+        if encoding == RLE:
+            # Repeat each run's value bytes instead of creating one object per row
+            run_values, lengths = self._runs(index)
+            data = b''.join(map(mul, map(self._pack, run_values), lengths))
+            return self._native_array(data)[:count]
+        if encoding == DELTA:
+            if width == 0:
+                # Constant step: an arithmetic sequence
+                if base == 0:
+                    return array(self.typecode, [first]) * count
+                return array(self.typecode, range(first, first + base * count, base))
+            codes = self._codes(index)
+            return array(self.typecode, accumulate(map(add, codes, repeat(base)), initial=first))
+        return self._decode_frame_of_reference(index, width, count, base)
+
+    def _native_array(self, data):
+        values = array(self.typecode)
+        values.frombytes(data)
+        return values
+
+    def _decode_frame_of_reference(self, index, width, count, base):
+        if width == 0:
+            return array(self.typecode, [base]) * count
+        codes = self._codes(index)
+        size = code_bytes(width)
+        unit = 1 << (8 * size)
+        offset = base % unit
+        if LITTLE_ENDIAN and size == 1 and offset + (1 << width) <= unit:
+            # Fold the base's low byte into the codes; no carry can occur
+            codes = codes.translate(bytes((code + offset) & 0xFF for code in range(256)))
+            offset = 0
+        if not LITTLE_ENDIAN or offset:
+            return array(self.typecode, map(add, codes, repeat(base)))
+        # Every value is the base with its low bytes replaced by the code
+        data = bytearray(array(self.typecode, [base - base % unit]).tobytes() * count)
+        code_data = codes if size == 1 else codes.tobytes()
+        for byte in range(size):
+            data[byte::8] = code_data[byte::size]
+        return self._native_array(data)
+
+    def _values_key(self, index):
+        return (self.owner, index, 'values')
+
+    def segment_values(self, index):
+        """Decoded values of one segment, through the buffer pool"""
+        return self.pool.get(self._values_key(index), lambda: self.decode_segment(index), self.ring)
+
+    def pinned_segment(self, index):
+        """Context manager pinning the decoded values of one segment"""
+        return self.pool.pinned(self._values_key(index), lambda: self.decode_segment(index), self.ring)
+
+    def scanning(self, ring):
+        """A view of this column that reads its pages through a ScanRing"""
+        view = copy.copy(self)
+        view.ring = ring
+        return view
+
+    def discard_pages(self):
+        """Drop this column's decoded pages from the pool"""
+        self.pool.discard(self.owner)
+
+    def segment_of(self, row_id):
+        """Index of the segment holding a row"""
+        return bisect_right(self.starts, row_id) - 1
+
+    def __getitem__(self, row_id):
+        if isinstance(row_id, slice):
+            start, stop, step = row_id.indices(len(self))
+            if step != 1:
+                return array(self.typecode, self)[row_id]
+            result = array(self.typecode)
+            while start < stop:
+                index = self.segment_of(start)
+                offset = self.starts[index]
+                end = min(stop, self.starts[index + 1])
+                with self.pinned_segment(index) as values:
+                    result.extend(values[start - offset:end - offset])
+                start = end
+            return result
+        if row_id < 0:
+            row_id += len(self)
+        if not 0 <= row_id < len(self):
+            raise IndexError("column index out of range")
+        index = self.segment_of(row_id)
+        return self.segment_values(index)[row_id - self.starts[index]]
+
+    def __iter__(self):
+        return chain.from_iterable(map(self.decode_segment, range(len(self.segments))))
+
+    def take(self, row_ids):
+        """Values of the given rows (ascending, at least two row ids)"""
+        index = self.segment_of(row_ids[0])
+        if index != self.segment_of(row_ids[-1]):
+            return [self[row_id] for row_id in row_ids]
+        offset = self.starts[index]
+        positions = map(sub, row_ids, repeat(offset))
+        with self.pinned_segment(index) as values:
+            return itemgetter(*positions)(values)
+
+    # ==================== Filtering ====================
+
+    def can_match(self, op, value):
+        """Whether match_mask() can evaluate `column op value`"""
+        return op in COMPARISON_OPERATORS and isinstance(value, (int, float))
+
+    def _segment_mask(self, index, compare, value, start, end):
+        encoding, width, count, base, _, _ = self.segments[index]
+        if encoding == RLE:
+            # One comparison per run, expanded to one flag per row
+            run_values, lengths = self._runs(index)
+            flags = map(FLAG_BYTES.__getitem__, map(compare, run_values, repeat(value)))
+            return b''.join(map(mul, flags, lengths))[start:end]
+        if encoding == FOR:
+            # Compare the codes with (value - base) instead of decoding them
+            codes = self._codes(index)
+            target = value - base
+            if width <= 8:
+                flags = bytes(map(compare, range(256), repeat(target)))
+                return codes[start:end].translate(flags)
+            return bytes(map(compare, codes[start:end], repeat(target)))
+        with self.pinned_segment(index) as values:
+            return bytes(map(compare, values[start:end], repeat(value)))
+
+    def match_mask(self, op, value, start, end):
+        """
+        Evaluate `column op value` for rows [start, end)
+
+        Returns:
+            bytes with one flag per row (1 = the comparison holds)
+        """
+        compare = COMPARISON_OPERATORS[op]
+        masks = []
+        while start < end:
+            index = self.segment_of(start)
+            offset = self.starts[index]
+            stop = min(end, self.starts[index + 1])
+            masks.append(self._segment_mask(index, compare, value, start - offset, stop - offset))
+            start = stop
+        return b''.join(masks)
+
+    # ==================== Reporting ====================
+
+    def encoding_name(self):
+        """Encodings used by the segments, e.g. 'delta' or 'for+rle'"""
+        used = sorted({segment[0] for segment in self.segments})
+        return '+'.join(ENCODING_NAMES[encoding] for encoding in used) or 'plain'
+
+    def stored_size(self):
+        """Bytes of encoded payload"""
+        return sum(len(segment[5]) for segment in self.segments)
@@ -0,0 +1,319 @@
+"""
+DB-API Style Connection and Cursor
+A thin facade over the lexer, parser and QueryExecutor. SELECT results are
+produced lazily from the scan pipeline and handed out with fetchone(),
+fetchmany() or iteration, so large extracts are never fully materialized.
+"""
+
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+from phase1_lexer.lexer import LexicalAnalyzer
+from phase1_lexer.token_definitions import TokenType
+from phase2_parser.parser import SyntaxAnalyzer
+from .evaluator import ExecutionError
+from .executor import QueryExecutor
+
+
+# Number of parsed statements each connection keeps
+PARSE_CACHE_SIZE = 256
+
+
+class DatabaseError(Exception):
+    """Raised when a statement fails to execute"""
+
+
+class ProgrammingError(DatabaseError):
+    """Raised for lexical or syntax errors and misuse of the API"""
+
+
+class ParseCache:
+    """
+    Parsed statements by SQL text, least recently used evicted first
+
+    Parse trees are never modified once built, so one cache can be shared
+    by several connections (e.g. every session of a QueryServer).
+    """
+
+    def __init__(self, size=PARSE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, sql):
+        """Cached statements for the text, or None"""
+        with self.lock:
+            statements = self.entries.get(sql)
+            if statements is not None:
+                self.entries.move_to_end(sql)
+            return statements
+
+    def put(self, sql, statements):
+        """Remember the statements parsed from the text"""
+        with self.lock:
+            self.entries[sql] = statements
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class Connection:
+    """A session: one catalog, one executor and a cache of parsed statements"""
+
+    def __init__(self, catalog=None, wal=None, parallelism=1, parse_cache=None):
+        """
+        Args:
+            catalog: Catalog to run against; a new empty one is created if omitted
+            wal: Optional WriteAheadLog for durable writes
+            parallelism: Degree of parallelism for large scans
+            parse_cache: ParseCache shared with other connections; a private
+                one is created if omitted
+        """
+        self.executor = QueryExecutor(catalog, wal, parallelism)
+        self.catalog = self.executor.catalog
+        self._parse_cache = parse_cache if parse_cache is not None else ParseCache()
+        self._closed = False
+
+    def parse(self, sql):
+        """
+        Lex and parse SQL text, reusing earlier results for identical text
+
+        Returns:
+            List of statement nodes
+
+        Raises:
+            ProgrammingError: on the first lexical or syntax error
+        """
+        statements = self._parse_cache.get(sql)
+        if statements is not None:
+            return statements
+
+        lexer = LexicalAnalyzer(sql)
+        tokens = lexer.tokenize()
+        if lexer.errors.has_errors():
+            raise ProgrammingError(lexer.errors.get_errors()[0]['message'])
+        parser = SyntaxAnalyzer([t for t in tokens if t.type not in [TokenType.COMMENT, TokenType.ERROR]])
+        program = parser.parse()
+        if parser.errors.has_errors():
+            raise ProgrammingError(parser.errors.get_errors()[0]['message'])
+
+        statements = program.children
+        self._parse_cache.put(sql, statements)
+        return statements
+
+    def cursor(self):
+        """Create a new cursor"""
+        self._check_open()
+        return Cursor(self)
+
+    def execute(self, sql, parameters=()):
+        """Shortcut: create a cursor and execute one statement on it"""
+        cursor = self.cursor()
+        cursor.execute(sql, parameters)
+        return cursor
+
+    def commit(self):
+        """
+        Commit the transaction opened by BEGIN, if any, and make every
+        logged write durable (syncs the write-ahead log)
+        """
+        self._check_open()
+        if self.executor.transaction is not None:
+            try:
+                self.executor.commit_transaction()
+            except ExecutionError as error:
+                raise DatabaseError(error.message) from error
+        if self.executor.wal is not None:
+            self.executor.wal.sync()
+
+    def rollback(self):
+        """Discard the rows buffered by the transaction opened by BEGIN, if any"""
+        self._check_open()
+        self.executor.transaction = None
+
+    def close(self):
+        """Close the session and release worker processes; an open transaction is rolled back"""
+        if not self._closed:
+            self.rollback()
+            self.commit()
+            self.executor.close()
+            self._closed = True
+
+    def _check_open(self):
+        if self._closed:
+            raise ProgrammingError("Connection is closed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Cursor:
+    """Executes statements and streams their results"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        # Summary of the last statement that did not return rows
+        self.statusmessage = None
+        self.arraysize = 1
+        self._rows = None
+
+    # ==================== Execution ====================
+
+    def _single_statement(self, sql):
+        statements = self.connection.parse(sql)
+        if len(statements) != 1:
+            raise ProgrammingError(f"Expected exactly one statement, found {len(statements)}")
+        return statements[0]
+
+    def _raise_last_error(self):
+        errors = self.connection.executor.errors.get_errors()
+        raise DatabaseError(errors[-1]['message'] if errors else "Statement failed")
+
+    def execute(self, sql, parameters=()):
+        """
+        Execute one statement
+
+        Args:
+            sql: Statement text, optionally with '?' placeholders
+            parameters: Sequence of values for the placeholders
+
+        Returns:
+            self, so calls can be chained with fetch methods
+        """
+        self.connection._check_open()
+        self.close_results()
+        node = self._single_statement(sql)
+        executor = self.connection.executor
+
+        if node.node_type == 'SELECT_STMT':
+            try:
+                columns, rows = executor.iterate_select(node, parameters)
+            except ExecutionError as error:
+                executor.report_error(error.message, error.node if error.node is not None else node)
+                self._raise_last_error()
+            self._set_results(columns, rows)
+            self.rowcount = -1
+            self.statusmessage = None
+            return self
+
+        result = executor.execute_statement(node, parameters)
+        if result is None:
+            self._raise_last_error()
+        if result.columns:
+            self._set_results(result.columns, iter(result.rows))
+        self.rowcount = result.row_count
+        self.statusmessage = result.message
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        """
+        Execute one statement once per parameter sequence
+
+        INSERT statements are parsed and compiled a single time and then only
+        rebind their '?' values for each row.
+        """
+        self.connection._check_open()
+        self.close_results()
+        node = self._single_statement(sql)
+        executor = self.connection.executor
+
+        if node.node_type == 'INSERT_STMT':
+            result = executor.execute_insert_many(node, seq_of_parameters)
+            if result is None:
+                self._raise_last_error()
+            self.rowcount = result.row_count
+            self.statusmessage = result.message
+            return self
+
+        total = 0
+        for parameters in seq_of_parameters:
+            result = executor.execute_statement(node, parameters)
+            if result is None:
+                self._raise_last_error()
+            total += result.row_count
+        self.rowcount = total
+        self.statusmessage = None
+        return self
+
+    # ==================== Fetching ====================
+
+    def _set_results(self, columns, rows):
+        self.description = tuple((name, None, None, None, None, None, None) for name in columns)
+        self._rows = rows
+
+    def _check_results(self):
+        if self._rows is None:
+            raise ProgrammingError("No result set to fetch from")
+
+    def _fetch(self, count=None):
+        self._check_results()
+        try:
+            if count is None:
+                return list(self._rows)
+            return list(islice(self._rows, count))
+        except ExecutionError as error:
+            self.close_results()
+            raise DatabaseError(error.message)
+
+    def fetchone(self):
+        """Next result row, or None when the result set is exhausted"""
+        rows = self._fetch(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=None):
+        """Up to `size` (default: arraysize) next result rows"""
+        return self._fetch(self.arraysize if size is None else size)
+
+    def fetchall(self):
+        """All remaining result rows"""
+        return self._fetch()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    # ==================== Cleanup ====================
+
+    def close_results(self):
+        """
+        Abandon the current result set
+
+        Closes the underlying generator so the scan stops immediately and
+        releases its references to the table buffers.
+        """
+        if self._rows is not None and hasattr(self._rows, 'close'):
+            self._rows.close()
+        self._rows = None
+        self.description = None
+
+    def cancel(self):
+        """Stop producing rows for the current statement"""
+        self.close_results()
+
+    def close(self):
+        """Close the cursor"""
+        self.close_results()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def connect(catalog=None, wal=None, parallelism=1, parse_cache=None):
+    """Open a new Connection"""
+    return Connection(catalog, wal, parallelism, parse_cache)
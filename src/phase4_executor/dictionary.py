@@ -0,0 +1,160 @@
+"""
+Dictionary-Encoded TEXT Columns
+A TEXT column with few distinct values is stored as one small integer code
+per row plus a list of the distinct strings. Equality and IN predicates on
+such a column are answered by comparing codes, without decoding or building
+rows.
+
+Columns whose number of distinct values grows too large are turned back
+into plain lists of strings by the owning Table (see Table.check_encodings).
+"""
+
+from array import array
+from operator import itemgetter
+
+
+# Largest dictionary kept before the column falls back to plain strings
+MAX_DICTIONARY_SIZE = 65536
+
+# Code array typecodes, widened as the dictionary grows past each limit
+CODE_TYPECODES = (('B', 1 << 8), ('H', 1 << 16), ('I', 1 << 32))
+
+# Above this ratio of distinct values to rows the dictionary saves nothing
+MAX_DISTINCT_RATIO = 0.5
+
+# Cardinality is only judged once a column has this many rows
+MIN_ROWS_FOR_FALLBACK = 4096
+
+# Operators answered on the codes of a dictionary column
+CODE_OPERATORS = ('=', '!=', '<>')
+
+
+class DictionaryColumn:
+    """
+    A TEXT column stored as codes into a dictionary of distinct values
+
+    Behaves like the list it replaces: len(), iteration, indexing, slicing,
+    append() and extend() all work on decoded strings.
+    """
+
+    def __init__(self, values=()):
+        # Codes start as unsigned bytes and widen as the dictionary grows
+        self.codes = array('B')
+        self.values = []
+        self.lookup = {}
+        self.extend(values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def __getitem__(self, row_id):
+        if isinstance(row_id, slice):
+            return list(map(self.values.__getitem__, self.codes[row_id]))
+        return self.values[self.codes[row_id]]
+
+    def take(self, row_ids):
+        """Decode the values of the given rows (at least two row ids)"""
+        return list(map(self.values.__getitem__, itemgetter(*row_ids)(self.codes)))
+
+    def __setitem__(self, row_id, value):
+        self.codes[row_id] = self.encode(value)
+
+    def __delitem__(self, row_ids):
+        # Values only the deleted rows used stay in the dictionary
+        del self.codes[row_ids]
+
+    def encode(self, value):
+        """Get the code of a value, adding it to the dictionary if needed"""
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            if code == 1 << (8 * self.codes.itemsize):
+                self._widen(code)
+            self.values.append(value)
+            self.lookup[value] = code
+        return code
+
+    def _widen(self, code):
+        for typecode, limit in CODE_TYPECODES:
+            if code < limit:
+                self.codes = array(typecode, self.codes)
+                return
+
+    def append(self, value):
+        code = self.encode(value)
+        self.codes.append(code)
+
+    def extend(self, values):
+        # Encode first: encode() may replace self.codes with a wider array
+        codes = list(map(self.encode, values))
+        self.codes.extend(codes)
+
+    @property
+    def distinct_count(self):
+        return len(self.values)
+
+    def is_high_cardinality(self):
+        """Whether the column should fall back to a plain list of strings"""
+        if len(self.values) > MAX_DICTIONARY_SIZE:
+            return True
+        rows = len(self.codes)
+        return rows >= MIN_ROWS_FOR_FALLBACK and len(self.values) > rows * MAX_DISTINCT_RATIO
+
+    def memory_size(self):
+        """Approximate bytes held by the codes, the dictionary and its strings"""
+        return (
+            self.codes.itemsize * len(self.codes)
+            + sum(len(value) for value in self.values)
+            + 16 * len(self.values)
+        )
+
+    def can_match(self, op, value):
+        """Whether match_mask() can evaluate `column op value`"""
+        if op == 'IN':
+            return all(isinstance(item, str) for item in value)
+        return op in CODE_OPERATORS and isinstance(value, str)
+
+    def match_mask(self, op, value, start, end):
+        """
+        Evaluate `column op value` on the codes of rows [start, end)
+
+        Args:
+            op: '=', '!=', '<>' or 'IN'
+            value: Constant compared with the column (a tuple for IN)
+
+        Returns:
+            bytes with one flag per row (1 = the comparison holds)
+        """
+        if op == 'IN':
+            return self._in_mask(value, start, end)
+        code = self.lookup.get(value) if isinstance(value, str) else None
+        if code is None:
+            # The value never occurs: '=' matches nothing, '!=' everything
+            return bytes(end - start) if op == '=' else b'\x01' * (end - start)
+        if self.codes.typecode == 'B':
+            # One byte per code: map every code to its flag in a single translate()
+            flags = bytearray(256) if op == '=' else bytearray(b'\x01' * 256)
+            flags[code] = op == '='
+            return self.codes[start:end].tobytes().translate(flags)
+        compare = code.__eq__ if op == '=' else code.__ne__
+        return bytes(map(compare, self.codes[start:end]))
+
+    def _in_mask(self, values, start, end):
+        # The codes of the listed values that occur; the others match no row
+        codes = {self.lookup[value] for value in values if value in self.lookup}
+        if not codes:
+            return bytes(end - start)
+        if self.codes.typecode == 'B':
+            flags = bytearray(256)
+            for code in codes:
+                flags[code] = 1
+            return self.codes[start:end].tobytes().translate(flags)
+        return bytes(map(codes.__contains__, self.codes[start:end]))
+
+
+def and_masks(left, right):
+    """Combine two flag masks of equal length with AND"""
+    return (int.from_bytes(left, 'little') & int.from_bytes(right, 'little')).to_bytes(len(left), 'little')
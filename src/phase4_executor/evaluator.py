@@ -0,0 +1,568 @@
+"""
+Expression and Condition Evaluation
+Compiles EXPRESSION / TERM / COMPARISON subtrees of the parse tree into
+Python closures that are evaluated once per row
+
+IN lists of constants are folded into a hashed set when compiled, BETWEEN is
+one chained comparison and LIKE patterns become string method calls (a
+regular expression only when '_' or an inner '%' needs one).
+"""
+
+import operator
+import re
+from functools import lru_cache
+
+
+class ExecutionError(Exception):
+    """Raised when a statement cannot be executed"""
+
+    def __init__(self, message, node=None):
+        super().__init__(message)
+        self.message = message
+        self.node = node
+
+
+COMPARISON_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def literal_value(lexeme):
+    """
+    Convert a LITERAL lexeme into a Python value
+
+    Args:
+        lexeme: Literal text as produced by the lexer (strings keep their quotes)
+
+    Returns:
+        str, float or int
+    """
+    if lexeme.startswith("'"):
+        return lexeme[1:-1]
+    if '.' in lexeme:
+        return float(lexeme)
+    return int(lexeme)
+
+
+def _divide(left, right):
+    if right == 0:
+        raise ZeroDivisionError
+    if isinstance(left, int) and isinstance(right, int):
+        # Integer division truncates toward zero like SQL
+        quotient = abs(left) // abs(right)
+        return quotient if (left >= 0) == (right >= 0) else -quotient
+    return left / right
+
+
+def _modulo(left, right):
+    if right == 0:
+        raise ZeroDivisionError
+    return left % right
+
+
+ARITHMETIC_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': _divide,
+    '%': _modulo,
+}
+
+
+def expression_text(node):
+    """
+    Rebuild the SQL text of an expression subtree
+
+    Used for result column headers and error messages.
+    """
+    if node.node_type in ('EXPRESSION', 'TERM'):
+        return f"{expression_text(node.children[0])} {node.value} {expression_text(node.children[1])}"
+    if node.node_type == 'PARAMETER':
+        return '?'
+    if node.node_type == 'FUNCTION_CALL':
+        return f"{node.value}({expression_text(node.children[0])})"
+    return str(node.value)
+
+
+def compile_expression(node, positions, parameters=None):
+    """
+    Compile an expression subtree into a function of one row
+
+    Args:
+        node: IDENTIFIER, LITERAL, PARAMETER, EXPRESSION, TERM or
+            FUNCTION_CALL node
+        positions: Mapping of column name to its position in the row tuple.
+            Rows that carry computed values (group keys, aggregates) also map
+            the expression text of those values, e.g. 'SUM(x)'.
+        parameters: List of bound '?' values; read at evaluation time, so the
+            caller may rebind it in place between rows
+
+    Returns:
+        Callable taking a row tuple and returning the expression value
+    """
+    if node.node_type in ('EXPRESSION', 'TERM', 'FUNCTION_CALL'):
+        position = positions.get(expression_text(node))
+        if position is not None:
+            return lambda row: row[position]
+
+    if node.node_type == 'FUNCTION_CALL':
+        raise ExecutionError(f"Aggregate {expression_text(node)} is not allowed here", node)
+
+    if node.node_type == 'LITERAL':
+        value = literal_value(node.value)
+        return lambda row: value
+
+    if node.node_type == 'IDENTIFIER':
+        if node.value not in positions:
+            raise ExecutionError(f"Unknown column '{node.value}'", node)
+        position = positions[node.value]
+        return lambda row: row[position]
+
+    if node.node_type == 'PARAMETER':
+        index = node.value
+        if parameters is None:
+            raise ExecutionError(f"No value bound for parameter {index + 1}", node)
+
+        def bound_value(row):
+            try:
+                return parameters[index]
+            except IndexError:
+                raise ExecutionError(f"No value bound for parameter {index + 1}", node)
+
+        return bound_value
+
+    if node.node_type in ('EXPRESSION', 'TERM'):
+        left = compile_expression(node.children[0], positions, parameters)
+        right = compile_expression(node.children[1], positions, parameters)
+        apply = ARITHMETIC_OPERATORS[node.value]
+        text = expression_text(node)
+
+        def evaluate(row):
+            try:
+                return apply(left(row), right(row))
+            except ZeroDivisionError:
+                raise ExecutionError(f"Division by zero in '{text}'", node)
+            except TypeError:
+                raise ExecutionError(f"Incompatible operand types in '{text}'", node)
+
+        return evaluate
+
+    raise ExecutionError(f"Unsupported expression '{node.node_type}'", node)
+
+
+def is_constant(node):
+    """Check whether an expression subtree is made of literals only (no columns or parameters)"""
+    if node.node_type == 'LITERAL':
+        return True
+    return node.node_type in ('EXPRESSION', 'TERM') and all(is_constant(child) for child in node.children)
+
+
+@lru_cache(maxsize=256)
+def like_matcher(pattern):
+    """
+    Compile a LIKE pattern into a predicate of one string
+
+    '%' matches any run of characters and '_' exactly one; the pattern has
+    to match the whole string.
+    """
+    if '_' not in pattern:
+        parts = pattern.split('%')
+        if len(parts) == 1:
+            return pattern.__eq__
+        if len(parts) == 2 and not parts[1]:
+            return operator.methodcaller('startswith', parts[0])
+        if len(parts) == 2 and not parts[0]:
+            return operator.methodcaller('endswith', parts[1])
+        if len(parts) == 3 and not parts[0] and not parts[2]:
+            inner = parts[1]
+            return lambda value: inner in value
+    regex = re.compile(
+        ''.join('.*' if char == '%' else '.' if char == '_' else re.escape(char) for char in pattern),
+        re.DOTALL
+    )
+    return lambda value: regex.fullmatch(value) is not None
+
+
+def like_prefix(pattern):
+    """
+    Literal text every match of a LIKE pattern starts with
+
+    Returns:
+        (prefix, exact) where exact is True if the pattern is the prefix
+        followed by nothing or by a single trailing '%'
+    """
+    end = len(pattern)
+    for position, char in enumerate(pattern):
+        if char in '%_':
+            end = position
+            break
+    prefix = pattern[:end]
+    return prefix, pattern[end:] in ('', '%')
+
+
+def compile_condition(node, positions, parameters=None):
+    """
+    Compile a condition subtree into a predicate of one row
+
+    Args:
+        node: OR_CONDITION, AND_CONDITION, NOT_CONDITION, COMPARISON,
+            IN_CONDITION, BETWEEN_CONDITION or LIKE_CONDITION node
+        positions: Mapping of column name to its position in the row tuple
+        parameters: List of bound '?' values (see compile_expression)
+
+    Returns:
+        Callable taking a row tuple and returning True or False
+    """
+    if node.node_type == 'WHERE_CLAUSE':
+        return compile_condition(node.children[0], positions, parameters)
+
+    if node.node_type == 'OR_CONDITION':
+        left = compile_condition(node.children[0], positions, parameters)
+        right = compile_condition(node.children[1], positions, parameters)
+        return lambda row: left(row) or right(row)
+
+    if node.node_type == 'AND_CONDITION':
+        left = compile_condition(node.children[0], positions, parameters)
+        right = compile_condition(node.children[1], positions, parameters)
+        return lambda row: left(row) and right(row)
+
+    if node.node_type == 'NOT_CONDITION':
+        operand = compile_condition(node.children[0], positions, parameters)
+        return lambda row: not operand(row)
+
+    if node.node_type == 'COMPARISON':
+        left = compile_expression(node.children[0], positions, parameters)
+        if len(node.children) == 1:
+            # Bare identifier used as a boolean column
+            return lambda row: bool(left(row))
+
+        if len(node.children) < 3:
+            raise ExecutionError("Comparison is missing its right operand", node.children[1])
+
+        compare = COMPARISON_OPERATORS[node.children[1].value]
+        right = compile_expression(node.children[2], positions, parameters)
+        op_node = node.children[1]
+
+        def evaluate(row):
+            try:
+                return compare(left(row), right(row))
+            except TypeError:
+                raise ExecutionError(
+                    f"Cannot compare values with '{op_node.value}'", op_node
+                )
+
+        return evaluate
+
+    if node.node_type == 'IN_CONDITION':
+        return compile_in(node, positions, parameters)
+
+    if node.node_type == 'BETWEEN_CONDITION':
+        return compile_between(node, positions, parameters)
+
+    if node.node_type == 'LIKE_CONDITION':
+        return compile_like(node, positions, parameters)
+
+    raise ExecutionError(f"Unsupported condition '{node.node_type}'", node)
+
+
+def compile_in(node, positions, parameters=None):
+    """
+    Compile `expression IN (values)`
+
+    The constant values are collected into a set once, so each row costs one
+    hash lookup however long the list is; values that read columns or
+    parameters are evaluated per row.
+    """
+    left = compile_expression(node.children[0], positions, parameters)
+    constants = set()
+    others = []
+    for item in node.children[1].children:
+        if is_constant(item):
+            constants.add(compile_expression(item, {}, None)(()))
+        else:
+            others.append(compile_expression(item, positions, parameters))
+    constants = frozenset(constants)
+    if not others:
+        return lambda row: left(row) in constants
+
+    def evaluate(row):
+        value = left(row)
+        return value in constants or any(value == other(row) for other in others)
+
+    return evaluate
+
+
+def compile_between(node, positions, parameters=None):
+    """Compile `expression BETWEEN low AND high` into one chained comparison"""
+    value, low, high = (compile_expression(child, positions, parameters) for child in node.children)
+    if is_constant(node.children[1]) and is_constant(node.children[2]):
+        low_value, high_value = low(()), high(())
+
+        def evaluate(row):
+            try:
+                return low_value <= value(row) <= high_value
+            except TypeError:
+                raise ExecutionError("Cannot compare values with 'BETWEEN'", node)
+
+        return evaluate
+
+    def evaluate(row):
+        try:
+            return low(row) <= value(row) <= high(row)
+        except TypeError:
+            raise ExecutionError("Cannot compare values with 'BETWEEN'", node)
+
+    return evaluate
+
+
+def compile_like(node, positions, parameters=None):
+    """Compile `expression LIKE pattern`; NULL values never match"""
+    value = compile_expression(node.children[0], positions, parameters)
+    pattern = compile_expression(node.children[1], positions, parameters)
+    constant_pattern = is_constant(node.children[1])
+    if constant_pattern:
+        matcher = like_matcher(_like_text(pattern(()), node))
+
+    def evaluate(row):
+        text = value(row)
+        if text is None:
+            return False
+        if not isinstance(text, str):
+            raise ExecutionError("LIKE needs a TEXT value", node)
+        if constant_pattern:
+            return matcher(text)
+        return like_matcher(_like_text(pattern(row), node))(text)
+
+    return evaluate
+
+
+def _like_text(pattern, node):
+    if not isinstance(pattern, str):
+        raise ExecutionError("LIKE needs a TEXT pattern", node)
+    return pattern
+
+
+def value_kind(node, column_type, parameters=None):
+    """
+    Static kind of an expression: 'TEXT', 'NUMBER' or None when unknown
+
+    Args:
+        node: Expression subtree
+        column_type: Callable mapping a column name to its declared type
+            (None for a name it does not know)
+        parameters: List of bound '?' values
+    """
+    if node.node_type == 'LITERAL':
+        return 'TEXT' if node.value.startswith("'") else 'NUMBER'
+    if node.node_type == 'IDENTIFIER':
+        data_type = column_type(node.value)
+        if data_type is None:
+            return None
+        return 'TEXT' if data_type == 'TEXT' else 'NUMBER'
+    if node.node_type == 'PARAMETER':
+        if parameters is None or node.value >= len(parameters):
+            return None
+        value = parameters[node.value]
+        if isinstance(value, str):
+            return 'TEXT'
+        return 'NUMBER' if isinstance(value, (int, float)) else None
+    if node.node_type in ('EXPRESSION', 'TERM'):
+        left, right = (value_kind(child, column_type, parameters) for child in node.children)
+        return left if left == right else None
+    return None
+
+
+def _mixed(first, second):
+    return first is not None and second is not None and first != second
+
+
+def check_condition_types(node, column_type, parameters=None):
+    """
+    Reject comparisons of TEXT with numbers before any row is read
+
+    Such a comparison would otherwise fail only on the rows that reach it,
+    or, for '=', '!=' and IN, quietly never (or always) match.
+
+    Args:
+        node: WHERE_CLAUSE or condition node (None is accepted)
+        column_type: Callable mapping a column name to its declared type
+        parameters: List of bound '?' values
+
+    Raises:
+        ExecutionError: for the first comparison of a TEXT and a numeric value
+    """
+    if node is None:
+        return
+    if node.node_type in ('WHERE_CLAUSE', 'OR_CONDITION', 'AND_CONDITION', 'NOT_CONDITION'):
+        for child in node.children:
+            check_condition_types(child, column_type, parameters)
+        return
+
+    kinds = [value_kind(child, column_type, parameters) for child in node.children]
+    if node.node_type == 'COMPARISON' and len(node.children) == 3:
+        if _mixed(kinds[0], kinds[2]):
+            op_node = node.children[1]
+            raise ExecutionError(f"Cannot compare values with '{op_node.value}'", op_node)
+    elif node.node_type == 'IN_CONDITION':
+        if any(_mixed(kinds[0], value_kind(item, column_type, parameters)) for item in node.children[1].children):
+            raise ExecutionError("Cannot compare values with 'IN'", node)
+    elif node.node_type == 'BETWEEN_CONDITION':
+        if _mixed(kinds[0], kinds[1]) or _mixed(kinds[0], kinds[2]):
+            raise ExecutionError("Cannot compare values with 'BETWEEN'", node)
+    elif node.node_type == 'LIKE_CONDITION':
+        if kinds[0] == 'NUMBER':
+            raise ExecutionError("LIKE needs a TEXT value", node)
+        if kinds[1] == 'NUMBER':
+            raise ExecutionError("LIKE needs a TEXT pattern", node)
+
+
+# Operator to use when the constant is on the left: 5 < x  ->  x > 5
+FLIPPED_OPERATORS = {
+    '=': '=', '!=': '!=', '<>': '<>',
+    '<': '>', '<=': '>=', '>': '<', '>=': '<=',
+}
+
+
+def split_conjuncts(node):
+    """
+    Split a condition into the terms joined by AND at its top level
+
+    Returns:
+        List of condition nodes; anything under OR or NOT stays whole
+    """
+    if node.node_type == 'WHERE_CLAUSE':
+        return split_conjuncts(node.children[0])
+    if node.node_type == 'AND_CONDITION':
+        return split_conjuncts(node.children[0]) + split_conjuncts(node.children[1])
+    return [node]
+
+
+def references_columns(node):
+    """Check whether an expression subtree reads any column"""
+    if node.node_type in ('IDENTIFIER', 'FUNCTION_CALL'):
+        return True
+    return any(references_columns(child) for child in node.children)
+
+
+def column_comparison(node, parameters=None):
+    """
+    Recognize a `column op constant` comparison (in either order)
+
+    The constant may be any expression that reads no column; it is evaluated
+    once with the bound parameters.
+
+    Returns:
+        (column_name, op, value, text) with op oriented as `column op value`,
+        or None if the node has another shape or the constant cannot be evaluated
+    """
+    if node.node_type != 'COMPARISON' or len(node.children) != 3:
+        return None
+    left, op_node, right = node.children
+    op = op_node.value
+    if left.node_type == 'IDENTIFIER' and not references_columns(right):
+        column, constant = left, right
+    elif right.node_type == 'IDENTIFIER' and not references_columns(left):
+        column, constant, op = right, left, FLIPPED_OPERATORS[op]
+    else:
+        return None
+    try:
+        value = compile_expression(constant, {}, parameters)(())
+    except ExecutionError:
+        return None
+    return column.value, op, value, f"{column.value} {op} {expression_text(constant)}"
+
+
+# IN lists longer than this are abbreviated in predicate texts (EXPLAIN)
+MAX_LISTED_VALUES = 8
+
+
+def column_predicates(node, parameters=None):
+    """
+    Recognize a condition that restricts one column to constant values
+
+    A comparison gives its `column op constant` predicate, BETWEEN a '>=' and
+    a '<=' predicate, IN one ('IN', sorted tuple of the values) predicate and
+    LIKE the range of strings starting with the pattern's literal prefix.
+
+    Returns:
+        (predicates, exact): list of (column_name, op, value, text) tuples
+        every row satisfying the node satisfies, and whether satisfying all
+        of them is also enough; ([], False) for any other node
+    """
+    if node.node_type == 'COMPARISON':
+        comparison = column_comparison(node, parameters)
+        return ([comparison], True) if comparison is not None else ([], False)
+    if node.node_type not in ('IN_CONDITION', 'BETWEEN_CONDITION', 'LIKE_CONDITION'):
+        return [], False
+    column = node.children[0]
+    if column.node_type != 'IDENTIFIER':
+        return [], False
+    operands = node.children[1].children if node.node_type == 'IN_CONDITION' else node.children[1:]
+    if any(references_columns(operand) for operand in operands):
+        return [], False
+    try:
+        values = [compile_expression(operand, {}, parameters)(()) for operand in operands]
+    except ExecutionError:
+        return [], False
+    name = column.value
+
+    if node.node_type == 'BETWEEN_CONDITION':
+        low, high = values
+        return [
+            (name, '>=', low, f"{name} >= {expression_text(operands[0])}"),
+            (name, '<=', high, f"{name} <= {expression_text(operands[1])}"),
+        ], True
+
+    if node.node_type == 'IN_CONDITION':
+        try:
+            values = tuple(sorted(set(values)))
+        except TypeError:
+            # Values of different types have no order to probe
+            return [], False
+        if len(operands) > MAX_LISTED_VALUES:
+            text = f"{name} IN ({len(operands)} values)"
+        else:
+            text = f"{name} IN ({', '.join(expression_text(operand) for operand in operands)})"
+        return [(name, 'IN', values, text)], True
+
+    pattern = values[0]
+    if not isinstance(pattern, str):
+        return [], False
+    prefix, exact = like_prefix(pattern)
+    if prefix == pattern:
+        return [(name, '=', prefix, f"{name} = '{prefix}'")], True
+    if not prefix:
+        return [], False
+    predicates = [(name, '>=', prefix, f"{name} >= '{prefix}'")]
+    if ord(prefix[-1]) < 0x10FFFF:
+        # Strings starting with the prefix sort before the prefix with its
+        # last character incremented
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        predicates.append((name, '<', upper, f"{name} < '{upper}'"))
+    else:
+        exact = False
+    return predicates, exact
+
+
+def compile_conjunction(conjuncts, positions, parameters=None):
+    """
+    Compile condition nodes that must all hold into one predicate
+
+    Returns:
+        Callable taking a row tuple, or None if there are no conjuncts
+    """
+    predicate = None
+    for conjunct in conjuncts:
+        right = compile_condition(conjunct, positions, parameters)
+        if predicate is None:
+            predicate = right
+        else:
+            left = predicate
+            predicate = lambda row, left=left, right=right: left(row) and right(row)
+    return predicate
@@ -0,0 +1,1526 @@
+"""
+Query Executor for SQL-like Language
+Walks the parse tree produced by the SyntaxAnalyzer and runs each statement
+against the tables registered in a Catalog
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager, nullcontext
+from itertools import islice
+from operator import itemgetter
+
+from phase1_lexer.error_handler import ErrorHandler
+from .aggregate import (
+    DEFAULT_AGGREGATE_MEMORY, HashAggregator, batch_evaluator, check_grouped, column_references,
+    filter_batch, find_aggregates, new_aggregate
+)
+from .bloom import DEFAULT_FALSE_POSITIVE_RATE
+from .catalog import Catalog
+from .evaluator import (
+    ExecutionError, check_condition_types, column_predicates, compile_condition, compile_conjunction,
+    compile_expression, expression_text, literal_value, split_conjuncts
+)
+from .bulk_load import copy_from_csv
+from .index_advisor import ADVICE_COLUMNS
+from .join import DEFAULT_JOIN_MEMORY, HashJoin, JoinedColumns, key_function
+from .parallel_scan import ParallelScanner
+from .result_cache import ResultCache, caching_rows
+from .scheduler import StatementScheduler
+from .sort import DEFAULT_SORT_MEMORY, ExternalSort, top_rows
+from .spill import chunks
+from .statistics import analyze_table
+from .storage import StorageError, load_snapshot, read_snapshot_manifest, save_snapshot
+from .transaction import Transaction
+from .zone_map import BLOCK_SIZE, plan_scan
+
+
+# Statements that change the catalog; they run one at a time per table (see write_lock)
+WRITE_STATEMENTS = ('INSERT_STMT', 'UPDATE_STMT', 'DELETE_STMT', 'CREATE_STMT', 'COPY_STMT')
+
+# Writes that cannot be buffered by a transaction
+UNBUFFERED_WRITES = ('CREATE_STMT', 'LOAD_SNAPSHOT_STMT')
+
+TRANSACTION_STATEMENTS = ('BEGIN_STMT', 'COMMIT_STMT', 'ROLLBACK_STMT')
+
+# Node type -> (fewest, most) children it needs to be executed; None means
+# any number. Covers the nodes whose children the executor indexes
+CHILD_COUNTS = {
+    'SELECT_STMT': (2, None), 'INSERT_STMT': (2, 2), 'UPDATE_STMT': (2, 3), 'DELETE_STMT': (1, 2),
+    'CREATE_STMT': (2, 2), 'COPY_STMT': (2, 2), 'EXPLAIN_STMT': (1, 1),
+    'SAVE_SNAPSHOT_STMT': (1, 2), 'LOAD_SNAPSHOT_STMT': (1, 1),
+    'SELECT_LIST': (1, None), 'JOIN_CLAUSE': (2, 2), 'WHERE_CLAUSE': (1, 1), 'GROUP_BY': (1, None),
+    'HAVING_CLAUSE': (1, 1), 'ORDER_BY': (1, None), 'SORT_KEY': (1, 1), 'LIMIT_CLAUSE': (1, 1),
+    'VALUE_LIST': (1, None), 'ASSIGNMENT_LIST': (1, None), 'ASSIGNMENT': (2, 2),
+    'COLUMN_DEF_LIST': (1, None), 'COLUMN_DEF': (2, 3),
+    'OR_CONDITION': (2, 2), 'AND_CONDITION': (2, 2), 'NOT_CONDITION': (1, 1),
+    'IN_CONDITION': (2, 2), 'IN_LIST': (1, None), 'BETWEEN_CONDITION': (3, 3), 'LIKE_CONDITION': (2, 2),
+    'EXPRESSION': (2, 2), 'TERM': (2, 2), 'FUNCTION_CALL': (1, 1),
+}
+
+# Statement type -> node types of its leading children
+LEADING_CHILDREN = {
+    'SELECT_STMT': ('SELECT_LIST', 'IDENTIFIER'), 'INSERT_STMT': ('IDENTIFIER', 'VALUE_LIST'),
+    'UPDATE_STMT': ('IDENTIFIER', 'ASSIGNMENT_LIST'), 'DELETE_STMT': ('IDENTIFIER',),
+    'CREATE_STMT': ('IDENTIFIER', 'COLUMN_DEF_LIST'), 'COPY_STMT': ('IDENTIFIER', 'FILE_PATH'),
+    'SAVE_SNAPSHOT_STMT': ('FILE_PATH',), 'LOAD_SNAPSHOT_STMT': ('FILE_PATH',),
+}
+
+# Fraction of rows assumed to pass a filter when the table was never analyzed
+DEFAULT_SELECTIVITY = 1 / 3
+
+# ORDER BY ... LIMIT k keeps the k first rows in a heap up to this k; larger
+# limits sort externally and stop after k rows
+TOP_K_ROWS = 100000
+
+
+def incomplete_node(node):
+    """
+    First node of a statement tree missing children it needs (see CHILD_COUNTS)
+
+    The parser drops statements that fail to parse; this guards against
+    trees built some other way or a parser bug leaving a node half built.
+
+    Returns:
+        The incomplete node, or None if the tree can be executed
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if any(child is None for child in node.children):
+            return node
+        count = len(node.children)
+        if node.node_type == 'COMPARISON':
+            # A bare boolean column or left, operator and right side
+            if count not in (1, 3) or (count == 3 and node.children[1].node_type != 'OPERATOR'):
+                return node
+        elif node.node_type in CHILD_COUNTS:
+            fewest, most = CHILD_COUNTS[node.node_type]
+            if count < fewest or (most is not None and count > most):
+                return node
+        leading = LEADING_CHILDREN.get(node.node_type, ())
+        if any(child.node_type != expected for child, expected in zip(node.children, leading)):
+            return node
+        stack.extend(node.children)
+    return None
+
+
+def row_projector(items, positions, parameters=None):
+    """
+    Compile a select list into one function of a row returning the result tuple
+
+    A list of plain columns becomes an itemgetter.
+    """
+    if all(item.node_type == 'IDENTIFIER' and item.value in positions for item in items):
+        pick = itemgetter(*(positions[item.value] for item in items))
+        return pick if len(items) > 1 else lambda row: (pick(row),)
+    projections = [compile_expression(item, positions, parameters) for item in items]
+    return lambda row: tuple(evaluate(row) for evaluate in projections)
+
+
+def sort_entries(rows, key_values, project):
+    """(ORDER BY key value(s), result tuple) pairs of rows, as ExternalSort expects"""
+    if project is None:
+        for row in rows:
+            yield key_values(row), row
+    else:
+        for row in rows:
+            yield key_values(row), project(row)
+
+
+class ExecutionResult:
+    """Outcome of one executed statement"""
+
+    def __init__(self, statement_type, columns=None, rows=None, row_count=0, message=None,
+                 blocks_scanned=0, blocks_skipped=0):
+        """
+        Args:
+            statement_type: Node type of the executed statement (e.g. 'SELECT_STMT')
+            columns: Result column names (SELECT, ANALYZE and EXPLAIN only)
+            rows: Result rows as tuples (SELECT, ANALYZE and EXPLAIN only)
+            row_count: Rows returned or affected
+            message: Short human-readable summary
+            blocks_scanned: Table blocks read by the statement's scan
+            blocks_skipped: Table blocks skipped using zone maps
+        """
+        self.statement_type = statement_type
+        self.columns = columns if columns is not None else []
+        self.rows = rows if rows is not None else []
+        self.row_count = row_count
+        self.message = message
+        self.blocks_scanned = blocks_scanned
+        self.blocks_skipped = blocks_skipped
+
+    def __repr__(self):
+        return f"ExecutionResult({self.statement_type}, {self.row_count} rows)"
+
+
+class QueryExecutor:
+    """Executes parsed statements against a Catalog"""
+
+    def __init__(self, catalog=None, wal=None, parallelism=1, aggregate_memory=DEFAULT_AGGREGATE_MEMORY,
+                 join_memory=DEFAULT_JOIN_MEMORY, sort_memory=DEFAULT_SORT_MEMORY, statement_workers=1,
+                 profiler=None):
+        """
+        Initialize the executor
+
+        Args:
+            catalog: Catalog to run against; a new empty one is created if omitted
+            wal: Optional WriteAheadLog receiving the effect of every write
+            parallelism: Degree of parallelism for scans of large tables
+            aggregate_memory: Bytes of groups a GROUP BY keeps in memory
+                before spilling partitions to disk
+            join_memory: Bytes a JOIN's hash table may hold before the join
+                partitions both inputs to disk
+            sort_memory: Bytes of rows an ORDER BY sorts in memory before
+                writing sorted runs to disk
+            statement_workers: Threads running the independent statements of
+                a script at the same time (1 runs them in order)
+            profiler: Optional PipelineProfiler (see instrumentation.py)
+                timing every statement and scan plan
+        """
+        self.catalog = catalog if catalog is not None else Catalog()
+        self.wal = wal
+        self.scanner = ParallelScanner(parallelism)
+        self.aggregate_memory = aggregate_memory
+        # HashAggregator of the most recent grouped SELECT (group and spill counts)
+        self.last_aggregation = None
+        self.join_memory = join_memory
+        # HashJoin of each JOIN in the most recent joining SELECT
+        self.last_joins = []
+        self.sort_memory = sort_memory
+        # ExternalSort of the most recent fully sorted SELECT (None if it was not)
+        self.last_sort = None
+        self.scheduler = StatementScheduler(statement_workers)
+        # Transaction opened by BEGIN, or None in autocommit mode
+        self.transaction = None
+        self.errors = ErrorHandler()
+        # Values bound to the '?' placeholders of the statement being executed
+        self.parameters = []
+        # ScanPlan of the most recent scan, and block counts over the session
+        self.last_scan = None
+        # (table, ScanPlan) of the scans of the statement being executed,
+        # passed to the catalog's IndexAdvisor once it succeeds
+        self.statement_scans = []
+        self.blocks_scanned = 0
+        self.blocks_skipped = 0
+        self.profiler = profiler
+
+    def set_parallelism(self, parallelism):
+        """Set this session's degree of parallelism (1 runs every scan serially)"""
+        self.scanner.set_parallelism(parallelism)
+
+    def close(self):
+        """Release the worker pool and shared scan buffers; an open transaction is rolled back"""
+        self.transaction = None
+        self.scanner.close()
+
+    def report_error(self, message, node=None):
+        """Report a runtime error at the position of the offending node"""
+        line = node.line if node is not None and node.line is not None else 0
+        column = node.column if node is not None and node.column is not None else 0
+        self.errors.add_error(
+            f"Runtime Error: {message} at line {line}, position {column}.", line, column
+        )
+
+    def execute(self, parse_tree):
+        """
+        Execute every statement of a PROGRAM node (or a single statement node)
+
+        Statements that fail are reported in self.errors and skipped. With
+        more than one statement worker, independent statements run
+        concurrently (see scheduler.py); results and errors still come in
+        statement order. Scripts that use transactions always run in order.
+
+        Returns:
+            List of ExecutionResult, one per successful statement
+        """
+        if parse_tree is None:
+            return []
+        statements = parse_tree.children if parse_tree.node_type == 'PROGRAM' else [parse_tree]
+        if (self.scheduler.workers > 1 and len(statements) > 1 and self.transaction is None
+                and not any(statement.node_type in TRANSACTION_STATEMENTS for statement in statements)):
+            return self.execute_concurrently(statements)
+        results = []
+        for statement in statements:
+            result = self.execute_statement(statement)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def execute_concurrently(self, statements):
+        """
+        Execute statements on the scheduler's worker threads
+
+        Each worker thread runs its statements in a session of its own that
+        shares this one's catalog, log and memory budgets.
+        """
+        local = threading.local()
+        sessions = []
+
+        def run(index, statement):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = QueryExecutor(
+                    self.catalog, self.wal, 1, self.aggregate_memory, self.join_memory, self.sort_memory,
+                    profiler=self.profiler
+                )
+                sessions.append(session)
+            errors = session.errors.get_errors()
+            first_error = len(errors)
+            result = session.execute_statement(statement)
+            return result, errors[first_error:]
+
+        try:
+            outcomes = self.scheduler.run(statements, run)
+        finally:
+            for session in sessions:
+                self.blocks_scanned += session.blocks_scanned
+                self.blocks_skipped += session.blocks_skipped
+                session.close()
+
+        results = []
+        for result, errors in outcomes:
+            for error in errors:
+                self.errors.add_error(error['message'], error['line'], error['column'])
+            if result is not None:
+                results.append(result)
+        return results
+
+    def execute_statement(self, node, parameters=None):
+        """
+        Execute one statement node
+
+        Args:
+            node: Statement node
+            parameters: Values for the statement's '?' placeholders, in order
+
+        Returns:
+            ExecutionResult, or None if the statement failed
+        """
+        if self.profiler is not None:
+            with self.profiler.statement(node) as profile:
+                result = self.run_statement(node, parameters)
+                profile.finish(result)
+            return result
+        return self.run_statement(node, parameters)
+
+    def run_statement(self, node, parameters=None):
+        """execute_statement() without profiling"""
+        # A fresh list per statement: closures compiled for an earlier
+        # statement (e.g. a cursor still streaming) keep their own bindings
+        self.parameters = list(parameters) if parameters else []
+        self.statement_scans = []
+        incomplete = incomplete_node(node)
+        if incomplete is not None:
+            self.report_error(
+                f"Incomplete {node.node_type} cannot be executed",
+                incomplete if incomplete.line is not None else node
+            )
+            return None
+        try:
+            if self.transaction is not None:
+                if node.node_type in UNBUFFERED_WRITES:
+                    raise ExecutionError(
+                        f"{node.node_type[:-len('_STMT')]} cannot run inside a transaction", node
+                    )
+                # Buffered writes do not touch the table until COMMIT
+                result = self.dispatch(node)
+            elif node.node_type in WRITE_STATEMENTS:
+                with self.write_lock(node.children[0].value):
+                    result = self.dispatch(node)
+                    self.invalidate_results(node.children[0].value)
+            elif node.node_type == 'LOAD_SNAPSHOT_STMT':
+                # Held until the load is logged, so a checkpoint never
+                # contains the load without its log record or the other way
+                with self.catalog.writers_locked():
+                    result = self.dispatch(node)
+            else:
+                result = self.dispatch(node)
+        except ExecutionError as error:
+            self.report_error(error.message, error.node if error.node is not None else node)
+            return None
+        except Exception as error:
+            # A bug, not a problem with the statement: say so rather than
+            # passing it off as a user error
+            self.report_error(
+                f"Internal error while executing {node.node_type}: {type(error).__name__}: {error}", node
+            )
+            return None
+        self.record_scans()
+        return result
+
+    def dispatch(self, node):
+        """Run one statement node by type; errors propagate as ExecutionError"""
+        if node.node_type == 'SELECT_STMT':
+            return self.execute_select(node)
+        elif node.node_type == 'INSERT_STMT':
+            return self.execute_insert(node)
+        elif node.node_type == 'UPDATE_STMT':
+            return self.execute_update(node)
+        elif node.node_type == 'DELETE_STMT':
+            return self.execute_delete(node)
+        elif node.node_type == 'CREATE_STMT':
+            return self.execute_create(node)
+        elif node.node_type == 'ANALYZE_STMT':
+            return self.execute_analyze(node)
+        elif node.node_type == 'COPY_STMT':
+            return self.execute_copy(node)
+        elif node.node_type == 'EXPLAIN_STMT':
+            return self.execute_explain(node)
+        elif node.node_type == 'BEGIN_STMT':
+            return self.execute_begin(node)
+        elif node.node_type == 'COMMIT_STMT':
+            return self.execute_commit(node)
+        elif node.node_type == 'ROLLBACK_STMT':
+            return self.execute_rollback(node)
+        elif node.node_type == 'SAVE_SNAPSHOT_STMT':
+            return self.execute_save_snapshot(node)
+        elif node.node_type == 'LOAD_SNAPSHOT_STMT':
+            return self.execute_load_snapshot(node)
+        elif node.node_type == 'SHOW_INDEX_ADVICE_STMT':
+            return self.execute_show_index_advice(node)
+        else:
+            raise ExecutionError(f"Unsupported statement '{node.node_type}'", node)
+
+    # ==================== Helpers ====================
+
+    def lookup_table(self, identifier_node):
+        """Resolve a table IDENTIFIER node against the catalog"""
+        table = self.catalog.get_table(identifier_node.value)
+        if table is None:
+            raise ExecutionError(f"Table '{identifier_node.value}' does not exist", identifier_node)
+        return table
+
+    @contextmanager
+    def write_lock(self, table_name):
+        """
+        Lock held by a statement writing a table
+
+        Writes to one table run one at a time; writes to different tables
+        may run concurrently. CREATE TABLE (and a write naming a table that
+        does not exist, which fails) takes the catalog's lock.
+        """
+        while True:
+            table = self.catalog.get_table(table_name)
+            with table.write_lock if table is not None else self.catalog.write_lock:
+                if self.catalog.get_table(table_name) is table:
+                    yield
+                    return
+            # LOAD SNAPSHOT replaced the table while this writer waited
+
+    def read_source(self, identifier_node, own_writes=True):
+        """
+        Resolve a table for reading
+
+        Args:
+            identifier_node: IDENTIFIER node naming the table
+            own_writes: Inside a transaction, read the table with the
+                transaction's pending writes applied (see Transaction.view)
+
+        Returns:
+            (table, snapshot) where the snapshot does not change with later writes
+        """
+        while True:
+            source = self.lookup_table(identifier_node)
+            with source.lock:
+                if not source.released:
+                    snapshot = source.snapshot()
+                    break
+            # LOAD SNAPSHOT replaced the table since it was looked up
+        if own_writes and self.transaction is not None:
+            snapshot = self.transaction.view(source, snapshot)
+        return source, snapshot
+
+    def transaction_view(self, identifier_node):
+        """
+        The table an UPDATE or DELETE inside a transaction changes
+
+        Returns:
+            (TableWrites buffering the changes, view of the table to match rows in)
+        """
+        source, snapshot = self.read_source(identifier_node, own_writes=False)
+        writes = self.transaction.table_writes(source)
+        return writes, writes.view(snapshot)
+
+    def invalidate_results(self, table_name):
+        """Drop the cached SELECT results that read a table that was just written"""
+        if self.catalog.result_cache is not None:
+            self.catalog.result_cache.invalidate_table(table_name)
+
+    def read_table(self, identifier_node):
+        """Resolve a table for reading: a snapshot of its committed data that later writes do not change"""
+        return self.read_source(identifier_node, own_writes=False)[1]
+
+    @staticmethod
+    def find_child(node, node_type):
+        """Get the first child of the given type, or None"""
+        for child in node.children:
+            if child.node_type == node_type:
+                return child
+        return None
+
+    def log(self, kind, table_name, payload):
+        """Record the effect of a write in the write-ahead log, if there is one"""
+        if self.wal is not None:
+            self.wal.append((kind, table_name, payload))
+
+    def coerce_value(self, table, column_name, value, node):
+        """Convert a value to the declared type of a column"""
+        data_type = table.column_types[column_name]
+        if data_type == 'TEXT':
+            if not isinstance(value, str):
+                raise ExecutionError(f"Column '{column_name}' expects TEXT, got {value!r}", node)
+            return value
+        if isinstance(value, str):
+            raise ExecutionError(f"Column '{column_name}' expects {data_type}, got {value!r}", node)
+        if data_type == 'INT':
+            if isinstance(value, float):
+                if not value.is_integer():
+                    raise ExecutionError(f"Column '{column_name}' expects INT, got {value!r}", node)
+                value = int(value)
+            return value
+        return float(value)
+
+    def plan_scan(self, table, where_clause):
+        """
+        Prune the blocks of a table that cannot match the WHERE clause
+
+        The plan is recorded in self.last_scan and added to the session's
+        block counters.
+
+        Returns:
+            ScanPlan
+
+        Raises:
+            ExecutionError: if the WHERE clause compares TEXT with numbers
+        """
+        check_condition_types(where_clause, table.column_types.get, self.parameters)
+        if self.profiler is None:
+            plan = plan_scan(table, where_clause, self.parameters)
+        else:
+            with self.profiler.phase('plan') as counts:
+                plan = plan_scan(table, where_clause, self.parameters)
+                counts['scans'] = counts.get('scans', 0) + 1
+                counts['blocks_scanned'] = counts.get('blocks_scanned', 0) + plan.blocks_scanned
+                counts['blocks_skipped'] = counts.get('blocks_skipped', 0) + plan.blocks_skipped
+        self.last_scan = plan
+        self.statement_scans.append((table, plan))
+        self.blocks_scanned += plan.blocks_scanned
+        self.blocks_skipped += plan.blocks_skipped
+        return plan
+
+    def record_scans(self, scans=None):
+        """
+        Pass the scans of the statement that just succeeded to the index advisor
+
+        Args:
+            scans: (table, ScanPlan) pairs to record; defaults to the scans
+                of the statement being executed
+        """
+        if scans is None:
+            scans, self.statement_scans = self.statement_scans, []
+        advisor = self.catalog.index_advisor
+        if advisor is not None:
+            for table, plan in scans:
+                advisor.record_scan(table, plan)
+
+    def use_parallel_scan(self, table, plan):
+        """Parallel scans read every block, so only use them when nothing was pruned"""
+        return not plan.pruned and self.scanner.should_parallelize(table)
+
+    def split_filters(self, table, where_clause, positions=None):
+        """
+        Separate the WHERE conjuncts that can be answered on encoded column data
+
+        Args:
+            table: Scanned table
+            where_clause: WHERE_CLAUSE node or None
+            positions: Column positions in the rows the predicate will see;
+                the table's full rows if omitted
+
+        Returns:
+            (encoded_filters, predicate) where encoded_filters are the
+            (column_name, op, value, text) comparisons evaluated on encoded data and
+            predicate checks the remaining conjuncts (None if there are none)
+        """
+        encoded_filters, remaining = self.encoded_conjuncts(table, where_clause)
+        if positions is None:
+            positions = table.column_positions()
+        return encoded_filters, compile_conjunction(remaining, positions, self.parameters)
+
+    def encoded_conjuncts(self, table, where_clause):
+        """
+        Like split_filters(), but return the remaining conjuncts uncompiled
+
+        Returns:
+            (encoded_filters, list of the other conjunct nodes)
+        """
+        if where_clause is None:
+            return [], []
+        encoded_filters = []
+        remaining = []
+        for conjunct in split_conjuncts(where_clause):
+            predicates, exact = column_predicates(conjunct, self.parameters)
+            if exact and predicates and all(table.can_filter_encoded(*predicate[:3]) for predicate in predicates):
+                encoded_filters.extend(predicates)
+            else:
+                remaining.append(conjunct)
+        return encoded_filters, remaining
+
+    def scan_columns(self, table, plan, column_names, where_clause, with_row_ids=False):
+        """
+        Scan only the named columns of the rows satisfying a WHERE clause
+
+        The WHERE clause is checked on the columns it reads before the named
+        columns are fetched for the rows that pass (see Table.scan_columns).
+
+        Args:
+            table: Scanned table
+            plan: ScanPlan of the WHERE clause
+            column_names: Columns of the rows produced
+            where_clause: WHERE_CLAUSE node or None
+            with_row_ids: Produce (row_id, row) pairs instead of rows
+
+        Returns:
+            Iterator over rows of the named columns' values
+        """
+        encoded_filters, remaining = self.encoded_conjuncts(table, where_clause)
+        references = {}
+        for conjunct in remaining:
+            column_references(conjunct, references)
+        self.check_columns(table, references)
+        predicate_columns = list(references)
+        predicate = compile_conjunction(
+            remaining, {column_name: i for i, column_name in enumerate(predicate_columns)}, self.parameters
+        )
+        plan.rows_returned = 0
+        return table.scan_columns(
+            column_names, plan.ranges(), encoded_filters, predicate, predicate_columns,
+            with_row_ids=with_row_ids, on_rows=plan.count_returned
+        )
+
+    @staticmethod
+    def check_columns(table, references):
+        """Raise for the first of the referenced {column name: node} the table does not have"""
+        for column_name, reference in references.items():
+            if not table.has_column(column_name):
+                raise ExecutionError(f"Unknown column '{column_name}'", reference)
+
+    def scan_message(self, message):
+        """Append the zone map outcome of the last scan to a result message"""
+        plan = self.last_scan
+        if plan is None or not plan.blocks_skipped:
+            return message
+        return f"{message} ({plan.blocks_skipped} of {plan.total_blocks} blocks skipped)"
+
+    def scan_result(self, statement_type, columns=None, rows=None, row_count=0, message=None):
+        """ExecutionResult carrying the block counts of the last scan"""
+        plan = self.last_scan
+        if plan is None:
+            # Answered from the result cache without scanning
+            return ExecutionResult(statement_type, columns, rows, row_count, f"{message} (cached)")
+        return ExecutionResult(
+            statement_type, columns, rows, row_count, self.scan_message(message),
+            plan.blocks_scanned, plan.blocks_skipped
+        )
+
+    def matching_row_ids(self, table, where_clause):
+        """Row ids satisfying the WHERE clause (every row if there is none)"""
+        return [row_id for row_id, _ in self.matching_rows(table, where_clause, [])]
+
+    def matching_rows(self, table, where_clause, column_names):
+        """
+        Rows satisfying the WHERE clause (every row if there is none)
+
+        Returns:
+            List of (row_id, row) pairs, each row holding the values of the
+            named columns only
+        """
+        plan = self.plan_scan(table, where_clause)
+        if where_clause is not None and self.use_parallel_scan(table, plan):
+            row_ids = self.scanner.matching_row_ids(table, where_clause, self.parameters)
+            fetch = [table.columns[column_name] for column_name in column_names]
+            return [(row_id, tuple(column[row_id] for column in fetch)) for row_id in row_ids]
+        return list(self.scan_columns(table, plan, column_names, where_clause, with_row_ids=True))
+
+    # ==================== Statements ====================
+
+    def execute_create(self, node):
+        """CREATE TABLE Identifier '(' ColumnDefList ')'"""
+        table_node = node.children[0]
+        if self.catalog.has_table(table_node.value):
+            raise ExecutionError(f"Table '{table_node.value}' already exists", table_node)
+
+        columns = []
+        bloom_filters = {}
+        seen = set()
+        for column_def in node.children[1].children:
+            name_node, type_node = column_def.children[:2]
+            if name_node.value in seen:
+                raise ExecutionError(f"Duplicate column '{name_node.value}'", name_node)
+            seen.add(name_node.value)
+            columns.append((name_node.value, type_node.value))
+            if len(column_def.children) > 2:
+                bloom_filters[name_node.value] = self.bloom_rate(column_def.children[2])
+
+        self.catalog.create_table(table_node.value, columns, bloom_filters)
+        self.log('CREATE', table_node.value, [
+            [column_name, data_type, bloom_filters[column_name]] if column_name in bloom_filters
+            else [column_name, data_type]
+            for column_name, data_type in columns
+        ])
+        return ExecutionResult('CREATE_STMT', message=f"Table '{table_node.value}' created")
+
+    @staticmethod
+    def bloom_rate(bloom_node):
+        """False positive rate of a BLOOM_FILTER column option"""
+        if bloom_node.value is None:
+            return DEFAULT_FALSE_POSITIVE_RATE
+        rate = float(bloom_node.value)
+        if not 0 < rate < 1:
+            raise ExecutionError(
+                f"Bloom filter false positive rate must be between 0 and 1, got {bloom_node.value}", bloom_node
+            )
+        return rate
+
+    def compile_insert(self, node, parameters):
+        """
+        Compile the VALUES list of an INSERT_STMT once
+
+        Returns:
+            (table, insert_row) where insert_row() evaluates the values against
+            the current contents of `parameters`, appends the row (buffers it
+            inside a transaction) and returns it
+        """
+        table = self.lookup_table(node.children[0])
+        value_nodes = node.children[1].children
+        if len(value_nodes) != len(table.column_names):
+            raise ExecutionError(
+                f"Table '{table.name}' has {len(table.column_names)} columns "
+                f"but {len(value_nodes)} values were supplied",
+                node
+            )
+        evaluators = [
+            (column_name, value_node, compile_expression(value_node, {}, parameters))
+            for column_name, value_node in zip(table.column_names, value_nodes)
+        ]
+
+        if self.transaction is not None:
+            writes = self.transaction.table_writes(table)
+
+            def buffer_row():
+                values = [
+                    self.coerce_value(table, column_name, evaluate(()), value_node)
+                    for column_name, value_node, evaluate in evaluators
+                ]
+                writes.append_row(values)
+                return values
+
+            return table, buffer_row
+
+        def insert_row():
+            values = [
+                self.coerce_value(table, column_name, evaluate(()), value_node)
+                for column_name, value_node, evaluate in evaluators
+            ]
+            table.append_row(values)
+            self.log('INSERT', table.name, values)
+            statistics = self.catalog.get_statistics(table.name)
+            if statistics is not None:
+                statistics.add_row(values)
+            return values
+
+        return table, insert_row
+
+    def execute_insert(self, node):
+        """INSERT INTO Identifier VALUES '(' ValueList ')'"""
+        _, insert_row = self.compile_insert(node, self.parameters)
+        insert_row()
+        return ExecutionResult('INSERT_STMT', row_count=1, message="1 row inserted")
+
+    def execute_insert_many(self, node, parameter_rows):
+        """
+        Run one parsed INSERT_STMT for every row of parameters
+
+        The statement is compiled once; each row only rebinds the '?' values.
+
+        Returns:
+            ExecutionResult with the number of rows inserted, or None on error
+        """
+        parameters = []
+        count = 0
+        buffered = self.transaction is not None
+        try:
+            with nullcontext() if buffered else self.write_lock(node.children[0].value):
+                table, insert_row = self.compile_insert(node, parameters)
+                try:
+                    for row in parameter_rows:
+                        parameters[:] = row
+                        insert_row()
+                        count += 1
+                finally:
+                    if not buffered:
+                        self.invalidate_results(table.name)
+        except ExecutionError as error:
+            self.report_error(error.message, error.node if error.node is not None else node)
+            return None
+        return ExecutionResult('INSERT_STMT', row_count=count, message=f"{count} rows inserted")
+
+    def select_rows(self, node):
+        """
+        Plan a SELECT and return its rows lazily
+
+        The rows come from the catalog's result cache when it holds a current
+        result for the statement and its parameters; otherwise they are
+        computed, and added to the cache once they have all been read.
+
+        Returns:
+            (column names, iterator over result tuples)
+        """
+        cache = self.catalog.result_cache
+        if cache is None or (self.transaction is not None and self.transaction.has_writes):
+            # Results reading a transaction's pending writes are its own
+            columns, rows, _ = self.compute_select(node)
+            return columns, rows
+        key = cache.key(node, self.parameters)
+        cached = cache.lookup(key, self.catalog)
+        if cached is not None:
+            self.last_scan = None
+            return cached.columns, iter(cached.rows)
+        columns, rows, sources = self.compute_select(node)
+        return columns, caching_rows(cache, key, columns, rows, ResultCache.table_versions(sources))
+
+    def compute_select(self, node):
+        """
+        Plan and start a SELECT
+
+        Returns:
+            (column names, iterator over result tuples, (table, snapshot)
+            pairs of the tables read)
+        """
+        select_list, table_node = node.children[0], node.children[1]
+        joins = [child for child in node.children if child.node_type == 'JOIN_CLAUSE']
+        if joins:
+            return self.compute_join_select(node, [table_node] + [join.children[0] for join in joins])
+        source, table = self.read_source(table_node)
+        sources = [(source, table)]
+        if self.is_grouped(node):
+            columns, rows = self.aggregate_rows(node, table)
+            return columns, rows, sources
+        items = select_list.children
+        star = items[0].node_type == 'ALL_COLUMNS'
+        where_clause = self.find_child(node, 'WHERE_CLAUSE')
+        order_by = self.find_child(node, 'ORDER_BY')
+        parameters = self.parameters
+
+        # Only the columns the select list and ORDER BY read are fetched, for
+        # the rows that pass the WHERE clause
+        references = {}
+        for reading_node in ([] if star else items) + ([order_by] if order_by is not None else []):
+            column_references(reading_node, references)
+        # Unknown columns are reported before any scan starts
+        checked = dict(references)
+        if where_clause is not None:
+            column_references(where_clause, checked)
+        self.check_columns(table, checked)
+        if star:
+            columns = list(table.column_names)
+            column_names = list(table.column_names)
+        else:
+            columns = [expression_text(item) for item in items]
+            column_names = list(references)
+        positions = {column_name: i for i, column_name in enumerate(column_names)}
+        project = None if star else row_projector(items, positions, parameters)
+
+        plan = self.plan_scan(table, where_clause)
+        ordered = order_by is not None or self.find_child(node, 'LIMIT_CLAUSE') is not None
+
+        # Parallel scans produce every row, so ORDER BY and LIMIT scan serially
+        if not ordered and self.use_parallel_scan(table, plan):
+            return columns, iter(self.scanner.select(table, None if star else items, where_clause, parameters)), sources
+
+        if star and where_clause is None and not plan.pruned:
+            rows = table.rows()
+        else:
+            rows = self.scan_columns(table, plan, column_names, where_clause)
+        return columns, self.order_rows(node, rows, positions, project), sources
+
+    def compute_join_select(self, node, table_nodes):
+        """
+        Plan and start a SELECT over joined tables
+
+        Returns:
+            See compute_select()
+        """
+        sources = [self.read_source(table_node) for table_node in table_nodes]
+        joined, rows = self.join_rows(node, [table for _, table in sources])
+        if self.is_grouped(node):
+            columns, rows = self.aggregate_rows(node, None, (rows, joined))
+            return columns, rows, sources
+        select_list = node.children[0]
+        if select_list.children[0].node_type == 'ALL_COLUMNS':
+            return joined.star_columns(), self.order_rows(node, rows, joined.positions, None), sources
+        columns = [expression_text(item) for item in select_list.children]
+        project = row_projector(select_list.children, joined.positions, self.parameters)
+        return columns, self.order_rows(node, rows, joined.positions, project), sources
+
+    def order_rows(self, node, rows, positions, project):
+        """
+        Apply a SELECT's ORDER BY and LIMIT clauses, then its select list
+
+        ORDER BY ... LIMIT k keeps the first k rows in a heap; other ORDER BYs
+        go through an ExternalSort; a LIMIT alone stops reading the rows once
+        it is reached.
+
+        Args:
+            node: SELECT_STMT node
+            rows: Iterator over the rows the ORDER BY keys are evaluated on
+            positions: Column positions in those rows
+            project: Function turning one of those rows into a result tuple
+                (None if they already are result tuples)
+
+        Returns:
+            Iterator over result tuples
+        """
+        order_by = self.find_child(node, 'ORDER_BY')
+        limit = self.limit_count(node)
+        self.last_sort = None
+        if limit == 0:
+            return iter(())
+        if order_by is not None:
+            evaluators = [
+                compile_expression(sort_key.children[0], positions, self.parameters)
+                for sort_key in order_by.children
+            ]
+            if len(evaluators) == 1:
+                key_values = evaluators[0]
+            else:
+                key_values = lambda row: tuple(evaluate(row) for evaluate in evaluators)
+            descending = [sort_key.value == 'DESC' for sort_key in order_by.children]
+            if limit is not None and limit <= TOP_K_ROWS:
+                rows = iter(top_rows(rows, key_values, descending, limit))
+                limit = None
+            else:
+                # Rows are projected before sorting, so runs only hold result columns
+                self.last_sort = ExternalSort(descending, self.sort_memory)
+                rows = self.last_sort.run(sort_entries(rows, key_values, project))
+                project = None
+        if limit is not None:
+            rows = islice(rows, limit)
+        if project is not None:
+            rows = map(project, rows)
+        return rows
+
+    def limit_count(self, node):
+        """Row count of a SELECT's LIMIT clause, or None if it has none"""
+        limit_clause = self.find_child(node, 'LIMIT_CLAUSE')
+        if limit_clause is None:
+            return None
+        count = compile_expression(limit_clause.children[0], {}, self.parameters)(())
+        if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+            raise ExecutionError(f"LIMIT expects a non-negative integer, got {count!r}", limit_clause)
+        return count
+
+    def join_rows(self, node, tables):
+        """
+        Plan the joins of a SELECT together with its WHERE clause
+
+        Conjuncts of WHERE and ON that read one table are pushed down to that
+        table's scan, where zone maps and encoded filters apply. Each JOIN is
+        a hash join keyed on the equalities linking its table to the tables
+        before it, built on the input estimated to have fewer rows; the other
+        conjuncts filter the joined rows once all the tables they read have
+        been joined.
+
+        Args:
+            node: SELECT_STMT node
+            tables: Snapshots of the tables, in FROM order
+
+        Returns:
+            (JoinedColumns, iterator over joined rows)
+        """
+        joins = [child for child in node.children if child.node_type == 'JOIN_CLAUSE']
+        joined = JoinedColumns(tables)
+        where_clause = self.find_child(node, 'WHERE_CLAUSE')
+        for reading_node in node.children[0].children + node.children[2:]:
+            if reading_node.node_type == 'JOIN_CLAUSE':
+                reading_node = reading_node.children[1]
+            joined.check(reading_node)
+
+        conjuncts = split_conjuncts(where_clause) if where_clause is not None else []
+        for join in joins:
+            conjuncts.extend(split_conjuncts(join.children[1]))
+        for conjunct in conjuncts:
+            check_condition_types(conjunct, joined.column_type, self.parameters)
+        pushed = [[] for _ in tables]
+        keys = [[] for _ in tables]
+        residual = [[] for _ in tables]
+        for conjunct in conjuncts:
+            read = joined.tables_read(conjunct)
+            last = max(read) if read else 0
+            if len(read) <= 1:
+                pushed[last].append(conjunct)
+                continue
+            sides = joined.join_sides(conjunct, last)
+            if sides is not None:
+                keys[last].append(sides)
+            else:
+                residual[last].append(conjunct)
+        for index, join in enumerate(joins, 1):
+            if not keys[index]:
+                raise ExecutionError(
+                    f"JOIN {tables[index].name} needs an ON condition equating its columns "
+                    f"with those of the tables before it", join
+                )
+
+        scans = []
+        for index, table in enumerate(tables):
+            local_where = joined.local_where(pushed[index])
+            scans.append((self.filtered_rows(table, local_where), self.estimate_rows(table, local_where)))
+
+        self.last_joins = []
+        rows, estimate = scans[0]
+        for index in range(1, len(tables)):
+            right_rows, right_estimate = scans[index]
+            left_key = key_function([left for left, _ in keys[index]], joined.positions, self.parameters)
+            right_key = key_function(
+                [right for _, right in keys[index]], joined.local_positions(index), self.parameters
+            )
+            if right_estimate <= estimate:
+                join = HashJoin(right_key, left_key, False, self.join_memory)
+                rows = join.run(right_rows, rows)
+            else:
+                join = HashJoin(left_key, right_key, True, self.join_memory)
+                rows = join.run(rows, right_rows)
+            self.last_joins.append(join)
+            estimate = max(estimate, right_estimate)
+            if residual[index]:
+                rows = filter(compile_conjunction(residual[index], joined.positions, self.parameters), rows)
+        return joined, rows
+
+    def filtered_rows(self, table, where_clause):
+        """Rows of a table satisfying a WHERE clause (all of them if it is None)"""
+        encoded_filters, predicate = self.split_filters(table, where_clause)
+        plan = self.plan_scan(table, where_clause)
+        if plan.pruned or encoded_filters:
+            rows = (row for _, row in table.scan_ranges(plan.ranges(), encoded_filters))
+        else:
+            rows = table.rows()
+        if predicate is not None:
+            rows = filter(predicate, rows)
+        return rows
+
+    def estimate_rows(self, table, where_clause):
+        """
+        Estimate how many rows of a table satisfy a WHERE clause
+
+        Uses the column statistics collected by ANALYZE for `column op
+        constant` conjuncts and DEFAULT_SELECTIVITY for the others.
+        """
+        estimate = table.live_row_count
+        if where_clause is None:
+            return estimate
+        statistics = self.catalog.get_statistics(table.name)
+        for conjunct in split_conjuncts(where_clause):
+            predicates, _ = column_predicates(conjunct, self.parameters)
+            if not predicates:
+                estimate *= DEFAULT_SELECTIVITY
+            for column_name, op, value, _ in predicates:
+                column_statistics = statistics.column(column_name) if statistics is not None else None
+                if column_statistics is not None:
+                    estimate *= column_statistics.selectivity(op, value)
+                else:
+                    estimate *= DEFAULT_SELECTIVITY
+        return estimate
+
+    def is_grouped(self, node):
+        """Whether a SELECT aggregates: it has GROUP BY or HAVING, or its list calls an aggregate"""
+        if self.find_child(node, 'GROUP_BY') or self.find_child(node, 'HAVING_CLAUSE'):
+            return True
+        return any(find_aggregates(item, {}) for item in node.children[0].children)
+
+    def aggregate_rows(self, node, table, joined=None):
+        """
+        Plan a grouped SELECT: scan the referenced columns in batches, hash
+        aggregate them, then apply HAVING and the select list to each group
+
+        Args:
+            node: SELECT_STMT node
+            table: Snapshot of the table read (None for a join)
+            joined: For a join, (joined rows, JoinedColumns); the rows
+                already satisfy the WHERE clause
+
+        Returns:
+            (column names, iterator over result tuples)
+        """
+        items = node.children[0].children
+        group_by = self.find_child(node, 'GROUP_BY')
+        having = self.find_child(node, 'HAVING_CLAUSE')
+        where_clause = self.find_child(node, 'WHERE_CLAUSE') if joined is None else None
+        parameters = self.parameters
+
+        if items[0].node_type == 'ALL_COLUMNS':
+            raise ExecutionError("SELECT * cannot be combined with GROUP BY or aggregates", items[0])
+        group_nodes = group_by.children if group_by is not None else []
+        group_texts = [expression_text(group_node) for group_node in group_nodes]
+        for group_node in group_nodes:
+            if find_aggregates(group_node, {}):
+                raise ExecutionError("Aggregates are not allowed in GROUP BY", group_node)
+        order_by = self.find_child(node, 'ORDER_BY')
+        output_nodes = items + ([having] if having is not None else [])
+        if order_by is not None:
+            output_nodes += [sort_key.children[0] for sort_key in order_by.children]
+        for output_node in output_nodes:
+            check_grouped(output_node, set(group_texts))
+
+        calls = {}
+        for output_node in output_nodes:
+            find_aggregates(output_node, calls)
+        aggregates = [new_aggregate(call) for call in calls.values()]
+
+        # Only the columns the keys, aggregate arguments and WHERE clause read are scanned
+        references = {}
+        for reading_node in group_nodes + list(calls.values()) + ([where_clause] if where_clause else []):
+            column_references(reading_node, references)
+        for column_name, reference in references.items():
+            if joined is None and not table.has_column(column_name):
+                raise ExecutionError(f"Unknown column '{column_name}'", reference)
+        column_names = list(references)
+        positions = {column_name: i for i, column_name in enumerate(column_names)}
+
+        if joined is None:
+            encoded_filters, predicate = self.split_filters(table, where_clause, positions)
+            plan = self.plan_scan(table, where_clause)
+            plan.rows_returned = 0
+            column_batches = table.column_batches(column_names, plan.ranges(), encoded_filters)
+        else:
+            predicate = None
+            plan = None
+            column_batches = self.joined_batches(*joined, column_names)
+        key_evaluators = [batch_evaluator(group_node, positions, parameters) for group_node in group_nodes]
+        argument_evaluators = [
+            batch_evaluator(call.children[0], positions, parameters)
+            for call, aggregate in zip(calls.values(), aggregates) if aggregate is not None
+        ]
+
+        # Each group comes out as (key values..., aggregate values...)
+        group_positions = {text: i for i, text in enumerate(group_texts)}
+        for i, text in enumerate(calls):
+            group_positions[text] = len(group_texts) + i
+        columns = [expression_text(item) for item in items]
+        if list(map(group_positions.get, columns)) == list(range(len(group_positions))):
+            # Groups come out as the result rows
+            project = None
+        elif all(column in group_positions for column in columns):
+            # The select list only picks group keys and aggregates
+            pick = itemgetter(*(group_positions[column] for column in columns))
+            project = pick if len(columns) > 1 else lambda row: (pick(row),)
+        else:
+            projections = [compile_expression(item, group_positions, parameters) for item in items]
+            project = lambda row: tuple(evaluate(row) for evaluate in projections)
+        having_predicate = (
+            compile_condition(having.children[0], group_positions, parameters) if having is not None else None
+        )
+
+        def batches():
+            for row_count, batch in column_batches:
+                if predicate is not None:
+                    row_count, batch = filter_batch(predicate, row_count, batch)
+                if plan is not None:
+                    plan.count_returned(row_count)
+                if not row_count:
+                    continue
+                key_columns = [evaluate(row_count, batch) for evaluate in key_evaluators]
+                if not key_columns:
+                    keys = None
+                elif len(key_columns) == 1:
+                    keys = key_columns[0]
+                else:
+                    keys = list(zip(*key_columns))
+                yield keys, row_count, [evaluate(row_count, batch) for evaluate in argument_evaluators]
+
+        aggregator = HashAggregator(len(group_nodes), aggregates, self.aggregate_memory)
+        self.last_aggregation = aggregator
+        rows = aggregator.run(batches())
+        if having_predicate is not None:
+            rows = filter(having_predicate, rows)
+        return columns, self.order_rows(node, rows, group_positions, project)
+
+    @staticmethod
+    def joined_batches(rows, joined, column_names):
+        """Cut joined rows into BLOCK_SIZE batches of the named columns, as Table.column_batches() does"""
+        getters = [itemgetter(joined.positions[column_name]) for column_name in column_names]
+        for chunk in chunks(rows, BLOCK_SIZE):
+            yield len(chunk), [list(map(getter, chunk)) for getter in getters]
+
+    def iterate_select(self, node, parameters=None):
+        """
+        Start a SELECT without materializing its result
+
+        Returns:
+            (column names, generator of result tuples); closing the generator
+            stops the scan
+
+        Raises:
+            ExecutionError: if the statement cannot be planned
+        """
+        self.parameters = list(parameters) if parameters else []
+        # The scans are planned here; the statement that runs next (while
+        # this one may still be streaming) gets a list of its own
+        scans = self.statement_scans = []
+        columns, rows = self.select_rows(node)
+        self.statement_scans = []
+
+        def stream():
+            yield from rows
+            # Recorded once read to the end, when the returned rows are counted
+            self.record_scans(scans)
+
+        return columns, stream()
+
+    def execute_select(self, node):
+        """
+        SELECT SelectList FROM Identifier (JOIN Identifier ON Condition)* [WHERE Condition]
+        [GROUP BY ExpressionList] [HAVING Condition] [ORDER BY SortKey, ...] [LIMIT count]
+        """
+        columns, rows = self.select_rows(node)
+        rows = list(rows)
+        return self.scan_result('SELECT_STMT', columns, rows, len(rows), f"{len(rows)} rows selected")
+
+    def execute_update(self, node):
+        """
+        UPDATE Identifier SET AssignmentList [WHERE Condition]
+
+        Inside a transaction the new values are buffered until COMMIT.
+        """
+        if self.transaction is not None:
+            writes, table = self.transaction_view(node.children[0])
+        else:
+            writes, table = None, self.lookup_table(node.children[0])
+
+        # The new values are computed from the columns they read only
+        references = {}
+        for assignment in node.children[1].children:
+            column_references(assignment.children[1], references)
+        self.check_columns(table, references)
+        column_names = list(references)
+        positions = {column_name: i for i, column_name in enumerate(column_names)}
+
+        assignments = []
+        for assignment in node.children[1].children:
+            column_node, value_node = assignment.children
+            if not table.has_column(column_node.value):
+                raise ExecutionError(f"Unknown column '{column_node.value}'", column_node)
+            assignments.append((column_node, compile_expression(value_node, positions, self.parameters)))
+
+        rows = self.matching_rows(table, self.find_child(node, 'WHERE_CLAUSE'), column_names)
+        row_ids = [row_id for row_id, _ in rows]
+
+        # Evaluate every new value against the old row before writing any of them
+        updates = []
+        for row_id, row in rows:
+            changes = {}
+            for column_node, evaluate in assignments:
+                changes[column_node.value] = self.coerce_value(
+                    table, column_node.value, evaluate(row), column_node
+                )
+            updates.append((row_id, changes))
+        if writes is not None:
+            writes.update_rows(updates)
+        else:
+            table.update_rows(updates)
+            if updates:
+                self.log('UPDATE', table.name, updates)
+
+        return self.scan_result('UPDATE_STMT', row_count=len(row_ids), message=f"{len(row_ids)} rows updated")
+
+    def execute_delete(self, node):
+        """
+        DELETE FROM Identifier [WHERE Condition]
+
+        Inside a transaction the deletions are buffered until COMMIT.
+        """
+        if self.transaction is not None:
+            writes, table = self.transaction_view(node.children[0])
+            row_ids = self.matching_row_ids(table, self.find_child(node, 'WHERE_CLAUSE'))
+            writes.delete_rows(row_ids)
+            return self.scan_result('DELETE_STMT', row_count=len(row_ids), message=f"{len(row_ids)} rows deleted")
+        table = self.lookup_table(node.children[0])
+        row_ids = self.matching_row_ids(table, self.find_child(node, 'WHERE_CLAUSE'))
+        table.delete_rows(row_ids)
+        if row_ids:
+            self.log('DELETE', table.name, row_ids)
+        return self.scan_result('DELETE_STMT', row_count=len(row_ids), message=f"{len(row_ids)} rows deleted")
+
+    def copy_from_csv(self, table_name, path, **options):
+        """
+        Bulk-load a CSV file into a table (Python API behind COPY)
+
+        Inside a transaction the rows are buffered until COMMIT.
+
+        Args:
+            table_name: Target table
+            path: CSV file path
+            **options: header, delimiter and batch_size, see bulk_load.copy_from_csv
+
+        Returns:
+            CopyResult
+        """
+        table = self.catalog.get_table(table_name)
+        if table is None:
+            raise ExecutionError(f"Table '{table_name}' does not exist")
+        if self.transaction is not None:
+            return copy_from_csv(self.transaction.table_writes(table), path, **options)
+        statistics = self.catalog.get_statistics(table_name)
+
+        def on_batch(columns):
+            if statistics is not None:
+                statistics.add_columns(columns)
+            self.log('APPEND', table_name, [list(values) for values in columns])
+
+        with table.write_lock:
+            try:
+                return copy_from_csv(table, path, on_batch=on_batch, **options)
+            finally:
+                self.invalidate_results(table_name)
+
+    def execute_copy(self, node):
+        """
+        COPY Identifier FROM STRING_LITERAL
+
+        Returns one row per rejected CSV record with its line number.
+        """
+        table = self.lookup_table(node.children[0])
+        path = literal_value(node.children[1].value)
+        try:
+            result = self.copy_from_csv(table.name, path)
+        except OSError as error:
+            raise ExecutionError(f"Cannot read '{path}': {error.strerror}", node.children[1])
+
+        return ExecutionResult(
+            'COPY_STMT', ['line', 'error'], result.rejected, result.rows_loaded,
+            f"{result.rows_loaded} rows copied, {len(result.rejected)} rejected"
+        )
+
+    def execute_analyze(self, node):
+        """
+        ANALYZE [Identifier]
+
+        Collects statistics for one table (or all tables), stores them in the
+        catalog and returns one summary row per column.
+        """
+        if node.children:
+            tables = [self.read_table(node.children[0])]
+        else:
+            tables = [self.catalog.get_table(name).snapshot() for name in self.catalog.table_names()]
+
+        columns = ['table', 'column', 'rows', 'nulls', 'distinct', 'min', 'max', 'buckets', 'encoding']
+        rows = []
+        for table in tables:
+            statistics = analyze_table(table)
+            self.catalog.set_statistics(table.name, statistics)
+            for column_name in statistics.column_names:
+                column_statistics = statistics.columns[column_name]
+                rows.append((
+                    table.name,
+                    column_name,
+                    column_statistics.row_count,
+                    column_statistics.null_count,
+                    column_statistics.distinct_count,
+                    column_statistics.min_value,
+                    column_statistics.max_value,
+                    len(column_statistics.histogram()),
+                    table.encoding(column_name),
+                ))
+
+        return ExecutionResult('ANALYZE_STMT', columns, rows, len(rows), f"{len(tables)} tables analyzed")
+
+    def execute_explain(self, node):
+        """
+        EXPLAIN (SELECT_STMT | UPDATE_STMT | DELETE_STMT)
+
+        Plans the scan of the explained statement without running it and
+        returns one (property, value) row per plan detail.
+        """
+        statement = node.children[0]
+        join = self.find_child(statement, 'JOIN_CLAUSE')
+        if join is not None:
+            raise ExecutionError("EXPLAIN does not support joins", join)
+        table_node = statement.children[1] if statement.node_type == 'SELECT_STMT' else statement.children[0]
+        table = self.read_table(table_node)
+        where_clause = self.find_child(statement, 'WHERE_CLAUSE')
+        encoded_filters, _ = self.split_filters(table, where_clause)
+
+        # Planned directly so the session's block counters only count real scans
+        plan = plan_scan(table, where_clause, self.parameters)
+        if self.use_parallel_scan(table, plan):
+            scan = f"parallel ({self.scanner.parallelism} workers)"
+        elif plan.row_ids is not None:
+            scan = "index"
+        elif plan.blocks_skipped or encoded_filters:
+            scan = "block ranges"
+        else:
+            scan = "full"
+
+        rows = [
+            ('statement', statement.node_type[:-len('_STMT')]),
+            ('table', table.name),
+            ('rows', table.live_row_count),
+            ('scan', scan),
+            ('pruning predicates', ' AND '.join(text for *_, text in plan.predicates) or 'none'),
+            ('encoded filters', ' AND '.join(text for *_, text in encoded_filters) or 'none'),
+            ('blocks', plan.total_blocks),
+            ('blocks scanned', plan.blocks_scanned),
+            ('blocks skipped', plan.blocks_skipped),
+            ('blocks skipped by bloom filters', plan.bloom_skipped),
+            ('index', plan.index or 'none'),
+        ]
+        if plan.row_ids is not None:
+            rows.append(('rows from index', len(plan.row_ids)))
+        bloom_bytes = table.zone_map.bloom_bytes()
+        if bloom_bytes:
+            rows.append(('bloom filter bytes', bloom_bytes))
+        return ExecutionResult(
+            'EXPLAIN_STMT', ['property', 'value'], rows, len(rows),
+            f"{plan.blocks_scanned} of {plan.total_blocks} blocks to scan",
+            plan.blocks_scanned, plan.blocks_skipped
+        )
+
+    # ==================== Transactions ====================
+
+    def execute_begin(self, node):
+        """BEGIN: buffer this session's writes until COMMIT"""
+        if self.transaction is not None:
+            raise ExecutionError("A transaction is already open", node)
+        self.transaction = Transaction()
+        return ExecutionResult('BEGIN_STMT', message="Transaction started")
+
+    def execute_commit(self, node):
+        """COMMIT: apply the buffered writes"""
+        if self.transaction is None:
+            raise ExecutionError("No transaction is open", node)
+        count = self.commit_transaction()
+        return ExecutionResult('COMMIT_STMT', row_count=count, message=f"Transaction committed ({count} rows)")
+
+    def execute_rollback(self, node):
+        """ROLLBACK: discard the buffered writes"""
+        if self.transaction is None:
+            raise ExecutionError("No transaction is open", node)
+        count = self.transaction.row_count
+        self.transaction = None
+        return ExecutionResult('ROLLBACK_STMT', message=f"Transaction rolled back ({count} rows discarded)")
+
+    def commit_transaction(self):
+        """
+        Apply and log the open transaction's buffered writes and close it
+
+        Every written table is locked (in name order, so concurrent commits
+        cannot deadlock), gets its updates and deletions in one change_rows()
+        call and its new rows in one append_columns() call; the whole
+        transaction is one write-ahead log record. Nothing is applied if a
+        table whose committed rows the transaction changed was written by
+        another session meanwhile.
+
+        Returns:
+            Number of rows committed
+
+        Raises:
+            ExecutionError: on such a conflict; the transaction is rolled back
+        """
+        transaction, self.transaction = self.transaction, None
+        writes = sorted(
+            (writes for writes in transaction.writes.values() if writes.changed_count),
+            key=lambda writes: writes.name
+        )
+        with ExitStack() as locks:
+            for table_writes in writes:
+                locks.enter_context(self.write_lock(table_writes.name))
+            for table_writes in writes:
+                if table_writes.conflicts_with(self.catalog.get_table(table_writes.name)):
+                    raise ExecutionError(
+                        f"Table '{table_writes.name}' was changed by another session; transaction rolled back"
+                    )
+            try:
+                records = []
+                for table_writes in writes:
+                    table = table_writes.table
+                    updates = sorted(table_writes.updates.items())
+                    deleted = sorted(table_writes.deleted)
+                    table.change_rows(updates, deleted)
+                    columns = table_writes.inserted_columns()
+                    if table_writes.inserted_count:
+                        table.append_columns(columns)
+                        statistics = self.catalog.get_statistics(table_writes.name)
+                        if statistics is not None:
+                            statistics.add_columns(columns)
+                    records.append([table_writes.name, [list(values) for values in columns], updates, deleted])
+                if writes:
+                    self.log('COMMIT', None, records)
+            finally:
+                for table_writes in writes:
+                    self.invalidate_results(table_writes.name)
+        return sum(table_writes.changed_count for table_writes in writes)
+
+    # ==================== Snapshots ====================
+
+    def execute_save_snapshot(self, node):
+        """SAVE SNAPSHOT STRING_LITERAL [UNCOMPRESSED]"""
+        path = literal_value(node.children[0].value)
+        compression = self.find_child(node, 'UNCOMPRESSED') is None
+        try:
+            count = save_snapshot(self.catalog, path, compression)
+        except OSError as error:
+            raise ExecutionError(f"Cannot write snapshot '{path}': {error.strerror}", node.children[0])
+        return ExecutionResult('SAVE_SNAPSHOT_STMT', row_count=count, message=f"{count} tables saved to '{path}'")
+
+    def execute_load_snapshot(self, node):
+        """
+        LOAD SNAPSHOT STRING_LITERAL
+
+        Replaces every table of the catalog with the snapshot's. The load is
+        logged with the snapshot's generation: replay loads the directory
+        again and fails if it was saved over since. A log that belongs to a
+        database directory is checkpointed right away instead, so that its
+        recovery does not depend on the loaded directory at all.
+        """
+        path = literal_value(node.children[0].value)
+        replaced = self.catalog.table_names()
+        try:
+            manifest = read_snapshot_manifest(path)
+            load_snapshot(path, self.catalog, manifest=manifest)
+        except OSError as error:
+            raise ExecutionError(f"Cannot read snapshot '{path}': {error.strerror}", node.children[0])
+        except StorageError as error:
+            raise ExecutionError(str(error), node.children[0])
+        for table_name in set(replaced) | set(self.catalog.table_names()):
+            self.invalidate_results(table_name)
+        self.scanner.discard_shared()
+        self.log('LOAD', None, [path, manifest.get('generation')])
+        if self.wal is not None and self.wal.directory is not None:
+            try:
+                self.wal.checkpoint(self.catalog, self.wal.directory)
+            except OSError as error:
+                raise ExecutionError(
+                    f"Loaded '{path}' but cannot checkpoint the database: {error.strerror}", node.children[0]
+                )
+        count = len(self.catalog.table_names())
+        return ExecutionResult(
+            'LOAD_SNAPSHOT_STMT', row_count=count, message=f"{count} tables loaded from '{path}'"
+        )
+
+    # ==================== Index Advice ====================
+
+    def execute_show_index_advice(self, node):
+        """
+        SHOW INDEX ADVICE [CREATE]: weigh an index for every column the
+        recorded WHERE clauses filtered on; CREATE also builds the advised
+        ones in the background
+        """
+        advisor = self.catalog.index_advisor
+        if advisor is None:
+            raise ExecutionError("Workload recording is off (the catalog has no index advisor)", node)
+        advice = advisor.advise(self.catalog)
+        message = f"{sum(row[-1] == 'create' for row in advice)} indexes advised"
+        if self.find_child(node, 'CREATE_INDEXES') is not None:
+            message = f"{advisor.create_advised(self.catalog, advice)} indexes being created"
+        return ExecutionResult('SHOW_INDEX_ADVICE_STMT', list(ADVICE_COLUMNS), advice, len(advice), message)
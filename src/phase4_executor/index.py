@@ -0,0 +1,253 @@
+"""
+Secondary Indexes
+A hash index maps every value of a column to the row ids holding it; an
+ordered index keeps the (value, row id) pairs sorted by value, so it also
+answers range predicates. A scan asks the index of a WHERE conjunct's
+column for the row ids that can match and reads only those rows instead of
+whole blocks.
+
+Like zone maps, indexes are conservative: an in-place update adds the row
+under its new value but leaves the old entry, and deletes are not removed
+(the deletion map hides them), so an index may return rows that no longer
+match but never misses one. A row updated to a value it held before is
+listed under that value more than once; candidates() returns every row id
+once. The scan checks every row it reads against the
+full WHERE clause anyway. Compaction rebuilds the indexes exactly.
+
+Indexes live in memory only: they are not saved with the table and are
+built again (see IndexAdvisor) after a restart.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from itertools import chain
+
+
+# Kinds of index and the operators each can answer
+INDEX_KINDS = ('hash', 'ordered')
+HASH_OPERATORS = ('=', 'IN')
+ORDERED_OPERATORS = ('=', 'IN', '<', '<=', '>', '>=')
+
+# An ordered index merges its unsorted tail into the sorted part once the
+# tail reaches this many entries, or at the next lookup
+MAX_PENDING_ENTRIES = 65536
+
+# Approximate bytes per distinct value of a hash index (dict slot, key and
+# row id list), and per row of an ordered index (key reference and row id)
+HASH_ENTRY_BYTES = 100
+ORDERED_ENTRY_BYTES = 16
+
+
+class HashIndex:
+    """Row ids of every value of one column"""
+
+    kind = 'hash'
+
+    def __init__(self):
+        # Value -> row id, or array of row ids once the value repeats
+        self.entries = {}
+        self.entry_count = 0
+
+    def add(self, row_id, value):
+        """Index one value stored at a row id"""
+        if value is None:
+            return
+        row_ids = self.entries.get(value)
+        if row_ids is None:
+            self.entries[value] = row_id
+        elif isinstance(row_ids, int):
+            if row_ids == row_id:
+                return
+            self.entries[value] = array('q', (row_ids, row_id))
+        elif row_ids[-1] == row_id:
+            return
+        else:
+            row_ids.append(row_id)
+        self.entry_count += 1
+
+    def add_range(self, first_row_id, values):
+        """Index consecutive values starting at first_row_id"""
+        entries = self.entries
+        count = 0
+        for row_id, value in enumerate(values, first_row_id):
+            if value is None:
+                continue
+            row_ids = entries.get(value)
+            if row_ids is None:
+                entries[value] = row_id
+            elif isinstance(row_ids, int):
+                entries[value] = array('q', (row_ids, row_id))
+            else:
+                row_ids.append(row_id)
+            count += 1
+        self.entry_count += count
+
+    def _row_ids(self, value):
+        try:
+            row_ids = self.entries.get(value, ())
+        except TypeError:
+            # Unhashable constant: it equals no stored value
+            return ()
+        return (row_ids,) if isinstance(row_ids, int) else row_ids
+
+    def candidates(self, predicates, limit):
+        """
+        Row ids that may satisfy every predicate this index can answer
+
+        Args:
+            predicates: (column_name, op, value, text) tuples on the indexed column
+            limit: Give up once more than this many rows match
+
+        Returns:
+            Ascending list of distinct row ids, or None if no predicate can
+            use the index or too many rows match
+        """
+        best = None
+        for _, op, value, _ in predicates:
+            if op not in HASH_OPERATORS:
+                continue
+            groups = [self._row_ids(value)] if op == '=' else [self._row_ids(item) for item in value]
+            count = sum(map(len, groups))
+            if best is None or count < best[0]:
+                best = count, groups
+        if best is None or best[0] > limit:
+            return None
+        return sorted(set(chain.from_iterable(best[1])))
+
+    @property
+    def memory_bytes(self):
+        """Approximate bytes held by the index"""
+        return HASH_ENTRY_BYTES * len(self.entries) + 8 * self.entry_count
+
+
+class OrderedIndex:
+    """(value, row id) pairs of one column sorted by value"""
+
+    kind = 'ordered'
+
+    def __init__(self):
+        self.keys = []
+        self.row_ids = array('q')
+        # Entries added since the last merge, in row id order
+        self.pending = []
+        # Guards keys, row_ids and pending: lookups from reader threads may
+        # merge while the writer adds entries
+        self._lock = threading.Lock()
+
+    def add(self, row_id, value):
+        """Index one value stored at a row id"""
+        if value is None:
+            return
+        with self._lock:
+            self.pending.append((value, row_id))
+            if len(self.pending) >= MAX_PENDING_ENTRIES:
+                self._merge()
+
+    def add_range(self, first_row_id, values):
+        """Index consecutive values starting at first_row_id"""
+        with self._lock:
+            self.pending.extend(
+                (value, row_id) for row_id, value in enumerate(values, first_row_id) if value is not None
+            )
+            if len(self.pending) >= MAX_PENDING_ENTRIES:
+                self._merge()
+
+    def _merge(self):
+        if not self.pending:
+            return
+        self.pending.sort()
+        merged = list(merge(zip(self.keys, self.row_ids), self.pending))
+        self.pending = []
+        # New lists: a lookup that started earlier keeps reading the old ones
+        self.keys = [key for key, _ in merged]
+        self.row_ids = array('q', [row_id for _, row_id in merged])
+
+    @staticmethod
+    def _bounds(keys, predicates):
+        # Slices of the sorted keys allowed by the predicates, or None
+        low, low_inclusive, high, high_inclusive = None, True, None, True
+        points = None
+        used = False
+        for _, op, value, _ in predicates:
+            if op not in ORDERED_OPERATORS:
+                continue
+            used = True
+            if op == '=':
+                points = [value] if points is None else [point for point in points if point == value]
+            elif op == 'IN':
+                points = list(value) if points is None else [point for point in points if point in value]
+            elif op in ('>', '>=') and (low is None or value > low or (value == low and op == '>')):
+                low, low_inclusive = value, op == '>='
+            elif op in ('<', '<=') and (high is None or value < high or (value == high and op == '<')):
+                high, high_inclusive = value, op == '<='
+        if not used:
+            return None
+
+        if points is not None:
+            slices = []
+            for point in points:
+                if low is not None and (point < low or (point == low and not low_inclusive)):
+                    continue
+                if high is not None and (point > high or (point == high and not high_inclusive)):
+                    continue
+                slices.append((bisect_left(keys, point), bisect_right(keys, point)))
+            return slices
+        start = 0 if low is None else (bisect_left if low_inclusive else bisect_right)(keys, low)
+        end = len(keys) if high is None else (bisect_right if high_inclusive else bisect_left)(keys, high)
+        return [(start, max(start, end))]
+
+    def candidates(self, predicates, limit):
+        """
+        Row ids that may satisfy every predicate this index can answer
+
+        Args:
+            predicates: (column_name, op, value, text) tuples on the indexed column
+            limit: Give up once more than this many rows match
+
+        Returns:
+            Ascending list of distinct row ids, or None if no predicate can
+            use the index or too many rows match
+        """
+        with self._lock:
+            self._merge()
+            keys, row_ids = self.keys, self.row_ids
+        try:
+            slices = self._bounds(keys, predicates)
+        except TypeError:
+            # A constant of another type than the column's values
+            return None
+        if slices is None or sum(end - start for start, end in slices) > limit:
+            return None
+        return sorted(set(chain.from_iterable(row_ids[start:end] for start, end in slices)))
+
+    @property
+    def memory_bytes(self):
+        """Approximate bytes held by the index"""
+        return ORDERED_ENTRY_BYTES * (len(self.keys) + len(self.pending))
+
+
+def new_index(kind):
+    """Create an empty index of the given kind ('hash' or 'ordered')"""
+    return HashIndex() if kind == 'hash' else OrderedIndex()
+
+
+def build_index(table, column_name, kind):
+    """
+    Index every row of a table's column
+
+    Returns:
+        HashIndex or OrderedIndex
+    """
+    index = new_index(kind)
+    column = table.columns[column_name]
+    if kind == 'ordered':
+        entries = sorted(
+            (value, row_id) for row_id, value in enumerate(table._bounded(column)) if value is not None
+        )
+        index.keys = [value for value, _ in entries]
+        index.row_ids = array('q', [row_id for _, row_id in entries])
+    else:
+        index.add_range(0, list(table._bounded(column)))
+    return index
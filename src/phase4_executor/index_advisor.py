@@ -0,0 +1,218 @@
+"""
+Index Advisor
+Records which columns the executed WHERE clauses filter on and recommends
+the indexes (see index.py) worth their upkeep.
+
+Every scan that used `column op constant` predicates is recorded per table
+and column: how often the column was compared for equality (=, IN) and by
+range (<, <=, >, >=, BETWEEN, LIKE prefixes), and how many rows the scan
+read against how many passed its WHERE clause.
+
+An index would have let those scans read roughly the rows they returned
+instead of the rows they read. Its cost is building it once plus adding
+every row written to the table since it was first observed. Both are
+counted in rows and weighted by the constants below; an index is advised
+when the benefit is larger. Advised indexes are taken by benefit per byte
+until the memory budget (which the existing indexes count against) is
+spent. A column only ever compared for equality gets a hash index, one
+compared by range an ordered index.
+"""
+
+import threading
+
+from .index import HASH_ENTRY_BYTES, ORDERED_ENTRY_BYTES
+
+
+DEFAULT_INDEX_MEMORY = 64 * 1024 * 1024
+
+# Relative cost, in sequentially scanned rows, of reading one row through an
+# index (one short range per row), of building an index entry and of
+# maintaining one on a write
+INDEX_ROW_COST = 8
+BUILD_ROW_COST = 2
+MAINTENANCE_ROW_COST = 4
+
+EQUALITY_OPERATORS = ('=', 'IN')
+RANGE_OPERATORS = ('<', '<=', '>', '>=')
+
+ADVICE_COLUMNS = [
+    'table', 'column', 'index', 'equality', 'range', 'rows scanned', 'rows returned',
+    'benefit', 'cost', 'bytes', 'advice'
+]
+
+
+class ColumnWorkload:
+    """What the recorded scans filtering on one column did"""
+
+    def __init__(self):
+        self.equality = 0
+        self.range = 0
+        # Rows read and returned by the scans whose returned rows were counted
+        self.rows_scanned = 0
+        self.rows_returned = 0
+
+    @property
+    def benefit(self):
+        """Scanned rows an index would have saved, in scanned-row units"""
+        return max(0, self.rows_scanned - INDEX_ROW_COST * self.rows_returned)
+
+    @property
+    def kind(self):
+        """Index kind the column's predicates need"""
+        return 'ordered' if self.range else 'hash'
+
+
+class IndexAdvisor:
+    """Per-column filter workload of a catalog and the indexes it calls for"""
+
+    def __init__(self, memory_budget=DEFAULT_INDEX_MEMORY):
+        """
+        Args:
+            memory_budget: Bytes all indexes together may take
+        """
+        self.memory_budget = memory_budget
+        # (table name, column name) -> ColumnWorkload
+        self.columns = {}
+        # Table name -> Table.rows_written when the table was first observed
+        self.written_baseline = {}
+        # Threads building indexes in the background
+        self.builds = []
+        self._lock = threading.Lock()
+
+    # ==================== Recording ====================
+
+    def record_scan(self, table, plan):
+        """
+        Account for one finished scan
+
+        Args:
+            table: Scanned table (or its snapshot)
+            plan: ScanPlan of the scan; its rows_returned is None when the
+                scan did not count them
+        """
+        seen = {}
+        for column_name, op, _, _ in plan.predicates:
+            if op in EQUALITY_OPERATORS or op in RANGE_OPERATORS:
+                seen.setdefault(column_name, set()).add('equality' if op in EQUALITY_OPERATORS else 'range')
+        if not seen:
+            return
+        counted = plan.rows_returned is not None
+        rows_scanned = plan.rows_scanned if counted else 0
+        with self._lock:
+            self.written_baseline.setdefault(table.name, table.rows_written)
+            for column_name, kinds in seen.items():
+                workload = self.columns.get((table.name, column_name))
+                if workload is None:
+                    workload = self.columns[(table.name, column_name)] = ColumnWorkload()
+                workload.equality += 'equality' in kinds
+                workload.range += 'range' in kinds
+                if counted:
+                    workload.rows_scanned += rows_scanned
+                    workload.rows_returned += plan.rows_returned
+
+    def reset(self):
+        """Forget the recorded workload"""
+        with self._lock:
+            self.columns = {}
+            self.written_baseline = {}
+
+    # ==================== Advice ====================
+
+    @staticmethod
+    def estimated_bytes(table, column_name, kind, statistics=None):
+        """Approximate bytes an index of the given kind on a column would take"""
+        rows = table.live_row_count
+        if kind == 'ordered':
+            return ORDERED_ENTRY_BYTES * rows
+        column_statistics = statistics.column(column_name) if statistics is not None else None
+        if column_statistics is not None:
+            distinct = column_statistics.distinct_count
+        else:
+            distinct = getattr(table.columns[column_name], 'distinct_count', rows)
+        return HASH_ENTRY_BYTES * min(distinct, rows) + 8 * rows
+
+    def advise(self, catalog):
+        """
+        Weigh an index for every recorded column
+
+        Returns:
+            List of row tuples in ADVICE_COLUMNS order, most beneficial first.
+            The advice is 'create', 'exists', 'not worth it' or 'over budget'.
+        """
+        with self._lock:
+            observed = list(self.columns.items())
+            baselines = dict(self.written_baseline)
+
+        candidates = []
+        used_bytes = 0
+        for table_name in catalog.table_names():
+            used_bytes += catalog.get_table(table_name).index_bytes()
+        for (table_name, column_name), workload in observed:
+            table = catalog.get_table(table_name)
+            if table is None or not table.has_column(column_name):
+                continue
+            kind = workload.kind
+            existing = table.indexes.get(column_name)
+            written = max(0, table.rows_written - baselines.get(table_name, table.rows_written))
+            cost = BUILD_ROW_COST * table.live_row_count + MAINTENANCE_ROW_COST * written
+            size = self.estimated_bytes(table, column_name, kind, catalog.get_statistics(table_name))
+            if existing is not None and (existing.kind == kind or existing.kind == 'ordered'):
+                advice = 'exists'
+                kind = existing.kind
+                size = existing.memory_bytes
+            elif workload.benefit <= cost:
+                advice = 'not worth it'
+            else:
+                advice = 'create'
+            candidates.append([
+                table_name, column_name, kind, workload.equality, workload.range,
+                workload.rows_scanned, workload.rows_returned, workload.benefit, cost, size, advice
+            ])
+
+        # The most benefit per byte first, while the budget lasts
+        for row in sorted(candidates, key=lambda row: row[7] / max(row[9], 1), reverse=True):
+            if row[10] != 'create':
+                continue
+            if used_bytes + row[9] > self.memory_budget:
+                row[10] = 'over budget'
+            else:
+                used_bytes += row[9]
+        candidates.sort(key=lambda row: row[7], reverse=True)
+        return [tuple(row) for row in candidates]
+
+    def create_advised(self, catalog, advice):
+        """
+        Build the advised indexes on a background thread
+
+        Each index is built while its table's write_lock keeps writers out;
+        queries keep running and use the index once it is in place.
+
+        Args:
+            advice: Rows returned by advise()
+
+        Returns:
+            Number of indexes being built
+        """
+        work = [
+            (catalog.get_table(row[0]), row[1], row[2]) for row in advice
+            if row[10] == 'create' and catalog.get_table(row[0]) is not None
+        ]
+        if not work:
+            return 0
+
+        def build():
+            for table, column_name, kind in work:
+                table.create_index(column_name, kind)
+
+        thread = threading.Thread(target=build, daemon=True)
+        with self._lock:
+            self.builds = [build for build in self.builds if build.is_alive()] + [thread]
+        thread.start()
+        return len(work)
+
+    def wait(self):
+        """Wait for the indexes being built in the background"""
+        with self._lock:
+            builds = list(self.builds)
+        for thread in builds:
+            thread.join()
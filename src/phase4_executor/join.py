@@ -0,0 +1,302 @@
+"""
+Hash Join
+Inner equi-join of two row streams. The input estimated to be smaller is
+loaded into a hash table keyed by its join key (build), and the other input
+is streamed past it (probe).
+
+If the build input grows past the memory budget, the join switches to grace
+mode: both inputs are hash-partitioned on the join key into spill files and
+each pair of partitions is joined on its own; a partition whose build side
+still does not fit is split again.
+"""
+
+import sys
+from itertools import chain, islice
+from operator import itemgetter
+
+from phase2_parser.parse_tree import ParseTreeNode
+from .evaluator import ExecutionError, compile_expression
+from .spill import MAX_SPILL_DEPTH, SpillPartitions, chunks
+
+
+# Default budget for the build side's hash table, in bytes
+DEFAULT_JOIN_MEMORY = 256 * 1024 * 1024
+
+# Build rows measured to estimate the memory held per row
+ROW_SAMPLE = 64
+
+# Approximate bytes for the hash table entry and list slot of one build row
+ENTRY_BYTES = 64
+
+
+class JoinedColumns:
+    """
+    Names of the columns in joined rows (every table's columns, in FROM order)
+
+    Every column can be named 'table.column'; the bare column name also
+    works when no other joined table has a column of that name.
+    """
+
+    def __init__(self, tables):
+        """
+        Args:
+            tables: The joined tables in FROM order
+
+        Raises:
+            ExecutionError: if a table is joined twice (aliases are not supported)
+        """
+        self.tables = tables
+        self.offsets = []
+        # Table index and column name of every position
+        self.owners = []
+        self.names = []
+        self.positions = {}
+        counts = {}
+        for index, table in enumerate(tables):
+            if any(other.name == table.name for other in tables[:index]):
+                raise ExecutionError(f"Table '{table.name}' is joined twice; aliases are not supported")
+            self.offsets.append(len(self.names))
+            for column_name in table.column_names:
+                self.positions[f"{table.name}.{column_name}"] = len(self.names)
+                counts[column_name] = counts.get(column_name, 0) + 1
+                self.owners.append(index)
+                self.names.append(column_name)
+        self.ambiguous = {column_name for column_name, count in counts.items() if count > 1}
+        for position, column_name in enumerate(self.names):
+            if column_name not in self.ambiguous:
+                self.positions[column_name] = position
+
+    def star_columns(self):
+        """Result column names of SELECT *: bare names unless ambiguous"""
+        return [
+            f"{self.tables[index].name}.{column_name}" if column_name in self.ambiguous else column_name
+            for index, column_name in zip(self.owners, self.names)
+        ]
+
+    def check(self, node):
+        """
+        Check that every column a subtree reads names exactly one joined column
+
+        Raises:
+            ExecutionError: for an unknown or ambiguous column
+        """
+        if node.node_type == 'IDENTIFIER' and node.value not in self.positions:
+            if node.value in self.ambiguous:
+                raise ExecutionError(
+                    f"Column '{node.value}' is ambiguous; qualify it with its table name", node
+                )
+            raise ExecutionError(f"Unknown column '{node.value}'", node)
+        for child in node.children:
+            self.check(child)
+
+    def column_type(self, name):
+        """Declared type of a joined column (None for an unknown or ambiguous name)"""
+        position = self.positions.get(name)
+        if position is None:
+            return None
+        return self.tables[self.owners[position]].column_types[self.names[position]]
+
+    def tables_read(self, node, found=None):
+        """Indexes of the tables whose columns a (checked) subtree reads"""
+        found = set() if found is None else found
+        if node.node_type == 'IDENTIFIER':
+            found.add(self.owners[self.positions[node.value]])
+        for child in node.children:
+            self.tables_read(child, found)
+        return found
+
+    def local_positions(self, index):
+        """Positions in the rows of one table alone, under every name of its columns"""
+        offset = self.offsets[index]
+        return {
+            name: position - offset for name, position in self.positions.items()
+            if self.owners[position] == index
+        }
+
+    def localize(self, node):
+        """Copy a subtree reading one table, naming its columns as that table does"""
+        copy = ParseTreeNode(node.node_type, node.value)
+        copy.set_position(node.line, node.column)
+        if node.node_type == 'IDENTIFIER':
+            copy.value = self.names[self.positions[node.value]]
+        copy.children = [self.localize(child) for child in node.children]
+        return copy
+
+    def local_where(self, conjuncts):
+        """WHERE_CLAUSE over one table joining localized conjuncts with AND (None if there are none)"""
+        if not conjuncts:
+            return None
+        condition = self.localize(conjuncts[0])
+        for conjunct in conjuncts[1:]:
+            and_node = ParseTreeNode('AND_CONDITION')
+            and_node.add_child(condition)
+            and_node.add_child(self.localize(conjunct))
+            condition = and_node
+        where_clause = ParseTreeNode('WHERE_CLAUSE')
+        where_clause.add_child(condition)
+        return where_clause
+
+    def join_sides(self, conjunct, index):
+        """
+        Recognize an equality linking table `index` to the tables before it
+
+        Returns:
+            (expression over the earlier tables, expression over table
+            `index`), or None if the conjunct has another shape
+        """
+        if conjunct.node_type != 'COMPARISON' or len(conjunct.children) != 3:
+            return None
+        left, op_node, right = conjunct.children
+        if op_node.value != '=':
+            return None
+        left_tables = self.tables_read(left)
+        right_tables = self.tables_read(right)
+        if right_tables == {index} and left_tables and max(left_tables) < index:
+            return left, right
+        if left_tables == {index} and right_tables and max(right_tables) < index:
+            return right, left
+        return None
+
+
+def key_function(nodes, positions, parameters=None):
+    """
+    Compile join key expressions into one function of a row
+
+    Returns:
+        Callable returning the key: the value of a single expression, or a
+        tuple of the values of several
+    """
+    if all(node.node_type == 'IDENTIFIER' for node in nodes):
+        return itemgetter(*(positions[node.value] for node in nodes))
+    evaluators = [compile_expression(node, positions, parameters) for node in nodes]
+    if len(evaluators) == 1:
+        return evaluators[0]
+    return lambda row: tuple(evaluate(row) for evaluate in evaluators)
+
+
+def keyed(chunks_read):
+    """Iterate over the (key, row) pairs of spilled [keys, rows] chunks"""
+    for keys, rows in chunks_read:
+        yield from zip(keys, rows)
+
+
+class HashJoin:
+    """
+    Joins two inputs on equal keys, producing left row + right row tuples
+
+    Statistics of the last run are kept as attributes: build_rows,
+    probe_rows, grace (whether the inputs were partitioned), partitions
+    (pairs joined in grace mode) and spilled_bytes.
+    """
+
+    def __init__(self, build_key, probe_key, build_left, memory_limit=DEFAULT_JOIN_MEMORY):
+        """
+        Args:
+            build_key: Function of a build row returning its join key
+            probe_key: Function of a probe row returning its join key
+            build_left: True if the build input is the left side of the join
+            memory_limit: Budget in bytes for the build side's hash table
+        """
+        self.build_key = build_key
+        self.probe_key = probe_key
+        self.build_left = build_left
+        self.memory_limit = memory_limit
+        self.max_build_rows = None
+        self.build_rows = 0
+        self.probe_rows = 0
+        self.grace = False
+        self.partitions = 0
+        self.spilled_bytes = 0
+
+    def run(self, build_rows, probe_rows):
+        """
+        Join the inputs
+
+        Args:
+            build_rows: Iterable of build side row tuples
+            probe_rows: Iterable of probe side row tuples
+
+        Yields:
+            Joined rows, left columns first
+        """
+        build_key, probe_key = self.build_key, self.probe_key
+        build = ((build_key(row), row) for row in build_rows)
+        probe = ((probe_key(row), row) for row in probe_rows)
+        yield from self._join(build, probe, None)
+
+    def _row_size(self, table):
+        sample = list(islice(chain.from_iterable(table.values()), ROW_SAMPLE))
+        return ENTRY_BYTES + sum(
+            sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in sample
+        ) // len(sample)
+
+    def _join(self, build, probe, parent):
+        # build and probe are iterators of (key, row); parent is the
+        # SpillPartitions these inputs were read from (None at the top level)
+        table = {}
+        get = table.get
+        count = 0
+        limit = self.max_build_rows
+        depth = parent.depth if parent is not None else -1
+        for key, row in build:
+            if key is None:
+                continue
+            bucket = get(key)
+            if bucket is None:
+                table[key] = [row]
+            else:
+                bucket.append(row)
+            count += 1
+            if limit is None:
+                if count == ROW_SAMPLE:
+                    limit = self.max_build_rows = max(ROW_SAMPLE, self.memory_limit // self._row_size(table))
+            elif count > limit and depth < MAX_SPILL_DEPTH:
+                # The rows are counted again when their partition is joined
+                yield from self._grace(table, build, probe, parent)
+                return
+        self.build_rows += count
+
+        if self.build_left:
+            for key, row in probe:
+                self.probe_rows += 1
+                matches = get(key)
+                if matches is not None:
+                    for match in matches:
+                        yield match + row
+        else:
+            for key, row in probe:
+                self.probe_rows += 1
+                matches = get(key)
+                if matches is not None:
+                    for match in matches:
+                        yield row + match
+
+    def _grace(self, table, build, probe, parent):
+        # Partition the rest of both inputs on the join key, then join the
+        # partitions pairwise
+        self.grace = True
+        build_partitions = parent.split() if parent is not None else SpillPartitions()
+        probe_partitions = parent.split() if parent is not None else SpillPartitions()
+        try:
+            spilled = chain(
+                ((key, row) for key, rows in table.items() for row in rows),
+                ((key, row) for key, row in build if key is not None)
+            )
+            self._spill(spilled, build_partitions)
+            table.clear()
+            self._spill(((key, row) for key, row in probe if key is not None), probe_partitions)
+            for index in range(build_partitions.count):
+                self.partitions += 1
+                yield from self._join(
+                    keyed(build_partitions.read(index)), keyed(probe_partitions.read(index)), build_partitions
+                )
+        finally:
+            self.spilled_bytes += build_partitions.bytes_written + probe_partitions.bytes_written
+            build_partitions.close()
+            probe_partitions.close()
+
+    @staticmethod
+    def _spill(pairs, partitions):
+        for chunk in chunks(pairs):
+            keys, rows = zip(*chunk)
+            partitions.write([list(keys), list(rows)])
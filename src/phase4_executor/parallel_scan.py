@@ -0,0 +1,338 @@
+"""
+Parallel Table Scans
+Splits a table into row-range partitions and evaluates the WHERE clause and
+the projection of each partition in a process pool.
+
+Column buffers are copied once into multiprocessing.shared_memory segments
+(INT/FLOAT as raw int64/float64, TEXT as offsets plus a UTF-8 heap) and
+workers attach to them by name, so only the parse tree fragments and the
+partition bounds are pickled per task. The shared copy is kept up to date
+by copying only the rows appended since; it is made again after an UPDATE,
+a compaction, or when another table (LOAD SNAPSHOT) takes its name.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from multiprocessing import shared_memory
+
+from .evaluator import compile_condition, compile_expression
+from .storage import MappedTextColumn, OFFSET_TYPECODE, encode_text_column
+from .table import COLUMN_TYPECODES, INVERT_FLAGS
+
+
+# Tables smaller than this are scanned serially: process dispatch and
+# result pickling cost more than the scan itself.
+DEFAULT_PARALLEL_THRESHOLD = 200000
+
+
+def partition_ranges(row_count, partitions):
+    """
+    Split [0, row_count) into contiguous, nearly equal ranges
+
+    Returns:
+        List of (start, end) pairs in row order
+    """
+    partitions = max(1, min(partitions, row_count))
+    size, extra = divmod(row_count, partitions)
+    ranges = []
+    start = 0
+    for i in range(partitions):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+class SharedBuffer:
+    """
+    A shared memory segment that bytes are appended to
+
+    When the segment is full it is replaced by one twice the size, so
+    appending n bytes a little at a time copies O(n) bytes in all. The name
+    changes when that happens.
+    """
+
+    def __init__(self):
+        self.segment = None
+        # Bytes in use; the segment may be larger
+        self.size = 0
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    def append(self, data):
+        """Copy bytes (or the bytes of an array) onto the end of the buffer"""
+        data = memoryview(data).cast('B')
+        end = self.size + len(data)
+        if self.segment is None or end > self.segment.size:
+            grown = shared_memory.SharedMemory(create=True, size=max(1, end, 2 * self.size))
+            if self.segment is not None:
+                grown.buf[:self.size] = self.segment.buf[:self.size]
+                self.close()
+            self.segment = grown
+        self.segment.buf[self.size:end] = data
+        self.size = end
+
+    def replace(self, data):
+        """Make data the whole content of the buffer"""
+        self.size = 0
+        self.append(data)
+
+    def close(self):
+        """Release and unlink the segment"""
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+
+class SharedColumns:
+    """
+    Copies of a table's column buffers placed in shared memory
+
+    Rows appended to the table later are copied onto the end of the same
+    buffers (see refresh()); an UPDATE or a compaction, which change rows
+    already copied, needs a new copy.
+    """
+
+    def __init__(self, table):
+        self.table_name = table.name
+        self.table_id = table.table_id
+        self.compaction_count = table.compaction_count
+        self.row_count = 0
+        self.rows_written = 0
+        self.dead_row_count = 0
+        self.version = None
+        # Column name, data type, values (offsets for TEXT) and TEXT heap
+        self.columns = [
+            (column_name, table.column_types[column_name], SharedBuffer(),
+             SharedBuffer() if table.column_types[column_name] == 'TEXT' else None)
+            for column_name in table.column_names
+        ]
+        self.deleted = SharedBuffer()
+        self._copy_rows(table)
+
+    @property
+    def descriptors(self):
+        """(column name, data type, segment name, heap segment name or None) per column"""
+        return [
+            (column_name, data_type, data.name, heap.name if heap is not None else None)
+            for column_name, data_type, data, heap in self.columns
+        ]
+
+    @property
+    def deleted_name(self):
+        """Segment of the deletion map, or None when no row is deleted"""
+        return self.deleted.name if self.dead_row_count else None
+
+    def refresh(self, table):
+        """
+        Bring the copy up to date with a later snapshot of its table
+
+        Returns:
+            False if rows already copied have changed (a new copy is needed)
+        """
+        if (table.table_id != self.table_id or table.compaction_count != self.compaction_count
+                or table.row_count < self.row_count
+                or table.rows_written - self.rows_written != table.row_count - self.row_count):
+            return False
+        if table.version != self.version:
+            self._copy_rows(table)
+        return True
+
+    def _copy_rows(self, table):
+        # The table may be a snapshot whose buffers the live table keeps
+        # appending to: copy slices of its rows only, and never export a
+        # buffer that an append would then fail to resize
+        start, end = self.row_count, table.row_count
+        for column_name, data_type, data, heap in self.columns:
+            values = table.columns[column_name][start:end]
+            if data_type == 'TEXT':
+                offsets, text = encode_text_column(values)
+                if heap.size:
+                    offsets = array(OFFSET_TYPECODE, [offset + heap.size for offset in offsets])
+                data.append(offsets)
+                heap.append(text)
+            else:
+                if not isinstance(values, (array, memoryview)):
+                    # Compressed columns are decoded once into the shared copy
+                    values = array(COLUMN_TYPECODES[data_type], values)
+                data.append(values)
+        if table.dead_row_count != self.dead_row_count:
+            # Deletions flag rows anywhere: copy the whole map again
+            self.deleted.replace(table.deleted[:end])
+        elif table.dead_row_count:
+            self.deleted.append(table.deleted[start:end])
+        self.row_count = end
+        self.rows_written = table.rows_written
+        self.dead_row_count = table.dead_row_count
+        self.version = table.version
+
+    def close(self):
+        """Release and unlink every segment"""
+        for _, _, data, heap in self.columns:
+            data.close()
+            if heap is not None:
+                heap.close()
+        self.deleted.close()
+
+
+# ==================== Worker side ====================
+
+# Segments attached by this worker process, by name
+_attached = {}
+
+
+def _attach(name, keep):
+    keep.add(name)
+    segment = _attached.get(name)
+    if segment is None:
+        segment = shared_memory.SharedMemory(name=name)
+        _attached[name] = segment
+    return segment
+
+
+def _release_unused(keep):
+    for name in list(_attached):
+        if name not in keep:
+            _attached.pop(name).close()
+
+
+def _open_columns(descriptors, deleted, row_count):
+    keep = set()
+    deleted_flags = _attach(deleted, keep).buf if deleted is not None else None
+    columns = []
+    for _, data_type, data_name, heap_name in descriptors:
+        data = _attach(data_name, keep).buf
+        if data_type == 'TEXT':
+            offsets = data[:row_count * 8].cast(OFFSET_TYPECODE)
+            heap = _attach(heap_name, keep).buf
+            columns.append(MappedTextColumn(offsets, heap))
+        else:
+            columns.append(data[:row_count * 8].cast(COLUMN_TYPECODES[data_type]))
+    _release_unused(keep)
+    return columns, deleted_flags
+
+
+def scan_partition(task):
+    """
+    Scan one row range inside a worker process
+
+    Args:
+        task: (descriptors, deleted, row_count, start, end, where_clause, select_items,
+               parameters, want_row_ids)
+
+    Returns:
+        Matching global row ids, or the projected rows, in row order
+    """
+    (descriptors, deleted, row_count, start, end,
+     where_clause, select_items, parameters, want_row_ids) = task
+    columns, deleted_flags = _open_columns(descriptors, deleted, row_count)
+    positions = {descriptor[0]: i for i, descriptor in enumerate(descriptors)}
+    predicate = None
+    if where_clause is not None:
+        predicate = compile_condition(where_clause, positions, parameters)
+    rows = enumerate(zip(*(column[start:end] for column in columns)), start)
+    if deleted_flags is not None:
+        rows = compress(rows, bytes(deleted_flags[start:end]).translate(INVERT_FLAGS))
+
+    if want_row_ids:
+        if predicate is None:
+            return [row_id for row_id, _ in rows]
+        return [row_id for row_id, row in rows if predicate(row)]
+
+    rows = (row for _, row in rows)
+    if predicate is not None:
+        rows = (row for row in rows if predicate(row))
+    if select_items is None:
+        return list(rows)
+    projections = [compile_expression(item, positions, parameters) for item in select_items]
+    return [tuple(project(row) for project in projections) for row in rows]
+
+
+# ==================== Coordinator side ====================
+
+class ParallelScanner:
+    """Runs partitioned scans on a process pool for one session"""
+
+    def __init__(self, parallelism=1, threshold=DEFAULT_PARALLEL_THRESHOLD):
+        """
+        Args:
+            parallelism: Degree of parallelism (1 disables parallel scans)
+            threshold: Minimum table size, in rows, worth scanning in parallel
+        """
+        self.parallelism = max(1, parallelism)
+        self.threshold = threshold
+        self._pool = None
+        self._shared = {}
+
+    def set_parallelism(self, parallelism):
+        """Change the degree of parallelism; the pool is recreated on next use"""
+        parallelism = max(1, parallelism)
+        if parallelism != self.parallelism and self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.parallelism = parallelism
+
+    def should_parallelize(self, table):
+        """Whether a scan of this table is worth running in parallel"""
+        return self.parallelism > 1 and table.row_count >= self.threshold
+
+    def _shared_columns(self, table):
+        shared = self._shared.get(table.name)
+        if shared is not None and shared.refresh(table):
+            return shared
+        if shared is not None:
+            shared.close()
+        shared = SharedColumns(table)
+        self._shared[table.name] = shared
+        return shared
+
+    def _run(self, table, where_clause, select_items, parameters, want_row_ids):
+        shared = self._shared_columns(table)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.parallelism)
+        tasks = [
+            (shared.descriptors, shared.deleted_name, shared.row_count, start, end,
+             where_clause, select_items, list(parameters), want_row_ids)
+            for start, end in partition_ranges(shared.row_count, self.parallelism)
+        ]
+        # map() yields results in submission order, so partitions merge in row order
+        merged = []
+        for part in self._pool.map(scan_partition, tasks):
+            merged.extend(part)
+        return merged
+
+    def select(self, table, select_items, where_clause, parameters=()):
+        """
+        Filter and project a table in parallel
+
+        Args:
+            table: Table to scan
+            select_items: Select list expression nodes, or None for '*'
+            where_clause: WHERE_CLAUSE node or None
+            parameters: Values bound to '?' placeholders
+
+        Returns:
+            Result rows in table order
+        """
+        return self._run(table, where_clause, select_items, parameters, False)
+
+    def matching_row_ids(self, table, where_clause, parameters=()):
+        """Row ids satisfying the WHERE clause, in ascending order"""
+        return self._run(table, where_clause, None, parameters, True)
+
+    def discard_shared(self):
+        """Free the shared copies of every table (their tables were replaced)"""
+        for shared in self._shared.values():
+            shared.close()
+        self._shared = {}
+
+    def close(self):
+        """Shut the pool down and free all shared segments"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.discard_shared()
@@ -0,0 +1,73 @@
+"""
+Wire Protocol of the Query Server
+Every message is one frame: a 4-byte big-endian payload length followed by
+a UTF-8 JSON object.
+
+Requests:
+    {"id": n, "sql": text, "parameters": [...]}
+
+Responses, all carrying the id of the request they answer:
+    {"id": n, "type": "columns", "columns": [...]}  statements returning rows
+    {"id": n, "type": "rows", "rows": [[...], ...]} zero or more batches
+    {"id": n, "type": "done", "row_count": n, "message": text}
+    {"id": n, "type": "error", "error": class name, "message": text}
+
+A request is answered by columns/rows frames followed by exactly one done
+or error frame. Requests on one connection are answered in the order they
+were sent, so a client may send several before reading any answer.
+"""
+
+import json
+import struct
+
+
+FRAME_HEADER = struct.Struct('>I')
+
+# Frames larger than this are rejected as corrupt
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends a malformed frame"""
+
+
+def encode_frame(message):
+    """
+    Serialize one message into a frame
+
+    Args:
+        message: JSON-serializable dict
+
+    Returns:
+        bytes
+    """
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    """
+    Read one message from an asyncio StreamReader
+
+    Returns:
+        The decoded dict, or None if the peer closed the connection
+        between frames
+
+    Raises:
+        ProtocolError: on an oversized or undecodable frame
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except EOFError:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    payload = await reader.readexactly(length)
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        raise ProtocolError("Frame does not contain valid JSON")
+    if not isinstance(message, dict):
+        raise ProtocolError("Frame does not contain a JSON object")
+    return message
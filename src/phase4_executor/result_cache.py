@@ -0,0 +1,246 @@
+"""
+SELECT Result Cache
+Keeps the rows of recent SELECTs, keyed by the statement's fingerprint
+(its parse tree, so whitespace and keyword case do not matter) and the
+values bound to its '?' placeholders.
+
+Every entry records the table_id and version of each table it read. An
+entry is only returned while those tables are still at the recorded
+versions (and were not replaced by LOAD SNAPSHOT); the
+executor also drops the entries of a table as soon as a write to it
+commits. Entries are evicted least recently used first once the cache
+holds more than its memory budget.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+# Default budget, in bytes
+DEFAULT_RESULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# Results estimated larger than this fraction of the budget are not cached
+MAX_ENTRY_FRACTION = 0.25
+
+# Rows measured to estimate the size of a result
+SIZE_SAMPLE_ROWS = 64
+
+# Rows collected by caching_rows() before the result's size is first checked
+SIZE_CHECK_ROWS = 1024
+
+
+def statement_fingerprint(node):
+    """
+    Normalized, hashable form of a statement's parse tree
+
+    Two statements have the same fingerprint when they parse to the same
+    tree, regardless of spacing, comments or keyword case.
+    """
+    return (node.node_type, node.value, tuple(statement_fingerprint(child) for child in node.children))
+
+
+def parameters_key(parameters):
+    # Typed, so 1 and 1.0 (equal and hashing alike) stay distinct
+    return tuple((type(value).__name__, value) for value in parameters)
+
+
+def result_size(columns, rows):
+    """Approximate bytes held by a result, measured on a sample of its rows"""
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(column) for column in columns)
+    if not rows:
+        return size
+    step = max(1, len(rows) // SIZE_SAMPLE_ROWS)
+    sample = rows[::step]
+    sample_size = sum(sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in sample)
+    return size + sample_size * len(rows) // len(sample)
+
+
+class CachedResult:
+    """One cached SELECT result"""
+
+    __slots__ = ('columns', 'rows', 'versions', 'size')
+
+    def __init__(self, columns, rows, versions, size):
+        """
+        Args:
+            columns: Result column names
+            rows: Result rows as a list of tuples
+            versions: {table name: (table_id, version)} of the tables read
+            size: Estimated bytes held
+        """
+        self.columns = columns
+        self.rows = rows
+        self.versions = versions
+        self.size = size
+
+
+class ResultCache:
+    """LRU cache of SELECT results under a memory budget"""
+
+    def __init__(self, capacity=DEFAULT_RESULT_CACHE_SIZE):
+        """
+        Args:
+            capacity: Budget in bytes
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        # Keys of the entries that read each table
+        self.keys_by_table = {}
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(node, parameters):
+        """Cache key of a statement with its bound parameters"""
+        return statement_fingerprint(node), parameters_key(parameters)
+
+    @staticmethod
+    def table_versions(sources):
+        """
+        The table versions a result depends on
+
+        Args:
+            sources: (table, snapshot) pairs: each catalog table read and the
+                snapshot the rows were read from
+        """
+        return {table.name: (table.table_id, snapshot.version) for table, snapshot in sources}
+
+    def lookup(self, key, catalog):
+        """
+        Get a cached result that is still current
+
+        Args:
+            key: See key()
+            catalog: Catalog holding the live tables the entry is checked against
+
+        Returns:
+            CachedResult, or None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and not self._is_current(entry, catalog):
+                self._remove(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    @staticmethod
+    def _is_current(entry, catalog):
+        for name, (table_id, version) in entry.versions.items():
+            table = catalog.get_table(name)
+            if table is None or table.table_id != table_id or table.version != version:
+                return False
+        return True
+
+    def accepts(self, size):
+        """Whether a result of this estimated size may be cached"""
+        return size <= self.capacity * MAX_ENTRY_FRACTION
+
+    def store(self, key, columns, rows, versions):
+        """
+        Cache a complete result
+
+        Args:
+            key: See key()
+            columns: Result column names
+            rows: List of result tuples
+            versions: See table_versions(), taken before the rows were read
+        """
+        size = result_size(columns, rows)
+        if not self.accepts(size):
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = CachedResult(columns, rows, versions, size)
+            self.used += size
+            for name in versions:
+                self.keys_by_table.setdefault(name, set()).add(key)
+            while self.used > self.capacity:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.used -= entry.size
+        for name in entry.versions:
+            keys = self.keys_by_table.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_table[name]
+
+    def invalidate_table(self, name):
+        """Drop every entry that read a table (called when a write to it commits)"""
+        with self.lock:
+            for key in list(self.keys_by_table.get(name, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_table.clear()
+            self.used = 0
+
+    # ==================== Reporting ====================
+
+    @property
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Counters and occupancy as a dict"""
+        with self.lock:
+            return {
+                'capacity': self.capacity,
+                'used': self.used,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'hit_rate': self.hit_rate,
+            }
+
+    def reset_counters(self):
+        """Zero the hit, miss, invalidation and eviction counters"""
+        with self.lock:
+            self.hits = self.misses = self.invalidations = self.evictions = 0
+
+
+def caching_rows(cache, key, columns, rows, versions):
+    """
+    Pass result rows through, caching them once every row has been read
+
+    Collection stops as soon as the result grows too large to be cached, so
+    streaming a big result does not keep a copy of it.
+    """
+    collected = []
+    check_at = SIZE_CHECK_ROWS
+    for row in rows:
+        if collected is not None:
+            collected.append(row)
+            if len(collected) == check_at:
+                if not cache.accepts(result_size(columns, collected)):
+                    collected = None
+                check_at *= 2
+        yield row
+    if collected is not None:
+        cache.store(key, columns, collected, versions)
@@ -0,0 +1,179 @@
+"""
+Statement Scheduler
+Runs the statements of a script concurrently where the order cannot matter.
+
+Each statement's read and write table sets are taken from its parse tree. A
+statement waits for the latest earlier statement that wrote a table it
+reads or writes, and a write also waits for the statements that read the
+table since that write. Statements with no path between them in this
+dependency graph touch disjoint tables (or only read the same ones), so
+running them at the same time leaves the catalog exactly as running the
+script in order would, and every SELECT sees the rows it would have seen.
+
+Statements whose tables cannot be determined (ANALYZE of every table,
+incomplete nodes) are barriers: they wait for everything before them and
+everything after them waits for them.
+"""
+
+import threading
+from collections import deque
+
+
+def statement_tables(node):
+    """
+    Tables a statement reads and writes
+
+    Returns:
+        (read set, write set) of table names, or None if the statement may
+        touch any table
+    """
+    try:
+        if node.node_type == 'EXPLAIN_STMT':
+            tables = statement_tables(node.children[0])
+            return None if tables is None else (tables[0] | tables[1], set())
+        if node.node_type == 'SELECT_STMT':
+            tables = {node.children[1].value}
+            tables.update(
+                child.children[0].value for child in node.children if child.node_type == 'JOIN_CLAUSE'
+            )
+            return tables, set()
+        if node.node_type in ('INSERT_STMT', 'UPDATE_STMT', 'DELETE_STMT', 'CREATE_STMT', 'COPY_STMT'):
+            return set(), {node.children[0].value}
+        if node.node_type == 'ANALYZE_STMT' and node.children:
+            # Collected statistics are written to the catalog
+            return set(), {node.children[0].value}
+    except (AttributeError, IndexError):
+        pass
+    return None
+
+
+def dependency_graph(statements):
+    """
+    Earlier statements each statement has to wait for
+
+    Returns:
+        List with one set of statement indexes per statement
+    """
+    dependencies = []
+    last_writer = {}
+    # Statements that read a table since its last write
+    readers = {}
+    barrier = None
+    since_barrier = []
+    for index, statement in enumerate(statements):
+        tables = statement_tables(statement)
+        if tables is None:
+            waits_for = set(since_barrier)
+            if barrier is not None:
+                waits_for.add(barrier)
+            barrier = index
+            since_barrier = []
+            last_writer = {}
+            readers = {}
+            dependencies.append(waits_for)
+            continue
+
+        reads, writes = tables
+        waits_for = set() if barrier is None else {barrier}
+        for table_name in reads | writes:
+            if table_name in last_writer:
+                waits_for.add(last_writer[table_name])
+        for table_name in writes:
+            waits_for.update(readers.pop(table_name, ()))
+            last_writer[table_name] = index
+        for table_name in reads - writes:
+            readers.setdefault(table_name, []).append(index)
+        since_barrier.append(index)
+        dependencies.append(waits_for)
+    return dependencies
+
+
+class StatementScheduler:
+    """
+    Runs statements on worker threads in an order consistent with their
+    dependency graph
+
+    Workers take ready statements from a shared queue; a worker that makes
+    another statement ready by finishing one usually runs it next itself,
+    so a chain of dependent statements stays on one thread.
+    """
+
+    def __init__(self, workers):
+        """
+        Args:
+            workers: Statements run at the same time at most
+        """
+        self.workers = max(1, workers)
+        # Statements of the last run, and the most that ran at the same time
+        self.statements = 0
+        self.max_concurrency = 0
+
+    def run(self, statements, execute):
+        """
+        Run every statement
+
+        Args:
+            statements: Statement nodes in script order
+            execute: Function of (index, statement) run on a worker thread
+
+        Returns:
+            List of what execute returned for each statement, in script order
+
+        Raises:
+            The first exception raised by execute; statements not started by
+            then are not run
+        """
+        dependencies = dependency_graph(statements)
+        waiting = [len(waits_for) for waits_for in dependencies]
+        dependents = [[] for _ in statements]
+        for index, waits_for in enumerate(dependencies):
+            for earlier in waits_for:
+                dependents[earlier].append(index)
+
+        outcomes = [None] * len(statements)
+        ready = deque(index for index, count in enumerate(waiting) if count == 0)
+        condition = threading.Condition()
+        state = {'remaining': len(statements), 'active': 0, 'failure': None}
+        self.statements = len(statements)
+        self.max_concurrency = 0
+
+        def work():
+            with condition:
+                while True:
+                    while not ready and state['remaining'] and state['failure'] is None:
+                        condition.wait()
+                    if not ready or state['failure'] is not None:
+                        return
+                    index = ready.popleft()
+                    state['active'] += 1
+                    self.max_concurrency = max(self.max_concurrency, state['active'])
+                    condition.release()
+                    try:
+                        outcome = execute(index, statements[index])
+                    except BaseException as error:
+                        condition.acquire()
+                        state['failure'] = error
+                        condition.notify_all()
+                        return
+                    condition.acquire()
+                    state['active'] -= 1
+                    state['remaining'] -= 1
+                    outcomes[index] = outcome
+                    for later in dependents[index]:
+                        waiting[later] -= 1
+                        if waiting[later] == 0:
+                            ready.append(later)
+                    if not state['remaining']:
+                        condition.notify_all()
+                    elif len(ready) > 1:
+                        # This worker takes one of them itself
+                        condition.notify(len(ready) - 1)
+
+        threads = [threading.Thread(target=work) for _ in range(min(self.workers, len(statements)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if state['failure'] is not None:
+            raise state['failure']
+        return outcomes
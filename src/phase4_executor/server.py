@@ -0,0 +1,268 @@
+"""
+Query Server
+An asyncio server that keeps a catalog, its tables and a shared parse cache
+loaded, and runs statements sent by clients over a Unix domain socket or
+localhost TCP (see protocol.py for the framing).
+
+Each client connection is one session (a Connection with its own executor).
+Statements run on a thread pool so the event loop keeps accepting and
+answering other clients; SELECT results are streamed back in batches as
+they are produced, and a slow reader holds up only its own scan.
+
+With a write-ahead log and a checkpoint directory (--wal), the server
+checkpoints every checkpoint_interval seconds when there were writes, and
+once more when it closes.
+"""
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .catalog import Catalog
+from .connection import Connection, DatabaseError, ParseCache
+from .protocol import ProtocolError, encode_frame, read_frame
+from .result_cache import ResultCache
+from .storage import open_catalog
+from .wal import open_database
+
+
+DEFAULT_WORKERS = 8
+
+# Rows per 'rows' frame
+DEFAULT_BATCH_SIZE = 1024
+
+# Statements kept parsed for all sessions together
+SERVER_PARSE_CACHE_SIZE = 4096
+
+# Pending connections the listening sockets queue (many clients connect at once)
+LISTEN_BACKLOG = 1024
+
+# Seconds between checkpoints of a logged database
+DEFAULT_CHECKPOINT_INTERVAL = 300
+
+
+class QueryServer:
+    """Serves one catalog to many clients"""
+
+    def __init__(self, catalog=None, wal=None, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                 checkpoint_directory=None, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        Args:
+            catalog: Catalog to serve; a new empty one is created if omitted
+            wal: Optional WriteAheadLog shared by every session
+            workers: Threads running statements
+            batch_size: Rows sent per frame
+            checkpoint_directory: Database directory the wal belongs to (see
+                open_database); checkpoints are taken only when it is given
+            checkpoint_interval: Seconds between checkpoints
+        """
+        self.catalog = catalog if catalog is not None else Catalog()
+        self.wal = wal
+        self.checkpoint_directory = checkpoint_directory if wal is not None else None
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_count = 0
+        self.batch_size = batch_size
+        self.parse_cache = ParseCache(SERVER_PARSE_CACHE_SIZE)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='query')
+        self.servers = []
+        # Tasks of the client sessions in progress
+        self.sessions = set()
+        self.connection_count = 0
+        self.statement_count = 0
+
+    async def start(self, path=None, host='127.0.0.1', port=None):
+        """
+        Start listening on a Unix socket path and/or a TCP port
+
+        Args:
+            path: Unix domain socket path; an existing socket file is replaced
+            host: TCP interface, localhost by default
+            port: TCP port (0 picks a free one)
+
+        Returns:
+            List of bound addresses (socket path or (host, port))
+        """
+        addresses = []
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle_client, path, backlog=LISTEN_BACKLOG)
+            self.servers.append(server)
+            addresses.append(path)
+        if port is not None:
+            server = await asyncio.start_server(self.handle_client, host, port, backlog=LISTEN_BACKLOG)
+            self.servers.append(server)
+            addresses.append(server.sockets[0].getsockname()[:2])
+        if not addresses:
+            raise ValueError("A socket path or a TCP port is required")
+        return addresses
+
+    async def serve_forever(self):
+        """Serve until cancelled"""
+        tasks = [server.serve_forever() for server in self.servers]
+        if self.checkpoint_directory is not None and self.checkpoint_interval > 0:
+            tasks.append(self.checkpoint_periodically())
+        await asyncio.gather(*tasks)
+
+    async def close(self):
+        """Stop listening, end every session, checkpoint and shut the worker threads down"""
+        for server in self.servers:
+            server.close()
+        for task in self.sessions:
+            task.cancel()
+        await asyncio.gather(*self.sessions, return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+        self.pool.shutdown(wait=True)
+        self.checkpoint()
+
+    # ==================== Checkpoints ====================
+
+    def checkpoint(self):
+        """
+        Checkpoint the log into the database directory if anything was logged
+
+        Returns:
+            True if a checkpoint was taken
+        """
+        if self.checkpoint_directory is None or not self.wal.record_count:
+            return False
+        self.wal.checkpoint(self.catalog, self.checkpoint_directory)
+        self.checkpoint_count += 1
+        return True
+
+    async def checkpoint_periodically(self):
+        """Checkpoint every checkpoint_interval seconds, on a worker thread"""
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.run(self.checkpoint)
+
+    # ==================== Sessions ====================
+
+    async def handle_client(self, reader, writer):
+        """Run one client session until it disconnects"""
+        task = asyncio.current_task()
+        self.sessions.add(task)
+        self.connection_count += 1
+        session = Connection(self.catalog, self.wal, parse_cache=self.parse_cache)
+        cursor = session.cursor()
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                await self.run_request(request, cursor, writer)
+        except (ProtocolError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # The server is closing
+            pass
+        finally:
+            self.sessions.discard(task)
+            cursor.close()
+            session.close()
+            writer.close()
+
+    def run(self, function, *args):
+        """Run a blocking call on the worker threads"""
+        return asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+
+    async def run_request(self, request, cursor, writer):
+        """Execute one request and write its answer frames"""
+        request_id = request.get('id')
+        self.statement_count += 1
+        try:
+            sql = request.get('sql')
+            if not isinstance(sql, str):
+                raise ProtocolError("Request has no 'sql' text")
+            await self.run(cursor.execute, sql, request.get('parameters') or ())
+            if cursor.description is not None:
+                columns = [column[0] for column in cursor.description]
+                writer.write(encode_frame({'id': request_id, 'type': 'columns', 'columns': columns}))
+                row_count = 0
+                while True:
+                    rows = await self.run(cursor.fetchmany, self.batch_size)
+                    if rows:
+                        row_count += len(rows)
+                        writer.write(encode_frame({'id': request_id, 'type': 'rows', 'rows': rows}))
+                        # Wait for the client to read before producing more
+                        await writer.drain()
+                    if len(rows) < self.batch_size:
+                        break
+                message = f"{row_count} rows selected"
+            else:
+                row_count = cursor.rowcount
+                message = cursor.statusmessage
+            writer.write(encode_frame({
+                'id': request_id, 'type': 'done', 'row_count': row_count, 'message': message
+            }))
+        except (DatabaseError, ProtocolError) as error:
+            cursor.close_results()
+            writer.write(encode_frame({
+                'id': request_id, 'type': 'error', 'error': type(error).__name__, 'message': str(error)
+            }))
+        await writer.drain()
+
+
+async def serve(catalog=None, path=None, host='127.0.0.1', port=None, **options):
+    """
+    Start a QueryServer and serve until cancelled
+
+    Args:
+        catalog: Catalog to serve
+        path, host, port: Listening addresses (see QueryServer.start)
+        **options: wal, workers, batch_size, checkpoint_directory and
+            checkpoint_interval, see QueryServer
+    """
+    server = QueryServer(catalog, **options)
+    await server.start(path, host, port)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a catalog over a Unix socket or localhost TCP")
+    parser.add_argument('--socket', help="Unix domain socket path")
+    parser.add_argument('--port', type=int, help="localhost TCP port")
+    parser.add_argument('--directory', help="Open the tables saved in this directory")
+    parser.add_argument('--wal', action='store_true',
+                        help="Treat --directory as a database: recover it from its log, log every write "
+                             "and checkpoint it")
+    parser.add_argument('--checkpoint-interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help="Seconds between checkpoints with --wal (0 checkpoints only on shutdown)")
+    parser.add_argument('--group-commit-size', type=int, default=1,
+                        help="Log records synced together with --wal")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Statement worker threads")
+    parser.add_argument('--result-cache-mb', type=int, default=0,
+                        help="Cache SELECT results in this many MB (0 disables the cache)")
+    args = parser.parse_args()
+    if args.socket is None and args.port is None:
+        parser.error("--socket or --port is required")
+    if args.wal and not args.directory:
+        parser.error("--wal requires --directory")
+
+    wal = None
+    if args.wal:
+        catalog, wal = open_database(args.directory, group_commit_size=args.group_commit_size)
+    else:
+        catalog = open_catalog(args.directory) if args.directory else Catalog()
+    if args.result_cache_mb > 0:
+        catalog.result_cache = ResultCache(args.result_cache_mb * 1024 * 1024)
+    try:
+        asyncio.run(serve(
+            catalog, args.socket, port=args.port, workers=args.workers, wal=wal,
+            checkpoint_directory=args.directory, checkpoint_interval=args.checkpoint_interval
+        ))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if wal is not None:
+            wal.close()
+
+
+if __name__ == '__main__':
+    main()
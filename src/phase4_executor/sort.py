@@ -0,0 +1,205 @@
+"""
+External Sort
+Orders rows by their ORDER BY key values under a memory budget. Rows are
+buffered until the budget is reached; each full buffer is sorted and
+written to a temporary file as a run, and the runs are streamed back
+through heapq.merge. With no more rows than the budget allows the sort
+never touches disk.
+
+ORDER BY ... LIMIT k does not sort at all: top_rows() keeps the k first
+rows in a heap while the input streams past, in O(n log k).
+"""
+
+import heapq
+import sys
+
+from .spill import SpillRuns
+
+
+# Default budget for the rows buffered in memory, in bytes
+DEFAULT_SORT_MEMORY = 256 * 1024 * 1024
+
+# Buffered rows measured to estimate the memory held per row
+ROW_SAMPLE = 64
+
+# Approximate bytes for the list slot and (key, row) pair of one buffered row
+ENTRY_BYTES = 64
+
+# Runs merged at once; more runs are first merged into longer runs, in passes
+MERGE_FAN_IN = 64
+
+
+class _Last:
+    """Stands in for NULL in sort keys, ordering after every value"""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return other is self
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __ge__(self, other):
+        return True
+
+    def __repr__(self):
+        return 'NULL'
+
+
+NULL_KEY = _Last()
+
+
+class Descending:
+    """Sort key component that orders in reverse"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def sort_key(descending):
+    """
+    Build the comparison key for ORDER BY key values
+
+    NULL sorts after every value, so before them when descending.
+
+    Args:
+        descending: One bool per ORDER BY key, True for DESC
+
+    Returns:
+        (key function, reverse) to pass to sorted() or heapq. The key
+        function takes the value of the only ORDER BY key, or a tuple of
+        the values of several; values without NULLs in keys that all sort
+        the same way are compared as they are.
+    """
+    if len(descending) == 1:
+        return (lambda value: NULL_KEY if value is None else value), descending[0]
+    if all(descending) or not any(descending):
+        return (lambda values: values if None not in values else tuple(
+            NULL_KEY if value is None else value for value in values
+        )), descending[0]
+    return (lambda values: tuple(
+        Descending(NULL_KEY if value is None else value) if reverse
+        else NULL_KEY if value is None else value
+        for value, reverse in zip(values, descending)
+    )), False
+
+
+def top_rows(rows, key_values, descending, limit):
+    """
+    The first `limit` rows in ORDER BY order, using a heap of `limit` rows
+
+    Args:
+        rows: Iterable of rows
+        key_values: Function of a row returning its ORDER BY value (a tuple
+            of values for several keys)
+        descending: See sort_key()
+        limit: Number of rows kept
+
+    Returns:
+        List of rows in order; ties keep their input order
+    """
+    key, reverse = sort_key(descending)
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    return select(limit, rows, key=lambda row: key(key_values(row)))
+
+
+class ExternalSort:
+    """
+    Sorts rows by key values, spilling sorted runs to disk past a memory budget
+
+    Statistics of the last run are kept as attributes: rows, runs (sorted
+    runs written to disk, 0 when the rows fit in memory), merge_passes and
+    spilled_bytes.
+    """
+
+    def __init__(self, descending, memory_limit=DEFAULT_SORT_MEMORY):
+        """
+        Args:
+            descending: See sort_key()
+            memory_limit: Budget in bytes for the rows buffered in memory
+        """
+        self.key, self.reverse = sort_key(descending)
+        self.memory_limit = memory_limit
+        self.max_run_rows = None
+        self.rows = 0
+        self.runs = 0
+        self.merge_passes = 0
+        self.spilled_bytes = 0
+
+    def run(self, entries):
+        """
+        Sort rows
+
+        Args:
+            entries: Iterable of (ORDER BY value or tuple of values, row) pairs
+
+        Yields:
+            The rows in order; ties keep their input order
+        """
+        key = self.key
+        entry_key = lambda entry: key(entry[0])
+        reverse = self.reverse
+        runs = SpillRuns()
+        spilled_bytes = 0
+        try:
+            buffer = []
+            limit = self.max_run_rows
+            for entry in entries:
+                buffer.append(entry)
+                if limit is None:
+                    if len(buffer) == ROW_SAMPLE:
+                        limit = self.max_run_rows = max(
+                            ROW_SAMPLE, self.memory_limit // self._entry_size(buffer)
+                        )
+                elif len(buffer) >= limit:
+                    self.rows += len(buffer)
+                    buffer.sort(key=entry_key, reverse=reverse)
+                    runs.write(buffer)
+                    buffer = []
+            self.rows += len(buffer)
+            buffer.sort(key=entry_key, reverse=reverse)
+            if not runs.count:
+                for _, row in buffer:
+                    yield row
+                return
+            runs.write(buffer)
+            buffer = []
+            self.runs = runs.count
+            while runs.count > MERGE_FAN_IN:
+                merged_runs = SpillRuns()
+                for start in range(0, runs.count, MERGE_FAN_IN):
+                    merged_runs.write(self._merge(runs, range(start, min(start + MERGE_FAN_IN, runs.count))))
+                spilled_bytes += runs.bytes_written
+                runs.close()
+                runs = merged_runs
+                self.merge_passes += 1
+            for _, row in self._merge(runs, range(runs.count)):
+                yield row
+        finally:
+            self.spilled_bytes = spilled_bytes + runs.bytes_written
+            runs.close()
+
+    def _merge(self, runs, indexes):
+        key = self.key
+        return heapq.merge(*map(runs.read, indexes), key=lambda entry: key(entry[0]), reverse=self.reverse)
+
+    @staticmethod
+    def _entry_size(buffer):
+        return ENTRY_BYTES + sum(value_size(key) + value_size(row) for key, row in buffer) // len(buffer)
+
+
+def value_size(value):
+    # Bytes held by a value, counting the items of a tuple
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(map(sys.getsizeof, value))
+    return sys.getsizeof(value)
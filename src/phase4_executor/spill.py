@@ -0,0 +1,144 @@
+"""
+Spill Files
+Temporary files used by operators whose state can outgrow memory:
+hash-partitioned files for hash aggregation and hash join, and sorted runs
+for the external sort.
+
+Records are chunks stored column by column, the first column holding the
+partitioning or sort keys; they are written with marshal, so keys and
+values must be ints, floats, strings, None or tuples of them.
+"""
+
+import marshal
+import tempfile
+from itertools import islice
+from operator import itemgetter
+
+
+# Partition files written when an operator's state does not fit
+SPILL_PARTITIONS = 16
+
+# Partitions still too large after this many splits are processed in memory
+MAX_SPILL_DEPTH = 4
+
+# Entries per chunk written to a partition file
+SPILL_CHUNK = 65536
+
+# Entries per chunk of a sorted run; every run being merged holds one chunk
+RUN_CHUNK = 4096
+
+
+def chunks(items, size=SPILL_CHUNK):
+    """Split an iterable into lists of at most `size` items"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class SpillPartitions:
+    """Temporary files holding column chunks, partitioned by key hash"""
+
+    def __init__(self, count=SPILL_PARTITIONS, depth=0):
+        """
+        Args:
+            count: Number of partitions
+            depth: How many times these entries have been split before; each
+                split partitions on the next digits of the key hash, so the
+                keys of a partition that all landed together get spread
+        """
+        self.count = count
+        self.divisor = count ** depth
+        self.depth = depth
+        self.files = [tempfile.TemporaryFile() for _ in range(count)]
+        self.bytes_written = 0
+
+    def write(self, columns):
+        """
+        Append a chunk to the partitions of its keys
+
+        Args:
+            columns: [keys, other values...], equally long lists
+        """
+        count = self.count
+        divisor = self.divisor
+        positions = [[] for _ in range(count)]
+        for position, key in enumerate(columns[0]):
+            positions[hash(key) // divisor % count].append(position)
+        for index, selected in enumerate(positions):
+            if not selected:
+                continue
+            if len(selected) == len(columns[0]):
+                chunk = columns
+            elif len(selected) == 1:
+                chunk = [[column[selected[0]]] for column in columns]
+            else:
+                gather = itemgetter(*selected)
+                chunk = [list(gather(column)) for column in columns]
+            data = marshal.dumps(chunk)
+            self.files[index].write(data)
+            self.bytes_written += len(data)
+
+    def read(self, index):
+        """Iterate over the chunks of one partition, then delete its file"""
+        spill_file = self.files[index]
+        spill_file.seek(0)
+        try:
+            while True:
+                try:
+                    yield marshal.load(spill_file)
+                except EOFError:
+                    return
+        finally:
+            spill_file.close()
+
+    def split(self):
+        """New, empty partitions for re-splitting one of these"""
+        return SpillPartitions(self.count, self.depth + 1)
+
+    def close(self):
+        for spill_file in self.files:
+            spill_file.close()
+
+
+class SpillRuns:
+    """Temporary files each holding one sorted run of (key, value) entries"""
+
+    def __init__(self):
+        self.files = []
+        self.bytes_written = 0
+
+    @property
+    def count(self):
+        """Number of runs written"""
+        return len(self.files)
+
+    def write(self, entries):
+        """Write a run (a list of (key, value) pairs, already in order) to a new file"""
+        run_file = tempfile.TemporaryFile()
+        self.files.append(run_file)
+        for chunk in chunks(entries, RUN_CHUNK):
+            keys, values = zip(*chunk)
+            data = marshal.dumps([list(keys), list(values)])
+            run_file.write(data)
+            self.bytes_written += len(data)
+
+    def read(self, index):
+        """Iterate over the (key, value) pairs of one run, then delete its file"""
+        run_file = self.files[index]
+        run_file.seek(0)
+        try:
+            while True:
+                try:
+                    keys, values = marshal.load(run_file)
+                except EOFError:
+                    return
+                yield from zip(keys, values)
+        finally:
+            run_file.close()
+
+    def close(self):
+        for run_file in self.files:
+            run_file.close()
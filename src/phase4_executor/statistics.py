@@ -0,0 +1,272 @@
+"""
+Table Statistics
+Collected by ANALYZE in one streaming pass per column with bounded memory:
+row and null counts, min/max, an equi-depth histogram built from a reservoir
+sample and a HyperLogLog sketch for the number of distinct values
+"""
+
+import bisect
+import math
+import random
+import struct
+from hashlib import blake2b
+
+
+_MASK64 = (1 << 64) - 1
+
+# Default sketch sizes. Memory per column is independent of the row count:
+# 2**HLL_PRECISION one-byte registers plus RESERVOIR_SIZE sampled values.
+HLL_PRECISION = 12
+RESERVOIR_SIZE = 4096
+HISTOGRAM_BUCKETS = 32
+
+
+def _mix64(x):
+    """splitmix64 finalizer, spreads the bits of an integer over 64 bits"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def hash_value(value):
+    """
+    Stable 64-bit hash of a column value
+
+    Python's built-in hash() is salted per process for strings, so TEXT
+    values are hashed with blake2b to keep sketches comparable across runs.
+    """
+    if isinstance(value, str):
+        return int.from_bytes(blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+    if isinstance(value, float):
+        value = struct.unpack('<q', struct.pack('<d', value))[0]
+    return _mix64(value & _MASK64)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        """
+        Args:
+            precision: Number of index bits; the sketch keeps 2**precision registers
+        """
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+        self._rank_bits = 64 - precision
+        self._rank_mask = (1 << self._rank_bits) - 1
+
+    def add(self, value):
+        """Add one value to the sketch"""
+        self.add_hash(hash_value(value))
+
+    def add_hash(self, hashed):
+        """Add an already hashed 64-bit value"""
+        index = hashed >> self._rank_bits
+        rank = self._rank_bits - (hashed & self._rank_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Fold another sketch of the same precision into this one"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        """Estimate the number of distinct values added so far"""
+        m = self.register_count
+        alpha = 0.7213 / (1 + 1.079 / m)
+        harmonic = sum(2.0 ** -register for register in self.registers)
+        estimate = alpha * m * m / harmonic
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class ColumnStatistics:
+    """Distribution statistics for one column"""
+
+    def __init__(self, column_name, data_type, reservoir_size=RESERVOIR_SIZE,
+                 hll_precision=HLL_PRECISION, seed=0):
+        self.column_name = column_name
+        self.data_type = data_type
+        self.row_count = 0
+        self.null_count = 0
+        self.min_value = None
+        self.max_value = None
+        self.sketch = HyperLogLog(hll_precision)
+        self.reservoir_size = reservoir_size
+        self.sample = []
+        self._seen = 0
+        self._random = random.Random(seed)
+        self._ordered = None
+
+    def add(self, value):
+        """
+        Account for one more value
+
+        Called for every row by ANALYZE and for every inserted row afterwards,
+        so statistics stay current without re-scanning the table.
+        """
+        self.row_count += 1
+        if value is None:
+            self.null_count += 1
+            return
+
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+        self.sketch.add(value)
+
+        # Reservoir sampling (Algorithm R) keeps a uniform sample of fixed size
+        self._seen += 1
+        if len(self.sample) < self.reservoir_size:
+            self.sample.append(value)
+        else:
+            slot = self._random.randrange(self._seen)
+            if slot < self.reservoir_size:
+                self.sample[slot] = value
+        self._ordered = None
+
+    def ordered_sample(self):
+        """The reservoir sample in ascending order, cached until the next add"""
+        if self._ordered is None:
+            self._ordered = sorted(self.sample)
+        return self._ordered
+
+    @property
+    def distinct_count(self):
+        """Estimated number of distinct non-null values"""
+        if self._seen == 0:
+            return 0
+        return min(self.sketch.estimate(), self._seen)
+
+    def histogram(self, buckets=HISTOGRAM_BUCKETS):
+        """
+        Equi-depth histogram over the non-null values
+
+        Returns:
+            List of (upper_bound, row_count) pairs; each bucket holds roughly
+            the same number of rows and covers values up to its upper bound
+        """
+        result = []
+        if self.sample:
+            ordered = self.ordered_sample()
+            non_null = self.row_count - self.null_count
+            bucket_count = min(buckets, len(ordered))
+            previous_end = 0
+            for i in range(1, bucket_count + 1):
+                end = (i * len(ordered)) // bucket_count
+                if end == previous_end:
+                    continue
+                rows = round(non_null * (end - previous_end) / len(ordered))
+                upper_bound = ordered[end - 1]
+                if result and result[-1][0] == upper_bound:
+                    # Merge buckets split inside a run of equal values
+                    result[-1] = (upper_bound, result[-1][1] + rows)
+                else:
+                    result.append((upper_bound, rows))
+                previous_end = end
+        return result
+
+    def selectivity(self, op, value):
+        """
+        Estimate the fraction of rows satisfying `column op value`
+
+        Args:
+            op: Comparison operator ('=', '!=', '<>', '<', '<=', '>', '>=') or 'IN'
+            value: Constant the column is compared with (a tuple for IN)
+
+        Returns:
+            Float between 0 and 1
+        """
+        if self.row_count == 0:
+            return 0.0
+        non_null_fraction = (self.row_count - self.null_count) / self.row_count
+        if op == '=':
+            distinct = self.distinct_count
+            return non_null_fraction / distinct if distinct else 0.0
+        if op == 'IN':
+            distinct = self.distinct_count
+            return non_null_fraction * min(1.0, len(value) / distinct) if distinct else 0.0
+        if op in ('!=', '<>'):
+            distinct = self.distinct_count
+            return non_null_fraction * (1 - 1 / distinct) if distinct else 0.0
+
+        if not self.sample:
+            return 0.0
+        ordered = self.ordered_sample()
+        try:
+            if op in ('<', '>='):
+                below = bisect.bisect_left(ordered, value)
+            else:
+                below = bisect.bisect_right(ordered, value)
+        except TypeError:
+            return non_null_fraction
+        fraction = below / len(ordered)
+        if op in ('<', '<='):
+            return non_null_fraction * fraction
+        return non_null_fraction * (1 - fraction)
+
+
+class TableStatistics:
+    """Statistics for every column of one table"""
+
+    def __init__(self, table_name, column_types):
+        """
+        Args:
+            table_name: Table name
+            column_types: List of (column_name, data_type) pairs in column order
+        """
+        self.table_name = table_name
+        self.row_count = 0
+        self.column_names = [column_name for column_name, _ in column_types]
+        self.columns = {
+            column_name: ColumnStatistics(column_name, data_type)
+            for column_name, data_type in column_types
+        }
+
+    def add_row(self, values):
+        """Update statistics with one newly inserted row"""
+        self.row_count += 1
+        for column_name, value in zip(self.column_names, values):
+            self.columns[column_name].add(value)
+
+    def add_columns(self, column_batches):
+        """Update statistics with a batch of rows given column by column"""
+        self.row_count += len(column_batches[0]) if column_batches else 0
+        for column_name, values in zip(self.column_names, column_batches):
+            add = self.columns[column_name].add
+            for value in values:
+                add(value)
+
+    def column(self, column_name):
+        """Get the statistics of one column"""
+        return self.columns.get(column_name)
+
+
+def analyze_table(table):
+    """
+    Collect statistics for a table in one pass over each column buffer
+
+    Args:
+        table: Table to analyze
+
+    Returns:
+        TableStatistics
+    """
+    statistics = TableStatistics(
+        table.name,
+        [(column_name, table.column_types[column_name]) for column_name in table.column_names]
+    )
+    for column_name in table.column_names:
+        column_statistics = statistics.columns[column_name]
+        add = column_statistics.add
+        for value in table.live_values(column_name):
+            add(value)
+    statistics.row_count = table.live_row_count
+    return statistics
@@ -0,0 +1,649 @@
+"""
+On-Disk Table Format
+Each table is stored as a small schema header plus one segment file per column:
+
+    <table>.tbl           JSON header: table name, row count, column names and types,
+                          per-block zone maps, Bloom filter rates
+    <table>.<column>.col  column header followed by fixed-width values
+                          (INT: int64, FLOAT: float64, TEXT: uint64 end offsets),
+                          or by a segment directory and encoded segments for
+                          compressed INT/FLOAT columns (see compression.py)
+    <table>.<column>.heap UTF-8 string heap (TEXT columns only)
+    <table>.deleted       deletion map, one flag byte per row (only when rows are deleted)
+    <table>.bloom         marshal-encoded per-block Bloom filters (only for BLOOM columns)
+
+A snapshot (save_snapshot) is a directory holding snapshot.json, the list
+of its tables, and a data-<generation> subdirectory with their files. Every
+save writes a new subdirectory and then replaces snapshot.json, so the
+manifest always names complete files.
+
+Files are opened with mmap and read through memoryview, so opening a table
+costs the same regardless of its size and scans read straight from the page
+cache without copying. Compressed segments are decoded when they are read,
+and the decoded pages are cached in a BufferPool (see buffer_pool.py).
+"""
+
+import json
+import marshal
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from .bloom import ColumnBlooms
+from .buffer_pool import default_buffer_pool
+from .catalog import Catalog
+from .compression import PLAIN, SEGMENT_COUNT, SEGMENT_ENTRY, EncodedColumn, encode_column
+from .table import Table, COLUMN_TYPECODES, build_table_column, new_column_buffer
+from .zone_map import BLOCK_SIZE, ZoneMap
+
+
+FORMAT_VERSION = 1
+COLUMN_MAGIC = b'MSQC'
+# Column header version of INT/FLOAT files holding encoded segments
+SEGMENTED_COLUMN_VERSION = 2
+
+# magic, version, type code, byte order, reserved, row count
+COLUMN_HEADER = struct.Struct('<4sBBBxQ')
+
+TYPE_CODES = {'INT': 1, 'FLOAT': 2, 'TEXT': 3}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+BYTE_ORDERS = {'little': 0, 'big': 1}
+
+# TEXT offsets are stored as uint64
+OFFSET_TYPECODE = 'Q'
+
+# marshal format version 4 has been stable since Python 3.4
+MARSHAL_VERSION = 4
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MANIFEST = 'snapshot.json'
+SNAPSHOT_DATA_PREFIX = 'data-'
+
+# Tables written at the same time by save_snapshot
+DEFAULT_SNAPSHOT_WORKERS = 4
+
+
+class StorageError(Exception):
+    """Raised when a table file is missing or malformed"""
+
+
+def table_header_path(directory, table_name):
+    return os.path.join(directory, f"{table_name}.tbl")
+
+
+def column_path(directory, table_name, column_name):
+    return os.path.join(directory, f"{table_name}.{column_name}.col")
+
+
+def heap_path(directory, table_name, column_name):
+    return os.path.join(directory, f"{table_name}.{column_name}.heap")
+
+
+def deleted_path(directory, table_name):
+    return os.path.join(directory, f"{table_name}.deleted")
+
+
+def bloom_path(directory, table_name):
+    return os.path.join(directory, f"{table_name}.bloom")
+
+
+def _write_atomically(path, chunks):
+    """Write chunks to a temporary file and move it into place"""
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _column_header(data_type, row_count, version=FORMAT_VERSION):
+    return COLUMN_HEADER.pack(
+        COLUMN_MAGIC, version, TYPE_CODES[data_type], BYTE_ORDERS[sys.byteorder], row_count
+    )
+
+
+def encode_text_column(values):
+    """
+    Encode TEXT values as uint64 end offsets plus a UTF-8 heap
+
+    Returns:
+        (offsets array, heap bytearray)
+    """
+    offsets = array(OFFSET_TYPECODE)
+    heap = bytearray()
+    for value in values:
+        heap += value.encode('utf-8')
+        offsets.append(len(heap))
+    return offsets, heap
+
+
+def write_column(directory, table_name, column_name, data_type, values, compression=True):
+    """
+    Write one column segment (and its string heap for TEXT)
+
+    Args:
+        directory: Target directory
+        table_name: Owning table
+        column_name: Column name
+        data_type: 'INT', 'FLOAT' or 'TEXT'
+        values: Sequence of column values
+        compression: Encode INT/FLOAT segments when that makes them smaller
+    """
+    row_count = len(values)
+    header = _column_header(data_type, row_count)
+
+    if data_type == 'TEXT':
+        offsets, heap = encode_text_column(values)
+        _write_atomically(heap_path(directory, table_name, column_name), [heap])
+        _write_atomically(column_path(directory, table_name, column_name), [header, offsets.tobytes()])
+        return
+
+    if not isinstance(values, array):
+        buffer = new_column_buffer(data_type)
+        buffer.extend(values)
+        values = buffer
+
+    if compression:
+        segments = encode_column(values, data_type)
+        # Columns where nothing compresses keep the plain, directly mappable layout
+        if any(segment[0] != PLAIN for segment in segments):
+            _write_segmented_column(directory, table_name, column_name, data_type, row_count, segments)
+            return
+    _write_atomically(column_path(directory, table_name, column_name), [header, memoryview(values).cast('B')])
+
+
+def _write_segmented_column(directory, table_name, column_name, data_type, row_count, segments):
+    header = _column_header(data_type, row_count, SEGMENTED_COLUMN_VERSION)
+    offset = COLUMN_HEADER.size + SEGMENT_COUNT.size + SEGMENT_ENTRY.size * len(segments)
+    directory_entries = [SEGMENT_COUNT.pack(len(segments))]
+    for encoding, width, base, first, payload, count in segments:
+        directory_entries.append(SEGMENT_ENTRY.pack(encoding, width, count, offset, len(payload), base, first))
+        offset += len(payload)
+    _write_atomically(
+        column_path(directory, table_name, column_name),
+        [header] + directory_entries + [segment[4] for segment in segments]
+    )
+
+
+def save_table(table, directory, compression=True):
+    """
+    Persist a table to a directory
+
+    Column segments are written first and the schema header last, so a crash
+    part-way through leaves the previous header (and row count) in effect.
+
+    Args:
+        table: Table to write
+        directory: Target directory
+        compression: Encode INT/FLOAT segments (see write_column)
+    """
+    os.makedirs(directory, exist_ok=True)
+    for column_name in table.column_names:
+        write_column(
+            directory, table.name, column_name,
+            table.column_types[column_name], table.columns[column_name], compression
+        )
+    if table.dead_row_count:
+        _write_atomically(deleted_path(directory, table.name), [table.deleted])
+    blooms = table.zone_map.blooms()
+    if blooms:
+        data = {
+            'block_size': BLOCK_SIZE,
+            'row_count': table.row_count,
+            'columns': {column_name: column_blooms.to_list() for column_name, column_blooms in blooms.items()},
+        }
+        _write_atomically(bloom_path(directory, table.name), [marshal.dumps(data, MARSHAL_VERSION)])
+    header = {
+        'version': FORMAT_VERSION,
+        'name': table.name,
+        'row_count': table.row_count,
+        'dead_row_count': table.dead_row_count,
+        'columns': [[column_name, table.column_types[column_name]] for column_name in table.column_names],
+        'zone_map': {'block_size': BLOCK_SIZE, 'columns': table.zone_map.to_dict()},
+        'bloom_filters': table.bloom_filters,
+    }
+    _write_atomically(table_header_path(directory, table.name), [json.dumps(header).encode('utf-8')])
+
+
+def _map_file(path):
+    """Map a whole file read-only; empty files map to an empty bytes object"""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MappedTextColumn:
+    """Read-only TEXT column backed by an offsets segment and a string heap"""
+
+    def __init__(self, offsets, heap):
+        """
+        Args:
+            offsets: memoryview of uint64 end offsets, one per row
+            heap: memoryview of the UTF-8 string heap
+        """
+        self.offsets = offsets
+        self.heap = heap
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, row_id):
+        if isinstance(row_id, slice):
+            return [self[i] for i in range(*row_id.indices(len(self)))]
+        if row_id < 0:
+            row_id += len(self)
+        start = self.offsets[row_id - 1] if row_id > 0 else 0
+        return str(self.heap[start:self.offsets[row_id]], 'utf-8')
+
+    def __iter__(self):
+        heap = self.heap
+        start = 0
+        for end in self.offsets:
+            yield str(heap[start:end], 'utf-8')
+            start = end
+
+
+class MappedTable(Table):
+    """
+    A table whose columns are memory-mapped segment files
+
+    Reads go through memoryview without copying. DELETE only touches the
+    in-memory deletion map; the first INSERT, UPDATE or compaction copies the
+    columns into ordinary in-memory buffers. Call save_table() to write the
+    changes back.
+    """
+
+    def __init__(self, directory, name, buffer_pool=None):
+        """
+        Args:
+            directory: Directory written by save_table
+            name: Table name
+            buffer_pool: BufferPool for decoded segments of compressed
+                columns; the process-wide default pool if omitted
+        """
+        with open(table_header_path(directory, name), 'rb') as file:
+            header = json.loads(file.read().decode('utf-8'))
+        if header.get('version') != FORMAT_VERSION:
+            raise StorageError(f"Unsupported table format version {header.get('version')} for '{name}'")
+
+        columns = [(column_name, data_type) for column_name, data_type in header['columns']]
+        super().__init__(header['name'], columns, header.get('bloom_filters'))
+        self.directory = directory
+        self.buffer_pool = buffer_pool if buffer_pool is not None else default_buffer_pool()
+        self.row_count = header['row_count']
+        self.dead_row_count = header.get('dead_row_count', 0)
+        if self.dead_row_count:
+            with open(deleted_path(directory, name), 'rb') as file:
+                self.deleted = bytearray(file.read(self.row_count))
+            if len(self.deleted) != self.row_count:
+                raise StorageError(f"Deletion map of '{name}' is truncated")
+        else:
+            self.deleted = bytearray(self.row_count)
+        self.mapped = True
+        self._maps = []
+        self._views = []
+
+        for column_name, data_type in columns:
+            self.columns[column_name] = self._open_column(column_name, data_type)
+
+        # Headers written before zone maps existed (or with another block
+        # size) get theirs rebuilt from the mapped columns
+        zone_map = header.get('zone_map')
+        if zone_map is not None and zone_map.get('block_size') == BLOCK_SIZE:
+            self.zone_map = ZoneMap.from_dict(zone_map['columns'])
+            if self.bloom_filters:
+                self._load_blooms()
+        else:
+            self.zone_map = ZoneMap.build(self)
+
+    def _load_blooms(self):
+        # Bloom filters saved for another block size or row count, or lost,
+        # are rebuilt from the mapped columns
+        try:
+            with open(bloom_path(self.directory, self.name), 'rb') as file:
+                data = marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            data = None
+        if (data is None or data.get('block_size') != BLOCK_SIZE or data.get('row_count') != self.row_count
+                or set(data.get('columns', ())) != set(self.bloom_filters)):
+            self.zone_map.build_blooms(self)
+            return
+        for column_name, column_blooms in data['columns'].items():
+            self.zone_map.columns[column_name].bloom = ColumnBlooms.from_list(column_blooms, BLOCK_SIZE)
+
+    def _view(self, path):
+        mapping = _map_file(path)
+        self._maps.append(mapping)
+        view = memoryview(mapping)
+        self._views.append(view)
+        return view
+
+    def _open_column(self, column_name, data_type):
+        view = self._view(column_path(self.directory, self.name, column_name))
+        if len(view) < COLUMN_HEADER.size:
+            raise StorageError(f"Column segment '{self.name}.{column_name}' is truncated")
+        magic, version, type_code, byte_order, row_count = COLUMN_HEADER.unpack_from(view)
+        segmented = version == SEGMENTED_COLUMN_VERSION and data_type != 'TEXT'
+        if magic != COLUMN_MAGIC or (version != FORMAT_VERSION and not segmented):
+            raise StorageError(f"Column segment '{self.name}.{column_name}' has an invalid header")
+        if TYPE_NAMES.get(type_code) != data_type:
+            raise StorageError(f"Column segment '{self.name}.{column_name}' does not match the schema type")
+        if row_count < self.row_count:
+            raise StorageError(f"Column segment '{self.name}.{column_name}' is shorter than the table")
+        if segmented:
+            return self._open_segmented_column(column_name, data_type, view, byte_order)
+
+        typecode = OFFSET_TYPECODE if data_type == 'TEXT' else COLUMN_TYPECODES[data_type]
+        width = struct.calcsize(typecode)
+        data = view[COLUMN_HEADER.size:COLUMN_HEADER.size + self.row_count * width]
+        self._views.append(data)
+
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            # Foreign byte order: fall back to a swapped in-memory copy
+            values = array(typecode)
+            values.frombytes(data)
+            values.byteswap()
+        else:
+            values = data.cast(typecode)
+            self._views.append(values)
+
+        if data_type == 'TEXT':
+            return MappedTextColumn(values, self._view(heap_path(self.directory, self.name, column_name)))
+        return values
+
+    def _open_segmented_column(self, column_name, data_type, view, byte_order):
+        position = COLUMN_HEADER.size
+        (segment_count,) = SEGMENT_COUNT.unpack_from(view, position)
+        position += SEGMENT_COUNT.size
+        segments = []
+        remaining = self.row_count
+        for _ in range(segment_count):
+            if remaining <= 0:
+                break
+            encoding, width, count, offset, length, base, first = SEGMENT_ENTRY.unpack_from(view, position)
+            position += SEGMENT_ENTRY.size
+            if offset + length > len(view):
+                raise StorageError(f"Column segment '{self.name}.{column_name}' is truncated")
+            payload = view[offset:offset + length]
+            self._views.append(payload)
+            # Rows past the table's row count belong to an unfinished save
+            segments.append((encoding, width, min(count, remaining), base, first, payload))
+            remaining -= count
+        return EncodedColumn(
+            data_type, segments, swap=byte_order != BYTE_ORDERS[sys.byteorder], pool=self.buffer_pool
+        )
+
+    def encoding(self, column_name):
+        column = self.columns[column_name]
+        if isinstance(column, EncodedColumn):
+            return column.encoding_name()
+        return super().encoding(column_name)
+
+    def _ring_columns(self, ranges):
+        # A scan that would fill a large part of the pool reads the
+        # compressed columns through a ring of its own.
+        # Returns (columns to read, ring), or (None, None) for a plain scan.
+        encoded = [
+            column_name for column_name, column in self.columns.items()
+            if isinstance(column, EncodedColumn)
+        ]
+        rows = sum(end - start for start, end in ranges)
+        if not encoded or not self.buffer_pool.wants_ring(rows * 8 * len(encoded)):
+            return None, None
+        ring = self.buffer_pool.scan_ring()
+        columns = dict(self.columns)
+        for column_name in encoded:
+            columns[column_name] = columns[column_name].scanning(ring)
+        return columns, ring
+
+    def scan_ranges(self, ranges, encoded_filters=(), columns=None):
+        if columns is not None:
+            yield from super().scan_ranges(ranges, encoded_filters, columns)
+            return
+        columns, ring = self._ring_columns(ranges)
+        try:
+            yield from super().scan_ranges(ranges, encoded_filters, columns)
+        finally:
+            if ring is not None:
+                ring.close()
+
+    def column_batches(self, column_names, ranges, encoded_filters=(), columns=None):
+        if columns is not None:
+            yield from super().column_batches(column_names, ranges, encoded_filters, columns)
+            return
+        columns, ring = self._ring_columns(ranges)
+        try:
+            yield from super().column_batches(column_names, ranges, encoded_filters, columns)
+        finally:
+            if ring is not None:
+                ring.close()
+
+    def scan_columns(self, column_names, ranges, encoded_filters=(), predicate=None,
+                     predicate_columns=(), columns=None, with_row_ids=False, on_rows=None):
+        if columns is None:
+            columns, ring = self._ring_columns(ranges)
+        else:
+            ring = None
+        try:
+            yield from super().scan_columns(
+                column_names, ranges, encoded_filters, predicate, predicate_columns, columns, with_row_ids,
+                on_rows
+            )
+        finally:
+            if ring is not None:
+                ring.close()
+
+    def materialize(self):
+        """Copy every mapped column into writable in-memory buffers"""
+        if not self.mapped:
+            return
+        for column_name in self.column_names:
+            self.columns[column_name] = build_table_column(
+                self.column_types[column_name], self.columns[column_name]
+            )
+        self.mapped = False
+        if len(self.snapshots):
+            # Snapshots still read the mapped columns; the maps are closed
+            # when the last view over them is released
+            self._views = []
+            self._maps = []
+        else:
+            self.close()
+
+    def release(self):
+        """Give up the memory maps of a table that was dropped from its catalog"""
+        with self.lock:
+            self.released = True
+            if len(self.snapshots):
+                # Snapshots still read the mapped columns; the maps are closed
+                # when the last view over them is released
+                self._views = []
+                self._maps = []
+            else:
+                self.close()
+
+    def close(self):
+        """Release the memory maps (the table must be materialized or no longer used)"""
+        for column in self.columns.values():
+            if isinstance(column, EncodedColumn):
+                column.discard_pages()
+        for view in reversed(self._views):
+            view.release()
+        for mapping in self._maps:
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+        self._views = []
+        self._maps = []
+
+    def append_row(self, values):
+        with self.lock:
+            self.materialize()
+            super().append_row(values)
+
+    def append_columns(self, column_batches):
+        with self.lock:
+            self.materialize()
+            super().append_columns(column_batches)
+
+    def change_rows(self, updates, row_ids):
+        with self.lock:
+            if updates:
+                self.materialize()
+            super().change_rows(updates, row_ids)
+
+    def compact(self):
+        with self.lock:
+            if self.dead_row_count:
+                self.materialize()
+            super().compact()
+
+
+def open_table(directory, name, buffer_pool=None):
+    """Open a persisted table without reading its data"""
+    return MappedTable(directory, name, buffer_pool)
+
+
+def save_catalog(catalog, directory, compression=True):
+    """Persist every table of a catalog"""
+    for name in catalog.table_names():
+        save_table(catalog.get_table(name), directory, compression)
+
+
+def open_catalog(directory, catalog=None, buffer_pool=None):
+    """
+    Open every table persisted in a directory
+
+    Args:
+        directory: Directory written by save_catalog
+        catalog: Catalog to register the tables in; a new one is created if omitted
+        buffer_pool: BufferPool shared by the tables (see MappedTable)
+
+    Returns:
+        The Catalog
+    """
+    catalog = catalog if catalog is not None else Catalog()
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.tbl'):
+            table = open_table(directory, file_name[:-len('.tbl')], buffer_pool)
+            catalog.tables[table.name] = table
+    return catalog
+
+
+def read_snapshot_manifest(directory):
+    """
+    Read the manifest of a snapshot directory
+
+    Returns:
+        The manifest dict, or None if the directory holds no snapshot
+
+    Raises:
+        StorageError: if the manifest is of an unknown version
+    """
+    try:
+        with open(os.path.join(directory, SNAPSHOT_MANIFEST), 'rb') as file:
+            manifest = json.loads(file.read().decode('utf-8'))
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') not in (1, SNAPSHOT_VERSION):
+        raise StorageError(f"Unsupported snapshot version {manifest.get('version')} in '{directory}'")
+    return manifest
+
+
+def _snapshot_data_directory(directory, manifest):
+    # Version 1 snapshots kept the table files next to the manifest
+    return os.path.join(directory, manifest['data']) if 'data' in manifest else directory
+
+
+def save_snapshot(catalog, directory, compression=True, workers=DEFAULT_SNAPSHOT_WORKERS, metadata=None):
+    """
+    Write a consistent copy of a whole catalog
+
+    Every table is locked against writers (readers are not blocked) while
+    the snapshot is written, several tables at a time. The files go to a
+    new data-<generation> subdirectory and snapshot.json is replaced last,
+    so an interrupted save leaves the previous snapshot loadable; the
+    previous generation is removed once the new manifest is in place.
+
+    Args:
+        catalog: Catalog to save
+        directory: Snapshot directory, created if needed
+        compression: Encode INT/FLOAT segments (see write_column)
+        workers: Tables written at the same time
+        metadata: Optional dict of extra manifest entries
+
+    Returns:
+        Number of tables saved
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous = read_snapshot_manifest(directory)
+    generation = previous.get('generation', 0) + 1 if previous is not None else 1
+    data_name = f"{SNAPSHOT_DATA_PREFIX}{generation:06d}"
+    data_directory = os.path.join(directory, data_name)
+    # Left over from a save that was interrupted
+    shutil.rmtree(data_directory, ignore_errors=True)
+
+    with catalog.writers_locked():
+        names = catalog.table_names()
+        tables = [catalog.get_table(name) for name in names]
+        os.makedirs(data_directory)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(lambda table: save_table(table, data_directory, compression), tables))
+        manifest = dict(metadata or {})
+        manifest.update({'version': SNAPSHOT_VERSION, 'generation': generation, 'data': data_name, 'tables': names})
+        _write_atomically(os.path.join(directory, SNAPSHOT_MANIFEST), [json.dumps(manifest).encode('utf-8')])
+
+    # Tables still mapped from older generations keep reading the unlinked files
+    for entry in os.listdir(directory):
+        if entry.startswith(SNAPSHOT_DATA_PREFIX) and entry != data_name:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return len(tables)
+
+
+def load_snapshot(directory, catalog=None, buffer_pool=None, manifest=None):
+    """
+    Replace the contents of a catalog with a snapshot
+
+    Tables are memory-mapped (see MappedTable): nothing is read row by row,
+    and column data is paged in as scans touch it. Collected statistics are
+    dropped. The swap waits for running writers; the replaced tables'
+    memory maps are released once no snapshot reads them any more.
+
+    Args:
+        directory: Directory written by save_snapshot
+        catalog: Catalog to restore into; a new one is created if omitted
+        buffer_pool: BufferPool shared by the tables
+        manifest: The directory's manifest, if the caller already read it
+            (see read_snapshot_manifest)
+
+    Returns:
+        The Catalog
+
+    Raises:
+        StorageError: if the directory holds no snapshot
+    """
+    if manifest is None:
+        manifest = read_snapshot_manifest(directory)
+    if manifest is None:
+        raise StorageError(f"No snapshot in '{directory}'")
+    data_directory = _snapshot_data_directory(directory, manifest)
+    tables = {name: open_table(data_directory, name, buffer_pool) for name in manifest['tables']}
+
+    catalog = catalog if catalog is not None else Catalog()
+    with catalog.writers_locked():
+        replaced = list(catalog.tables.values())
+        catalog.tables = tables
+        catalog.statistics = {}
+        if catalog.result_cache is not None:
+            catalog.result_cache.clear()
+    for table in replaced:
+        if isinstance(table, MappedTable):
+            table.release()
+    return catalog
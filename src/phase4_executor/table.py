@@ -0,0 +1,656 @@
+"""
+Column-Oriented Table Storage
+Every column of a table is kept in its own typed buffer
+
+Readers work on snapshots (see Table.snapshot): read-only views sharing the
+table's buffers. A writer only appends past a snapshot's row count, and
+copies a buffer before changing it in place while a snapshot still uses it,
+so readers see a consistent table without ever blocking the writer.
+"""
+
+import copy
+import threading
+import time
+import weakref
+from array import array
+from itertools import compress, count, islice, repeat
+from operator import itemgetter
+
+from .dictionary import DictionaryColumn, and_masks
+from .index import INDEX_KINDS, build_index
+from .zone_map import BLOCK_SIZE, ZoneMap
+
+
+# A table is compacted once this fraction of its row slots are tombstones
+COMPACTION_THRESHOLD = 0.3
+
+# Maps deletion flags (1 = dead) to liveness flags (1 = live) for compress()
+INVERT_FLAGS = bytes([1, 0]) + bytes(254)
+
+# Source of Table.table_id
+_table_ids = count(1)
+
+
+def new_table_id():
+    """A table_id no table has had yet"""
+    return next(_table_ids)
+
+# Data types produced by parse_data_type and their array typecodes.
+# TEXT columns have no fixed width and are kept in Python lists.
+COLUMN_TYPECODES = {
+    'INT': 'q',
+    'FLOAT': 'd',
+    'TEXT': None,
+}
+
+
+def new_column_buffer(data_type):
+    """
+    Create an empty buffer for a column of the given data type
+
+    Args:
+        data_type: One of 'INT', 'FLOAT', 'TEXT'
+
+    Returns:
+        array.array for fixed-width types, list for TEXT
+    """
+    typecode = COLUMN_TYPECODES[data_type]
+    if typecode is None:
+        return []
+    return array(typecode)
+
+
+def new_table_column(data_type):
+    """
+    Create the storage buffer a Table uses for a column
+
+    TEXT columns start out dictionary-encoded; other types use
+    new_column_buffer().
+    """
+    if data_type == 'TEXT':
+        return DictionaryColumn()
+    return new_column_buffer(data_type)
+
+
+def build_table_column(data_type, values):
+    """
+    Create a table column holding the given values
+
+    TEXT values are dictionary-encoded a block at a time; as soon as the
+    dictionary turns out too large the rest is stored as a plain list.
+    """
+    buffer = new_table_column(data_type)
+    if not isinstance(buffer, DictionaryColumn):
+        buffer.extend(values)
+        return buffer
+    values = iter(values)
+    while True:
+        chunk = list(islice(values, BLOCK_SIZE))
+        if not chunk:
+            return buffer
+        buffer.extend(chunk)
+        if buffer.is_high_cardinality():
+            plain = list(buffer)
+            plain.extend(values)
+            return plain
+
+
+def _fetch(column, start, end, row_ids):
+    # Values of a column at some row ids; a whole block (a range) is sliced
+    if isinstance(row_ids, range):
+        return column[start:end]
+    if len(row_ids) == 1:
+        return [column[row_ids[0]]]
+    if hasattr(column, 'take'):
+        return column.take(row_ids)
+    return itemgetter(*row_ids)(column)
+
+
+class Table:
+    """
+    An in-memory table stored column by column
+
+    Rows are addressed by their slot (row id) in the column buffers. DELETE
+    only sets a flag in the deletion map, so row ids stay stable until the
+    table is compacted; every scan skips flagged slots.
+    """
+
+    def __init__(self, name, columns, bloom_filters=None):
+        """
+        Initialize an empty table
+
+        Args:
+            name: Table name
+            columns: List of (column_name, data_type) pairs in declaration order
+            bloom_filters: Dict of column name -> false positive rate for the
+                columns declared with BLOOM
+        """
+        self.name = name
+        # Different for every table ever created, even under the same name
+        # (CREATE after LOAD SNAPSHOT); snapshots share their table's
+        self.table_id = new_table_id()
+        self.column_names = [column_name for column_name, _ in columns]
+        self.column_types = dict(columns)
+        self.columns = {
+            column_name: new_table_column(data_type)
+            for column_name, data_type in columns
+        }
+        # Number of row slots, including deleted ones
+        self.row_count = 0
+        # One flag byte per slot, 1 marks a deleted row
+        self.deleted = bytearray()
+        self.dead_row_count = 0
+        self.compaction_threshold = COMPACTION_THRESHOLD
+        self.compaction_count = 0
+        self.compaction_seconds = 0.0
+        # Bumped by every write so cached copies of the data can be invalidated
+        self.version = 0
+        # Per-block min/max/null counts (and Bloom filters) used to skip
+        # blocks during scans
+        self.bloom_filters = dict(bloom_filters or {})
+        self.zone_map = ZoneMap(self.column_names, self.bloom_filters)
+        # Column name -> HashIndex or OrderedIndex (see index.py). Replaced,
+        # never changed, when an index is added or dropped so snapshots keep
+        # the set of indexes they started with
+        self.indexes = {}
+        # Rows appended or updated, which every index has to follow
+        self.rows_written = 0
+        # Held while a statement changes the table so a snapshot never sees
+        # half of a write
+        self.lock = threading.RLock()
+        # Held for the whole of every write statement on the table: one
+        # writer per table at a time, while readers never take it
+        self.write_lock = threading.RLock()
+        # Live read-only views created by snapshot()
+        self.snapshots = weakref.WeakSet()
+        # Set once the catalog has dropped the table and its storage was
+        # given up; it must not be read from again
+        self.released = False
+
+    @property
+    def live_row_count(self):
+        """Number of rows that have not been deleted"""
+        return self.row_count - self.dead_row_count
+
+    def has_column(self, column_name):
+        """Check whether the table defines a column"""
+        return column_name in self.column_types
+
+    def column_index(self, column_name):
+        """Get the position of a column in the row tuple"""
+        return self.column_names.index(column_name)
+
+    def column_positions(self):
+        """Map every column name to its position in the row tuple"""
+        return {column_name: i for i, column_name in enumerate(self.column_names)}
+
+    # ==================== Snapshots ====================
+
+    def snapshot(self):
+        """
+        Take a read-only view of the table as of now
+
+        The view shares the column buffers, deletion map and zone map of the
+        table; later writes do not show through it. It must not be written.
+
+        Returns:
+            Table (of the same class) frozen at the current version
+        """
+        with self.lock:
+            view = copy.copy(self)
+            view.columns = dict(self.columns)
+            self.snapshots.add(view)
+        return view
+
+    def _own_deleted(self):
+        # Copy the deletion map before flagging rows if a snapshot reads it
+        if any(view.deleted is self.deleted for view in self.snapshots):
+            self.deleted = bytearray(self.deleted)
+
+    def _own_column(self, column_name):
+        # Copy a column before overwriting values if a snapshot reads it
+        column = self.columns[column_name]
+        if any(view.columns.get(column_name) is column for view in self.snapshots):
+            self.columns[column_name] = copy.copy(column) if isinstance(column, array) else list(column)
+
+    def _bounded(self, column):
+        # Buffers shared with the live table may grow past a snapshot while
+        # a lazy scan is still reading them
+        return islice(column, self.row_count)
+
+    # ==================== Reading ====================
+
+    def live_mask(self):
+        """Liveness flags (1 = live) for every slot, for itertools.compress"""
+        deleted = self.deleted if len(self.deleted) == self.row_count else self.deleted[:self.row_count]
+        return deleted.translate(INVERT_FLAGS)
+
+    def _zip_columns(self):
+        # zip() stops at the shortest input, so bounding the first column
+        # bounds every row
+        columns = [self.columns[column_name] for column_name in self.column_names]
+        if columns:
+            columns[0] = self._bounded(columns[0])
+        return zip(*columns)
+
+    def rows(self):
+        """Iterate over live rows as tuples in column order"""
+        rows = self._zip_columns()
+        if not self.dead_row_count:
+            return rows
+        return compress(rows, self.live_mask())
+
+    def scan(self):
+        """Iterate over (row_id, row) pairs for live rows"""
+        rows = enumerate(self._zip_columns())
+        if not self.dead_row_count:
+            return rows
+        return compress(rows, self.live_mask())
+
+    def scan_ranges(self, ranges, encoded_filters=(), columns=None):
+        """
+        Iterate over (row_id, row) pairs for live rows inside row id ranges
+
+        Args:
+            ranges: Ascending, non-overlapping (start, end) pairs
+            encoded_filters: (column_name, op, value, ...) comparisons
+                evaluated on encoded column data (see can_filter_encoded);
+                rows failing any of them are skipped
+            columns: Mapping of column name to the column object to read;
+                self.columns if omitted
+        """
+        by_name = columns if columns is not None else self.columns
+        columns = [by_name[column_name] for column_name in self.column_names]
+        if encoded_filters:
+            yield from self._scan_selected(by_name, columns, ranges, encoded_filters)
+            return
+        for start, end in ranges:
+            rows = enumerate(zip(*(column[start:end] for column in columns)), start)
+            if self.dead_row_count:
+                rows = compress(rows, self.deleted[start:end].translate(INVERT_FLAGS))
+            yield from rows
+
+    def _scan_selected(self, by_name, columns, ranges, encoded_filters):
+        # Evaluate the encoded filters a block at a time and only build the
+        # rows that pass them
+        for range_start, range_end in ranges:
+            for start in range(range_start, range_end, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, range_end)
+                mask = self.deleted[start:end].translate(INVERT_FLAGS) if self.dead_row_count else None
+                for column_name, op, value, *_ in encoded_filters:
+                    matches = by_name[column_name].match_mask(op, value, start, end)
+                    mask = matches if mask is None else and_masks(mask, matches)
+                row_ids = list(compress(range(start, end), mask))
+                if len(row_ids) > 1:
+                    gather = itemgetter(*row_ids)
+                    yield from zip(row_ids, zip(*(
+                        column.take(row_ids) if hasattr(column, 'take') else gather(column)
+                        for column in columns
+                    )))
+                elif row_ids:
+                    row_id = row_ids[0]
+                    yield row_id, tuple(column[row_id] for column in columns)
+
+    def column_batches(self, column_names, ranges, encoded_filters=(), columns=None):
+        """
+        Iterate over live rows inside row id ranges a block at a time, column by column
+
+        Only the requested columns are read, and a block without deleted or
+        filtered-out rows is passed on as plain slices of the buffers.
+
+        Args:
+            column_names: Columns to read
+            ranges, encoded_filters, columns: See scan_ranges
+
+        Yields:
+            (row count, [values of each requested column]) per block
+        """
+        by_name = columns if columns is not None else self.columns
+        selected = [by_name[column_name] for column_name in column_names]
+        for range_start, range_end in ranges:
+            for start in range(range_start, range_end, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, range_end)
+                mask = self.deleted[start:end].translate(INVERT_FLAGS) if self.dead_row_count else None
+                for column_name, op, value, *_ in encoded_filters:
+                    matches = by_name[column_name].match_mask(op, value, start, end)
+                    mask = matches if mask is None else and_masks(mask, matches)
+                if mask is None:
+                    yield end - start, [column[start:end] for column in selected]
+                    continue
+                count = mask.count(1)
+                if count == end - start:
+                    yield count, [column[start:end] for column in selected]
+                elif count:
+                    yield count, [list(compress(column[start:end], mask)) for column in selected]
+
+    def scan_columns(self, column_names, ranges, encoded_filters=(), predicate=None,
+                     predicate_columns=(), columns=None, with_row_ids=False, on_rows=None):
+        """
+        Iterate over live rows inside row id ranges, reading only some columns
+
+        Rows are filtered before their values are fetched (late
+        materialization): the deletion map and encoded filters give each
+        block's candidate row ids, the predicate is evaluated on the values
+        of predicate_columns for those rows only, and the requested columns
+        are then fetched for the row ids that passed.
+
+        Args:
+            column_names: Columns of the rows produced
+            ranges, encoded_filters, columns: See scan_ranges
+            predicate: Function of a tuple of predicate_columns values
+                returning whether the row is kept; None keeps every candidate
+            predicate_columns: Columns the predicate reads
+            with_row_ids: Yield (row_id, row) pairs instead of rows
+            on_rows: Function called with the number of rows of each block
+                that passed the filters
+
+        Yields:
+            Tuples of the values of column_names (see with_row_ids)
+        """
+        by_name = columns if columns is not None else self.columns
+        for range_start, range_end in ranges:
+            for start in range(range_start, range_end, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, range_end)
+                mask = self.deleted[start:end].translate(INVERT_FLAGS) if self.dead_row_count else None
+                for column_name, op, value, *_ in encoded_filters:
+                    matches = by_name[column_name].match_mask(op, value, start, end)
+                    mask = matches if mask is None else and_masks(mask, matches)
+                row_ids = range(start, end)
+                if mask is not None and mask.count(1) != end - start:
+                    row_ids = list(compress(row_ids, mask))
+                    if not row_ids:
+                        continue
+
+                fetched = {}
+                if predicate is not None:
+                    if predicate_columns:
+                        for column_name in predicate_columns:
+                            fetched[column_name] = _fetch(by_name[column_name], start, end, row_ids)
+                        keep = list(map(predicate, zip(*(fetched[name] for name in predicate_columns))))
+                    else:
+                        keep = [predicate(())] * len(row_ids)
+                    if not all(keep):
+                        row_ids = list(compress(row_ids, keep))
+                        if not row_ids:
+                            continue
+                        fetched = {name: list(compress(values, keep)) for name, values in fetched.items()}
+                if on_rows is not None:
+                    on_rows(len(row_ids))
+
+                values = [
+                    fetched[name] if name in fetched else _fetch(by_name[name], start, end, row_ids)
+                    for name in column_names
+                ]
+                rows = zip(*values) if values else repeat((), len(row_ids))
+                if with_row_ids:
+                    yield from zip(row_ids, rows)
+                else:
+                    yield from rows
+
+    def can_filter_encoded(self, column_name, op, value):
+        """
+        Whether `column op value` can be answered on the column's encoded data
+
+        Dictionary columns compare codes; compressed mapped columns compare
+        run values and frame-of-reference codes. Both provide match_mask().
+        """
+        column = self.columns.get(column_name)
+        return hasattr(column, 'match_mask') and column.can_match(op, value)
+
+    def live_values(self, column_name):
+        """Iterate over the values of one column, skipping deleted rows"""
+        values = self._bounded(self.columns[column_name])
+        if not self.dead_row_count:
+            return iter(values)
+        return compress(values, self.live_mask())
+
+    def is_deleted(self, row_id):
+        """Check whether a row slot holds a deleted row"""
+        return bool(self.deleted[row_id])
+
+    def get_value(self, column_name, row_id):
+        """Read one cell"""
+        return self.columns[column_name][row_id]
+
+    def get_row(self, row_id):
+        """Read one row as a tuple in column order"""
+        return tuple(self.columns[column_name][row_id] for column_name in self.column_names)
+
+    # ==================== Writing ====================
+
+    def append_row(self, values):
+        """
+        Append one row
+
+        A value its column cannot hold (say text in an INT column) fails the
+        whole row and leaves every column as it was.
+
+        Args:
+            values: Sequence of already-converted values in column order
+        """
+        with self.lock:
+            try:
+                for column_name, value in zip(self.column_names, values):
+                    self.columns[column_name].append(value)
+            except BaseException:
+                self._truncate_columns()
+                raise
+            self.zone_map.add_row(self.row_count, self.column_names, values)
+            if self.indexes:
+                self._index_row(self.row_count, values)
+            self.deleted.append(0)
+            self.row_count += 1
+            self.rows_written += 1
+            self.version += 1
+            if self.row_count % BLOCK_SIZE == 0:
+                self.check_encodings()
+
+    def append_columns(self, column_batches):
+        """
+        Append a batch of rows given column by column
+
+        Like append_row(), a value that does not fit fails the whole batch.
+
+        Args:
+            column_batches: One sequence of converted values per column, in column order
+        """
+        count = len(column_batches[0]) if column_batches else 0
+        with self.lock:
+            try:
+                for column_name, values in zip(self.column_names, column_batches):
+                    self.columns[column_name].extend(values)
+            except BaseException:
+                self._truncate_columns()
+                raise
+            self.zone_map.add_columns(self.row_count, self.column_names, column_batches)
+            for column_name, index in self.indexes.items():
+                index.add_range(self.row_count, column_batches[self.column_names.index(column_name)])
+            self.deleted.extend(bytes(count))
+            self.row_count += count
+            self.rows_written += count
+            self.version += 1
+            self.check_encodings()
+
+    def _truncate_columns(self):
+        # Undo a partly applied append: a value that did not fit one column
+        # must not leave the others a row ahead
+        for column in self.columns.values():
+            if len(column) > self.row_count:
+                del column[self.row_count:]
+
+    def update_rows(self, updates):
+        """
+        Apply the new values computed by one UPDATE statement
+
+        Fixed-width columns are overwritten in place (widening the block's
+        zone map), after copying them if a snapshot still reads them. A row
+        that gets a new TEXT value is deleted and re-appended with its
+        changes, so its row id changes.
+
+        Args:
+            updates: List of (row_id, {column_name: value}) pairs
+        """
+        self.change_rows(updates, ())
+
+    def delete_rows(self, row_ids):
+        """
+        Delete rows by flagging them in the deletion map
+
+        Args:
+            row_ids: Collection of row ids to delete
+        """
+        self.change_rows((), row_ids)
+
+    def change_rows(self, updates, row_ids):
+        """
+        Apply updates (see update_rows), then delete rows, compacting at most
+        once afterwards
+
+        Every row id refers to the table as it was before the call, so one
+        committed transaction's updates and deletions apply together.
+
+        Args:
+            updates: List of (row_id, {column_name: value}) pairs
+            row_ids: Collection of row ids to delete
+        """
+        if not updates and not row_ids:
+            return
+        with self.lock:
+            self._own_deleted()
+            owned = set()
+            for row_id, changes in updates:
+                if any(self.column_types[column_name] == 'TEXT' for column_name in changes):
+                    row = [
+                        changes[column_name] if column_name in changes else self.columns[column_name][row_id]
+                        for column_name in self.column_names
+                    ]
+                    self._mark_deleted(row_id)
+                    self.append_row(row)
+                else:
+                    for column_name, value in changes.items():
+                        if column_name not in owned:
+                            self._own_column(column_name)
+                            owned.add(column_name)
+                        self.columns[column_name][row_id] = value
+                        self.zone_map.add_value(row_id, column_name, value)
+                        index = self.indexes.get(column_name)
+                        if index is not None:
+                            index.add(row_id, value)
+            self.rows_written += len(updates)
+            for row_id in row_ids:
+                self._mark_deleted(row_id)
+            self.version += 1
+            self.maybe_compact()
+
+    def _index_row(self, row_id, values):
+        for column_name, value in zip(self.column_names, values):
+            index = self.indexes.get(column_name)
+            if index is not None:
+                index.add(row_id, value)
+
+    def _mark_deleted(self, row_id):
+        if not self.deleted[row_id]:
+            self.deleted[row_id] = 1
+            self.dead_row_count += 1
+
+    # ==================== Encoding ====================
+
+    def check_encodings(self):
+        """Turn dictionary columns that have too many distinct values into plain lists"""
+        for column_name, column in self.columns.items():
+            if isinstance(column, DictionaryColumn) and column.is_high_cardinality():
+                self.columns[column_name] = list(column)
+
+    def encoding(self, column_name):
+        """Name of the in-memory encoding of a column"""
+        column = self.columns[column_name]
+        if isinstance(column, DictionaryColumn):
+            return 'dictionary'
+        return 'plain' if isinstance(column, (array, list)) else 'mapped'
+
+    # ==================== Indexes ====================
+
+    def create_index(self, column_name, kind):
+        """
+        Build an index over one column and start maintaining it
+
+        The index is built while the table's write_lock keeps writers out;
+        readers go on meanwhile and start using it once it is in place.
+
+        Args:
+            column_name: Indexed column
+            kind: 'hash' (equality and IN) or 'ordered' (also ranges)
+
+        Returns:
+            The new index
+        """
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Unknown index kind '{kind}'")
+        with self.write_lock:
+            index = build_index(self, column_name, kind)
+            with self.lock:
+                self.indexes = {**self.indexes, column_name: index}
+        return index
+
+    def drop_index(self, column_name):
+        """Stop maintaining the index of a column, if it has one"""
+        with self.write_lock, self.lock:
+            self.indexes = {name: index for name, index in self.indexes.items() if name != column_name}
+
+    def index_bytes(self):
+        """Approximate bytes held by the table's indexes"""
+        return sum(index.memory_bytes for index in self.indexes.values())
+
+    # ==================== Compaction ====================
+
+    def dead_row_ratio(self):
+        """Fraction of row slots holding deleted rows"""
+        return self.dead_row_count / self.row_count if self.row_count else 0.0
+
+    def maybe_compact(self):
+        """
+        Compact if the dead-row ratio has crossed the threshold
+
+        Returns:
+            True if the table was compacted
+        """
+        if self.dead_row_count and self.dead_row_ratio() >= self.compaction_threshold:
+            self.compact()
+            return True
+        return False
+
+    def compact(self):
+        """
+        Rewrite every column without its deleted rows; row ids are renumbered
+
+        New buffers replace the old ones, so snapshots keep reading the old
+        versions, which are freed once the last of them is released.
+        """
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        if not self.dead_row_count:
+            return
+        start = time.perf_counter()
+        mask = self.live_mask()
+        for column_name in self.column_names:
+            column = self.columns[column_name]
+            # Columns that fell back to plain lists stay plain
+            if isinstance(column, list):
+                self.columns[column_name] = list(compress(column, mask))
+            else:
+                self.columns[column_name] = build_table_column(
+                    self.column_types[column_name], compress(column, mask)
+                )
+        self.row_count -= self.dead_row_count
+        self.deleted = bytearray(self.row_count)
+        self.dead_row_count = 0
+        self.zone_map = ZoneMap.build(self)
+        self.indexes = {
+            column_name: build_index(self, column_name, index.kind) for column_name, index in self.indexes.items()
+        }
+        self.check_encodings()
+        self.version += 1
+        self.compaction_count += 1
+        self.compaction_seconds += time.perf_counter() - start
@@ -0,0 +1,235 @@
+"""
+Transactions
+Between BEGIN and COMMIT a session buffers its writes instead of applying
+them. INSERT and COPY rows are kept per table in columnar form, one typed
+buffer per column, so COMMIT appends each table's rows with a single
+append_columns() call (one zone map, dictionary and Bloom filter update per
+batch). UPDATE and DELETE are kept as the new values and the deletions of
+the table's rows, and applied together with one change_rows() call. The
+whole transaction is logged as one write-ahead log record, synced once.
+ROLLBACK drops the buffers: nothing was applied, so there is nothing to undo.
+
+Statements inside a transaction read committed data with the transaction's
+own writes applied on top (TableWrites.view). The first UPDATE or DELETE
+that changes committed rows of a table pins the snapshot it read: later
+statements in the transaction read that table as of the snapshot, and COMMIT
+fails if another session has written the table since (first committer
+wins). Tables only inserted into never conflict.
+
+CREATE TABLE and LOAD SNAPSHOT are not allowed inside a transaction.
+"""
+
+from itertools import compress
+
+from .table import INVERT_FLAGS, Table, new_column_buffer, new_table_id
+
+
+class TableWrites:
+    """
+    Writes a transaction makes to one table
+
+    Has the name, column_names, column_types and append_columns() of a
+    Table, so bulk_load.copy_from_csv can load into it.
+    """
+
+    def __init__(self, table):
+        """
+        Args:
+            table: Table the writes are for
+        """
+        self.table = table
+        self.name = table.name
+        self.column_names = table.column_names
+        self.column_types = table.column_types
+        # Inserted rows, column by column; rows deleted again are flagged
+        # in `dropped` and left out at COMMIT
+        self.columns = [new_column_buffer(table.column_types[column_name]) for column_name in table.column_names]
+        self.row_count = 0
+        self.dropped = bytearray()
+        self.dropped_count = 0
+        # Committed rows changed: row id -> {column: value}, and row ids deleted
+        self.updates = {}
+        self.deleted = set()
+        # Snapshot the committed row ids refer to, pinned by the first of them
+        self.base = None
+        # Bumped by every write, so a cached view knows it is out of date
+        self.change_count = 0
+        self._view = None
+        self._view_key = None
+        # Snapshot the last view was built on
+        self._view_base = None
+
+    @property
+    def inserted_count(self):
+        """Inserted rows that are still to be committed"""
+        return self.row_count - self.dropped_count
+
+    @property
+    def changed_count(self):
+        """Rows inserted, updated or deleted"""
+        return self.inserted_count + len(self.updates) + len(self.deleted)
+
+    # ==================== Inserting ====================
+
+    def append_row(self, values):
+        """Buffer one row of converted values in column order"""
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.row_count += 1
+        self.dropped.append(0)
+        self.change_count += 1
+
+    def append_columns(self, column_batches):
+        """Buffer a batch of rows given column by column"""
+        count = len(column_batches[0]) if column_batches else 0
+        for column, values in zip(self.columns, column_batches):
+            column.extend(values)
+        self.row_count += count
+        self.dropped.extend(bytes(count))
+        self.change_count += 1
+
+    def inserted_columns(self):
+        """The rows to append at COMMIT, column by column"""
+        if not self.dropped_count:
+            return self.columns
+        keep = self.dropped.translate(INVERT_FLAGS)
+        return [list(compress(column, keep)) for column in self.columns]
+
+    # ==================== Reading ====================
+
+    def view(self, snapshot):
+        """
+        A table to read: committed data with this transaction's writes applied
+
+        Row ids of the view below the base snapshot's row count are those of
+        the committed rows; the inserted rows follow. The view is rebuilt
+        only after a write or when committed data changed.
+
+        Args:
+            snapshot: Current snapshot of the table (ignored once a base is pinned)
+
+        Returns:
+            Table that must not be written
+        """
+        if self.base is not None:
+            snapshot = self.base
+        self._view_base = snapshot
+        if not self.changed_count:
+            return snapshot
+        key = (snapshot.table_id, snapshot.version, snapshot.row_count, self.change_count)
+        if self._view_key != key:
+            self._view = self._build_view(snapshot)
+            self._view_key = key
+        return self._view
+
+    def _build_view(self, snapshot):
+        if not self.updates and not self.inserted_count:
+            # Deletions only: the committed columns can be shared
+            view = snapshot.snapshot()
+            # Not the committed table any more (parallel scans cache by id)
+            view.table_id = new_table_id()
+            view.deleted = bytearray(snapshot.deleted[:snapshot.row_count])
+        else:
+            view = Table(self.name, [
+                (column_name, self.column_types[column_name]) for column_name in self.column_names
+            ], snapshot.bloom_filters)
+            # A private table, so compaction must not renumber its rows
+            view.compaction_threshold = float('inf')
+            columns = []
+            for position, column_name in enumerate(self.column_names):
+                values = list(snapshot._bounded(snapshot.columns[column_name]))
+                for row_id, changes in self.updates.items():
+                    if column_name in changes:
+                        values[row_id] = changes[column_name]
+                values.extend(self.columns[position])
+                columns.append(values)
+            view.append_columns(columns)
+            view.deleted = bytearray(snapshot.deleted[:snapshot.row_count]) + self.dropped
+        for row_id in self.deleted:
+            view.deleted[row_id] = 1
+        view.dead_row_count = view.deleted.count(1)
+        return view
+
+    # ==================== Changing ====================
+
+    def update_rows(self, updates):
+        """
+        Buffer the new values an UPDATE computed against the last view()
+
+        Args:
+            updates: List of (row_id, {column_name: value}) pairs, row ids of the view
+        """
+        base = self._view_base
+        for row_id, changes in updates:
+            if row_id >= base.row_count:
+                position = row_id - base.row_count
+                for column_name, value in changes.items():
+                    self.columns[self.column_names.index(column_name)][position] = value
+            else:
+                self._pin(base)
+                self.updates.setdefault(row_id, {}).update(changes)
+        self.change_count += 1
+
+    def delete_rows(self, row_ids):
+        """Buffer the deletion of rows of the last view()"""
+        base = self._view_base
+        for row_id in row_ids:
+            if row_id >= base.row_count:
+                position = row_id - base.row_count
+                if not self.dropped[position]:
+                    self.dropped[position] = 1
+                    self.dropped_count += 1
+            else:
+                self._pin(base)
+                self.updates.pop(row_id, None)
+                self.deleted.add(row_id)
+        self.change_count += 1
+
+    def _pin(self, snapshot):
+        if self.base is None:
+            self.base = snapshot
+
+    def conflicts_with(self, table):
+        """
+        Whether committing would overwrite another session's writes
+
+        Args:
+            table: The table as it is now (locked against writers)
+        """
+        if table is not self.table:
+            return True
+        if self.base is None:
+            return False
+        return table.version != self.base.version
+
+
+class Transaction:
+    """The buffered writes of one open transaction"""
+
+    def __init__(self):
+        # Table name -> TableWrites, in the order the tables were first written
+        self.writes = {}
+
+    def table_writes(self, table):
+        """The TableWrites buffering writes to a table, created on first use"""
+        writes = self.writes.get(table.name)
+        if writes is None:
+            writes = self.writes[table.name] = TableWrites(table)
+        return writes
+
+    def view(self, source, snapshot):
+        """A snapshot of a table with the transaction's writes to it applied (see TableWrites.view)"""
+        writes = self.writes.get(source.name)
+        if writes is None or writes.table is not source:
+            return snapshot
+        return writes.view(snapshot)
+
+    @property
+    def has_writes(self):
+        """Whether any table has a pending change"""
+        return any(writes.changed_count for writes in self.writes.values())
+
+    @property
+    def row_count(self):
+        """Rows inserted, updated or deleted over every table"""
+        return sum(writes.changed_count for writes in self.writes.values())
@@ -0,0 +1,365 @@
+"""
+Write-Ahead Log
+Append-only log of the effects of INSERT, UPDATE, DELETE, CREATE TABLE,
+committed transactions and LOAD SNAPSHOT.
+
+Every record is framed as (length, crc32, payload) where the payload is the
+marshal encoding of a small tuple:
+
+    ('CREATE', table, [[column, type], ...])    [column, type, rate] for BLOOM columns
+    ('INSERT', table, [value, ...])
+    ('UPDATE', table, [(row_id, {column: value, ...}), ...])
+    ('DELETE', table, [row_id, ...])
+    ('APPEND', table, [[value, ...], ...])    one list per column (COPY batches)
+    ('COMMIT', None, [[table, [[value, ...], ...], updates, row_ids], ...])
+        a transaction's writes per table: its UPDATE pairs and deleted row ids
+        (one change_rows), then its new rows (one APPEND)
+    ('LOAD', None, [path, generation])    LOAD SNAPSHOT of that snapshot generation;
+        replay refuses a snapshot that was saved over since
+    ('CHECKPOINT', None, generation)    first record after a checkpoint
+
+fsync calls are batched (group commit): the log is synced once
+group_commit_size records are pending, or group_commit_interval seconds
+after the first pending record, whichever comes first. Records still pending
+when the process crashes are lost; everything synced is replayed on startup.
+
+fsync runs without holding the append lock, so threads writing other tables
+keep appending meanwhile, and one fsync makes every record written before it
+durable: a thread whose record was covered by another thread's sync does not
+sync again.
+
+A database directory (open_database) holds a snapshot (see save_snapshot)
+and the log of the writes made since it was taken. checkpoint() writes a new
+snapshot with every writer locked out, then starts the log over; both carry
+the checkpoint's generation, so a crash between the two steps leaves a log
+that recovery recognises as already contained in the snapshot and skips.
+LOAD SNAPSHOT into such a database is checkpointed at once, so recovery
+never reads the loaded snapshot's directory again.
+"""
+
+import marshal
+import os
+import struct
+import threading
+import time
+import zlib
+
+from .catalog import Catalog
+from .storage import (
+    MARSHAL_VERSION, StorageError, load_snapshot, open_catalog, read_snapshot_manifest, save_snapshot
+)
+
+
+WAL_MAGIC = b'MSQW\x01\x00\x00\x00'
+RECORD_HEADER = struct.Struct('<II')
+
+# Log file of a database directory (see open_database)
+WAL_FILE_NAME = 'wal.log'
+
+
+def encode_record(record):
+    """Frame one record for the log"""
+    payload = marshal.dumps(record, MARSHAL_VERSION)
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def apply_record(catalog, record):
+    """
+    Re-apply one logged effect to a catalog
+
+    Args:
+        catalog: Catalog being rebuilt
+        record: Decoded log record
+    """
+    kind, table_name, payload = record
+    if kind == 'CREATE':
+        catalog.create_table(
+            table_name,
+            [tuple(column[:2]) for column in payload],
+            {column[0]: column[2] for column in payload if len(column) > 2}
+        )
+        return
+    if kind == 'LOAD':
+        path, generation = payload
+        manifest = read_snapshot_manifest(path)
+        if manifest is None or manifest.get('generation') != generation:
+            raise StorageError(
+                f"Snapshot '{path}' is no longer generation {generation}, the one LOAD SNAPSHOT loaded"
+            )
+        load_snapshot(path, catalog, manifest=manifest)
+        return
+    if kind == 'COMMIT':
+        for name, column_batches, updates, row_ids in payload:
+            table = catalog.get_table(name)
+            table.change_rows(updates, row_ids)
+            if column_batches and len(column_batches[0]):
+                table.append_columns(column_batches)
+        return
+
+    table = catalog.get_table(table_name)
+    if kind == 'INSERT':
+        table.append_row(payload)
+    elif kind == 'UPDATE':
+        table.update_rows(payload)
+    elif kind == 'DELETE':
+        table.delete_rows(payload)
+    elif kind == 'APPEND':
+        table.append_columns(payload)
+
+
+class WriteAheadLog:
+    """Append-only statement effect log with group commit"""
+
+    def __init__(self, path, group_commit_size=1, group_commit_interval=0.0, directory=None):
+        """
+        Open (or create) a log file
+
+        Args:
+            path: Log file path
+            group_commit_size: Sync after this many pending records (1 syncs every record)
+            group_commit_interval: Maximum seconds a record may stay unsynced;
+                0 disables the background flusher
+            directory: Database directory the log belongs to (see open_database),
+                None for a log on its own
+        """
+        self.path = path
+        self.directory = directory
+        # Checkpoint the log follows; 0 until the first checkpoint
+        self.generation = 0
+        self.group_commit_size = max(1, group_commit_size)
+        self.group_commit_interval = group_commit_interval
+        self.pending = 0
+        self.sync_count = 0
+        self.record_count = 0
+        # Records known to be on disk
+        self.synced_count = 0
+        self._first_pending_at = None
+        self._lock = threading.Lock()
+        # Held while syncing; taken before _lock when both are needed
+        self._sync_lock = threading.Lock()
+        self._closed = False
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            self._truncate_torn_tail()
+            for record in self.records():
+                if record[0] == 'CHECKPOINT':
+                    self.generation = record[2]
+                break
+        self._file = open(path, 'ab')
+        if not exists:
+            self._file.write(WAL_MAGIC)
+            self._sync_locked()
+
+        self._flusher = None
+        if group_commit_interval > 0:
+            self._wakeup = threading.Event()
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    # ==================== Writing ====================
+
+    def append(self, record):
+        """
+        Append one record and sync if the current group is full
+
+        Returns:
+            True if the record is already durable
+        """
+        data = encode_record(record)
+        with self._lock:
+            self._file.write(data)
+            self.record_count += 1
+            self.pending += 1
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            if self.pending < self.group_commit_size:
+                return False
+            position = self.record_count
+        self._sync_through(position)
+        return True
+
+    def sync(self):
+        """Force every pending record to disk"""
+        with self._lock:
+            position = self.record_count
+        self._sync_through(position)
+
+    def _sync_through(self, position):
+        # Make the first `position` records durable, unless a sync by another
+        # thread already did
+        with self._sync_lock:
+            if self.synced_count >= position:
+                return
+            with self._lock:
+                self._file.flush()
+                position = self.record_count
+                self.pending = 0
+                self._first_pending_at = None
+            os.fsync(self._file.fileno())
+            self.sync_count += 1
+            self.synced_count = max(self.synced_count, position)
+
+    def _sync_locked(self):
+        # Sync while holding _lock, before the log is shared or while it is
+        # being rewritten
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.sync_count += 1
+        self.synced_count = self.record_count
+        self.pending = 0
+        self._first_pending_at = None
+
+    def _flush_periodically(self):
+        interval = self.group_commit_interval
+        while not self._wakeup.wait(interval / 2):
+            with self._lock:
+                due = (self.pending and self._first_pending_at is not None
+                       and time.monotonic() - self._first_pending_at >= interval)
+                position = self.record_count
+            if due:
+                self._sync_through(position)
+
+    # ==================== Recovery ====================
+
+    def _scan(self):
+        """
+        Iterate over (end_offset, record) for every intact record
+
+        Reading stops at the first torn or corrupt record, which is where a
+        crash interrupted the last write.
+        """
+        with open(self.path, 'rb') as file:
+            if file.read(len(WAL_MAGIC)) != WAL_MAGIC:
+                return
+            while True:
+                header = file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                length, checksum = RECORD_HEADER.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    return
+                yield file.tell(), marshal.loads(payload)
+
+    def _truncate_torn_tail(self):
+        """Cut a partially written last record so new records stay reachable"""
+        with open(self.path, 'rb') as file:
+            if file.read(len(WAL_MAGIC)) != WAL_MAGIC:
+                raise StorageError(f"'{self.path}' is not a write-ahead log")
+        valid_end = len(WAL_MAGIC)
+        for valid_end, _ in self._scan():
+            pass
+        if os.path.getsize(self.path) > valid_end:
+            with open(self.path, 'r+b') as file:
+                file.truncate(valid_end)
+                os.fsync(file.fileno())
+
+    def records(self):
+        """Iterate over the durable records in the log"""
+        for _, record in self._scan():
+            yield record
+
+    def replay(self, catalog, generation=0):
+        """
+        Re-apply every durable record to a catalog
+
+        Args:
+            catalog: Catalog restored from the snapshot the log follows
+            generation: Checkpoint generation of that snapshot
+
+        Returns:
+            Number of records replayed
+
+        Raises:
+            StorageError: if the log follows a later checkpoint than the snapshot
+        """
+        self.sync()
+        if self.generation < generation:
+            # A crash hit between writing the checkpoint's snapshot and
+            # starting the log over: the snapshot holds every record already
+            with self._sync_lock, self._lock:
+                self._restart(generation)
+            return 0
+        if self.generation > generation:
+            raise StorageError(
+                f"'{self.path}' follows checkpoint {self.generation} but the snapshot is checkpoint {generation}"
+            )
+        count = 0
+        for record in self.records():
+            if record[0] != 'CHECKPOINT':
+                apply_record(catalog, record)
+                count += 1
+        return count
+
+    def checkpoint(self, catalog, directory):
+        """
+        Snapshot the catalog into a database directory and start the log over
+
+        Every writer is locked out (catalog first, then the log) from before
+        the snapshot until the log is truncated, so each write is either in
+        the snapshot or in the new log, never both. A later open_database(
+        directory) loads the snapshot and replays the log from there.
+
+        Returns:
+            The new checkpoint generation
+        """
+        with catalog.writers_locked(), self._sync_lock, self._lock:
+            generation = self.generation + 1
+            save_snapshot(catalog, directory, metadata={'wal_generation': generation})
+            self._restart(generation)
+        return generation
+
+    def _restart(self, generation):
+        # Empty the log, leaving only the checkpoint record (holding both locks)
+        self._file.flush()
+        self._file.truncate(0)
+        self._file.seek(0)
+        self._file.write(WAL_MAGIC)
+        self._file.write(encode_record(('CHECKPOINT', None, generation)))
+        self.generation = generation
+        self.record_count = 0
+        self._sync_locked()
+
+    def close(self):
+        """Sync pending records and close the log"""
+        if self._closed:
+            return
+        if self._flusher is not None:
+            self._wakeup.set()
+            self._flusher.join()
+        self.sync()
+        self._file.close()
+        self._closed = True
+
+
+def open_database(directory, buffer_pool=None, **options):
+    """
+    Recover a database directory: load its last checkpoint and replay its log
+
+    The directory is created if needed; tables saved by save_catalog (the
+    layout before checkpoints wrote snapshots) are opened as they are.
+
+    Args:
+        directory: Database directory
+        buffer_pool: BufferPool shared by the tables
+        **options: group_commit_size and group_commit_interval, see WriteAheadLog
+
+    Returns:
+        (Catalog, WriteAheadLog) ready for new writes
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_snapshot_manifest(directory)
+    if manifest is not None:
+        catalog = load_snapshot(directory, buffer_pool=buffer_pool)
+        generation = manifest.get('wal_generation', 0)
+    else:
+        catalog = open_catalog(directory, Catalog(), buffer_pool)
+        generation = 0
+    wal = WriteAheadLog(os.path.join(directory, WAL_FILE_NAME), directory=directory, **options)
+    try:
+        wal.replay(catalog, generation)
+    except BaseException:
+        wal.close()
+        raise
+    return catalog, wal
@@ -0,0 +1,377 @@
+"""
+Zone Maps
+Every column is divided into fixed-size blocks of rows and each block keeps
+the minimum, maximum and number of nulls of its values. A scan compares the
+COMPARISON conjuncts of the WHERE clause with these ranges and skips blocks
+that cannot contain a matching row.
+
+Zone maps are conservative: in-place updates only widen a block's range and
+deletes leave it untouched, so a block is never skipped wrongly. Compaction
+rebuilds them exactly.
+
+Columns declared with BLOOM also keep a Bloom filter per block (see
+bloom.py), which lets equality predicates skip blocks whose range contains
+the value but whose rows do not, and IN lists skip the blocks where none of
+the values can occur.
+
+When a predicate's column has an index (see index.py) that narrows the scan
+to few enough rows, the plan reads just those rows.
+"""
+
+from bisect import bisect_left
+
+from .bloom import ColumnBlooms
+from .evaluator import column_predicates, split_conjuncts
+
+
+BLOCK_SIZE = 4096
+
+# Longest IN list probed against a block's Bloom filter
+MAX_BLOOM_PROBES = 64
+
+# A scan reads the rows an index returns while they are at most this
+# fraction of the table; past it, reading whole blocks is cheaper
+INDEX_SCAN_FRACTION = 1 / 16
+
+
+class ColumnZones:
+    """Per-block min, max and null count of one column"""
+
+    def __init__(self, bloom=None):
+        """
+        Args:
+            bloom: ColumnBlooms kept alongside the ranges, or None
+        """
+        self.mins = []
+        self.maxs = []
+        self.null_counts = []
+        self.bloom = bloom
+
+    def _open_block(self):
+        self.mins.append(None)
+        self.maxs.append(None)
+        self.null_counts.append(0)
+
+    def add(self, block, value):
+        """Account for a value stored in the given block"""
+        while block >= len(self.mins):
+            self._open_block()
+        if value is None:
+            self.null_counts[block] += 1
+            return
+        if self.bloom is not None:
+            self.bloom.add(block, value)
+        low = self.mins[block]
+        if low is None or value < low:
+            self.mins[block] = value
+        high = self.maxs[block]
+        if high is None or value > high:
+            self.maxs[block] = value
+
+    def add_range(self, first_row_id, values):
+        """Account for consecutive values starting at first_row_id"""
+        position = 0
+        row_id = first_row_id
+        count = len(values)
+        while position < count:
+            block = row_id // BLOCK_SIZE
+            take = min(count - position, (block + 1) * BLOCK_SIZE - row_id)
+            chunk = values[position:position + take]
+            non_null = [value for value in chunk if value is not None]
+            while block >= len(self.mins):
+                self._open_block()
+            self.null_counts[block] += take - len(non_null)
+            if non_null:
+                self._widen(block, min(non_null), max(non_null))
+                if self.bloom is not None:
+                    self.bloom.add_block(block, non_null)
+            position += take
+            row_id += take
+
+    def _widen(self, block, low, high):
+        if self.mins[block] is None or low < self.mins[block]:
+            self.mins[block] = low
+        if self.maxs[block] is None or high > self.maxs[block]:
+            self.maxs[block] = high
+
+    def may_match(self, block, op, value):
+        """Whether any value of the block can satisfy `column op value`"""
+        low, high = self.mins[block], self.maxs[block]
+        if low is None:
+            # Only nulls (or nothing) in this block: no comparison is true
+            return False
+        try:
+            if op == '=':
+                return low <= value <= high
+            if op in ('!=', '<>'):
+                return not (low == high == value)
+            if op == '<':
+                return low < value
+            if op == '<=':
+                return low <= value
+            if op == '>':
+                return high > value
+            if op == '>=':
+                return high >= value
+            if op == 'IN':
+                # Binary search the sorted values for the first one >= low
+                position = bisect_left(value, low)
+                return position < len(value) and value[position] <= high
+        except TypeError:
+            pass
+        return True
+
+    def bloom_rules_out(self, block, op, value):
+        """Whether the block's Bloom filter proves `column op value` false for every row"""
+        if self.bloom is None:
+            return False
+        if op == 'IN':
+            return len(value) <= MAX_BLOOM_PROBES and not any(self.bloom.may_contain(block, item) for item in value)
+        return op == '=' and not self.bloom.may_contain(block, value)
+
+    def to_list(self):
+        return [self.mins, self.maxs, self.null_counts]
+
+    @classmethod
+    def from_list(cls, data):
+        zones = cls()
+        zones.mins, zones.maxs, zones.null_counts = data
+        return zones
+
+
+class ZoneMap:
+    """Zone maps for every column of a table"""
+
+    def __init__(self, column_names, bloom_filters=None):
+        """
+        Args:
+            column_names: Columns of the table
+            bloom_filters: Dict of column name -> false positive rate for the
+                columns that keep Bloom filters
+        """
+        bloom_filters = bloom_filters or {}
+        self.columns = {
+            column_name: ColumnZones(
+                ColumnBlooms(bloom_filters[column_name], BLOCK_SIZE) if column_name in bloom_filters else None
+            )
+            for column_name in column_names
+        }
+
+    def add_row(self, row_id, column_names, values):
+        """Maintain the zone maps for one appended or updated row"""
+        block = row_id // BLOCK_SIZE
+        for column_name, value in zip(column_names, values):
+            self.columns[column_name].add(block, value)
+
+    def add_value(self, row_id, column_name, value):
+        """Widen one column's block range for an in-place update"""
+        self.columns[column_name].add(row_id // BLOCK_SIZE, value)
+
+    def add_columns(self, first_row_id, column_names, column_batches):
+        """Maintain the zone maps for a batch of appended rows"""
+        for column_name, values in zip(column_names, column_batches):
+            self.columns[column_name].add_range(first_row_id, values)
+
+    @classmethod
+    def build(cls, table):
+        """Compute exact zone maps from a table's column buffers"""
+        zone_map = cls(table.column_names, table.bloom_filters)
+        for column_name in table.column_names:
+            zone_map.columns[column_name].add_range(0, table.columns[column_name])
+        return zone_map
+
+    def to_dict(self):
+        return {column_name: zones.to_list() for column_name, zones in self.columns.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        zone_map = cls([])
+        zone_map.columns = {column_name: ColumnZones.from_list(zones) for column_name, zones in data.items()}
+        return zone_map
+
+    def build_blooms(self, table):
+        """Compute the Bloom filters of a table's BLOOM columns from its column buffers"""
+        for column_name, rate in table.bloom_filters.items():
+            blooms = ColumnBlooms(rate, BLOCK_SIZE)
+            column = table.columns[column_name]
+            for block in range(block_count(table.row_count)):
+                start, end = block_range(block, table.row_count)
+                blooms.add_block(block, column[start:end])
+            self.columns[column_name].bloom = blooms
+
+    def blooms(self):
+        """Dict of column name -> ColumnBlooms for the columns that have them"""
+        return {
+            column_name: zones.bloom for column_name, zones in self.columns.items() if zones.bloom is not None
+        }
+
+    def bloom_bytes(self):
+        """Bytes held by the table's Bloom filters"""
+        return sum(blooms.memory_bytes for blooms in self.blooms().values())
+
+
+def block_count(row_count):
+    """Number of blocks needed for row_count rows"""
+    return (row_count + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def block_range(block, row_count):
+    """Row id range [start, end) covered by a block"""
+    start = block * BLOCK_SIZE
+    return start, min(start + BLOCK_SIZE, row_count)
+
+
+def prunable_predicates(where_clause, table, parameters=None):
+    """
+    Extract the `column op constant` conjuncts of a WHERE clause
+
+    Only conjuncts joined by AND at the top of the condition can prune
+    blocks; anything under OR or NOT is ignored. BETWEEN and a LIKE pattern
+    with a literal prefix contribute the two ends of their range, and IN its
+    sorted values.
+
+    Returns:
+        List of (column_name, op, value, text) tuples
+    """
+    predicates = []
+    if where_clause is None:
+        return predicates
+    for conjunct in split_conjuncts(where_clause):
+        for predicate in column_predicates(conjunct, parameters)[0]:
+            if table.has_column(predicate[0]):
+                predicates.append(predicate)
+    return predicates
+
+
+def candidate_blocks(table, predicates):
+    """
+    Blocks that may contain rows matching every predicate
+
+    Returns:
+        (list of block numbers in ascending order, number of blocks whose
+        ranges matched but were ruled out by a Bloom filter)
+    """
+    total = block_count(table.row_count)
+    if not predicates:
+        return list(range(total)), 0
+    checks = [(table.zone_map.columns[column_name], op, value) for column_name, op, value, _ in predicates]
+    bloom_checks = [
+        (zones, op, value) for zones, op, value in checks if op in ('=', 'IN') and zones.bloom is not None
+    ]
+    blocks = []
+    bloom_skipped = 0
+    for block in range(total):
+        if all(zones.may_match(block, op, value) for zones, op, value in checks):
+            if any(zones.bloom_rules_out(block, op, value) for zones, op, value in bloom_checks):
+                bloom_skipped += 1
+            else:
+                blocks.append(block)
+    return blocks, bloom_skipped
+
+
+def index_candidates(table, predicates):
+    """
+    Row ids the most selective usable index returns for the predicates
+
+    Returns:
+        (ascending list of row ids, description of the index used), or
+        (None, None) if no index applies or every index returns too many rows
+    """
+    if not table.indexes or not predicates:
+        return None, None
+    limit = int(table.row_count * INDEX_SCAN_FRACTION)
+    best = None, None
+    for column_name, index in table.indexes.items():
+        column_predicates = [predicate for predicate in predicates if predicate[0] == column_name]
+        if not column_predicates:
+            continue
+        row_ids = index.candidates(column_predicates, limit)
+        if row_ids is not None:
+            best = row_ids, f"{index.kind} index on {column_name}"
+            limit = len(row_ids)
+    row_ids, used = best
+    if row_ids is not None:
+        # A snapshot does not see the rows appended after it was taken
+        row_ids = row_ids[:bisect_left(row_ids, table.row_count)]
+    return row_ids, used
+
+
+class ScanPlan:
+    """Blocks (or rows, when an index was used) a scan has to read after pruning"""
+
+    def __init__(self, table, predicates, blocks, bloom_skipped=0, row_ids=None, index=None):
+        """
+        Args:
+            table: Scanned table
+            predicates: Pruning predicates from prunable_predicates()
+            blocks: Candidate block numbers in ascending order
+            bloom_skipped: Skipped blocks that only a Bloom filter ruled out
+            row_ids: Ascending candidate row ids from an index, or None to
+                read the candidate blocks whole
+            index: Description of the index that gave row_ids
+        """
+        self.table = table
+        self.predicates = predicates
+        self.blocks = blocks
+        self.bloom_skipped = bloom_skipped
+        self.row_ids = row_ids
+        self.index = index
+        self.total_blocks = block_count(table.row_count)
+        # Rows that passed the whole WHERE clause, when the scan counted them
+        self.rows_returned = None
+
+    @property
+    def blocks_scanned(self):
+        return len(self.blocks)
+
+    @property
+    def blocks_skipped(self):
+        return self.total_blocks - len(self.blocks)
+
+    @property
+    def pruned(self):
+        """Whether the scan reads less than the whole table"""
+        return self.row_ids is not None or self.blocks_skipped > 0
+
+    @property
+    def rows_scanned(self):
+        """Row slots the scan reads"""
+        return sum(end - start for start, end in self.ranges())
+
+    def count_returned(self, count):
+        """Add rows that passed the WHERE clause to rows_returned"""
+        self.rows_returned = (self.rows_returned or 0) + count
+
+    def ranges(self):
+        """Row id ranges of the candidate rows or blocks, adjacent ones merged"""
+        ranges = []
+        if self.row_ids is not None:
+            for row_id in self.row_ids:
+                if ranges and row_id < ranges[-1][1]:
+                    # Already covered: every row is read once
+                    continue
+                if ranges and ranges[-1][1] == row_id:
+                    ranges[-1] = (ranges[-1][0], row_id + 1)
+                else:
+                    ranges.append((row_id, row_id + 1))
+            return ranges
+        for block in self.blocks:
+            start, end = block_range(block, self.table.row_count)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+
+def plan_scan(table, where_clause, parameters=None):
+    """Prune a table's blocks (or rows, through an index) with the WHERE clause and return the ScanPlan"""
+    predicates = prunable_predicates(where_clause, table, parameters)
+    blocks, bloom_skipped = candidate_blocks(table, predicates)
+    row_ids, index = index_candidates(table, predicates)
+    if row_ids is not None:
+        # Rows in blocks the zone maps ruled out cannot match either
+        kept = set(blocks)
+        row_ids = [row_id for row_id in row_ids if row_id // BLOCK_SIZE in kept]
+        blocks = sorted({row_id // BLOCK_SIZE for row_id in row_ids})
+    return ScanPlan(table, predicates, blocks, bloom_skipped, row_ids, index)
@@ -0,0 +1,23 @@
+"""
+Test setup: the phase packages live in src/ and import each other as
+top-level packages, so src/ goes on the import path
+"""
+
+import os
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from support import Session  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Session on a fresh, empty executor"""
+    session = Session()
+    yield session
+    session.close()
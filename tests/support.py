@@ -0,0 +1,72 @@
+"""
+Helpers shared by the tests: run SQL text through the lexer, parser and
+executor the way main.py does
+"""
+
+from phase1_lexer.lexer import LexicalAnalyzer
+from phase1_lexer.token_definitions import TokenType
+from phase2_parser.parser import SyntaxAnalyzer
+from phase4_executor import QueryExecutor
+
+
+def parse_with_errors(sql):
+    """
+    Parse a script
+
+    Returns:
+        (parse tree, list of lexical and syntax error messages)
+    """
+    lexer = LexicalAnalyzer(sql)
+    tokens = [token for token in lexer.tokenize() if token.type not in (TokenType.COMMENT, TokenType.ERROR)]
+    parser = SyntaxAnalyzer(tokens)
+    tree = parser.parse()
+    errors = lexer.errors.get_errors() + parser.errors.get_errors()
+    return tree, [error['message'] for error in errors]
+
+
+def parse(sql):
+    """Parse a script that must be free of lexical and syntax errors"""
+    tree, errors = parse_with_errors(sql)
+    assert not errors, errors
+    return tree
+
+
+class Session:
+    """An executor plus shortcuts for running SQL text against it"""
+
+    def __init__(self, executor=None, **options):
+        self.executor = executor if executor is not None else QueryExecutor(**options)
+
+    def run(self, sql):
+        """Run a script that must succeed; returns its ExecutionResults"""
+        results = self.executor.execute(parse(sql))
+        errors = self.take_errors()
+        assert not errors, errors
+        return results
+
+    def rows(self, sql):
+        """Rows of the last statement of a script that must succeed"""
+        return self.run(sql)[-1].rows
+
+    def fails(self, sql):
+        """Run a script expected to fail; returns the runtime error messages"""
+        self.executor.execute(parse(sql))
+        errors = self.take_errors()
+        assert errors, f"expected {sql!r} to fail"
+        return errors
+
+    def take_errors(self):
+        """Runtime error messages reported so far, then forget them"""
+        errors = [error['message'] for error in self.executor.errors.get_errors()]
+        self.executor.errors.errors.clear()
+        return errors
+
+    @property
+    def catalog(self):
+        return self.executor.catalog
+
+    def table(self, name):
+        return self.executor.catalog.get_table(name)
+
+    def close(self):
+        self.executor.close()
@@ -0,0 +1,91 @@
+"""GROUP BY and aggregates, in memory and spilled to partition files"""
+
+from collections import defaultdict
+
+import pytest
+
+from phase4_executor import QueryExecutor
+from support import Session
+
+
+ROWS = 20000
+GROUPS = 5000
+
+
+def fill(session):
+    session.run("CREATE TABLE t (id INT, grp INT, v FLOAT, name TEXT)")
+    session.table('t').append_columns([
+        list(range(ROWS)),
+        [i % GROUPS for i in range(ROWS)],
+        [i / 2 for i in range(ROWS)],
+        [f"n{i % 7}" for i in range(ROWS)],
+    ])
+    return session
+
+
+@pytest.fixture
+def grouped(db):
+    return fill(db)
+
+
+@pytest.fixture
+def spilling():
+    """A session that may hold only a handful of groups in memory"""
+    session = fill(Session(QueryExecutor(aggregate_memory=1)))
+    yield session
+    session.close()
+
+
+def expected_groups():
+    groups = defaultdict(list)
+    for i in range(ROWS):
+        groups[i % GROUPS].append(i)
+    return {
+        grp: (len(ids), sum(i / 2 for i in ids), min(ids), max(ids), sum(i / 2 for i in ids) / len(ids))
+        for grp, ids in groups.items()
+    }
+
+
+GROUPED = "SELECT grp, COUNT(*), SUM(v), MIN(id), MAX(id), AVG(v) FROM t GROUP BY grp"
+
+
+def test_group_by(grouped):
+    rows = grouped.rows(GROUPED)
+    assert {row[0]: row[1:] for row in rows} == pytest.approx(expected_groups())
+    assert len(rows) == GROUPS
+    assert grouped.executor.last_aggregation.spill_count == 0
+
+
+def test_spilled_group_by_gives_the_same_groups(grouped, spilling):
+    rows = spilling.rows(GROUPED)
+    aggregation = spilling.executor.last_aggregation
+    assert aggregation.spill_count > 1
+    assert aggregation.spilled_bytes > 0
+    assert aggregation.group_count == GROUPS
+    assert sorted(rows) == sorted(grouped.rows(GROUPED))
+
+
+def test_spilled_group_by_with_having(spilling):
+    rows = sorted(spilling.rows(
+        "SELECT grp, name, COUNT(*) FROM t WHERE id < 10000 GROUP BY grp, name HAVING grp < 3"
+    ))
+    expected = sorted({(i % GROUPS, f"n{i % 7}") for i in range(10000) if i % GROUPS < 3})
+    assert [row[:2] for row in rows] == expected
+    assert all(row[2] == 1 for row in rows)
+    assert spilling.executor.last_aggregation.spill_count > 0
+
+
+def test_aggregates_without_group_by(grouped):
+    assert grouped.rows("SELECT COUNT(*), MIN(name), MAX(name), SUM(id) FROM t") == [
+        (ROWS, 'n0', 'n6', sum(range(ROWS)))
+    ]
+
+
+def test_empty_input(grouped):
+    assert grouped.rows("SELECT COUNT(*), SUM(v), MAX(id) FROM t WHERE id < 0") == [(0, None, None)]
+    assert grouped.rows("SELECT grp, COUNT(*) FROM t WHERE id < 0 GROUP BY grp") == []
+
+
+def test_errors(grouped):
+    assert "GROUP BY" in grouped.fails("SELECT id, COUNT(*) FROM t GROUP BY grp")[0]
+    assert "SUM(name)" in grouped.fails("SELECT SUM(name) FROM t")[0]
@@ -0,0 +1,77 @@
+"""Per-block Bloom filters on BLOOM columns"""
+
+import random
+
+import pytest
+
+from phase4_executor import ColumnBlooms, open_table, save_table
+from phase4_executor.bloom import filter_size, value_key
+from phase4_executor.zone_map import BLOCK_SIZE
+
+
+BLOCKS = 4
+
+
+@pytest.fixture
+def keyed(db):
+    """t(id, email) with random emails, so zone map ranges of email span every block"""
+    rng = random.Random(3)
+    db.run("CREATE TABLE t (id INT, email TEXT BLOOM (0.001), code INT BLOOM)")
+    emails = [f"{rng.getrandbits(40):x}@example.com" for _ in range(BLOCKS * BLOCK_SIZE)]
+    db.table('t').append_columns([list(range(len(emails))), emails, [rng.getrandbits(30) for _ in emails]])
+    return db
+
+
+def explain(session, condition):
+    return dict(session.rows(f"EXPLAIN SELECT id FROM t WHERE {condition}"))
+
+
+def test_equality_skips_blocks_by_bloom_filter(keyed):
+    email = keyed.table('t').get_value('email', BLOCK_SIZE + 17)
+    plan = explain(keyed, f"email = '{email}'")
+    assert plan['blocks scanned'] == 1
+    assert plan['blocks skipped by bloom filters'] == BLOCKS - 1
+    assert plan['bloom filter bytes'] > 0
+    assert keyed.rows(f"SELECT id FROM t WHERE email = '{email}'") == [(BLOCK_SIZE + 17,)]
+
+
+def test_absent_values_and_in_lists(keyed):
+    assert explain(keyed, "email = 'nobody@example.com'")['blocks scanned'] == 0
+    code = keyed.table('t').get_value('code', 5)
+    plan = explain(keyed, f"code IN ({code}, 1, 2)")
+    assert plan['blocks scanned'] <= 2
+    assert (5,) in keyed.rows(f"SELECT id FROM t WHERE code IN ({code}, 1, 2)")
+
+
+def test_filters_follow_inserts_and_updates(keyed):
+    keyed.run("INSERT INTO t VALUES (99999, 'late@example.com', 7)")
+    keyed.run("UPDATE t SET code = 123456789012 WHERE id = 3")
+    assert keyed.rows("SELECT id FROM t WHERE email = 'late@example.com'") == [(99999,)]
+    assert keyed.rows("SELECT id FROM t WHERE code = 123456789012") == [(3,)]
+
+
+def test_false_positive_rate_is_close_to_the_target():
+    blooms = ColumnBlooms(0.01, BLOCK_SIZE)
+    blooms.add_block(0, range(BLOCK_SIZE))
+    false_positives = sum(blooms.may_contain(0, value) for value in range(BLOCK_SIZE, 11 * BLOCK_SIZE))
+    assert false_positives / (10 * BLOCK_SIZE) < 0.02
+    assert all(blooms.may_contain(0, value) for value in range(BLOCK_SIZE))
+    assert not blooms.may_contain(1, 0)
+
+
+def test_sizing_and_stable_keys():
+    bits, hashes = filter_size(BLOCK_SIZE, 0.01)
+    assert bits % 8 == 0 and bits >= 9 * BLOCK_SIZE
+    assert hashes == 7
+    # Equal numbers probe the same bits whatever their type
+    assert value_key(3) == value_key(3.0)
+    assert value_key(3) != value_key('3')
+
+
+def test_filters_are_saved_with_the_table(keyed, tmp_path):
+    table = keyed.table('t')
+    save_table(table, str(tmp_path))
+    mapped = open_table(str(tmp_path), 't')
+    assert mapped.zone_map.columns['email'].bloom.filters == table.zone_map.columns['email'].bloom.filters
+    assert mapped.bloom_filters == {'email': 0.001, 'code': 0.01}
+    mapped.close()
@@ -0,0 +1,95 @@
+"""Buffer pool: CLOCK eviction under a byte budget, pinning and scan rings"""
+
+from array import array
+
+from phase4_executor import BufferPool, Table, open_table, save_table
+from phase4_executor.compression import SEGMENT_ROWS
+
+
+PAGE = 100
+
+
+def page(fill=0):
+    return bytes([fill]) * PAGE
+
+
+def loader(calls, fill=0):
+    def load():
+        calls.append(fill)
+        return page(fill)
+    return load
+
+
+def test_hits_and_misses():
+    pool = BufferPool(capacity=10 * PAGE)
+    calls = []
+    assert pool.get((1, 0), loader(calls)) == page()
+    assert pool.get((1, 0), loader(calls)) == page()
+    assert calls == [0]
+    assert (pool.hits, pool.misses, pool.used) == (1, 1, PAGE)
+    assert pool.hit_rate == 0.5
+
+
+def test_clock_gives_referenced_pages_a_second_chance():
+    pool = BufferPool(capacity=3 * PAGE)
+    calls = []
+    for key in range(3):
+        pool.get((1, key), loader(calls))
+    # Only page 0 is read again, so it survives the next eviction
+    pool.get((1, 0), loader(calls))
+    pool.get((1, 3), loader(calls))
+    assert sorted(key for _, key in pool.frames) == [0, 2, 3]
+    assert pool.evictions == 1
+    assert pool.used <= pool.capacity
+
+
+def test_pinned_pages_are_not_evicted():
+    pool = BufferPool(capacity=PAGE)
+    with pool.pinned((1, 0), loader([])):
+        pool.get((1, 1), loader([]))
+        assert (1, 0) in pool.frames
+    pool.get((1, 2), loader([]))
+    assert (1, 0) not in pool.frames
+    assert pool.stats()['pinned'] == 0
+
+
+def test_scan_ring_only_holds_its_own_slots():
+    pool = BufferPool(capacity=100 * PAGE)
+    pool.get((1, 'hot'), loader([]))
+    ring = pool.scan_ring(pages=2)
+    for key in range(10):
+        pool.get((2, key), loader([]), ring)
+    pool.get((1, 'hot'), loader([]), ring)
+    assert sorted(pool.frames, key=str) == [(1, 'hot'), (2, 8), (2, 9)]
+    ring.close()
+    assert list(pool.frames) == [(1, 'hot')]
+
+
+def test_discard_resize_and_clear():
+    pool = BufferPool(capacity=10 * PAGE)
+    for owner in (1, 2):
+        for key in range(3):
+            pool.get((owner, key), loader([]))
+    pool.discard(1)
+    assert {owner for owner, _ in pool.frames} == {2}
+    pool.resize(PAGE)
+    assert len(pool) == 1
+    pool.clear()
+    assert len(pool) == 0 and pool.used == 0
+    pool.reset_counters()
+    assert pool.stats()['misses'] == 0
+
+
+def test_decoded_segments_are_cached(tmp_path):
+    table = Table('t', [('id', 'INT')])
+    table.append_columns([array('q', range(3 * SEGMENT_ROWS))])
+    save_table(table, str(tmp_path))
+    pool = BufferPool()
+    mapped = open_table(str(tmp_path), 't', pool)
+
+    assert mapped.get_value('id', SEGMENT_ROWS + 1) == SEGMENT_ROWS + 1
+    assert mapped.get_value('id', SEGMENT_ROWS + 2) == SEGMENT_ROWS + 2
+    assert (pool.misses, pool.hits) == (1, 1)
+
+    mapped.close()
+    assert len(pool) == 0
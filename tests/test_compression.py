@@ -0,0 +1,108 @@
+"""Compressed INT/FLOAT column segments: encodings, decoding and filtering on encoded data"""
+
+import random
+from array import array
+
+import pytest
+
+from phase4_executor import BufferPool, EncodedColumn, Table, open_table, save_table
+from phase4_executor.compression import (
+    BIT_WIDTHS, DELTA, FOR, PLAIN, RLE, SEGMENT_ROWS, encode_column, encode_segment, pack_codes, unpack_codes
+)
+
+
+def encoded(values, data_type='INT'):
+    """An EncodedColumn over encode_column() output, as a mapped table would build it"""
+    segments = [
+        (encoding, width, count, base, first, memoryview(payload))
+        for encoding, width, base, first, payload, count in encode_column(values, data_type)
+    ]
+    return EncodedColumn(data_type, segments, pool=BufferPool())
+
+
+def random_values(draw, count=1000):
+    rng = random.Random(count)
+    return [draw(rng) for _ in range(count)]
+
+
+@pytest.mark.parametrize('width', BIT_WIDTHS)
+@pytest.mark.parametrize('count', [0, 1, 7, 1001])
+def test_pack_round_trip(width, count):
+    rng = random.Random(width * 1000 + count)
+    codes = [rng.randrange(1 << width) for _ in range(count)]
+    payload = pack_codes(codes, width)
+    assert len(payload) == (count * width + 7) // 8
+    assert list(unpack_codes(payload, width, count)) == codes
+
+
+@pytest.mark.parametrize('values, data_type, encoding', [
+    ([10 ** 12 * (i // 250) for i in range(1000)], 'INT', RLE),
+    ([1000 + i % 16 for i in range(1000)], 'INT', FOR),
+    ([5 * i for i in range(1000)], 'INT', DELTA),
+    (random_values(lambda rng: rng.getrandbits(63)), 'INT', PLAIN),
+    ([0.5] * 500 + [1.5] * 500, 'FLOAT', RLE),
+    (random_values(lambda rng: rng.random()), 'FLOAT', PLAIN),
+])
+def test_smallest_encoding_is_chosen(values, data_type, encoding):
+    typecode = 'q' if data_type == 'INT' else 'd'
+    assert encode_segment(array(typecode, values), data_type)[0] == encoding
+    assert list(encoded(values, data_type)) == values
+
+
+def test_float_bit_patterns_survive():
+    values = [0.0, -0.0, -0.0, 1.5]
+    decoded = list(encoded(values, 'FLOAT'))
+    assert [str(value) for value in decoded] == ['0.0', '-0.0', '-0.0', '1.5']
+
+
+def test_random_access_and_slices_across_segments():
+    values = [i // 3 for i in range(SEGMENT_ROWS + 500)] + [42] * 700
+    column = encoded(values)
+    assert len(column) == len(values)
+    assert column[SEGMENT_ROWS + 1] == values[SEGMENT_ROWS + 1]
+    assert column[-1] == 42
+    assert list(column[SEGMENT_ROWS - 3:SEGMENT_ROWS + 3]) == values[SEGMENT_ROWS - 3:SEGMENT_ROWS + 3]
+    assert list(column.take([SEGMENT_ROWS + 5, SEGMENT_ROWS + 9])) == [values[SEGMENT_ROWS + 5], values[SEGMENT_ROWS + 9]]
+    with pytest.raises(IndexError):
+        column[len(values)]
+
+
+@pytest.mark.parametrize('values', [
+    [i % 50 for i in range(3000)],
+    [i // 100 for i in range(3000)],
+    [3 * i for i in range(3000)],
+])
+@pytest.mark.parametrize('op', ['=', '!=', '<', '<=', '>', '>='])
+def test_match_mask_matches_decoded_values(values, op):
+    column = encoded(values)
+    value = values[1234]
+    assert column.can_match(op, value)
+    compare = {
+        '=': value.__eq__, '!=': value.__ne__, '<': value.__gt__,
+        '<=': value.__ge__, '>': value.__lt__, '>=': value.__le__,
+    }[op]
+    assert list(column.match_mask(op, value, 10, 2900)) == [int(compare(v)) for v in values[10:2900]]
+
+
+def test_saved_tables_are_compressed(tmp_path):
+    rows = 2 * SEGMENT_ROWS
+    table = Table('t', [('id', 'INT'), ('flag', 'INT'), ('score', 'FLOAT')])
+    table.append_columns([list(range(rows)), [i // 1000 % 2 for i in range(rows)], [i / 8 for i in range(rows)]])
+    save_table(table, str(tmp_path))
+    mapped = open_table(str(tmp_path), 't', BufferPool())
+
+    assert mapped.encoding('id') == 'delta'
+    assert mapped.encoding('flag') in ('rle', 'for', 'for+rle')
+    assert mapped.columns['id'].stored_size() < rows
+    assert list(mapped.rows()) == list(table.rows())
+    mapped.close()
+
+
+def test_compression_can_be_turned_off(db, tmp_path):
+    db.run("CREATE TABLE t (id INT)")
+    db.table('t').append_columns([list(range(1000))])
+    path = str(tmp_path / 'snap')
+    db.run(f"SAVE SNAPSHOT '{path}' UNCOMPRESSED")
+    db.run(f"LOAD SNAPSHOT '{path}'")
+    assert db.table('t').encoding('id') == 'mapped'
+    assert db.rows("SELECT COUNT(*) FROM t WHERE id >= 500") == [(500,)]
@@ -0,0 +1,96 @@
+"""DB-API style connections and cursors: lazy fetching, parameters and the parse cache"""
+
+import pytest
+
+from phase4_executor import DatabaseError, ParseCache, ProgrammingError, connect
+
+
+ROWS = 1000
+
+
+@pytest.fixture
+def connection():
+    connection = connect()
+    connection.execute("CREATE TABLE t (id INT, name TEXT)")
+    connection.catalog.get_table('t').append_columns([list(range(ROWS)), [f"n{i}" for i in range(ROWS)]])
+    yield connection
+    connection.close()
+
+
+def test_fetchone_fetchmany_fetchall(connection):
+    cursor = connection.execute("SELECT id FROM t WHERE id < 10")
+    assert [column[0] for column in cursor.description] == ['id']
+    assert cursor.fetchone() == (0,)
+    assert cursor.fetchmany(3) == [(1,), (2,), (3,)]
+    cursor.arraysize = 2
+    assert cursor.fetchmany() == [(4,), (5,)]
+    assert cursor.fetchall() == [(6,), (7,), (8,), (9,)]
+    assert cursor.fetchone() is None
+    assert cursor.fetchmany(5) == []
+
+
+def test_results_are_produced_lazily(connection, monkeypatch):
+    produced = []
+    table = connection.catalog.get_table('t')
+    scan = type(table).scan_columns
+
+    def counting(self, *args, **kwargs):
+        for row in scan(self, *args, **kwargs):
+            produced.append(row)
+            yield row
+
+    monkeypatch.setattr(type(table), 'scan_columns', counting)
+    cursor = connection.execute("SELECT id, name FROM t")
+    assert cursor.fetchmany(2) == [(0, 'n0'), (1, 'n1')]
+    # The scan stopped where the fetch did
+    assert 0 < len(produced) < ROWS
+    cursor.close()
+
+
+def test_iteration(connection):
+    cursor = connection.execute("SELECT id FROM t WHERE id >= ?", (ROWS - 3,))
+    assert [row[0] for row in cursor] == [ROWS - 3, ROWS - 2, ROWS - 1]
+
+
+def test_write_statements_report_row_counts(connection):
+    cursor = connection.execute("DELETE FROM t WHERE id < 5")
+    assert cursor.rowcount == 5
+    assert cursor.description is None
+    with pytest.raises(ProgrammingError):
+        cursor.fetchone()
+
+
+def test_executemany_inserts(connection):
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO t VALUES (?, ?)", [(ROWS + i, f"x{i}") for i in range(3)])
+    assert cursor.rowcount == 3
+    assert len(connection.execute("SELECT id FROM t").fetchall()) == ROWS + 3
+
+
+def test_errors(connection):
+    with pytest.raises(ProgrammingError):
+        connection.execute("SELEC id FROM t")
+    with pytest.raises(ProgrammingError):
+        connection.execute("SELECT id FROM t; SELECT id FROM t")
+    with pytest.raises(DatabaseError):
+        connection.execute("SELECT id FROM missing")
+
+
+def test_parse_cache_is_shared_and_bounded():
+    cache = ParseCache(size=2)
+    first = connect(parse_cache=cache)
+    second = connect(catalog=first.catalog, parse_cache=cache)
+    first.execute("CREATE TABLE u (a INT)")
+    statements = first.parse("SELECT a FROM u")
+    assert second.parse("SELECT a FROM u") is statements
+    second.parse("SELECT a FROM u WHERE a = 1")
+    assert len(cache) == 2
+    assert cache.get("CREATE TABLE u (a INT)") is None
+    first.close()
+    second.close()
+
+
+def test_closed_connection_rejects_use(connection):
+    connection.close()
+    with pytest.raises(ProgrammingError):
+        connection.cursor()
@@ -0,0 +1,71 @@
+"""COPY: bulk CSV import with per-record rejection"""
+
+import pytest
+
+from phase4_executor import Table, copy_from_csv
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    def write(text):
+        path = tmp_path / 'data.csv'
+        path.write_text(text, encoding='utf-8')
+        return str(path)
+    return write
+
+
+def test_copy_statement_loads_rows(db, csv_file):
+    path = csv_file("1,1.5,ann\n2,2.5,\"b, o\"\n\n3,3.5,cy\n")
+    db.run("CREATE TABLE t (id INT, score FLOAT, name TEXT)")
+    result = db.run(f"COPY t FROM '{path}'")[0]
+    assert result.row_count == 3
+    assert result.rows == []
+    assert db.rows("SELECT id, score, name FROM t") == [(1, 1.5, 'ann'), (2, 2.5, 'b, o'), (3, 3.5, 'cy')]
+
+
+def test_bad_records_are_rejected_with_their_line(db, csv_file):
+    path = csv_file("1,a\nx,b\n3\n4,d\n")
+    db.run("CREATE TABLE t (id INT, name TEXT)")
+    result = db.run(f"COPY t FROM '{path}'")[0]
+    assert result.row_count == 2
+    assert result.rows == [
+        (2, "invalid INT value 'x' for column 'id'"),
+        (3, "expected 2 fields, found 1"),
+    ]
+    assert db.rows("SELECT id, name FROM t") == [(1, 'a'), (4, 'd')]
+
+
+def test_missing_file_is_a_runtime_error(db, tmp_path):
+    db.run("CREATE TABLE t (id INT)")
+    errors = db.fails(f"COPY t FROM '{tmp_path / 'missing.csv'}'")
+    assert "Cannot read" in errors[0]
+
+
+def test_batches_header_and_delimiter(csv_file):
+    path = csv_file("id;name\n" + "".join(f"{i};n{i}\n" for i in range(25)))
+    table = Table('t', [('id', 'INT'), ('name', 'TEXT')])
+    batches = []
+    result = copy_from_csv(table, path, header=True, delimiter=';', batch_size=10, on_batch=batches.append)
+    assert result.rows_loaded == 25
+    assert [len(columns[0]) for columns in batches] == [10, 10, 5]
+    assert list(table.live_values('id')) == list(range(25))
+    assert result.bytes_read > 0
+
+
+def test_copy_updates_statistics_and_is_logged(db, csv_file):
+    path = csv_file("5\n6\n")
+    db.run("CREATE TABLE t (id INT); INSERT INTO t VALUES (1); ANALYZE t")
+    logged = []
+    db.executor.log = lambda *record: logged.append(record)
+    db.run(f"COPY t FROM '{path}'")
+    assert db.catalog.get_statistics('t').column('id').max_value == 6
+    assert logged == [('APPEND', 't', [[5, 6]])]
+
+
+def test_copy_inside_a_transaction_waits_for_commit(db, csv_file):
+    path = csv_file("1\n2\n")
+    db.run("CREATE TABLE t (id INT); BEGIN")
+    db.run(f"COPY t FROM '{path}'")
+    assert db.table('t').live_row_count == 0
+    db.run("COMMIT")
+    assert db.rows("SELECT id FROM t") == [(1,), (2,)]
@@ -0,0 +1,70 @@
+"""Dictionary-encoded TEXT columns and filters evaluated on their codes"""
+
+import pytest
+
+from phase4_executor import DictionaryColumn
+from phase4_executor.dictionary import MIN_ROWS_FOR_FALLBACK
+
+
+def test_behaves_like_a_list():
+    column = DictionaryColumn(['a', 'b', 'a'])
+    column.append('c')
+    column[1] = 'a'
+    assert list(column) == ['a', 'a', 'a', 'c']
+    assert column[3] == 'c'
+    assert column[1:3] == ['a', 'a']
+    assert column.take([0, 3]) == ['a', 'c']
+    assert column.distinct_count == 3
+    assert column.codes.typecode == 'B'
+
+
+def test_codes_widen_with_the_dictionary():
+    column = DictionaryColumn(f"v{i}" for i in range(300))
+    assert column.codes.typecode == 'H'
+    assert column[299] == 'v299'
+    assert column[0] == 'v0'
+
+
+@pytest.mark.parametrize('values', [['x', 'y'] * 10, [f"v{i % 300}" for i in range(600)]])
+def test_match_masks(values):
+    column = DictionaryColumn(values)
+    for op, value, expected in [
+        ('=', values[1], [v == values[1] for v in values]),
+        ('!=', values[1], [v != values[1] for v in values]),
+        ('=', 'missing', [False] * len(values)),
+        ('<>', 'missing', [True] * len(values)),
+        ('IN', (values[0], 'missing'), [v == values[0] for v in values]),
+        ('IN', ('missing',), [False] * len(values)),
+    ]:
+        assert column.can_match(op, value)
+        assert list(column.match_mask(op, value, 2, len(values))) == expected[2:]
+    assert not column.can_match('<', 'x')
+    assert not column.can_match('=', 1)
+
+
+def test_high_cardinality_columns_fall_back_to_lists(db):
+    db.run("CREATE TABLE t (id INT, low TEXT, high TEXT)")
+    rows = MIN_ROWS_FOR_FALLBACK * 2
+    db.table('t').append_columns([
+        list(range(rows)), [f"g{i % 4}" for i in range(rows)], [f"u{i}" for i in range(rows)],
+    ])
+    encodings = {row[1]: row[8] for row in db.rows("ANALYZE t")}
+    assert encodings == {'id': 'plain', 'low': 'dictionary', 'high': 'plain'}
+    assert isinstance(db.table('t').columns['high'], list)
+
+
+def test_filters_run_on_codes(db):
+    db.run("CREATE TABLE t (id INT, grp TEXT)")
+    db.table('t').append_columns([list(range(100)), [f"g{i % 4}" for i in range(100)]])
+    plan = dict(db.rows("EXPLAIN SELECT id FROM t WHERE grp = 'g1' AND id < 50"))
+    assert plan['encoded filters'] == "grp = 'g1'"
+    assert db.rows("SELECT id FROM t WHERE grp = 'g1' AND id < 10") == [(1,), (5,), (9,)]
+    assert db.rows("SELECT COUNT(*) FROM t WHERE grp IN ('g0', 'g3', 'zz')") == [(50,)]
+    assert db.rows("SELECT COUNT(*) FROM t WHERE grp != 'g2'") == [(75,)]
+
+
+def test_updates_keep_the_encoding(db):
+    db.run("CREATE TABLE t (id INT, grp TEXT); INSERT INTO t VALUES (1, 'a'); INSERT INTO t VALUES (2, 'b')")
+    db.run("UPDATE t SET grp = 'c' WHERE id = 1")
+    assert db.table('t').encoding('grp') == 'dictionary'
+    assert db.rows("SELECT id FROM t WHERE grp = 'c'") == [(1,)]
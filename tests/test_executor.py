@@ -0,0 +1,68 @@
+"""Executing statement trees: incomplete trees and internal errors"""
+
+import pytest
+
+from phase2_parser.parse_tree import ParseTreeNode
+from phase4_executor.executor import incomplete_node
+from support import parse
+
+
+def statement(sql):
+    return parse(sql).children[0]
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM t WHERE a = 1 AND NOT b BETWEEN 1 AND 2",
+    "SELECT a, COUNT(*) FROM t JOIN u ON t.a = u.a GROUP BY a ORDER BY a DESC LIMIT 3",
+    "INSERT INTO t VALUES (1, 'x')",
+    "UPDATE t SET a = a + 1 WHERE name LIKE 'x%' OR a IN (1, 2)",
+    "DELETE FROM t",
+    "CREATE TABLE t (a INT, name TEXT BLOOM)",
+    "EXPLAIN DELETE FROM t WHERE flag",
+    "SAVE SNAPSHOT 'dir' UNCOMPRESSED",
+])
+def test_parsed_statements_are_complete(sql):
+    assert incomplete_node(statement(sql)) is None
+
+
+def test_missing_children_are_found():
+    delete = statement("DELETE FROM t WHERE a = 1 AND b = 2")
+    condition = delete.children[1].children[0]
+    condition.children.pop()
+    assert incomplete_node(delete) is condition
+
+    select = statement("SELECT * FROM t WHERE a BETWEEN 1 AND 2")
+    select.children[2].children[0].children[2] = None
+    assert incomplete_node(select) is select.children[2].children[0]
+
+    comparison = statement("SELECT * FROM t WHERE a > 1")
+    comparison.children[2].children[0].children.pop()
+    assert incomplete_node(comparison) is comparison.children[2].children[0]
+
+    insert = ParseTreeNode('INSERT_STMT', children=[ParseTreeNode('VALUE_LIST')])
+    assert incomplete_node(insert) is insert
+
+
+def test_incomplete_statement_is_reported_not_run(db):
+    db.run("CREATE TABLE t (a INT); INSERT INTO t VALUES (1); INSERT INTO t VALUES (2)")
+    delete = statement("DELETE FROM t WHERE a = 1")
+    delete.children[1].children.clear()
+    program = ParseTreeNode('PROGRAM', children=[delete])
+
+    assert db.executor.execute(program) == []
+    assert db.take_errors() == ["Runtime Error: Incomplete DELETE_STMT cannot be executed at line 1, position 15."]
+    assert db.table('t').live_row_count == 2
+
+
+def test_unexpected_exceptions_are_reported_as_internal_errors(db, monkeypatch):
+    db.run("CREATE TABLE t (a INT)")
+
+    def broken(self, node):
+        raise KeyError('a')
+
+    monkeypatch.setattr(type(db.executor), 'execute_insert', broken)
+    errors = db.fails("INSERT INTO t VALUES (1)")
+    assert errors == ["Runtime Error: Internal error while executing INSERT_STMT: KeyError: 'a' at line 1, position 1."]
+    # Later statements still run
+    monkeypatch.undo()
+    assert db.run("INSERT INTO t VALUES (1)")[0].row_count == 1
@@ -0,0 +1,111 @@
+"""Secondary indexes and the workload-driven index advisor (SHOW INDEX ADVICE)"""
+
+import pytest
+
+
+ROWS = 10000
+
+
+@pytest.fixture
+def indexed(db):
+    """10000 rows where every x value repeats 10 times, x hash-indexed and v ordered-indexed"""
+    db.run("CREATE TABLE t (id INT, x INT, v INT, name TEXT)")
+    db.table('t').append_columns([
+        list(range(ROWS)), [i % 1000 for i in range(ROWS)], list(range(ROWS)),
+        [f"n{i % 50}" for i in range(ROWS)]
+    ])
+    db.table('t').create_index('x', 'hash')
+    db.table('t').create_index('v', 'ordered')
+    return db
+
+
+def test_index_scan_matches_full_scan(indexed):
+    assert sorted(indexed.rows("SELECT id FROM t WHERE x = 7")) == [(i,) for i in range(7, ROWS, 1000)]
+    assert indexed.rows("SELECT COUNT(*) FROM t WHERE v >= 100 AND v < 150") == [(50,)]
+    assert indexed.rows("SELECT COUNT(*) FROM t WHERE x IN (1, 2, 3)") == [(30,)]
+    explain = dict(indexed.rows("EXPLAIN SELECT id FROM t WHERE x = 7"))
+    assert explain['scan'] == 'index'
+    assert explain['rows from index'] == 10
+
+
+def test_updated_rows_are_returned_once(indexed):
+    # Rows updated to the value they already hold are indexed under it again
+    indexed.run("UPDATE t SET x = 5 WHERE x = 5")
+    indexed.run("UPDATE t SET x = 5 WHERE x = 5")
+    indexed.run("UPDATE t SET v = 7 WHERE id = 7")
+    indexed.run("UPDATE t SET v = 7 WHERE id = 7")
+
+    assert sorted(indexed.rows("SELECT id FROM t WHERE x = 5")) == [(i,) for i in range(5, ROWS, 1000)]
+    assert indexed.rows("SELECT id, v FROM t WHERE v >= 7 AND v <= 7") == [(7, 7)]
+    assert dict(indexed.rows("EXPLAIN SELECT id FROM t WHERE x = 5"))['rows from index'] == 10
+
+    result = indexed.run("UPDATE t SET name = 'dup' WHERE x = 5")[-1]
+    assert result.row_count == 10
+    assert indexed.table('t').live_row_count == ROWS
+    assert indexed.rows("SELECT COUNT(*) FROM t WHERE name = 'dup'") == [(10,)]
+
+    result = indexed.run("DELETE FROM t WHERE x = 5")[-1]
+    assert result.row_count == 10
+    assert indexed.table('t').live_row_count == ROWS - 10
+
+
+def test_index_follows_writes_and_compaction(indexed):
+    indexed.run("INSERT INTO t VALUES (20000, 7, 20000, 'new')")
+    indexed.run("UPDATE t SET x = 7 WHERE id = 3")
+    indexed.run("DELETE FROM t WHERE id = 1007")
+    expected = sorted([(i,) for i in range(7, ROWS, 1000) if i != 1007] + [(3,), (20000,)])
+    assert sorted(indexed.rows("SELECT id FROM t WHERE x = 7")) == expected
+
+    indexed.run("DELETE FROM t WHERE id >= 5000 AND id < 10000")
+    assert indexed.table('t').compaction_count >= 1
+    assert sorted(indexed.rows("SELECT id FROM t WHERE x = 7")) == [
+        (3,), (7,), (2007,), (3007,), (4007,), (20000,)
+    ]
+
+
+def test_advisor_recommends_and_creates_indexes(db):
+    db.run("CREATE TABLE t (id INT, x INT, v INT)")
+    db.table('t').append_columns([list(range(ROWS)), [i % 1000 for i in range(ROWS)], list(range(ROWS))])
+    for i in range(20):
+        db.run(f"SELECT id FROM t WHERE x = {i}")
+        db.run(f"SELECT id FROM t WHERE v > {i * 10} AND v < {i * 10 + 5}")
+
+    rows = db.rows("SHOW INDEX ADVICE")
+    assert all(isinstance(row, tuple) for row in rows)
+    advice = {(row[0], row[1]): row for row in rows}
+    assert advice[('t', 'x')][2] == 'hash'
+    assert advice[('t', 'v')][2] == 'ordered'
+    assert advice[('t', 'x')][-1] == 'create'
+
+    db.run("SHOW INDEX ADVICE CREATE")
+    db.catalog.index_advisor.wait()
+    assert db.table('t').indexes['x'].kind == 'hash'
+    assert db.table('t').indexes['v'].kind == 'ordered'
+    assert {row[-1] for row in db.rows("SHOW INDEX ADVICE")} == {'exists'}
+
+
+def test_advisor_respects_memory_budget(db):
+    db.catalog.index_advisor.memory_budget = 1
+    db.run("CREATE TABLE t (id INT, x INT)")
+    db.table('t').append_columns([list(range(ROWS)), [i % 1000 for i in range(ROWS)]])
+    for i in range(20):
+        db.run(f"SELECT id FROM t WHERE x = {i}")
+    assert [row[-1] for row in db.rows("SHOW INDEX ADVICE")] == ['over budget']
+
+
+def test_cursor_selects_are_recorded():
+    from phase4_executor import connect
+
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE t (id INT, x INT)")
+    connection.executor.catalog.get_table('t').append_columns([list(range(ROWS)), [i % 1000 for i in range(ROWS)]])
+    for i in range(50):
+        assert len(cursor.execute("SELECT id FROM t WHERE x = ?", (i,)).fetchall()) == 10
+
+    workload = connection.executor.catalog.index_advisor.columns[('t', 'x')]
+    assert workload.equality == 50
+    assert workload.rows_returned == 500
+    advice = cursor.execute("SHOW INDEX ADVICE").fetchall()
+    assert [(row[1], row[2], row[-1]) for row in advice] == [('x', 'hash', 'create')]
+    connection.close()
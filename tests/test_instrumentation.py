@@ -0,0 +1,99 @@
+"""Per-phase timing and memory profiling of the compile pipeline"""
+
+import json
+
+import pytest
+
+from instrumentation import PHASES, PipelineProfiler, count_nodes, profiling_requested
+from phase4_executor import QueryExecutor
+from support import parse
+
+
+SCRIPT = "CREATE TABLE t (id INT, v INT); INSERT INTO t VALUES (1, 5); SELECT id FROM t WHERE v > 3; SELECT id FROM nope"
+
+
+def profiled(sql, trace_memory=True):
+    with PipelineProfiler(trace_memory) as profiler:
+        profiler.begin_file('script.sql')
+        QueryExecutor(profiler=profiler).execute(parse(sql))
+    return profiler
+
+
+def test_statements_are_profiled():
+    report = profiled(SCRIPT).report()
+    [file_report] = report['files']
+    assert file_report['path'] == 'script.sql'
+    statements = file_report['statements']
+    assert [statement['type'] for statement in statements] == [node.node_type for node in parse(SCRIPT).children]
+    assert [statement['succeeded'] for statement in statements] == [True, True, True, False]
+    assert statements[2]['phases']['execute']['rows'] == 1
+    assert statements[2]['phases']['plan']['scans'] == 1
+    assert report['phases']['execute']['calls'] == 4
+
+
+def test_phase_times_add_up():
+    profiler = PipelineProfiler(trace_memory=False)
+    with profiler.phase('lex') as counts:
+        counts['tokens'] = 3
+    with profiler.statement(parse("SELECT id FROM t").children[0]):
+        with profiler.phase('plan'):
+            pass
+    totals = profiler.files[0].phase_totals()
+    assert list(totals) == ['lex', 'plan', 'execute']
+    assert totals['lex'].counts == {'tokens': 3}
+    file_report = profiler.report()['files'][0]
+    # The nested plan time is not counted again in execute
+    assert file_report['wall_seconds'] == pytest.approx(
+        sum(phase['wall_seconds'] for phase in file_report['phases'].values()), abs=1e-5)
+    assert all(timing.peak_bytes == 0 for timing in totals.values())
+
+
+def test_peak_memory_of_nested_phases():
+    with PipelineProfiler() as profiler:
+        with profiler.phase('execute'):
+            with profiler.phase('plan'):
+                data = bytearray(1 << 20)
+                del data
+    phases = profiler.files[0].phases
+    assert phases['plan'].peak_bytes >= 1 << 20
+    # The enclosing phase includes the peak of the nested one
+    assert phases['execute'].peak_bytes >= phases['plan'].peak_bytes
+
+
+def test_report_as_json(tmp_path):
+    profiler = profiled(SCRIPT, trace_memory=False)
+    path = tmp_path / 'profile.json'
+    profiler.write_json(str(path))
+    report = json.loads(path.read_text())
+    assert report == json.loads(profiler.to_json())
+    assert report['memory_traced'] is False
+    assert set(report['phases']) <= set(PHASES)
+
+
+def test_profiling_requested(monkeypatch):
+    monkeypatch.delenv('MINISQL_PROFILE', raising=False)
+    assert not profiling_requested()
+    assert profiling_requested(True)
+    monkeypatch.setenv('MINISQL_PROFILE', ' Yes ')
+    assert profiling_requested()
+    monkeypatch.setenv('MINISQL_PROFILE', '0')
+    assert not profiling_requested()
+
+
+def test_count_nodes():
+    assert count_nodes(None) == 0
+    tree = parse("SELECT id FROM t")
+    assert count_nodes(tree) == 1 + sum(count_nodes(child) for child in tree.children)
+
+
+def test_main_profiles_every_phase(tmp_path, capsys):
+    main = pytest.importorskip('main')
+    script = tmp_path / 'script.sql'
+    script.write_text(SCRIPT.replace('; ', ';\n') + ';\n')
+    output = tmp_path / 'profile.json'
+    main.main([str(script), '--profile-json', str(output), '--no-trace-memory'])
+    report = json.loads(output.read_text())
+    assert list(report['phases']) == list(PHASES)
+    assert report['phases']['lex']['tokens'] > 0
+    assert report['phases']['parse']['statements'] == 4
+    assert len(report['files'][0]['statements']) == 4
@@ -0,0 +1,89 @@
+"""Snapshot isolation: readers see a table as of one moment while writers go on"""
+
+import threading
+
+import pytest
+
+from phase4_executor import QueryExecutor, Table
+from support import Session
+
+
+ROWS = 20
+
+
+@pytest.fixture
+def table():
+    table = Table('t', [('id', 'INT'), ('v', 'FLOAT'), ('name', 'TEXT')])
+    table.append_columns([list(range(ROWS)), [float(i) for i in range(ROWS)], [f"n{i}" for i in range(ROWS)]])
+    return table
+
+
+def test_snapshot_ignores_appends(table):
+    snapshot = table.snapshot()
+    table.append_columns([[100], [1.0], ['x']])
+    assert snapshot.row_count == ROWS
+    assert len(list(snapshot.rows())) == ROWS
+    assert len(list(snapshot.live_values('name'))) == ROWS
+
+
+def test_snapshot_ignores_in_place_updates(table):
+    snapshot = table.snapshot()
+    column = table.columns['v']
+    table.update_rows([(0, {'v': -1.0})])
+    # The column was copied before being overwritten
+    assert table.columns['v'] is not column
+    assert snapshot.get_value('v', 0) == 0.0
+    assert table.get_value('v', 0) == -1.0
+
+
+def test_writes_without_snapshots_do_not_copy(table):
+    column = table.columns['v']
+    deleted = table.deleted
+    table.update_rows([(0, {'v': -1.0})])
+    table.delete_rows([1])
+    assert table.columns['v'] is column
+    assert table.deleted is deleted
+
+
+def test_snapshot_ignores_deletes_and_text_updates(table):
+    snapshot = table.snapshot()
+    table.delete_rows([2])
+    table.update_rows([(3, {'name': 'three'})])
+    assert not snapshot.is_deleted(2)
+    assert snapshot.get_row(3) == (3, 3.0, 'n3')
+    assert sorted(snapshot.rows()) == sorted((i, float(i), f"n{i}") for i in range(ROWS))
+
+
+def test_snapshots_are_tracked_weakly(table):
+    snapshot = table.snapshot()
+    assert len(table.snapshots) == 1
+    del snapshot
+    assert len(table.snapshots) == 0
+
+
+def test_readers_never_see_half_a_statement(db):
+    db.run("CREATE TABLE t (id INT, v INT)")
+    db.table('t').append_columns([list(range(500)), [0] * 500])
+    writer = Session(QueryExecutor(db.catalog))
+    stop = threading.Event()
+    seen = []
+
+    def read():
+        reader = Session(QueryExecutor(db.catalog))
+        while not stop.is_set():
+            seen.append([v for v, in reader.rows("SELECT v FROM t")])
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(30):
+            writer.run("UPDATE t SET v = v + 1")
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert seen
+    # Every scan saw all rows at one and the same value
+    assert all(len(values) == 500 and len(set(values)) == 1 for values in seen)
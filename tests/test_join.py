@@ -0,0 +1,101 @@
+"""Hash joins, in memory and partitioned to spill files (grace mode)"""
+
+from collections import Counter
+
+import pytest
+
+from phase4_executor import HashJoin, QueryExecutor
+from support import Session
+
+
+CUSTOMERS = 3000
+ORDERS = 9000
+
+
+def fill(session):
+    session.run("CREATE TABLE customers (id INT, name TEXT); CREATE TABLE orders (id INT, customer INT, total FLOAT)")
+    session.table('customers').append_columns([list(range(CUSTOMERS)), [f"c{i}" for i in range(CUSTOMERS)]])
+    # Every third order belongs to a customer that does not exist
+    session.table('orders').append_columns([
+        list(range(ORDERS)),
+        [i if i % 3 == 0 else i % CUSTOMERS for i in range(ORDERS)],
+        [float(i) for i in range(ORDERS)],
+    ])
+    return session
+
+
+@pytest.fixture
+def joined(db):
+    return fill(db)
+
+
+@pytest.fixture
+def spilling():
+    """A session whose join hash tables may hold only a handful of rows"""
+    session = fill(Session(QueryExecutor(join_memory=1)))
+    yield session
+    session.close()
+
+
+JOIN = "SELECT orders.id, customers.name FROM orders JOIN customers ON orders.customer = customers.id"
+
+
+def expected_join():
+    return sorted(
+        (i, f"c{customer}")
+        for i, customer in ((i, i if i % 3 == 0 else i % CUSTOMERS) for i in range(ORDERS))
+        if customer < CUSTOMERS
+    )
+
+
+def test_inner_join(joined):
+    assert sorted(joined.rows(JOIN)) == expected_join()
+    [join] = joined.executor.last_joins
+    assert not join.grace
+    # The smaller input is the build side
+    assert join.build_rows == CUSTOMERS
+
+
+def test_grace_join_gives_the_same_rows(spilling):
+    assert sorted(spilling.rows(JOIN)) == expected_join()
+    [join] = spilling.executor.last_joins
+    assert join.grace
+    assert join.partitions > 1
+    assert join.spilled_bytes > 0
+    assert join.build_rows == CUSTOMERS
+    assert join.probe_rows == ORDERS
+
+
+def test_filters_are_pushed_below_the_join(spilling):
+    rows = spilling.rows(
+        "SELECT orders.id, name, total FROM orders JOIN customers ON customer = customers.id "
+        "WHERE customers.id < 10 AND total > 3000 AND orders.id != customer"
+    )
+    expected = sorted(
+        (i, f"c{i % CUSTOMERS}", float(i)) for i in range(3001, ORDERS)
+        if i % 3 and i % CUSTOMERS < 10
+    )
+    assert sorted(rows) == expected
+
+
+def test_aggregating_a_spilled_join(spilling):
+    rows = sorted(spilling.rows(
+        "SELECT customers.id, COUNT(*) FROM orders JOIN customers ON orders.customer = customers.id "
+        "GROUP BY customers.id HAVING customers.id < 3"
+    ))
+    counts = Counter(name for _, name in expected_join())
+    assert rows == [(i, counts[f"c{i}"]) for i in range(3)]
+
+
+def test_join_needs_an_equality(joined):
+    errors = joined.fails("SELECT * FROM orders JOIN customers ON orders.total > customers.id")
+    assert "needs an ON condition" in errors[0]
+
+
+def test_duplicate_keys_and_nulls():
+    join = HashJoin(lambda row: row[0], lambda row: row[0], True, memory_limit=1)
+    build = [(1, 'a'), (1, 'b'), (None, 'n')] + [(k, 'x') for k in range(2, 200)]
+    probe = [(1, 'p'), (None, 'q'), (2, 'r')]
+    rows = sorted(join.run(build, probe))
+    assert rows == [(1, 'a', 1, 'p'), (1, 'b', 1, 'p'), (2, 'x', 2, 'r')]
+    assert join.grace
@@ -0,0 +1,73 @@
+"""The command line driver (main.py)"""
+
+import pytest
+
+pytest.importorskip('rich')
+
+import main  # noqa: E402
+
+
+SETUP = "CREATE TABLE t (id INT, v INT);\nINSERT INTO t VALUES (1, 5);\nINSERT INTO t VALUES (2, 0);\n"
+
+
+def run_script(tmp_path, sql):
+    path = tmp_path / 'script.sql'
+    path.write_text(sql)
+    return main.run_file(str(path))
+
+
+def test_runs_a_valid_script(tmp_path, monkeypatch):
+    closed = []
+    monkeypatch.setattr(main.QueryExecutor, 'close', lambda self: closed.append(self))
+    executor = run_script(tmp_path, SETUP + "DELETE FROM t WHERE v > 3;\n")
+    assert executor is not None
+    assert executor.catalog.get_table('t').live_row_count == 1
+    assert closed == [executor]
+
+
+@pytest.mark.parametrize('where', ["v BETWEEN -3 AND 0", "v IN (-3)", "v < -3"])
+def test_script_with_syntax_errors_is_not_executed(tmp_path, monkeypatch, where):
+    executed = []
+    monkeypatch.setattr(main.QueryExecutor, 'execute', lambda self, tree: executed.append(tree) or [])
+    assert run_script(tmp_path, SETUP + f"DELETE FROM t WHERE {where};\n") is None
+    assert executed == []
+
+
+def test_database_persists_between_runs(tmp_path, capsys):
+    script = tmp_path / 'script.sql'
+    script.write_text(SETUP)
+    database = str(tmp_path / 'db')
+    main.main([str(script), '--database', database])
+    script.write_text("INSERT INTO t VALUES (3, 1);\nSELECT COUNT(*) FROM t;\n")
+    main.main([str(script), '--database', database])
+
+    catalog, wal = main.open_database(database)
+    wal.close()
+    assert catalog.get_table('t').live_row_count == 3
+
+
+def test_log_is_closed_when_the_last_checkpoint_fails(tmp_path, monkeypatch):
+    script = tmp_path / 'script.sql'
+    script.write_text(SETUP)
+    database = str(tmp_path / 'db')
+    open_database = main.open_database
+    opened = []
+
+    def fail(catalog, directory):
+        raise OSError(28, 'No space left on device')
+
+    def open_and_fail_checkpoints(directory):
+        catalog, wal = open_database(directory)
+        wal.checkpoint = fail
+        opened.append(wal)
+        return catalog, wal
+
+    monkeypatch.setattr(main, 'open_database', open_and_fail_checkpoints)
+    with pytest.raises(OSError):
+        main.main([str(script), '--database', database])
+    assert opened[0]._closed
+
+    # The log still holds every write
+    catalog, wal = open_database(database)
+    wal.close()
+    assert catalog.get_table('t').live_row_count == 2
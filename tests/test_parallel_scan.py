@@ -0,0 +1,104 @@
+"""Parallel scans over shared-memory copies of the columns"""
+
+import pytest
+
+from phase4_executor import QueryExecutor
+from phase4_executor.parallel_scan import SharedBuffer
+from support import Session
+
+
+ROWS = 2000
+
+
+@pytest.fixture
+def parallel():
+    """A session scanning every table in 2 worker processes, plus a second serial session on its catalog"""
+    session = Session(QueryExecutor(parallelism=2))
+    session.executor.scanner.threshold = 1
+    session.run("CREATE TABLE t (id INT, name TEXT)")
+    session.table('t').append_columns([list(range(ROWS)), [f"n{i}" for i in range(ROWS)]])
+    yield session, Session(QueryExecutor(session.catalog))
+    session.close()
+
+
+def test_parallel_scan_matches_serial(parallel):
+    session, serial = parallel
+    sql = "SELECT id, name FROM t WHERE id % 7 = 3"
+    assert session.rows(sql) == serial.rows(sql)
+    assert len(session.rows(sql)) == len(range(3, ROWS, 7))
+
+
+def test_shared_copy_follows_writes(parallel):
+    session, _ = parallel
+    assert session.rows("SELECT COUNT(*) FROM t WHERE id < 10") == [(10,)]
+    session.run("DELETE FROM t WHERE id < 5")
+    assert session.rows("SELECT id FROM t WHERE id < 10") == [(i,) for i in range(5, 10)]
+
+
+def test_appended_rows_extend_the_shared_copy(parallel):
+    session, _ = parallel
+    session.rows("SELECT id FROM t WHERE id < 3")
+    scanner = session.executor.scanner
+    shared = scanner._shared['t']
+    for i in range(3):
+        session.run(f"INSERT INTO t VALUES ({ROWS + i}, 'x{i}')")
+    session.run("DELETE FROM t WHERE id = 1")
+
+    assert session.rows("SELECT id, name FROM t WHERE id = 1 OR id > 1998") == [
+        (1999, 'n1999'), (ROWS, 'x0'), (ROWS + 1, 'x1'), (ROWS + 2, 'x2')
+    ]
+    # Only the new rows (and the deletion map) were copied
+    assert scanner._shared['t'] is shared and shared.row_count == ROWS + 3
+
+    # An UPDATE changes rows already copied
+    session.run("UPDATE t SET id = 5000 WHERE id = 2")
+    assert session.rows("SELECT id FROM t WHERE id > 4999") == [(5000,)]
+    assert scanner._shared['t'] is not shared
+
+
+def test_rows_appended_while_the_shared_copy_is_made(parallel, monkeypatch):
+    session, _ = parallel
+    table = session.table('t')
+    append = SharedBuffer.append
+
+    def append_while_copying(self, data):
+        table.append_row([ROWS, 'late'])
+        append(self, data)
+
+    monkeypatch.setattr(SharedBuffer, 'append', append_while_copying)
+    # The scan reads the table as it was when it started
+    assert session.rows("SELECT id FROM t WHERE id >= 1995") == [(i,) for i in range(1995, ROWS)]
+    monkeypatch.undo()
+
+    assert table.row_count > ROWS
+    assert all(len(column) == table.row_count for column in table.columns.values())
+    assert session.rows("SELECT id FROM t WHERE id = 1999 OR name = 'late'")[:2] == [(1999,), (ROWS,)]
+
+
+def test_shared_copy_is_not_reused_for_a_loaded_table(parallel, tmp_path):
+    session, other = parallel
+    path = str(tmp_path / 'snap')
+    other.run(f"SAVE SNAPSHOT '{path}'")
+    other.run("DELETE FROM t WHERE id = 1")
+    assert session.rows("SELECT id FROM t WHERE id = 1") == []
+    version = session.table('t').version
+
+    # Another session loads a table of the same name, size and version
+    other.run(f"LOAD SNAPSHOT '{path}'")
+    other.table('t').version = version
+    assert other.table('t').row_count == ROWS
+
+    assert session.rows("SELECT id FROM t WHERE id = 1") == [(1,)]
+
+
+def test_load_snapshot_frees_the_shared_copies(parallel, tmp_path):
+    session, _ = parallel
+    path = str(tmp_path / 'snap')
+    session.run(f"SAVE SNAPSHOT '{path}'")
+    session.rows("SELECT id FROM t WHERE id = 1")
+    assert session.executor.scanner._shared
+
+    session.run(f"LOAD SNAPSHOT '{path}'")
+
+    assert not session.executor.scanner._shared
+    assert session.rows("SELECT id FROM t WHERE id = 1") == [(1,)]
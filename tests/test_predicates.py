@@ -0,0 +1,105 @@
+"""IN, BETWEEN and LIKE predicates"""
+
+import pytest
+
+from support import parse_with_errors
+
+
+@pytest.fixture
+def people(db):
+    db.run("CREATE TABLE p (id INT, age INT, name TEXT)")
+    db.run(
+        "INSERT INTO p VALUES (1, 15, 'alice'); INSERT INTO p VALUES (2, 30, 'bob');"
+        "INSERT INTO p VALUES (3, 45, 'alan'); INSERT INTO p VALUES (4, 30, 'carol_x');"
+        "INSERT INTO p VALUES (5, 60, 'a%b')"
+    )
+    return db
+
+
+def ids(db, where):
+    return sorted(row[0] for row in db.rows(f"SELECT id FROM p WHERE {where}"))
+
+
+@pytest.mark.parametrize('where, expected', [
+    ("age IN (30, 60)", [2, 4, 5]),
+    ("age NOT IN (30, 60)", [1, 3]),
+    ("name IN ('bob', 'nobody')", [2]),
+    ("age IN (30)", [2, 4]),
+    ("age BETWEEN 30 AND 45", [2, 3, 4]),
+    ("age NOT BETWEEN 30 AND 45", [1, 5]),
+    ("age BETWEEN 45 AND 30", []),
+    ("age BETWEEN 30 AND 45 AND id > 2", [3, 4]),
+    ("name LIKE 'al%'", [1, 3]),
+    ("name LIKE '%o%'", [2, 4]),
+    ("name LIKE 'b_b'", [2]),
+    ("name LIKE 'bob'", [2]),
+    ("name NOT LIKE 'a%'", [2, 4]),
+    ("name LIKE 'carol_x'", [4]),
+])
+def test_predicate_semantics(people, where, expected):
+    assert ids(people, where) == expected
+
+
+def test_predicates_prune_blocks(db):
+    db.run("CREATE TABLE t (id INT, name TEXT)")
+    db.table('t').append_columns([list(range(20000)), [f"k{i:05d}" for i in range(20000)]])
+    assert db.rows("SELECT COUNT(*) FROM t WHERE id BETWEEN 100 AND 199") == [(100,)]
+    assert db.rows("SELECT COUNT(*) FROM t WHERE id IN (5, 15000, 99999)") == [(2,)]
+    assert db.rows("SELECT COUNT(*) FROM t WHERE name LIKE 'k0001%'") == [(10,)]
+    explain = dict(db.rows("EXPLAIN SELECT id FROM t WHERE id BETWEEN 100 AND 199"))
+    assert explain['blocks skipped'] > 0
+
+
+@pytest.mark.parametrize('where, message', [
+    ("age = 'x'", "Cannot compare values with '='"),
+    ("'x' != age", "Cannot compare values with '!='"),
+    ("name = 5", "Cannot compare values with '='"),
+    ("age + 1 > 'x'", "Cannot compare values with '>'"),
+    ("age IN ('x')", "Cannot compare values with 'IN'"),
+    ("name NOT IN (1, 'bob')", "Cannot compare values with 'IN'"),
+    ("age BETWEEN 'a' AND 'b'", "Cannot compare values with 'BETWEEN'"),
+    ("age LIKE 'x%'", "LIKE needs a TEXT value"),
+    ("name LIKE 5", "LIKE needs a TEXT pattern"),
+    ("id = 1 OR age = 'x'", "Cannot compare values with '='"),
+])
+def test_text_and_numbers_are_not_compared(people, where, message):
+    [error] = people.fails(f"SELECT id FROM p WHERE {where}")
+    assert message in error
+    [error] = people.fails(f"DELETE FROM p WHERE {where}")
+    assert message in error
+    assert people.rows("SELECT COUNT(*) FROM p") == [(5,)]
+
+
+def test_type_errors_do_not_need_rows(db):
+    db.run("CREATE TABLE t (id INT, name TEXT); CREATE TABLE u (id INT, name TEXT)")
+    assert "Cannot compare values with '='" in db.fails("SELECT id FROM t WHERE id = 'x'")[0]
+    assert "Cannot compare values with '='" in db.fails("SELECT t.id FROM t JOIN u ON t.id = u.name")[0]
+    assert db.rows("SELECT t.id FROM t JOIN u ON t.id = u.id WHERE u.name = 'x'") == []
+
+
+@pytest.mark.parametrize('statement', [
+    "DELETE FROM p WHERE age BETWEEN -3 AND 0",
+    "DELETE FROM p WHERE age IN (-3)",
+    "DELETE FROM p WHERE age IN (1,)",
+    "DELETE FROM p WHERE age BETWEEN 1",
+    "DELETE FROM p WHERE age >",
+    "DELETE FROM p WHERE age > 1 AND",
+    "DELETE FROM p WHERE age > 1 OR age <",
+    "DELETE FROM p WHERE NOT",
+    "DELETE FROM p WHERE",
+    "DELETE FROM p WHERE age + > 3",
+    "UPDATE p SET name = 'x' WHERE age IN (-3)",
+    "UPDATE p SET name = 'x', age = -3 WHERE id = 1",
+    "SELECT id FROM p WHERE name LIKE",
+    "SELECT id FROM p WHERE age > 1 GROUP BY",
+])
+def test_malformed_condition_drops_the_statement(statement):
+    tree, errors = parse_with_errors(statement + ";")
+    assert errors
+    assert tree.children == []
+
+
+def test_statements_after_a_malformed_one_still_parse():
+    tree, errors = parse_with_errors("DELETE FROM p WHERE age IN (-3); SELECT id FROM p WHERE age IN (1, 2);")
+    assert len(errors) >= 1
+    assert [statement.node_type for statement in tree.children] == ['SELECT_STMT']
@@ -0,0 +1,67 @@
+"""Scans read only the columns a statement references, for the rows that pass its filters"""
+
+import pytest
+
+from phase4_executor.zone_map import BLOCK_SIZE
+
+
+ROWS = 2 * BLOCK_SIZE
+
+
+class CountingColumn(list):
+    """A TEXT column that counts the values read from it"""
+
+    reads = 0
+
+    def __getitem__(self, item):
+        values = super().__getitem__(item)
+        type(self).reads += len(values) if isinstance(item, slice) else 1
+        return values
+
+    def __iter__(self):
+        for value in super().__iter__():
+            type(self).reads += 1
+            yield value
+
+
+@pytest.fixture
+def wide(db):
+    """t(id, grp, payload) where reads of payload are counted"""
+    db.run("CREATE TABLE t (id INT, grp INT, payload TEXT)")
+    table = db.table('t')
+    table.append_columns([list(range(ROWS)), [i % 100 for i in range(ROWS)], [f"p{i}" for i in range(ROWS)]])
+    table.columns['payload'] = CountingColumn(table.columns['payload'])
+    CountingColumn.reads = 0
+    return db
+
+
+def test_unreferenced_columns_are_not_read(wide):
+    assert wide.rows("SELECT id FROM t WHERE grp = 7 AND id < 300") == [(7,), (107,), (207,)]
+    assert wide.rows("SELECT COUNT(*), MAX(grp) FROM t") == [(ROWS, 99)]
+    wide.run("UPDATE t SET grp = grp + 1 WHERE id = 5")
+    assert CountingColumn.reads == 0
+
+
+def test_referenced_columns_are_read_after_filtering(wide):
+    assert wide.rows("SELECT payload FROM t WHERE grp = 3 AND id % 7 = 0") == [
+        (f"p{i}",) for i in range(ROWS) if i % 100 == 3 and i % 7 == 0
+    ]
+    # Only the rows that passed had their payload fetched
+    assert CountingColumn.reads == len([i for i in range(ROWS) if i % 100 == 3 and i % 7 == 0])
+
+
+def test_order_by_columns_are_read(wide):
+    rows = wide.rows("SELECT id FROM t WHERE id < 3 ORDER BY payload DESC")
+    assert rows == [(2,), (1,), (0,)]
+    assert CountingColumn.reads == 3
+
+
+def test_star_reads_every_column(wide):
+    assert len(wide.rows("SELECT * FROM t WHERE id < 10")) == 10
+    assert CountingColumn.reads >= 10
+
+
+def test_delete_reads_only_its_where_columns(wide):
+    result = wide.run("DELETE FROM t WHERE grp = 1")[0]
+    assert result.row_count == len(range(1, ROWS, 100))
+    assert CountingColumn.reads == 0
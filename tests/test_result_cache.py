@@ -0,0 +1,116 @@
+"""SELECT result cache: fingerprints, invalidation on writes and the memory budget"""
+
+import pytest
+
+from phase4_executor import QueryExecutor, ResultCache, connect
+from phase4_executor.result_cache import result_size
+from support import Session
+
+
+@pytest.fixture
+def cached(db):
+    db.catalog.result_cache = ResultCache()
+    db.run("CREATE TABLE t (id INT, name TEXT)")
+    for i in range(5):
+        db.run(f"INSERT INTO t VALUES ({i}, 'n{i}')")
+    return db
+
+
+def cache_of(session):
+    return session.catalog.result_cache
+
+
+def test_repeated_select_is_a_hit(cached):
+    first = cached.rows("SELECT id FROM t WHERE id > 2")
+    second = cached.rows("SELECT  id\nFROM t   WHERE id > 2 -- same statement")
+    assert first == second == [(3,), (4,)]
+    assert (cache_of(cached).hits, cache_of(cached).misses) == (1, 1)
+
+
+def test_parameters_are_part_of_the_key(cached):
+    connection = connect(cached.catalog)
+    sql = "SELECT id FROM t WHERE id = ?"
+    assert connection.execute(sql, (1,)).fetchall() == [(1,)]
+    assert connection.execute(sql, (2,)).fetchall() == [(2,)]
+    assert connection.execute(sql, (1.0,)).fetchall() == [(1,)]
+    assert cache_of(cached).hits == 0
+    assert connection.execute(sql, (2,)).fetchall() == [(2,)]
+    assert cache_of(cached).hits == 1
+    connection.close()
+
+
+@pytest.mark.parametrize('write', [
+    "INSERT INTO t VALUES (9, 'n9')",
+    "UPDATE t SET id = 9 WHERE id = 0",
+    "DELETE FROM t WHERE id = 0",
+])
+def test_writes_invalidate(cached, write):
+    before = cached.rows("SELECT id, name FROM t")
+    cached.run(write)
+    assert cache_of(cached).invalidations == 1
+    assert cached.rows("SELECT id, name FROM t") != before
+    assert cache_of(cached).hits == 0
+
+
+def test_writes_by_another_session_invalidate(cached):
+    other = Session(QueryExecutor(cached.catalog))
+    cached.rows("SELECT id FROM t")
+    other.run("INSERT INTO t VALUES (5, 'n5')")
+    assert len(cached.rows("SELECT id FROM t")) == 6
+
+
+def test_a_version_change_alone_is_detected(cached):
+    cached.rows("SELECT id FROM t")
+    # A change that bypassed the executor
+    cached.table('t').append_row([5, 'n5'])
+    assert len(cached.rows("SELECT id FROM t")) == 6
+    assert cache_of(cached).invalidations == 1
+
+
+def test_a_replaced_table_is_detected(cached, tmp_path):
+    path = str(tmp_path / 'snap')
+    cached.run(f"SAVE SNAPSHOT '{path}'")
+    cached.run("INSERT INTO t VALUES (5, 'n5')")
+    version = cached.table('t').version
+    connection = connect(cached.catalog)
+    cursor = connection.execute("SELECT id FROM t")
+    assert cursor.fetchmany(1) == [(0,)]
+
+    Session(QueryExecutor(cached.catalog)).run(f"LOAD SNAPSHOT '{path}'")
+    cached.table('t').version = version
+    # The cursor still reads the replaced table and caches its rows once done
+    assert len(cursor.fetchall()) == 5
+    assert len(cached.rows("SELECT id FROM t")) == 5
+    connection.close()
+
+
+def test_transactions_with_writes_bypass_the_cache(cached):
+    cached.rows("SELECT COUNT(*) FROM t")
+    cached.run("BEGIN; DELETE FROM t WHERE id = 1")
+    assert cached.rows("SELECT COUNT(*) FROM t") == [(4,)]
+    cached.run("ROLLBACK")
+    assert cached.rows("SELECT COUNT(*) FROM t") == [(5,)]
+    assert cache_of(cached).hits == 1
+
+
+def test_partly_read_results_are_not_cached(cached):
+    connection = connect(cached.catalog)
+    cursor = connection.execute("SELECT id FROM t")
+    assert cursor.fetchone() == (0,)
+    cursor.close()
+    assert len(cache_of(cached)) == 0
+    connection.close()
+
+
+def test_budget_evicts_least_recently_used():
+    rows = [(i, 'x' * 20) for i in range(20)]
+    # Room for four results
+    cache = ResultCache(capacity=4 * result_size(['a', 'b'], rows))
+    for key in range(5):
+        cache.store(key, ['a', 'b'], rows, {})
+    assert cache.used <= cache.capacity
+    assert cache.evictions == 1
+    assert list(cache.entries) == [1, 2, 3, 4]
+
+    cache.store('big', ['a'], [(i,) for i in range(10000)], {})
+    assert 'big' not in cache.entries
@@ -0,0 +1,104 @@
+"""Concurrent execution of the independent statements of a script"""
+
+import threading
+
+import pytest
+
+from phase4_executor import QueryExecutor, StatementScheduler
+from phase4_executor.scheduler import dependency_graph, statement_tables
+from support import Session, parse
+
+
+def statements(sql):
+    return parse(sql).children
+
+
+SCRIPT = """
+    CREATE TABLE a (x INT);
+    CREATE TABLE b (y INT);
+    INSERT INTO a VALUES (1);
+    INSERT INTO b VALUES (2);
+    SELECT x FROM a;
+    SELECT y FROM b;
+    UPDATE a SET x = 10;
+    SELECT x, y FROM a JOIN b ON a.x = b.y;
+    ANALYZE;
+    SELECT y FROM b;
+"""
+
+
+def test_statement_tables():
+    create, _, insert, _, select, _, update, join, analyze, _ = statements(SCRIPT)
+    assert statement_tables(create) == (set(), {'a'})
+    assert statement_tables(select) == ({'a'}, set())
+    assert statement_tables(join) == ({'a', 'b'}, set())
+    assert statement_tables(analyze) is None
+
+
+def test_dependency_graph():
+    assert dependency_graph(statements(SCRIPT)) == [
+        set(), set(),
+        {0}, {1},
+        {2}, {3},
+        # The UPDATE waits for the last write of a and for its reader since
+        {2, 4},
+        {6, 3},
+        # ANALYZE of every table is a barrier
+        {0, 1, 2, 3, 4, 5, 6, 7},
+        {8},
+    ]
+
+
+def test_results_come_back_in_script_order():
+    session = Session(QueryExecutor(statement_workers=4))
+    results = session.run(SCRIPT)
+    assert [result.statement_type for result in results] == [node.node_type for node in statements(SCRIPT)]
+    assert results[4].rows == [(1,)]
+    assert results[7].rows == []
+    assert session.rows("SELECT x FROM a") == [(10,)]
+    session.close()
+
+
+def test_independent_statements_overlap():
+    scheduler = StatementScheduler(4)
+    barrier = threading.Barrier(3, timeout=5)
+    nodes = statements("SELECT x FROM a; SELECT y FROM b; SELECT z FROM c")
+
+    def execute(index, node):
+        # Returns only once all three statements are running
+        barrier.wait()
+        return index
+
+    outcomes = scheduler.run(nodes, execute)
+    assert outcomes == [0, 1, 2]
+    assert scheduler.max_concurrency == 3
+
+
+def test_dependent_statements_run_in_order():
+    scheduler = StatementScheduler(4)
+    order = []
+    nodes = statements("INSERT INTO a VALUES (1); SELECT x FROM a; UPDATE a SET x = 2; SELECT x FROM a")
+    scheduler.run(nodes, lambda index, node: order.append(index))
+    assert order == [0, 1, 2, 3]
+    assert scheduler.max_concurrency == 1
+
+
+def test_failures_are_reported_in_order():
+    session = Session(QueryExecutor(statement_workers=4))
+    session.executor.execute(parse("CREATE TABLE a (x INT); SELECT x FROM missing; SELECT nope FROM a"))
+    errors = session.take_errors()
+    assert len(errors) == 2
+    assert "missing" in errors[0] and "nope" in errors[1]
+    session.close()
+
+
+def test_exceptions_stop_the_run():
+    scheduler = StatementScheduler(2)
+
+    def execute(index, node):
+        if index == 1:
+            raise RuntimeError("boom")
+        return index
+
+    with pytest.raises(RuntimeError):
+        scheduler.run(statements("SELECT x FROM a; INSERT INTO a VALUES (1); SELECT x FROM a"), execute)
@@ -0,0 +1,129 @@
+"""Query server and client: framing, sessions, streaming, pipelining and pooling"""
+
+import asyncio
+
+import pytest
+
+from phase4_executor import Catalog, ClientConnection, ConnectionPool, DatabaseError, ProgrammingError, Table
+from phase4_executor.protocol import FRAME_HEADER, MAX_FRAME_SIZE, ProtocolError, encode_frame, read_frame
+from phase4_executor.server import QueryServer
+
+
+ROWS = 2500
+BATCH_SIZE = 1000
+
+
+def run_with_server(test, tmp_path):
+    """Run `await test(server, path)` against a server holding t(id, name) with ROWS rows"""
+    async def run():
+        catalog = Catalog()
+        table = Table('t', [('id', 'INT'), ('name', 'TEXT')])
+        table.append_columns([list(range(ROWS)), [f"n{i}" for i in range(ROWS)]])
+        catalog.tables['t'] = table
+        server = QueryServer(catalog, batch_size=BATCH_SIZE)
+        path = str(tmp_path / 'server.sock')
+        await server.start(path=path)
+        try:
+            await test(server, path)
+        finally:
+            await server.close()
+    asyncio.run(run())
+
+
+def read(data):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_frame(reader)
+    return asyncio.run(run())
+
+
+def test_frames_round_trip():
+    message = {'id': 1, 'sql': "SELECT name FROM t WHERE name = 'é'", 'parameters': [1, 2.5, None]}
+    assert read(encode_frame(message)) == message
+    assert read(b'') is None
+
+
+@pytest.mark.parametrize('data, error', [
+    (FRAME_HEADER.pack(MAX_FRAME_SIZE + 1), "exceeds"),
+    (FRAME_HEADER.pack(3) + b'{x}', "valid JSON"),
+    (FRAME_HEADER.pack(2) + b'[]', "JSON object"),
+])
+def test_malformed_frames_are_rejected(data, error):
+    with pytest.raises(ProtocolError, match=error):
+        read(data)
+
+
+def test_statements_and_results(tmp_path):
+    async def test(server, path):
+        async with await ClientConnection.open(path) as client:
+            result = await client.execute("SELECT id, name FROM t WHERE id < ?", [3])
+            assert result.columns == ['id', 'name']
+            assert result.rows == [(0, 'n0'), (1, 'n1'), (2, 'n2')]
+            assert result.row_count == 3
+
+            result = await client.execute("DELETE FROM t WHERE id >= 10")
+            assert result.columns == [] and result.row_count == ROWS - 10
+
+            with pytest.raises(ProgrammingError):
+                await client.execute("SELEC 1")
+            with pytest.raises(DatabaseError):
+                await client.execute("SELECT id FROM missing")
+            # The session survives errors
+            assert (await client.execute("SELECT id FROM t WHERE id > 7")).rows == [(8,), (9,)]
+        assert server.connection_count == 1
+    run_with_server(test, tmp_path)
+
+
+def test_rows_stream_in_batches(tmp_path):
+    async def test(server, path):
+        async with await ClientConnection.open(path) as client:
+            ids = [row[0] async for row in client.stream("SELECT id FROM t")]
+            assert ids == list(range(ROWS))
+    run_with_server(test, tmp_path)
+
+
+def test_pipelined_requests_are_answered_in_order(tmp_path):
+    async def test(server, path):
+        async with await ClientConnection.open(path) as client:
+            results = await asyncio.gather(*(
+                client.execute("SELECT id FROM t WHERE id = ?", [i]) for i in range(20)
+            ))
+            assert [result.rows for result in results] == [[(i,)] for i in range(20)]
+    run_with_server(test, tmp_path)
+
+
+def test_sessions_share_the_catalog_but_not_transactions(tmp_path):
+    async def test(server, path):
+        async with await ClientConnection.open(path) as first, await ClientConnection.open(path) as second:
+            await first.execute("BEGIN")
+            await first.execute("INSERT INTO t VALUES (?, ?)", [ROWS, 'new'])
+            assert (await second.execute("SELECT COUNT(*) FROM t")).rows == [(ROWS,)]
+            await first.execute("COMMIT")
+            assert (await second.execute("SELECT COUNT(*) FROM t")).rows == [(ROWS + 1,)]
+    run_with_server(test, tmp_path)
+
+
+def test_connection_pool(tmp_path):
+    async def test(server, path):
+        async with ConnectionPool(path, size=3) as pool:
+            results = await asyncio.gather(*(pool.execute("SELECT id FROM t WHERE id = 7") for _ in range(12)))
+            assert all(result.rows == [(7,)] for result in results)
+            assert 1 <= len(pool.connections) <= 3
+        assert server.statement_count == 12
+    run_with_server(test, tmp_path)
+
+
+def test_requests_in_flight_fail_when_the_server_closes(tmp_path):
+    async def test(server, path):
+        client = await ClientConnection.open(path)
+        await client.execute("SELECT id FROM t WHERE id = 0")
+        for task in list(server.sessions):
+            task.cancel()
+        await client.reader_task
+        assert client.closed
+        with pytest.raises(DatabaseError, match="closed"):
+            await client.execute("SELECT id FROM t WHERE id = 0")
+        await client.close()
+    run_with_server(test, tmp_path)
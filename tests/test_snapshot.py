@@ -0,0 +1,115 @@
+"""SAVE SNAPSHOT / LOAD SNAPSHOT: round trip, atomic replacement and releasing the old tables"""
+
+import json
+import os
+
+import pytest
+
+from phase4_executor import MappedTable, load_snapshot, save_snapshot
+from phase4_executor.storage import SNAPSHOT_MANIFEST, StorageError
+
+
+@pytest.fixture
+def filled(db):
+    db.run("""
+        CREATE TABLE users (id INT, name TEXT, score FLOAT);
+        CREATE TABLE tags (id INT, tag TEXT);
+        INSERT INTO users VALUES (1, 'ann', 1.5);
+        INSERT INTO users VALUES (2, 'bob', 2.5);
+        INSERT INTO users VALUES (3, 'cy', 3.5);
+        INSERT INTO tags VALUES (1, 'a');
+        INSERT INTO tags VALUES (2, 'b');
+        DELETE FROM users WHERE id = 2;
+    """)
+    return db
+
+
+def manifest(directory):
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST)) as file:
+        return json.load(file)
+
+
+def test_round_trip(filled, tmp_path):
+    path = str(tmp_path / 'snap')
+    filled.run(f"SAVE SNAPSHOT '{path}'")
+    filled.run("INSERT INTO users VALUES (9, 'zed', 9.5)")
+
+    filled.run(f"LOAD SNAPSHOT '{path}'")
+
+    assert sorted(filled.rows("SELECT id, name, score FROM users")) == [(1, 'ann', 1.5), (3, 'cy', 3.5)]
+    assert sorted(filled.rows("SELECT * FROM tags")) == [(1, 'a'), (2, 'b')]
+    assert isinstance(filled.table('users'), MappedTable)
+    # Loaded tables take writes like any other
+    filled.run("UPDATE users SET score = 0.5 WHERE id = 1")
+    assert filled.rows("SELECT score FROM users WHERE id = 1") == [(0.5,)]
+
+
+def test_saving_again_writes_a_new_generation(filled, tmp_path):
+    path = str(tmp_path / 'snap')
+    filled.run(f"SAVE SNAPSHOT '{path}'")
+    first = manifest(path)
+    filled.run("INSERT INTO tags VALUES (3, 'c')")
+    filled.run(f"SAVE SNAPSHOT '{path}'")
+    second = manifest(path)
+
+    assert second['generation'] == first['generation'] + 1
+    assert sorted(os.listdir(path)) == sorted([second['data'], SNAPSHOT_MANIFEST])
+    filled.run(f"LOAD SNAPSHOT '{path}'")
+    assert filled.rows("SELECT COUNT(*) FROM tags") == [(3,)]
+
+
+def test_interrupted_save_leaves_previous_snapshot_loadable(filled, tmp_path, monkeypatch):
+    path = str(tmp_path / 'snap')
+    filled.run(f"SAVE SNAPSHOT '{path}'")
+    filled.run("INSERT INTO tags VALUES (3, 'c')")
+
+    from phase4_executor import storage
+    calls = []
+
+    def fail_on_second_table(table, directory, compression=True):
+        calls.append(table.name)
+        if len(calls) == 2:
+            raise OSError(28, 'No space left on device')
+        return save_table(table, directory, compression)
+
+    save_table = storage.save_table
+    monkeypatch.setattr(storage, 'save_table', fail_on_second_table)
+    with pytest.raises(OSError):
+        save_snapshot(filled.catalog, path, workers=1)
+    monkeypatch.undo()
+
+    catalog = load_snapshot(path)
+    assert catalog.get_table('tags').row_count == 2
+    assert catalog.get_table('users').live_row_count == 2
+
+
+def test_load_releases_replaced_maps(filled, tmp_path):
+    path = str(tmp_path / 'snap')
+    filled.run(f"SAVE SNAPSHOT '{path}'")
+    filled.run(f"LOAD SNAPSHOT '{path}'")
+    first = filled.table('users')
+    assert first._maps
+
+    filled.run(f"LOAD SNAPSHOT '{path}'")
+
+    assert filled.table('users') is not first
+    assert first.released and not first._maps and not first._views
+    assert sorted(filled.rows("SELECT id FROM users")) == [(1,), (3,)]
+
+
+def test_load_keeps_running_readers_consistent(filled, tmp_path):
+    path = str(tmp_path / 'snap')
+    filled.run(f"SAVE SNAPSHOT '{path}'")
+    filled.run(f"LOAD SNAPSHOT '{path}'")
+    view = filled.table('users').snapshot()
+
+    filled.run(f"LOAD SNAPSHOT '{path}'")
+
+    # The view still reads the replaced table's mapped columns
+    assert sorted(view.columns['id'][row] for row in range(view.row_count) if not view.deleted[row]) == [1, 3]
+
+
+def test_load_of_missing_snapshot_fails(db, tmp_path):
+    with pytest.raises(StorageError):
+        load_snapshot(str(tmp_path / 'missing'))
+    assert db.fails(f"LOAD SNAPSHOT '{tmp_path / 'missing'}'")
@@ -0,0 +1,87 @@
+"""ORDER BY: in-memory sorts, external sorts with spilled runs, and top-K"""
+
+import random
+
+import pytest
+
+from phase4_executor import ExternalSort, QueryExecutor
+from phase4_executor.sort import MERGE_FAN_IN, top_rows
+from support import Session
+
+
+ROWS = 6000
+
+
+def fill(session):
+    rng = random.Random(7)
+    session.run("CREATE TABLE t (id INT, grp INT, name TEXT)")
+    ids = list(range(ROWS))
+    rng.shuffle(ids)
+    session.table('t').append_columns([ids, [i % 10 for i in ids], [f"n{rng.randrange(1000)}" for _ in ids]])
+    return session
+
+
+@pytest.fixture
+def ordered(db):
+    return fill(db)
+
+
+@pytest.fixture
+def spilling():
+    """A session that may buffer only a handful of rows per sorted run"""
+    session = fill(Session(QueryExecutor(sort_memory=1)))
+    yield session
+    session.close()
+
+
+def test_in_memory_sort(ordered):
+    assert ordered.rows("SELECT id FROM t ORDER BY id") == [(i,) for i in range(ROWS)]
+    assert ordered.executor.last_sort.runs == 0
+
+
+def test_external_sort_gives_the_same_order(ordered, spilling):
+    sql = "SELECT grp, name, id FROM t ORDER BY grp DESC, name, id"
+    rows = spilling.rows(sql)
+    sort = spilling.executor.last_sort
+    assert sort.runs > MERGE_FAN_IN
+    assert sort.merge_passes == 1
+    assert sort.spilled_bytes > 0
+    assert sort.rows == ROWS
+    assert rows == ordered.rows(sql)
+    assert rows == sorted(rows, key=lambda row: (-row[0], row[1], row[2]))
+
+
+def test_external_sort_is_stable(spilling):
+    rows = spilling.rows("SELECT grp, id FROM t ORDER BY grp")
+    table = spilling.table('t')
+    input_order = {row_id: position for position, row_id in enumerate(table.live_values('id'))}
+    for grp in range(10):
+        ids = [row_id for g, row_id in rows if g == grp]
+        assert ids == sorted(ids, key=input_order.__getitem__)
+
+
+def test_limit_uses_top_k(spilling):
+    assert spilling.rows("SELECT id FROM t ORDER BY id DESC LIMIT 3") == [(ROWS - 1,), (ROWS - 2,), (ROWS - 3,)]
+    # A heap of three rows, no sort at all
+    assert spilling.executor.last_sort is None
+    assert spilling.rows("SELECT id FROM t ORDER BY id LIMIT 0") == []
+
+
+def test_order_by_an_expression(ordered):
+    assert ordered.rows("SELECT id FROM t WHERE id < 5 ORDER BY id % 3, id") == [(0,), (3,), (1,), (4,), (2,)]
+
+
+@pytest.mark.parametrize('memory', [1, 1 << 20])
+def test_nulls_sort_last_ascending_and_first_descending(memory):
+    entries = [(value, (value,)) for value in [3, None, 1] * 50]
+    ascending = [row[0] for row in ExternalSort([False], memory).run(entries)]
+    assert ascending == [1] * 50 + [3] * 50 + [None] * 50
+    descending = [row[0] for row in ExternalSort([True], memory).run(entries)]
+    assert descending == [None] * 50 + [3] * 50 + [1] * 50
+
+
+def test_mixed_directions_with_nulls():
+    rows = [(1, 'b'), (None, 'a'), (1, None), (2, 'a'), (1, 'a')]
+    result = list(ExternalSort([True, False]).run(((row, row) for row in rows)))
+    assert result == [(None, 'a'), (2, 'a'), (1, 'a'), (1, 'b'), (1, None)]
+    assert top_rows(rows, lambda row: row, [True, False], 2) == [(None, 'a'), (2, 'a')]
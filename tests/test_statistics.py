@@ -0,0 +1,77 @@
+"""ANALYZE: column statistics, distinct-count sketches and histograms"""
+
+import pytest
+
+from phase4_executor.statistics import HISTOGRAM_BUCKETS, ColumnStatistics
+
+
+@pytest.fixture
+def analyzed(db):
+    """t(id, grp, name) with 1000 rows: ids 0-999, grp = id % 10, name NULL on every fourth row"""
+    db.run("CREATE TABLE t (id INT, grp INT, name TEXT)")
+    db.table('t').append_columns([
+        list(range(1000)),
+        [i % 10 for i in range(1000)],
+        [None if i % 4 == 0 else f"n{i}" for i in range(1000)],
+    ])
+    return db
+
+
+def test_analyze_returns_a_row_per_column(analyzed):
+    result = analyzed.run("ANALYZE t")[0]
+    assert result.columns == ['table', 'column', 'rows', 'nulls', 'distinct', 'min', 'max', 'buckets', 'encoding']
+    by_column = {row[1]: row for row in result.rows}
+    assert list(by_column) == ['id', 'grp', 'name']
+
+    rows, nulls, distinct, low, high = by_column['id'][2:7]
+    assert (rows, nulls, low, high) == (1000, 0, 0, 999)
+    # A sketch estimate, exact enough at this size
+    assert distinct == pytest.approx(1000, rel=0.02)
+    assert by_column['grp'][2:7] == (1000, 0, 10, 0, 9)
+    assert by_column['name'][2:4] == (1000, 250)
+    assert by_column['id'][7] == HISTOGRAM_BUCKETS
+
+
+def test_analyze_without_a_table_covers_every_table(analyzed):
+    analyzed.run("CREATE TABLE u (a INT); INSERT INTO u VALUES (1)")
+    result = analyzed.run("ANALYZE")[0]
+    assert {row[0] for row in result.rows} == {'t', 'u'}
+    assert analyzed.catalog.get_statistics('u').row_count == 1
+
+
+def test_inserts_keep_statistics_current(analyzed):
+    analyzed.run("ANALYZE t")
+    analyzed.run("INSERT INTO t VALUES (5000, 42, 'late')")
+    statistics = analyzed.catalog.get_statistics('t')
+    assert statistics.row_count == 1001
+    assert statistics.column('id').max_value == 5000
+    assert statistics.column('grp').distinct_count == 11
+
+
+def test_distinct_count_estimate_is_close():
+    column = ColumnStatistics('a', 'INT')
+    for i in range(50000):
+        column.add(i % 20000)
+    assert abs(column.distinct_count - 20000) / 20000 < 0.05
+
+
+def test_histogram_is_equi_depth():
+    column = ColumnStatistics('a', 'INT')
+    for i in range(10000):
+        column.add(i)
+    histogram = column.histogram()
+    assert len(histogram) == HISTOGRAM_BUCKETS
+    assert sum(rows for _, rows in histogram) == pytest.approx(10000, abs=HISTOGRAM_BUCKETS)
+    assert max(rows for _, rows in histogram) - min(rows for _, rows in histogram) <= 1
+    assert histogram[-1][0] == max(column.sample)
+
+
+def test_selectivity(analyzed):
+    analyzed.run("ANALYZE t")
+    statistics = analyzed.catalog.get_statistics('t')
+    assert statistics.column('grp').selectivity('=', 3) == pytest.approx(0.1)
+    assert statistics.column('id').selectivity('<', 250) == pytest.approx(0.25)
+    assert statistics.column('id').selectivity('>=', 250) == pytest.approx(0.75)
+    assert statistics.column('grp').selectivity('IN', (1, 2)) == pytest.approx(0.2)
+    # Nulls never satisfy a comparison
+    assert statistics.column('name').selectivity('!=', 'x') < 0.75
@@ -0,0 +1,115 @@
+"""On-disk table format: memory-mapped column segments"""
+
+from array import array
+
+import pytest
+
+from phase4_executor import MappedTable, StorageError, Table, open_catalog, open_table, save_catalog, save_table
+from phase4_executor.storage import COLUMN_HEADER, column_path, table_header_path
+
+
+ROWS = 3000
+
+
+@pytest.fixture
+def table():
+    table = Table('t', [('id', 'INT'), ('score', 'FLOAT'), ('name', 'TEXT')])
+    for i in range(ROWS):
+        table.append_row((i, i / 4, f"name {i} é"))
+    return table
+
+
+@pytest.fixture
+def saved(table, tmp_path):
+    save_table(table, str(tmp_path), compression=False)
+    mapped = open_table(str(tmp_path), 't')
+    yield mapped
+    mapped.close()
+
+
+def test_round_trip(table, saved):
+    assert isinstance(saved, MappedTable)
+    assert saved.mapped
+    assert saved.column_names == table.column_names
+    assert saved.column_types == table.column_types
+    assert list(saved.rows()) == list(table.rows())
+
+
+def test_columns_are_mapped_not_copied(saved):
+    assert isinstance(saved.columns['id'], memoryview)
+    assert isinstance(saved.columns['score'], memoryview)
+    assert saved.columns['name'][ROWS - 1] == f"name {ROWS - 1} é"
+
+
+def test_deletion_map_is_saved(table, tmp_path):
+    table.delete_rows([0, 5])
+    save_table(table, str(tmp_path), compression=False)
+    mapped = open_table(str(tmp_path), 't')
+    assert mapped.live_row_count == ROWS - 2
+    assert [row[0] for row in mapped.rows()][:4] == [1, 2, 3, 4]
+    mapped.close()
+
+
+def test_writes_materialize_the_columns(saved):
+    saved.delete_rows([1])
+    # A deletion only touches the deletion map
+    assert saved.mapped
+    saved.append_row([ROWS, 0.0, 'new'])
+    assert not saved.mapped
+    assert saved.get_row(ROWS) == (ROWS, 0.0, 'new')
+    assert saved.live_row_count == ROWS
+
+
+def test_foreign_byte_order_is_swapped(table, tmp_path):
+    save_table(table, str(tmp_path), compression=False)
+    path = column_path(str(tmp_path), 't', 'id')
+    with open(path, 'rb') as file:
+        data = bytearray(file.read())
+    magic, version, type_code, byte_order, row_count = COLUMN_HEADER.unpack_from(data)
+    COLUMN_HEADER.pack_into(data, 0, magic, version, type_code, 1 - byte_order, row_count)
+    body = array('q', data[COLUMN_HEADER.size:])
+    body.byteswap()
+    data[COLUMN_HEADER.size:] = body.tobytes()
+    with open(path, 'wb') as file:
+        file.write(data)
+
+    mapped = open_table(str(tmp_path), 't')
+    assert list(mapped.live_values('id')) == list(range(ROWS))
+    mapped.close()
+
+
+def test_invalid_files_are_rejected(table, tmp_path):
+    save_table(table, str(tmp_path), compression=False)
+    path = column_path(str(tmp_path), 't', 'score')
+    with open(path, 'r+b') as file:
+        file.write(b'XXXX')
+    with pytest.raises(StorageError, match="invalid header"):
+        open_table(str(tmp_path), 't')
+
+    with open(path, 'wb') as file:
+        file.write(b'MSQC')
+    with pytest.raises(StorageError, match="truncated"):
+        open_table(str(tmp_path), 't')
+
+
+def test_header_is_written_last(table, tmp_path):
+    save_table(table, str(tmp_path), compression=False)
+    with open(table_header_path(str(tmp_path), 't'), 'rb') as file:
+        header = file.read()
+    # A save interrupted after its column files leaves the old header in effect
+    table.append_row([ROWS, 1.0, 'extra'])
+    save_table(table, str(tmp_path), compression=False)
+    with open(table_header_path(str(tmp_path), 't'), 'wb') as file:
+        file.write(header)
+
+    mapped = open_table(str(tmp_path), 't')
+    assert mapped.row_count == ROWS
+    mapped.close()
+
+
+def test_catalog_round_trip(db, tmp_path):
+    db.run("CREATE TABLE a (x INT); CREATE TABLE b (y TEXT); INSERT INTO a VALUES (1); INSERT INTO b VALUES ('q')")
+    save_catalog(db.catalog, str(tmp_path))
+    catalog = open_catalog(str(tmp_path))
+    assert catalog.table_names() == ['a', 'b']
+    assert list(catalog.get_table('b').rows()) == [('q',)]
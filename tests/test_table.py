@@ -0,0 +1,97 @@
+"""Table storage: tombstone deletion, in-place updates and compaction"""
+
+import pytest
+
+from phase4_executor import Table
+from phase4_executor.table import COMPACTION_THRESHOLD
+
+
+ROWS = 100
+
+
+@pytest.fixture
+def table():
+    table = Table('t', [('id', 'INT'), ('name', 'TEXT')])
+    table.append_columns([list(range(ROWS)), [f"n{i}" for i in range(ROWS)]])
+    return table
+
+
+def test_delete_flags_rows_without_moving_others(table):
+    table.delete_rows([3, 7])
+    assert table.row_count == ROWS
+    assert table.dead_row_count == 2
+    assert table.is_deleted(3)
+    assert table.get_row(8) == (8, 'n8')
+    assert 3 not in list(table.live_values('id'))
+    assert table.compaction_count == 0
+
+
+def test_deleting_twice_counts_once(table):
+    table.delete_rows([4])
+    table.delete_rows([4])
+    assert table.dead_row_count == 1
+
+
+def test_fixed_width_updates_are_in_place(table):
+    table.update_rows([(5, {'id': 500})])
+    assert table.get_row(5) == (500, 'n5')
+    assert table.dead_row_count == 0
+
+
+def test_text_updates_move_the_row(table):
+    table.update_rows([(5, {'name': 'five'})])
+    assert table.is_deleted(5)
+    assert table.get_row(ROWS) == (5, 'five')
+    assert table.live_row_count == ROWS
+
+
+def test_failed_appends_change_nothing():
+    table = Table('u', [('name', 'TEXT'), ('id', 'INT')])
+    table.append_row(['a', 1])
+    with pytest.raises(TypeError):
+        table.append_row(['b', 'two'])
+    with pytest.raises(TypeError):
+        table.append_columns([['c', 'd'], [3, 'four']])
+    assert table.row_count == 1
+    assert [len(column) for column in table.columns.values()] == [1, 1]
+    table.append_row(['e', 5])
+    assert list(table.rows()) == [('a', 1), ('e', 5)]
+
+
+def test_compaction_at_the_threshold(table):
+    below = int(ROWS * COMPACTION_THRESHOLD) - 1
+    table.delete_rows(range(below))
+    assert table.compaction_count == 0
+
+    table.delete_rows([below])
+    assert table.compaction_count == 1
+    assert table.row_count == table.live_row_count == ROWS - below - 1
+    assert table.dead_row_count == 0
+    assert list(table.rows())[0] == (below + 1, f"n{below + 1}")
+    assert table.compaction_seconds >= 0
+
+
+def test_change_rows_compacts_once(table):
+    table.change_rows([(0, {'name': 'zero'})], range(1, 40))
+    assert table.compaction_count == 1
+    assert sorted(table.rows())[0] == (0, 'zero')
+    assert table.live_row_count == ROWS - 39
+
+
+def test_snapshots_do_not_see_later_deletes(table):
+    snapshot = table.snapshot()
+    table.delete_rows(range(50))
+    assert table.compaction_count == 1
+    assert snapshot.live_row_count == ROWS
+    assert len(list(snapshot.rows())) == ROWS
+
+
+def test_delete_statement_uses_tombstones(db):
+    db.run("CREATE TABLE t (id INT)")
+    db.table('t').append_columns([list(range(10))])
+    db.run("DELETE FROM t WHERE id = 2")
+    assert db.table('t').dead_row_count == 1
+    assert len(db.rows("SELECT id FROM t")) == 9
+    db.run("DELETE FROM t WHERE id < 5")
+    assert db.table('t').compaction_count == 1
+    assert db.rows("SELECT id FROM t") == [(i,) for i in range(5, 10)]
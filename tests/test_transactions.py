@@ -0,0 +1,143 @@
+"""BEGIN / COMMIT / ROLLBACK: buffered writes, reading them back and conflicts"""
+
+import pytest
+
+from phase4_executor import Catalog, QueryExecutor, WriteAheadLog, connect
+from phase4_executor.connection import DatabaseError
+from support import Session
+
+
+@pytest.fixture
+def sessions(db):
+    """Two sessions on one catalog holding t(id, v, name) with ids 1 to 5"""
+    db.run("CREATE TABLE t (id INT, v INT, name TEXT)")
+    for i in range(1, 6):
+        db.run(f"INSERT INTO t VALUES ({i}, {i * 10}, 'n{i}')")
+    other = Session(QueryExecutor(db.catalog))
+    yield db, other
+    other.close()
+
+
+def ids(session):
+    return sorted(row[0] for row in session.rows("SELECT id FROM t"))
+
+
+def test_select_reads_own_inserts(sessions):
+    session, other = sessions
+    session.run("BEGIN; INSERT INTO t VALUES (6, 60, 'n6')")
+
+    assert ids(session) == [1, 2, 3, 4, 5, 6]
+    assert session.rows("SELECT COUNT(*), SUM(v) FROM t") == [(6, 210)]
+    assert ids(other) == [1, 2, 3, 4, 5]
+
+    session.run("COMMIT")
+    assert ids(other) == [1, 2, 3, 4, 5, 6]
+
+
+def test_update_and_delete_are_buffered(sessions):
+    session, other = sessions
+    session.run("""
+        BEGIN;
+        INSERT INTO t VALUES (6, 60, 'n6');
+        INSERT INTO t VALUES (7, 70, 'n7');
+        UPDATE t SET v = v + 1 WHERE id >= 4;
+        UPDATE t SET name = 'renamed' WHERE id = 2;
+        DELETE FROM t WHERE id = 1 OR id = 7;
+    """)
+
+    expected = [(2, 20, 'renamed'), (3, 30, 'n3'), (4, 41, 'n4'), (5, 51, 'n5'), (6, 61, 'n6')]
+    assert sorted(session.rows("SELECT id, v, name FROM t")) == expected
+    assert sorted(other.rows("SELECT id, v, name FROM t")) == [(i, i * 10, f"n{i}") for i in range(1, 6)]
+
+    result = session.run("COMMIT")[0]
+    # 6 inserted, 2, 4 and 5 updated, 1 deleted; 7 never existed outside the transaction
+    assert result.row_count == 5
+    assert sorted(other.rows("SELECT id, v, name FROM t")) == expected
+
+
+def test_rollback_discards_every_write(sessions):
+    session, other = sessions
+    session.run("BEGIN; UPDATE t SET v = 0; DELETE FROM t WHERE id = 3; INSERT INTO t VALUES (9, 9, 'x')")
+    session.run("ROLLBACK")
+    assert sorted(session.rows("SELECT id, v FROM t")) == [(i, i * 10) for i in range(1, 6)]
+
+
+def test_deletes_hide_indexed_rows(sessions):
+    session, _ = sessions
+    session.table('t').create_index('id', 'hash')
+    session.run("BEGIN; DELETE FROM t WHERE id = 3")
+    assert session.rows("SELECT id FROM t WHERE id = 3") == []
+    assert session.rows("SELECT COUNT(*) FROM t") == [(4,)]
+    session.run("COMMIT")
+    assert session.rows("SELECT id FROM t WHERE id = 3") == []
+
+
+def test_later_statements_read_the_pinned_snapshot(sessions):
+    session, other = sessions
+    session.run("BEGIN; DELETE FROM t WHERE id = 1")
+    other.run("INSERT INTO t VALUES (8, 80, 'n8')")
+    # The transaction keeps reading the table it changed as it was
+    assert ids(session) == [2, 3, 4, 5]
+
+
+def test_conflicting_commit_is_rolled_back(sessions):
+    session, other = sessions
+    session.run("BEGIN; UPDATE t SET v = 0 WHERE id = 2; INSERT INTO t VALUES (6, 60, 'n6')")
+    other.run("UPDATE t SET v = 99 WHERE id = 2")
+
+    errors = session.fails("COMMIT")
+    assert "was changed by another session" in errors[0]
+    assert session.executor.transaction is None
+    assert sorted(session.rows("SELECT id, v FROM t WHERE id >= 2 AND id <= 6")) == [
+        (2, 99), (3, 30), (4, 40), (5, 50)
+    ]
+
+
+def test_insert_only_transactions_do_not_conflict(sessions):
+    session, other = sessions
+    session.run("BEGIN; INSERT INTO t VALUES (6, 60, 'n6')")
+    other.run("DELETE FROM t WHERE id = 1")
+    session.run("COMMIT")
+    assert ids(other) == [2, 3, 4, 5, 6]
+
+
+def test_create_is_still_rejected(sessions):
+    session, _ = sessions
+    session.run("BEGIN")
+    assert "cannot run inside a transaction" in session.fails("CREATE TABLE u (a INT)")[0]
+
+
+def test_committed_changes_are_replayed(tmp_path):
+    path = str(tmp_path / 'wal')
+    wal = WriteAheadLog(path)
+    session = Session(QueryExecutor(Catalog(), wal))
+    session.run("CREATE TABLE t (id INT, name TEXT)")
+    for i in range(1, 4):
+        session.run(f"INSERT INTO t VALUES ({i}, 'n{i}')")
+    session.run("""
+        BEGIN;
+        UPDATE t SET name = 'two' WHERE id = 2;
+        DELETE FROM t WHERE id = 3;
+        INSERT INTO t VALUES (4, 'n4');
+        COMMIT;
+    """)
+    wal.close()
+
+    catalog = Catalog()
+    wal = WriteAheadLog(path)
+    wal.replay(catalog)
+    wal.close()
+    restored = Session(QueryExecutor(catalog))
+    assert sorted(restored.rows("SELECT id, name FROM t")) == [(1, 'n1'), (2, 'two'), (4, 'n4')]
+
+
+def test_connection_commit_reports_conflicts(sessions):
+    session, other = sessions
+    connection = connect(session.catalog)
+    connection.execute("BEGIN")
+    connection.execute("DELETE FROM t WHERE id = 5")
+    other.run("DELETE FROM t WHERE id = 4")
+    with pytest.raises(DatabaseError):
+        connection.commit()
+    connection.close()
+    assert ids(other) == [1, 2, 3, 5]
@@ -0,0 +1,220 @@
+"""Write-ahead log: replay, checkpoints and recovering a database directory"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from phase4_executor import Catalog, QueryExecutor, WriteAheadLog, open_database
+from phase4_executor.server import QueryServer
+from phase4_executor.storage import StorageError
+from phase4_executor.wal import WAL_FILE_NAME
+from support import Session
+
+
+WRITES = """
+    CREATE TABLE t (id INT, name TEXT);
+    INSERT INTO t VALUES (1, 'a');
+    INSERT INTO t VALUES (2, 'b');
+    INSERT INTO t VALUES (3, 'c');
+    UPDATE t SET name = 'bb' WHERE id = 2;
+    DELETE FROM t WHERE id = 3;
+"""
+
+
+def open_session(directory):
+    catalog, wal = open_database(directory)
+    return Session(QueryExecutor(catalog, wal)), wal
+
+
+def reopen(directory):
+    catalog, wal = open_database(directory)
+    wal.close()
+    return Session(QueryExecutor(catalog))
+
+
+def test_replay_restores_every_write(tmp_path):
+    session, wal = open_session(str(tmp_path))
+    session.run(WRITES)
+    session.run("BEGIN; INSERT INTO t VALUES (4, 'd'); COMMIT")
+    wal.close()
+
+    restored = reopen(str(tmp_path))
+    assert sorted(restored.rows("SELECT id, name FROM t")) == [(1, 'a'), (2, 'bb'), (4, 'd')]
+
+
+def test_checkpoint_then_log(tmp_path):
+    directory = str(tmp_path)
+    session, wal = open_session(directory)
+    session.run(WRITES)
+    assert wal.checkpoint(session.catalog, directory) == 1
+    assert wal.record_count == 0
+    session.run("INSERT INTO t VALUES (5, 'e')")
+    wal.close()
+
+    restored = reopen(directory)
+    assert sorted(restored.rows("SELECT id FROM t")) == [(1,), (2,), (5,)]
+
+
+def test_crash_between_snapshot_and_log_restart(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    session, wal = open_session(directory)
+    session.run(WRITES)
+
+    def crash(generation):
+        raise OSError("crashed before the log was truncated")
+
+    monkeypatch.setattr(wal, '_restart', crash)
+    with pytest.raises(OSError):
+        wal.checkpoint(session.catalog, directory)
+    monkeypatch.undo()
+    wal.close()
+
+    # The snapshot already holds the logged writes: they are not applied twice
+    catalog, wal = open_database(directory)
+    assert wal.generation == 1 and wal.record_count == 0
+    Session(QueryExecutor(catalog, wal)).run("INSERT INTO t VALUES (6, 'f')")
+    wal.close()
+    restored = reopen(directory)
+    assert sorted(restored.rows("SELECT id FROM t")) == [(1,), (2,), (6,)]
+
+
+def test_checkpoint_waits_for_running_writers(tmp_path):
+    directory = str(tmp_path)
+    session, wal = open_session(directory)
+    session.run(WRITES)
+    table = session.table('t')
+    done = threading.Event()
+
+    def checkpoint():
+        wal.checkpoint(session.catalog, directory)
+        done.set()
+
+    with table.write_lock:
+        # A write applied but not logged yet
+        table.append_row([7, 'g'])
+        worker = threading.Thread(target=checkpoint)
+        worker.start()
+        assert not done.wait(0.2)
+        wal.append(('INSERT', 't', [7, 'g']))
+    worker.join()
+    wal.close()
+
+    restored = reopen(directory)
+    assert sorted(restored.rows("SELECT id FROM t")) == [(1,), (2,), (7,)]
+
+
+def test_log_of_a_later_checkpoint_is_rejected(tmp_path):
+    directory = str(tmp_path)
+    session, wal = open_session(directory)
+    session.run(WRITES)
+    wal.checkpoint(session.catalog, directory)
+    wal.close()
+    os.remove(os.path.join(directory, 'snapshot.json'))
+
+    with pytest.raises(StorageError):
+        open_database(directory)
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = str(tmp_path / WAL_FILE_NAME)
+    wal = WriteAheadLog(path)
+    wal.append(('CREATE', 't', [['id', 'INT']]))
+    wal.append(('INSERT', 't', [1]))
+    wal.close()
+    with open(path, 'ab') as file:
+        file.write(b'\x10\x00\x00\x00torn')
+
+    catalog, wal = open_database(str(tmp_path))
+    wal.close()
+    assert catalog.get_table('t').row_count == 1
+
+
+def test_load_is_checkpointed(tmp_path):
+    directory = str(tmp_path / 'db')
+    snapshot = str(tmp_path / 'snap')
+    session, wal = open_session(directory)
+    session.run("CREATE TABLE t (id INT, name TEXT); INSERT INTO t VALUES (1, 'a')")
+    session.run(f"SAVE SNAPSHOT '{snapshot}'")
+    session.run(f"LOAD SNAPSHOT '{snapshot}'")
+    assert wal.generation == 1
+    session.run("INSERT INTO t VALUES (3, 'c')")
+    # The directory the database was loaded from no longer holds what was loaded
+    session.run(f"SAVE SNAPSHOT '{snapshot}'")
+    assert sorted(session.rows("SELECT id FROM t")) == [(1,), (3,)]
+    wal.close()
+
+    restored = reopen(directory)
+    assert sorted(restored.rows("SELECT id FROM t")) == [(1,), (3,)]
+
+
+def test_replayed_load_needs_the_same_snapshot(tmp_path):
+    path = str(tmp_path / WAL_FILE_NAME)
+    snapshot = str(tmp_path / 'snap')
+    wal = WriteAheadLog(path)
+    session = Session(QueryExecutor(Catalog(), wal))
+    session.run("CREATE TABLE t (id INT, name TEXT); INSERT INTO t VALUES (1, 'a')")
+    session.run(f"SAVE SNAPSHOT '{snapshot}'")
+    session.run(f"LOAD SNAPSHOT '{snapshot}'")
+    session.run("INSERT INTO t VALUES (2, 'b')")
+    wal.close()
+
+    catalog = Catalog()
+    wal = WriteAheadLog(path)
+    wal.replay(catalog)
+    assert Session(QueryExecutor(catalog)).rows("SELECT id FROM t") == [(1,), (2,)]
+
+    session = Session(QueryExecutor(catalog, wal))
+    session.run(f"SAVE SNAPSHOT '{snapshot}'")
+    wal.close()
+    wal = WriteAheadLog(path)
+    with pytest.raises(StorageError, match="no longer"):
+        wal.replay(Catalog())
+    wal.close()
+
+
+def test_server_checkpoints_on_close(tmp_path):
+    directory = str(tmp_path)
+    catalog, wal = open_database(directory)
+    server = QueryServer(catalog, wal, workers=1, checkpoint_directory=directory)
+    Session(QueryExecutor(catalog, wal)).run(WRITES)
+
+    asyncio.run(server.close())
+    wal.close()
+
+    assert server.checkpoint_count == 1
+    assert os.path.exists(os.path.join(directory, 'snapshot.json'))
+    restored = reopen(directory)
+    assert sorted(restored.rows("SELECT id FROM t")) == [(1,), (2,)]
+
+
+def test_group_commit_batches_syncs(tmp_path):
+    catalog, wal = open_database(str(tmp_path), group_commit_size=3)
+    session = Session(QueryExecutor(catalog, wal))
+    syncs = wal.sync_count
+    session.run(WRITES)
+    # Six records in two full groups
+    assert wal.record_count == 6
+    assert wal.sync_count - syncs == 2
+    session.run("INSERT INTO t VALUES (7, 'g')")
+    assert wal.pending == 1 and wal.synced_count == 6
+    # Closing syncs the group that is not full yet
+    wal.close()
+    assert wal.synced_count == 7
+
+    restored = reopen(str(tmp_path))
+    assert sorted(restored.rows("SELECT id FROM t")) == [(1,), (2,), (7,)]
+
+
+def test_group_commit_interval_flushes_pending_records(tmp_path):
+    catalog, wal = open_database(str(tmp_path), group_commit_size=100, group_commit_interval=0.01)
+    session = Session(QueryExecutor(catalog, wal))
+    session.run("CREATE TABLE t (id INT, name TEXT)")
+    deadline = time.monotonic() + 5
+    while wal.synced_count < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert wal.synced_count == 1
+    assert wal.pending == 0
+    wal.close()
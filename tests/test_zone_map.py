@@ -0,0 +1,78 @@
+"""Zone maps: per-block min/max ranges that let scans skip blocks"""
+
+import pytest
+
+from phase4_executor import Table, plan_scan
+from phase4_executor.zone_map import BLOCK_SIZE, ColumnZones
+
+
+BLOCKS = 4
+
+
+@pytest.fixture
+def ordered(db):
+    """t(id, grp) with ids in ascending order over four blocks and grp = id % 3"""
+    db.run("CREATE TABLE t (id INT, grp INT)")
+    ids = list(range(BLOCKS * BLOCK_SIZE))
+    db.table('t').append_columns([ids, [i % 3 for i in ids]])
+    return db
+
+
+def explain(session, sql):
+    return dict(session.rows(f"EXPLAIN SELECT * FROM t WHERE {sql}"))
+
+
+@pytest.mark.parametrize('condition, scanned', [
+    ("id < 100", 1),
+    (f"id >= {3 * BLOCK_SIZE}", 1),
+    (f"id = {BLOCK_SIZE + 5}", 1),
+    (f"id > {BLOCK_SIZE} AND id < {2 * BLOCK_SIZE + 1}", 2),
+    ("id IN (1, 99999)", 1),
+    ("id < 0", 0),
+    ("grp = 1", BLOCKS),
+    ("id < 100 OR grp = 1", BLOCKS),
+])
+def test_blocks_scanned(ordered, condition, scanned):
+    plan = explain(ordered, condition)
+    assert plan['blocks'] == BLOCKS
+    assert plan['blocks scanned'] == scanned
+    assert plan['blocks skipped'] == BLOCKS - scanned
+
+
+def test_pruned_results_match_a_full_scan(ordered):
+    pruned = ordered.run(f"SELECT id FROM t WHERE id >= {2 * BLOCK_SIZE} AND id < {2 * BLOCK_SIZE + 3}")[0]
+    assert pruned.rows == [(2 * BLOCK_SIZE,), (2 * BLOCK_SIZE + 1,), (2 * BLOCK_SIZE + 2,)]
+    assert (pruned.blocks_scanned, pruned.blocks_skipped) == (1, BLOCKS - 1)
+
+
+def test_updates_widen_the_ranges(ordered):
+    ordered.run("UPDATE t SET id = 999999 WHERE id = 7")
+    assert ordered.rows("SELECT grp FROM t WHERE id = 999999") == [(7 % 3,)]
+    assert explain(ordered, "id = 999999")['blocks scanned'] == 1
+
+
+def test_compaction_rebuilds_exact_ranges(ordered):
+    ordered.run(f"DELETE FROM t WHERE id < {2 * BLOCK_SIZE}")
+    table = ordered.table('t')
+    assert table.compaction_count == 1
+    zones = table.zone_map.columns['id']
+    assert (zones.mins[0], zones.maxs[0]) == (2 * BLOCK_SIZE, 3 * BLOCK_SIZE - 1)
+
+
+def test_null_only_blocks_never_match():
+    zones = ColumnZones()
+    zones.add_range(0, [None, None])
+    zones.add(1, 5)
+    assert zones.null_counts == [2, 0]
+    assert not zones.may_match(0, '=', 1)
+    assert not zones.may_match(0, '!=', 1)
+    assert zones.may_match(1, '<=', 5)
+    assert not zones.may_match(1, '<', 5)
+
+
+def test_plan_without_a_where_clause_reads_everything():
+    table = Table('t', [('a', 'INT')])
+    table.append_columns([list(range(BLOCK_SIZE + 1))])
+    plan = plan_scan(table, None)
+    assert not plan.pruned
+    assert plan.ranges() == [(0, BLOCK_SIZE + 1)]